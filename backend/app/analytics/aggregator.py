@@ -0,0 +1,281 @@
+"""
+aggregator.py
+--------------
+Incremental traffic statistics for the dashboard, fed by the store stage.
+
+Stored packets are counted into tumbling buckets of STATS_BUCKET_SECONDS kept in a
+ring covering the longest configured window. A sliding window is the merge of its
+buckets: packet/byte counts per protocol and risk level, Space-Saving top talkers
+and HyperLogLog distinct sources/destinations. Merges of the closed buckets are
+cached until the next bucket starts, so a query costs at most one merge per window
+and bucket period plus a merge of the live bucket, independent of packet volume.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional
+from app.analytics.sketches import HyperLogLog, SpaceSaving
+
+# Top-talker sketches per bucket and the unit they count
+TALKER_SKETCHES = {
+    "sourcesByBytes": "bytes",
+    "sourcesByPackets": "packets",
+    "destinationsByBytes": "bytes",
+    "destinationsByPackets": "packets",
+}
+
+
+class _Bucket:
+    """
+    Counts of one time bucket, or of several merged buckets.
+    """
+
+    def __init__(self, index: int, topCapacity: int, hllPrecision: int):
+        self.index = index
+        self.packets: int = 0
+        self.bytes: int = 0
+        # protocol -> [packets, bytes]
+        self.protocols: Dict[str, List[int]] = {}
+        # risk level -> packets
+        self.risks: Dict[str, int] = {}
+        self.talkers = {name: SpaceSaving(topCapacity) for name in TALKER_SKETCHES}
+        self.distinctSources = HyperLogLog(hllPrecision)
+        self.distinctDestinations = HyperLogLog(hllPrecision)
+
+    def mergeFrom(self, other: "_Bucket") -> None:
+        self.packets += other.packets
+        self.bytes += other.bytes
+        for protocol, (packets, size) in other.protocols.items():
+            counts = self.protocols.setdefault(protocol, [0, 0])
+            counts[0] += packets
+            counts[1] += size
+        for risk, packets in other.risks.items():
+            self.risks[risk] = self.risks.get(risk, 0) + packets
+        for name, sketch in other.talkers.items():
+            self.talkers[name].mergeFrom(sketch)
+        self.distinctSources.mergeFrom(other.distinctSources)
+        self.distinctDestinations.mergeFrom(other.distinctDestinations)
+
+    def copy(self) -> "_Bucket":
+        clone = _Bucket.__new__(_Bucket)
+        clone.index = self.index
+        clone.packets = self.packets
+        clone.bytes = self.bytes
+        clone.protocols = {protocol: list(counts) for protocol, counts in self.protocols.items()}
+        clone.risks = dict(self.risks)
+        clone.talkers = {name: sketch.copy() for name, sketch in self.talkers.items()}
+        clone.distinctSources = self.distinctSources.copy()
+        clone.distinctDestinations = self.distinctDestinations.copy()
+        return clone
+
+
+class TrafficAggregator:
+    """
+    Sliding-window and session statistics over stored packets.
+    """
+
+    def __init__(
+        self,
+        bucketSeconds: float = 1.0,
+        windows: List[int] = (10, 60, 300),
+        topCapacity: int = 64,
+        hllPrecision: int = 10,
+        timelineBuckets: int = 60,
+    ):
+        self.bucketSeconds = max(0.1, bucketSeconds)
+        self.windows = sorted({int(window) for window in windows if window > 0}) or [60]
+        self.topCapacity = topCapacity
+        self.hllPrecision = hllPrecision
+        self.timelineBuckets = timelineBuckets
+        # Ring of buckets covering the longest window
+        self.bucketCount = max(1, int(round(self.windows[-1] / self.bucketSeconds)))
+        self.lock = threading.Lock()
+        # window seconds (or "session") -> (live bucket index, merge of the closed buckets)
+        self._closedCache: Dict[object, tuple] = {}
+        self.clear()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.buckets: List[Optional[_Bucket]] = [None] * self.bucketCount
+            # Buckets that left the ring; with the ring they make up the session totals
+            self.expired = self._newBucket(0)
+            self.startedAt: Optional[float] = None
+            self._closedCache = {}
+
+    def _newBucket(self, index: int) -> _Bucket:
+        return _Bucket(index, self.topCapacity, self.hllPrecision)
+
+    def _bucketIndex(self, timestamp: float) -> int:
+        return int(timestamp // self.bucketSeconds)
+
+    # -----------------------------------------------------------------------
+    # Ingestion
+    # -----------------------------------------------------------------------
+
+    def update(self, packets: List[Dict]) -> None:
+        """
+        Counts one stored batch. The batch is pre-aggregated without the lock,
+        so the sketches see each distinct key once per batch.
+        """
+        if not packets:
+            return
+        totalBytes = 0
+        protocols: Dict[str, List[int]] = {}
+        risks: Dict[str, int] = {}
+        # address -> [packets, bytes]
+        sources: Dict[str, List[int]] = {}
+        destinations: Dict[str, List[int]] = {}
+        for packetData in packets:
+            length = packetData.get("length") or 0
+            totalBytes += length
+            counts = protocols.setdefault(packetData.get("protocol", "UNKNOWN"), [0, 0])
+            counts[0] += 1
+            counts[1] += length
+            risk = packetData.get("risk", "UNKNOWN")
+            risks[risk] = risks.get(risk, 0) + 1
+            for addresses, field in ((sources, "source"), (destinations, "destination")):
+                counts = addresses.setdefault(packetData.get(field, "UNKNOWN"), [0, 0])
+                counts[0] += 1
+                counts[1] += length
+        talkerWeights = {
+            "sourcesByBytes": {address: size for address, (_, size) in sources.items()},
+            "sourcesByPackets": {address: count for address, (count, _) in sources.items()},
+            "destinationsByBytes": {address: size for address, (_, size) in destinations.items()},
+            "destinationsByPackets": {address: count for address, (count, _) in destinations.items()},
+        }
+
+        with self.lock:
+            # Read under the lock: once a snapshot has seen a newer bucket, older ones never change again
+            timestamp = time.time()
+            index = self._bucketIndex(timestamp)
+            if self.startedAt is None:
+                self.startedAt = timestamp
+            slot = index % self.bucketCount
+            bucket = self.buckets[slot]
+            if bucket is None or bucket.index != index:
+                if bucket is not None:
+                    self.expired.mergeFrom(bucket)
+                # Closed buckets are replaced, never mutated, so snapshots can merge them unlocked
+                bucket = self.buckets[slot] = self._newBucket(index)
+            bucket.packets += len(packets)
+            bucket.bytes += totalBytes
+            for protocol, (count, size) in protocols.items():
+                counts = bucket.protocols.setdefault(protocol, [0, 0])
+                counts[0] += count
+                counts[1] += size
+            for risk, count in risks.items():
+                bucket.risks[risk] = bucket.risks.get(risk, 0) + count
+            for name, weights in talkerWeights.items():
+                bucket.talkers[name].updateMany(weights)
+            bucket.distinctSources.addMany(sources)
+            bucket.distinctDestinations.addMany(destinations)
+
+    # -----------------------------------------------------------------------
+    # Queries
+    # -----------------------------------------------------------------------
+
+    def _closedMerge(self, key, liveIndex: int, closedBuckets: List[_Bucket]) -> _Bucket:
+        """
+        Merges closed buckets once per live bucket; closed buckets never change, so the result stays valid until then.
+        """
+        cached = self._closedCache.get(key)
+        if cached is not None and cached[0] == liveIndex:
+            return cached[1]
+        merged = self._newBucket(liveIndex)
+        for bucket in closedBuckets:
+            merged.mergeFrom(bucket)
+        self._closedCache[key] = (liveIndex, merged)
+        return merged
+
+    def _summarize(self, bucket: _Bucket, seconds: float, top: int) -> Dict:
+        seconds = max(seconds, self.bucketSeconds)
+        highRisk = bucket.risks.get("HIGH", 0)
+        summary = {
+            "seconds": seconds,
+            "packets": bucket.packets,
+            "bytes": bucket.bytes,
+            "packetsPerSecond": bucket.packets / seconds,
+            "bytesPerSecond": bucket.bytes / seconds,
+            "protocols": {
+                protocol: {"packets": packets, "bytes": size}
+                for protocol, (packets, size) in sorted(bucket.protocols.items(), key=lambda item: -item[1][0])
+            },
+            "risk": dict(bucket.risks),
+            "riskPerSecond": {risk: count / seconds for risk, count in bucket.risks.items()},
+            "highRiskShare": highRisk / bucket.packets if bucket.packets else 0.0,
+            "distinctSources": bucket.distinctSources.count(),
+            "distinctDestinations": bucket.distinctDestinations.count(),
+        }
+        for name, sketch in bucket.talkers.items():
+            unit = TALKER_SKETCHES[name]
+            summary[name] = [
+                {"address": address, unit: count, "error": error} for address, count, error in sketch.top(top)
+            ]
+        return summary
+
+    def snapshot(self, window: Optional[int] = None, top: int = 10) -> Dict:
+        """
+        Returns the statistics of every configured window (or only 'window' seconds),
+        the session totals and a per-bucket timeline of the most recent buckets.
+        Raises ValueError for a window longer than the retained buckets.
+        """
+        if window is not None and not 0 < window <= self.bucketCount * self.bucketSeconds:
+            raise ValueError(f"window must be between 1 and {int(self.bucketCount * self.bucketSeconds)} seconds.")
+        windows = [window] if window is not None else self.windows
+
+        with self.lock:
+            now = time.time()
+            liveIndex = self._bucketIndex(now)
+            # References are enough for closed buckets; the live one keeps changing, so it is copied
+            ringBuckets = [bucket for bucket in self.buckets if bucket is not None]
+            liveBucket = next((bucket.copy() for bucket in ringBuckets if bucket.index == liveIndex), None)
+            # The session merge is the expired buckets plus the closed ring buckets. The cache check and the
+            # choice of base happen in one locked step, so a concurrent snapshot replacing the cached entry
+            # cannot make this one merge the ring without the expired buckets
+            cachedSession = self._closedCache.get("session")
+            if cachedSession is not None and cachedSession[0] == liveIndex:
+                sessionClosed, expired = cachedSession[1], None
+            else:
+                sessionClosed, expired = None, self.expired.copy()
+            startedAt = self.startedAt
+
+        buckets = [bucket for bucket in ringBuckets if liveIndex - bucket.index < self.bucketCount]
+
+        elapsed = now - startedAt if startedAt is not None else 0.0
+        result = {"bucketSeconds": self.bucketSeconds, "windows": {}}
+        for seconds in windows:
+            span = max(1, int(round(seconds / self.bucketSeconds)))
+            closed = [bucket for bucket in buckets if 0 < liveIndex - bucket.index < span]
+            merged = self._closedMerge(seconds, liveIndex, closed).copy()
+            if liveBucket is not None:
+                merged.mergeFrom(liveBucket)
+            # Young sessions are averaged over their actual age
+            result["windows"][str(seconds)] = self._summarize(merged, min(seconds, elapsed), top)
+
+        # Stale buckets still in the ring (no traffic for a full window) belong to the session as well
+        if sessionClosed is None:
+            sessionClosed = expired
+            for bucket in ringBuckets:
+                if bucket.index != liveIndex:
+                    sessionClosed.mergeFrom(bucket)
+            self._closedCache["session"] = (liveIndex, sessionClosed)
+        session = sessionClosed.copy()
+        if liveBucket is not None:
+            session.mergeFrom(liveBucket)
+        result["session"] = self._summarize(session, elapsed, top)
+
+        # Tumbling per-bucket series for charts, oldest first, with empty buckets filled in
+        byIndex = {bucket.index: bucket for bucket in buckets if bucket.index != liveIndex}
+        if liveBucket is not None:
+            byIndex[liveIndex] = liveBucket
+        timeline = []
+        for index in range(liveIndex - min(self.timelineBuckets, self.bucketCount) + 1, liveIndex + 1):
+            bucket = byIndex.get(index)
+            timeline.append({
+                "start": index * self.bucketSeconds,
+                "packets": bucket.packets if bucket else 0,
+                "bytes": bucket.bytes if bucket else 0,
+                "risk": dict(bucket.risks) if bucket else {},
+            })
+        result["timeline"] = timeline
+        return result
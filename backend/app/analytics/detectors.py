@@ -0,0 +1,265 @@
+"""
+detectors.py
+-------------
+Streaming scan and flood detection across all traffic, in fixed memory.
+
+The model judges packets one at a time from flow features, so it cannot see a source
+touching hundreds of ports or a flood building up across many flows. This stage looks
+at every scored batch before it is stored and keeps, per tumbling window of
+DETECTOR_WINDOW_SECONDS:
+
+- portscan: distinct destination ports per source (virtual HyperLogLog)
+- hostscan: distinct destination hosts per source (virtual HyperLogLog)
+- synflood: SYN packets per source (Count-Min) above an absolute threshold and
+  DETECTOR_BASELINE_FACTOR times its EWMA baseline from earlier windows
+- flood:    packets per destination (Count-Min) against the same kind of baseline
+
+All sketches are sized up front, so millions of sources cost no extra memory; only
+flagged addresses (at most DETECTOR_MAX_FLAGGED) and recent alerts are kept by key.
+Packets from a flagged source or to a flagged flood target are escalated to
+DETECTOR_RISK for DETECTOR_FLAG_WINDOWS windows.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.analytics.sketches import CountMinSketch, VirtualHyperLogLog, hashKeys, mix64
+from app.utils import metrics
+
+RISK_ORDER = {"LOW": 0, "MEDIUM": 1, "HIGH": 2}
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+# Protocol number folded into the port element, so TCP/80 and UDP/80 count as different services
+_PROTOCOL_TAGS = {"TCP": 6 << 16, "UDP": 17 << 16}
+# Addresses that name no real host
+_NO_ADDRESS = ("", "UNKNOWN", "PARSE_ERROR")
+
+ALERTS_HELP = "Alerts raised by the streaming scan/flood detectors"
+
+
+class StreamingDetector:
+    """
+    Scan and flood detectors fed with scored packet batches (see module docstring).
+    """
+
+    def __init__(
+        self,
+        windowSeconds: float = 10.0,
+        portScanPorts: int = 100,
+        hostScanHosts: int = 64,
+        synFloodPackets: int = 1000,
+        floodPackets: int = 20000,
+        baselineFactor: float = 5.0,
+        ewmaAlpha: float = 0.2,
+        sketchWidth: int = 1 << 16,
+        sketchDepth: int = 4,
+        poolRegisters: int = 1 << 20,
+        virtualRegisters: int = 128,
+        maxFlagged: int = 10000,
+        flagWindows: int = 3,
+        maxAlerts: int = 1000,
+        risk: str = "HIGH",
+        session: str = "default",
+    ):
+        self.windowSeconds = max(1.0, windowSeconds)
+        self.portScanPorts = portScanPorts
+        self.hostScanHosts = hostScanHosts
+        self.synFloodPackets = synFloodPackets
+        self.floodPackets = floodPackets
+        self.baselineFactor = baselineFactor
+        self.maxFlagged = max(1, maxFlagged)
+        self.flagWindows = max(1, flagWindows)
+        self.risk = risk
+        # Capture session label of the alert counters
+        self.session = session
+        self.lock = threading.Lock()
+
+        # Packets per source only pre-selects scan candidates: a source needs at least
+        # as many packets as ports or hosts it touched
+        self.sourcePackets = CountMinSketch(sketchWidth, sketchDepth)
+        self.sourceSyns = CountMinSketch(sketchWidth, sketchDepth, ewmaAlpha)
+        self.destinationPackets = CountMinSketch(sketchWidth, sketchDepth, ewmaAlpha)
+        self.destinationPorts = VirtualHyperLogLog(poolRegisters, virtualRegisters)
+        self.destinationHosts = VirtualHyperLogLog(poolRegisters, virtualRegisters)
+
+        # (role, address) -> {"kinds": {kind: alertId}, "window": last window it was seen}
+        self.flagged: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        self.alerts: deque = deque(maxlen=max(1, maxAlerts))
+        self.nextAlertId: int = 1
+        self.windowIndex: Optional[int] = None
+        self.packetsInspected: int = 0
+        self.packetsEscalated: int = 0
+
+    def clear(self) -> None:
+        with self.lock:
+            for sketch in (self.sourcePackets, self.sourceSyns, self.destinationPackets,
+                           self.destinationPorts, self.destinationHosts):
+                sketch.clear()
+            self.flagged.clear()
+            self.windowIndex = None
+            self.packetsInspected = 0
+            self.packetsEscalated = 0
+
+    # -----------------------------------------------------------------------
+    # Detection
+    # -----------------------------------------------------------------------
+
+    def _rotate(self, now: float) -> None:
+        """
+        Starts a new window: folds counts into the EWMA baselines, resets the distinct counters
+        and forgets flags that were not refreshed for flagWindows windows.
+        """
+        windowIndex = int(now // self.windowSeconds)
+        if self.windowIndex is None:
+            self.windowIndex = windowIndex
+            return
+        periods = windowIndex - self.windowIndex
+        if periods <= 0:
+            return
+        self.windowIndex = windowIndex
+        self.sourcePackets.rotate(periods)
+        self.sourceSyns.rotate(periods)
+        self.destinationPackets.rotate(periods)
+        self.destinationPorts.clear()
+        self.destinationHosts.clear()
+        for key in [key for key, entry in self.flagged.items() if windowIndex - entry["window"] >= self.flagWindows]:
+            del self.flagged[key]
+
+    def _flag(self, role: str, address: str, kind: str, value: float, threshold: float) -> None:
+        """
+        Marks an address; the first detection of each kind per flag period raises an alert.
+        """
+        key = (role, address)
+        entry = self.flagged.get(key)
+        if entry is None:
+            entry = self.flagged[key] = {"kinds": {}, "window": self.windowIndex}
+            if len(self.flagged) > self.maxFlagged:
+                self.flagged.popitem(last=False)
+        else:
+            entry["window"] = self.windowIndex
+            self.flagged.move_to_end(key)
+        if kind in entry["kinds"]:
+            return
+
+        alert = {
+            "id": self.nextAlertId,
+            "time": time.time(),
+            "kind": kind,
+            role: address,
+            "value": round(float(value), 1),
+            "threshold": round(float(threshold), 1),
+            "windowSeconds": self.windowSeconds,
+        }
+        self.nextAlertId += 1
+        entry["kinds"][kind] = alert["id"]
+        self.alerts.append(alert)
+        metrics.registry.counter("udon_detector_alerts_total", ALERTS_HELP, kind=kind, session=self.session).inc()
+
+    def _detectSources(self, uniqueSources: List[str], sourceHashes: np.ndarray) -> None:
+        if not uniqueSources:
+            return
+        candidates = np.flatnonzero(self.sourcePackets.estimate(sourceHashes) >= min(self.portScanPorts, self.hostScanHosts))
+        if len(candidates):
+            candidateHashes = sourceHashes[candidates]
+            ports = self.destinationPorts.estimate(candidateHashes)
+            hosts = self.destinationHosts.estimate(candidateHashes)
+            for position, index in enumerate(candidates):
+                if ports[position] >= self.portScanPorts:
+                    self._flag("source", uniqueSources[index], "portscan", ports[position], self.portScanPorts)
+                if hosts[position] >= self.hostScanHosts:
+                    self._flag("source", uniqueSources[index], "hostscan", hosts[position], self.hostScanHosts)
+
+        syns = self.sourceSyns.estimate(sourceHashes)
+        baselines = self.sourceSyns.baselineEstimate(sourceHashes)
+        for index in np.flatnonzero((syns >= self.synFloodPackets) & (syns > self.baselineFactor * baselines)):
+            self._flag("source", uniqueSources[index], "synflood", syns[index], max(self.synFloodPackets, self.baselineFactor * baselines[index]))
+
+    def _detectDestinations(self, uniqueDestinations: List[str], destinationHashes: np.ndarray) -> None:
+        if not uniqueDestinations:
+            return
+        packets = self.destinationPackets.estimate(destinationHashes)
+        baselines = self.destinationPackets.baselineEstimate(destinationHashes)
+        for index in np.flatnonzero((packets >= self.floodPackets) & (packets > self.baselineFactor * baselines)):
+            self._flag("destination", uniqueDestinations[index], "flood", packets[index], max(self.floodPackets, self.baselineFactor * baselines[index]))
+
+    def inspect(self, packets: List[Dict]) -> int:
+        """
+        Updates the sketches with one scored batch, raises alerts and escalates the risk of
+        packets from flagged sources or to flagged flood targets. Returns the escalated count.
+        """
+        # Column-wise extraction keeps the per-packet Python work to a few comprehensions
+        if any(packetData.get("source", "") in _NO_ADDRESS for packetData in packets):
+            addressed = [packetData for packetData in packets if packetData.get("source", "") not in _NO_ADDRESS]
+        else:
+            addressed = packets
+        sources = [packetData["source"] for packetData in addressed]
+        destinations = [packetData.get("destination", "") for packetData in addressed]
+        protocolTags = np.array([_PROTOCOL_TAGS.get(packetData.get("protocol"), 0) for packetData in addressed], dtype=np.uint64)
+        ports = np.array([packetData.get("destinationPort") or 0 for packetData in addressed], dtype=np.uint64)
+        flags = np.array([packetData.get("tcpFlags") or 0 for packetData in addressed], dtype=np.uint64)
+        portMask = (protocolTags > 0) & (ports > 0)
+        # Connection attempts: SYN without ACK
+        synMask = (protocolTags == _PROTOCOL_TAGS["TCP"]) & ((flags & np.uint64(TCP_SYN | TCP_ACK)) == TCP_SYN)
+
+        with self.lock:
+            self._rotate(time.time())
+            self.packetsInspected += len(packets)
+            if sources:
+                sourceHashes = hashKeys(sources)
+                destinationHashes = hashKeys(destinations)
+
+                self.sourcePackets.add(sourceHashes)
+                self.sourceSyns.add(sourceHashes[synMask])
+                self.destinationPackets.add(destinationHashes)
+                self.destinationPorts.add(sourceHashes[portMask], mix64((protocolTags | ports)[portMask]))
+                self.destinationHosts.add(sourceHashes, destinationHashes)
+
+                # Each address is evaluated once per batch
+                sourcePositions = dict(zip(sources, range(len(sources))))
+                destinationPositions = dict(zip(destinations, range(len(destinations))))
+                self._detectSources(list(sourcePositions), sourceHashes[list(sourcePositions.values())])
+                self._detectDestinations(list(destinationPositions), destinationHashes[list(destinationPositions.values())])
+
+            if not self.flagged:
+                return 0
+            escalated = 0
+            level = RISK_ORDER.get(self.risk, 2)
+            for packetData in packets:
+                if (("source", packetData.get("source")) in self.flagged
+                        or ("destination", packetData.get("destination")) in self.flagged):
+                    if RISK_ORDER.get(packetData.get("risk"), 0) < level:
+                        packetData["risk"] = self.risk
+                        escalated += 1
+            self.packetsEscalated += escalated
+            return escalated
+
+    # -----------------------------------------------------------------------
+    # Queries
+    # -----------------------------------------------------------------------
+
+    def getAlerts(self, sinceId: int = 0, limit: int = 100) -> List[Dict]:
+        """
+        Returns up to 'limit' of the oldest retained alerts with an ID greater than sinceId.
+        """
+        with self.lock:
+            return [dict(alert) for alert in self.alerts if alert["id"] > sinceId][:limit]
+
+    def getStats(self) -> Dict:
+        with self.lock:
+            kinds: Dict[str, int] = {}
+            for alert in self.alerts:
+                kinds[alert["kind"]] = kinds.get(alert["kind"], 0) + 1
+            return {
+                "windowSeconds": self.windowSeconds,
+                "packetsInspected": self.packetsInspected,
+                "packetsEscalated": self.packetsEscalated,
+                "flagged": len(self.flagged),
+                "lastAlertId": self.nextAlertId - 1,
+                "recentAlerts": kinds,
+                "memoryBytes": sum(
+                    sketch.table.nbytes + (sketch.baseline.nbytes if sketch.baseline is not None else 0)
+                    for sketch in (self.sourcePackets, self.sourceSyns, self.destinationPackets)
+                ) + self.destinationPorts.registers.nbytes + self.destinationHosts.registers.nbytes,
+            }
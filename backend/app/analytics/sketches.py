@@ -0,0 +1,308 @@
+"""
+sketches.py
+------------
+Fixed-size probabilistic summaries for high-volume traffic streams.
+
+- SpaceSaving: top-K heavy hitters (after Metwally et al.) with a per-key error bound.
+  Summaries are mergeable, so per-bucket sketches combine into window totals.
+- HyperLogLog: distinct counts in 2^precision one-byte registers
+  (standard error about 1.04 / sqrt(2^precision)), merged by register-wise max.
+- CountMinSketch: per-key counts for any number of keys in depth x width counters,
+  optionally with an EWMA baseline per counter (rate baselines in fixed memory).
+- VirtualHyperLogLog: per-key distinct counts for any number of keys; every key
+  owns a virtual HLL of 'virtualRegisters' registers drawn from one shared pool
+  (Xiao et al., "Better with Fewer Bits"), with the pool's noise subtracted.
+
+The last two take NumPy arrays of 64-bit key hashes (see hashKeys()) so a whole
+batch is applied with a few vectorized operations.
+
+Memory and update cost depend only on the configured sizes, never on traffic volume.
+"""
+
+import math
+from typing import Dict, Hashable, List, Tuple
+import numpy as np
+
+_HASH_MASK = (1 << 64) - 1
+_SHIFT_30, _SHIFT_27, _SHIFT_31, _SHIFT_32 = np.uint64(30), np.uint64(27), np.uint64(31), np.uint64(32)
+_MIX_1, _MIX_2 = np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB)
+
+
+def mix64(values: np.ndarray) -> np.ndarray:
+    """
+    SplitMix64 finalizer: spreads hashes of small integers (ports) and Python's hash() output over 64 bits.
+    """
+    values = values.astype(np.uint64, copy=True)
+    values ^= values >> _SHIFT_30
+    values *= _MIX_1
+    values ^= values >> _SHIFT_27
+    values *= _MIX_2
+    values ^= values >> _SHIFT_31
+    return values
+
+
+def hashKeys(keys) -> np.ndarray:
+    """
+    Mixed 64-bit hashes of hashable keys (per-process, like hash()).
+    """
+    return mix64(np.fromiter((hash(key) & _HASH_MASK for key in keys), dtype=np.uint64))
+
+
+class SpaceSaving:
+    """
+    Space-Saving summary of the heaviest keys, holding between 'capacity' and twice as many.
+    Trimming back to 'capacity' only when the slack is used up keeps updates amortized O(1).
+    A key's true weight lies in [count, count + error]; unmonitored keys weigh at most 'floor'.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = max(1, capacity)
+        # key -> [count, error]
+        self.counters: Dict[Hashable, List[float]] = {}
+        # Upper bound on the weight of any key that is not monitored
+        self.floor: float = 0
+
+    def __len__(self) -> int:
+        return len(self.counters)
+
+    def update(self, key: Hashable, weight: float = 1) -> None:
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += weight
+            return
+        # The key may have been evicted before with up to 'floor' weight
+        self.counters[key] = [weight, self.floor]
+        if len(self.counters) > 2 * self.capacity:
+            self._trim()
+
+    def updateMany(self, weights: Dict[Hashable, float]) -> None:
+        """
+        Applies pre-aggregated weights, e.g. one batch of packets.
+        """
+        for key, weight in weights.items():
+            self.update(key, weight)
+
+    def mergeFrom(self, other: "SpaceSaving") -> None:
+        """
+        Adds another summary's counts. A key missing from one side may have had up to that
+        side's floor, which is added to its error rather than its count.
+        """
+        for key, (count, error) in other.counters.items():
+            counter = self.counters.get(key)
+            if counter is not None:
+                counter[0] += count
+                counter[1] += error
+            else:
+                self.counters[key] = [count, error + self.floor]
+        if other.floor:
+            for key, counter in self.counters.items():
+                if key not in other.counters:
+                    counter[1] += other.floor
+        self.floor += other.floor
+        if len(self.counters) > 2 * self.capacity:
+            self._trim()
+
+    def _trim(self) -> None:
+        ranked = sorted(self.counters.items(), key=lambda item: -item[1][0])
+        for _, (count, error) in ranked[self.capacity:]:
+            if count + error > self.floor:
+                self.floor = count + error
+        self.counters = dict(ranked[:self.capacity])
+
+    def top(self, limit: int = 10) -> List[Tuple[Hashable, float, float]]:
+        """
+        Returns up to 'limit' (key, count, error) tuples, heaviest first.
+        """
+        ranked = sorted(self.counters.items(), key=lambda item: -item[1][0])[:limit]
+        return [(key, count, error) for key, (count, error) in ranked]
+
+    def copy(self) -> "SpaceSaving":
+        clone = SpaceSaving(self.capacity)
+        clone.counters = {key: list(counter) for key, counter in self.counters.items()}
+        clone.floor = self.floor
+        return clone
+
+    def clear(self) -> None:
+        self.counters.clear()
+        self.floor = 0
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter over hashable values (Python's hash() of str is SipHash,
+    randomized per process, which is fine for in-process counting).
+    """
+
+    def __init__(self, precision: int = 10):
+        self.precision = min(16, max(4, precision))
+        self.registerCount = 1 << self.precision
+        # bytearray keeps per-item updates cheap; merges and estimates view it through NumPy
+        self.registers = bytearray(self.registerCount)
+        self._restBits = 64 - self.precision
+        self._restMask = (1 << self._restBits) - 1
+
+    def add(self, value: Hashable) -> None:
+        hashValue = hash(value) & _HASH_MASK
+        index = hashValue >> self._restBits
+        # Position of the leftmost one bit in the remaining bits
+        rank = self._restBits - (hashValue & self._restMask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def addMany(self, values) -> None:
+        for value in values:
+            self.add(value)
+
+    def mergeFrom(self, other: "HyperLogLog") -> None:
+        own = np.frombuffer(self.registers, dtype=np.uint8)
+        np.maximum(own, np.frombuffer(other.registers, dtype=np.uint8), out=own)
+
+    def count(self) -> int:
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        size = self.registerCount
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / float(np.sum(np.exp2(-registers.astype(np.float64))))
+        zeros = size - int(np.count_nonzero(registers))
+        # Linear counting is more accurate while many registers are still empty
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+    def copy(self) -> "HyperLogLog":
+        clone = HyperLogLog(self.precision)
+        clone.registers[:] = self.registers
+        return clone
+
+    def clear(self) -> None:
+        self.registers[:] = bytes(self.registerCount)
+
+
+class CountMinSketch:
+    """
+    Count-Min sketch over 64-bit key hashes: estimates never undercount and overcount by
+    at most e/width of the total with probability 1 - exp(-depth).
+    With ewmaAlpha > 0, rotate() folds the current counts into a per-counter EWMA baseline
+    and starts a new period.
+    """
+
+    def __init__(self, width: int = 65536, depth: int = 4, ewmaAlpha: float = 0.0):
+        # Power-of-two width so row indexes are a mask
+        self.width = 1 << max(4, int(width - 1).bit_length())
+        self.depth = max(1, depth)
+        self.ewmaAlpha = ewmaAlpha
+        self.table = np.zeros((self.depth, self.width), dtype=np.uint32)
+        self.baseline = np.zeros((self.depth, self.width), dtype=np.float32) if ewmaAlpha > 0 else None
+        self._rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        self._rowOffsets = np.arange(self.depth, dtype=np.intp)[:, None] * self.width
+        self._mask = np.uint64(self.width - 1)
+
+    def _indexes(self, hashes: np.ndarray) -> np.ndarray:
+        # Double hashing: row i uses low + i * high (high forced odd)
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = (hashes >> _SHIFT_32) | np.uint64(1)
+        return ((low[None, :] + self._rows * high[None, :]) & self._mask).astype(np.intp)
+
+    def add(self, hashes: np.ndarray, counts=1) -> None:
+        if not len(hashes):
+            return
+        # One unbuffered add over the flattened table handles repeated keys within the batch
+        flat = (self._indexes(hashes) + self._rowOffsets).ravel()
+        increments = np.broadcast_to(np.asarray(counts, dtype=np.uint32), (self.depth, len(hashes))).ravel()
+        np.add.at(self.table.reshape(-1), flat, increments)
+
+    def estimate(self, hashes: np.ndarray) -> np.ndarray:
+        indexes = self._indexes(hashes)
+        return self.table[np.arange(self.depth)[:, None], indexes].min(axis=0)
+
+    def baselineEstimate(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        EWMA of the per-period counts (zeros without a baseline).
+        """
+        if self.baseline is None:
+            return np.zeros(len(hashes), dtype=np.float32)
+        indexes = self._indexes(hashes)
+        return self.baseline[np.arange(self.depth)[:, None], indexes].min(axis=0)
+
+    def rotate(self, periods: int = 1) -> None:
+        """
+        Ends the current period ('periods' > 1 when whole periods passed without traffic).
+        """
+        if self.baseline is not None and periods > 0:
+            self.baseline *= 1 - self.ewmaAlpha
+            self.baseline += self.ewmaAlpha * self.table
+            if periods > 1:
+                self.baseline *= (1 - self.ewmaAlpha) ** (periods - 1)
+        self.table.fill(0)
+
+    def clear(self) -> None:
+        self.table.fill(0)
+        if self.baseline is not None:
+            self.baseline.fill(0)
+
+
+class VirtualHyperLogLog:
+    """
+    Per-key distinct counting in a shared pool of 'poolRegisters' one-byte registers.
+    Each key's 'virtualRegisters' registers are chosen by hashing (key, slot), so the memory
+    is fixed however many keys appear; the noise other keys add is estimated from the whole
+    pool and subtracted. Accuracy is that of an HLL with 'virtualRegisters' registers
+    (about 9% for 128) while the pool is far from saturated.
+    """
+
+    def __init__(self, poolRegisters: int = 1 << 20, virtualRegisters: int = 128):
+        self.poolSize = 1 << max(8, int(poolRegisters - 1).bit_length())
+        self.virtualSize = 1 << max(4, int(virtualRegisters - 1).bit_length())
+        self.registers = np.zeros(self.poolSize, dtype=np.uint8)
+        self._poolMask = np.uint64(self.poolSize - 1)
+        self._slotMask = np.uint64(self.virtualSize - 1)
+        # One salt per virtual slot; a key's registers are mix64(keyHash ^ salt)
+        self._salts = mix64(np.arange(1, self.virtualSize + 1, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15))
+        self._alpha = 0.7213 / (1 + 1.079 / self.virtualSize)
+        self.clear()
+
+    def clear(self) -> None:
+        self.registers.fill(0)
+        # Running sum of 2^-register over the pool and number of zero registers, for the noise estimate
+        self._inverseSum = float(self.poolSize)
+        self._zeros = self.poolSize
+
+    def add(self, keyHashes: np.ndarray, elementHashes: np.ndarray) -> None:
+        """
+        Records that each key was seen with the matching element (e.g. source -> destination port).
+        """
+        if not len(keyHashes):
+            return
+        slots = (elementHashes & self._slotMask).astype(np.intp)
+        poolIndexes = (mix64(keyHashes ^ self._salts[slots]) & self._poolMask).astype(np.intp)
+        # Rank = position of the leftmost one bit in the element hash's upper 32 bits (33 when all zero)
+        upper = (elementHashes >> _SHIFT_32).astype(np.float64)
+        ranks = (33 - np.frexp(upper)[1]).astype(np.uint8)
+
+        touched = np.unique(poolIndexes)
+        before = self.registers[touched].astype(np.int16)
+        np.maximum.at(self.registers, poolIndexes, ranks)
+        after = self.registers[touched].astype(np.int16)
+        changed = after != before
+        if changed.any():
+            self._inverseSum += float(np.sum(np.exp2(-after[changed].astype(np.float64)) - np.exp2(-before[changed].astype(np.float64))))
+            self._zeros -= int(np.count_nonzero(before[changed] == 0))
+
+    def _hllEstimate(self, inverseSums: np.ndarray, zeros: np.ndarray, size: int, alpha: float) -> np.ndarray:
+        raw = alpha * size * size / inverseSums
+        # Linear counting while registers are still empty
+        linear = size * np.log(size / np.maximum(zeros, 1))
+        return np.where((raw <= 2.5 * size) & (zeros > 0), linear, raw)
+
+    def estimate(self, keyHashes: np.ndarray) -> np.ndarray:
+        """
+        Estimated distinct elements per key.
+        """
+        poolIndexes = (mix64(keyHashes[:, None] ^ self._salts[None, :]) & self._poolMask).astype(np.intp)
+        virtual = self.registers[poolIndexes].astype(np.float64)
+        perKey = self._hllEstimate(
+            np.exp2(-virtual).sum(axis=1), np.count_nonzero(virtual == 0, axis=1), self.virtualSize, self._alpha
+        )
+        poolAlpha = 0.7213 / (1 + 1.079 / self.poolSize)
+        pool = float(self._hllEstimate(np.array([self._inverseSum]), np.array([self._zeros]), self.poolSize, poolAlpha)[0])
+        scale = self.poolSize * self.virtualSize / (self.poolSize - self.virtualSize)
+        return np.maximum(0.0, scale * (perKey / self.virtualSize - pool / self.poolSize))
@@ -0,0 +1,134 @@
+"""
+boundedQueue.py
+----------------
+Fixed-capacity ring queue used between the stages of the capture pipeline.
+Each queue applies a configurable overflow policy and keeps its own
+backpressure and drop counters so that no packet loss goes unnoticed.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+# Supported behaviours when a producer finds the queue full
+DROP_OLDEST = "drop-oldest"
+DROP_NEWEST = "drop-newest"
+BLOCK = "block"
+QUEUE_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class BoundedQueue:
+    """
+    Thread-safe bounded FIFO with drop-oldest, drop-newest or blocking overflow handling.
+    Mirrors the subset of the queue.Queue API used by the pipeline (put/get/get_nowait).
+    """
+
+    def __init__(self, capacity: int, policy: str = DROP_OLDEST, name: str = "queue"):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}'. Expected one of {QUEUE_POLICIES}.")
+
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.policy = policy
+        # Ring storage, bounded by "capacity" through the overflow policy
+        self.items: deque = deque()
+        self.lock = threading.Lock()
+        self.notEmpty = threading.Condition(self.lock)
+        self.notFull = threading.Condition(self.lock)
+        self._resetCounters()
+
+    def _resetCounters(self) -> None:
+        self.enqueued: int = 0
+        self.dequeued: int = 0
+        self.dropped: int = 0
+        self.blockedPuts: int = 0
+        self.blockedSeconds: float = 0.0
+        self.highWatermark: int = 0
+
+    # -----------------------------------------------------------------------
+    # Producer / Consumer API
+    # -----------------------------------------------------------------------
+
+    def put(self, item: Any, timeout: Optional[float] = None) -> bool:
+        """
+        Adds an item according to the overflow policy.
+        Returns False when the item itself was dropped.
+        """
+        with self.lock:
+            if len(self.items) >= self.capacity:
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+
+                if self.policy == DROP_OLDEST:
+                    self.items.popleft()
+                    self.dropped += 1
+
+                else:
+                    self.blockedPuts += 1
+                    waitStart = time.monotonic()
+                    hasRoom = self.notFull.wait_for(lambda: len(self.items) < self.capacity, timeout)
+                    self.blockedSeconds += time.monotonic() - waitStart
+                    if not hasRoom:
+                        self.dropped += 1
+                        return False
+
+            self.items.append(item)
+            self.enqueued += 1
+            self.highWatermark = max(self.highWatermark, len(self.items))
+            self.notEmpty.notify()
+            return True
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """
+        Removes and returns the oldest item, raising queue.Empty on timeout.
+        """
+        with self.lock:
+            if not self.notEmpty.wait_for(lambda: len(self.items) > 0, timeout):
+                raise queue.Empty
+            item = self.items.popleft()
+            self.dequeued += 1
+            self.notFull.notify()
+            return item
+
+    def get_nowait(self) -> Any:
+        """
+        Removes and returns the oldest item without waiting.
+        """
+        return self.get(timeout=0)
+
+    def qsize(self) -> int:
+        return len(self.items)
+
+    def empty(self) -> bool:
+        return len(self.items) == 0
+
+    def clear(self) -> None:
+        """
+        Discards all queued items and resets the counters.
+        """
+        with self.lock:
+            self.items.clear()
+            self._resetCounters()
+            self.notFull.notify_all()
+
+    def getStats(self) -> Dict:
+        """
+        Returns depth, backpressure and drop counters for this queue.
+        """
+        with self.lock:
+            return {
+                "name": self.name,
+                "policy": self.policy,
+                "capacity": self.capacity,
+                "depth": len(self.items),
+                "highWatermark": self.highWatermark,
+                "utilization": len(self.items) / self.capacity,
+                "enqueued": self.enqueued,
+                "dequeued": self.dequeued,
+                "dropped": self.dropped,
+                "blockedPuts": self.blockedPuts,
+                "blockedSeconds": self.blockedSeconds,
+            }
@@ -0,0 +1,205 @@
+"""
+captureFilter.py
+-----------------
+Capture profiles: what a capture session reads and how much of it.
+
+- BPF filters are attached to the capture socket, so the kernel discards unwanted
+  frames before they are copied into Python. A filter combines a named profile,
+  an optional custom expression and the automatic exclusion of the backend's own
+  API traffic (CAPTURE_SELF_PORTS).
+- FlowSampler keeps a deterministic 1-in-N share of flows on overloaded links.
+  Both directions of a flow share one decision, and the same flows are kept across
+  restarts for a given CAPTURE_SAMPLE_SEED. Classic BPF cannot hash a 5-tuple
+  portably, so sampling runs in the capture thread before packets are queued.
+- PacketRateLimiter caps the packets per second a session admits (its CPU share),
+  so one busy session cannot starve the parse and scoring work of the others.
+"""
+
+import shutil
+import time
+from typing import Dict, List, Optional
+from app.capture.rawDecoder import flowHash
+from app import config
+
+# Named BPF presets; "all" attaches no profile filter
+CAPTURE_PROFILES: Dict[str, str] = {
+    "all": "",
+    "ip": "ip or ip6",
+    "transport": "tcp or udp",
+    "unicast": "not broadcast and not multicast",
+    "web": "tcp port 80 or tcp port 443 or udp port 443",
+    "dns": "udp port 53 or tcp port 53",
+}
+
+# Knuth's multiplicative constant; decorrelates sampling from the shard choice (flowHash % workers)
+_GOLDEN_RATIO = 2654435761
+
+
+def composeFilter(*expressions: str) -> str:
+    """
+    Joins non-empty BPF expressions with 'and'.
+    """
+    parts = [expression.strip() for expression in expressions if expression and expression.strip()]
+    if len(parts) == 1:
+        return parts[0]
+    return " and ".join(f"({part})" for part in parts)
+
+
+def selfTrafficFilter(ports: List[int]) -> str:
+    """
+    Excludes TCP traffic on the backend's own ports (API polling, streaming clients).
+    """
+    if not ports:
+        return ""
+    return "not (" + " or ".join(f"tcp port {port}" for port in ports) + ")"
+
+
+def filterCompilerAvailable() -> bool:
+    """
+    Whether Scapy can compile BPF expressions here (libpcap/Npcap or a tcpdump binary).
+    """
+    from app.capture.packetParser import loadScapy  # pylint: disable=import-outside-toplevel
+    conf = loadScapy().conf
+    return bool(conf.use_pcap) or shutil.which(conf.prog.tcpdump) is not None
+
+
+def validateFilter(expression: str, iface: Optional[str] = None) -> None:
+    """
+    Compiles 'expression' once so that a typo is reported by /start instead of the capture thread.
+    Raises ValueError when it does not compile.
+    """
+    if not expression:
+        return
+    try:
+        from scapy.arch.common import compile_filter  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        # Older Scapy versions: the capture socket reports the error itself
+        return
+    try:
+        compile_filter(expression, iface=iface)
+    except Exception as e:
+        raise ValueError(f"Invalid BPF filter '{expression}': {str(e)}") from e
+
+
+class CaptureSettings:
+    """
+    Resolved parameters of one capture session.
+    Unset arguments fall back to the CAPTURE_* configuration.
+    """
+
+    def __init__(
+        self,
+        iface: Optional[str] = None,
+        profile: Optional[str] = None,
+        bpfFilter: Optional[str] = None,
+        sampleRate: Optional[int] = None,
+        excludeSelf: Optional[bool] = None,
+    ):
+        self.iface = iface or config.CAPTURE_INTERFACE or None
+        self.profile = profile or config.CAPTURE_PROFILE
+        if self.profile not in CAPTURE_PROFILES:
+            raise ValueError(f"Unknown capture profile '{self.profile}' (expected one of {', '.join(CAPTURE_PROFILES)}).")
+        self.customFilter = config.CAPTURE_FILTER if bpfFilter is None else bpfFilter
+        self.sampleRate = config.CAPTURE_SAMPLE_RATE if sampleRate is None else sampleRate
+        if self.sampleRate < 1:
+            raise ValueError("Sample rate must be at least 1 (1 keeps every flow).")
+        self.excludeSelf = config.CAPTURE_EXCLUDE_SELF if excludeSelf is None else excludeSelf
+        # Set by resolveFilter(): the expression attached to the capture socket
+        self.bpfFilter: str = ""
+        self.selfExcluded: bool = False
+
+    def resolveFilter(self, logger=None) -> str:
+        """
+        Builds and validates the kernel filter.
+        Without a BPF compiler, only the automatic self-exclusion is dropped (with a warning);
+        an explicit profile or filter raises ValueError instead of silently capturing everything.
+        """
+        explicit = composeFilter(CAPTURE_PROFILES[self.profile], self.customFilter)
+        selfFilter = selfTrafficFilter(config.CAPTURE_SELF_PORTS) if self.excludeSelf else ""
+        if selfFilter and not filterCompilerAvailable():
+            if logger is not None:
+                logger.logWarning("No BPF compiler (libpcap or tcpdump) available; backend traffic is not excluded.")
+            selfFilter = ""
+        self.bpfFilter = composeFilter(explicit, selfFilter)
+        self.selfExcluded = bool(selfFilter)
+        validateFilter(self.bpfFilter, self.iface)
+        return self.bpfFilter
+
+    def toDict(self) -> Dict:
+        return {
+            "iface": self.iface,
+            "profile": self.profile,
+            "customFilter": self.customFilter,
+            "excludeSelf": self.selfExcluded,
+            "bpfFilter": self.bpfFilter,
+            "sampleRate": self.sampleRate,
+        }
+
+
+class FlowSampler:
+    """
+    Deterministic flow-hash sampler keeping 1 in 'rate' flows.
+    Frames without an IP 5-tuple (ARP, ...) are always kept.
+    """
+
+    def __init__(self, rate: int = 1, seed: int = 0):
+        self.rate = max(1, rate)
+        self.seed = seed & 0xFFFFFFFF
+        # Flows whose mixed 16-bit hash falls below this threshold are kept
+        self.threshold = max(1, 65536 // self.rate)
+        self.seen: int = 0
+        self.kept: int = 0
+
+    def accept(self, packet) -> bool:
+        """
+        Returns whether the packet's flow is sampled; 'packet' is frame bytes or a Scapy packet.
+        """
+        if self.rate == 1:
+            return True
+        # Dissected Scapy packets keep the bytes they were built from
+        frame = packet if isinstance(packet, bytes) else (getattr(packet, "original", None) or bytes(packet))
+        hashValue = flowHash(frame)
+        keep = hashValue == 0 or (((hashValue ^ self.seed) * _GOLDEN_RATIO) & 0xFFFFFFFF) >> 16 < self.threshold
+        # Single writer (the capture thread), so the counters need no lock
+        self.seen += 1
+        if keep:
+            self.kept += 1
+        return keep
+
+    def getStats(self) -> Dict:
+        seen, kept = self.seen, self.kept
+        return {"rate": self.rate, "seen": seen, "kept": kept, "sampledOut": seen - kept}
+
+
+class PacketRateLimiter:
+    """
+    Token bucket admitting at most 'rate' packets per second, with bursts of up to one second's worth.
+    A rate of 0 admits everything.
+    """
+
+    def __init__(self, rate: float = 0.0):
+        self.rate = max(0.0, rate)
+        # Bucket size: one second's worth of packets, but at least one packet
+        self.capacity: float = max(self.rate, 1.0)
+        self.tokens: float = self.capacity
+        self.lastRefill: float = time.monotonic()
+        self.admitted: int = 0
+        self.limited: int = 0
+
+    def accept(self) -> bool:
+        if not self.rate:
+            return True
+        # Single writer (the capture thread), so the bucket needs no lock. Refilling on every call,
+        # capped at the bucket size, keeps idle time from being credited on top of a full bucket.
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.lastRefill) * self.rate)
+        self.lastRefill = now
+        if self.tokens < 1.0:
+            self.limited += 1
+            return False
+        self.tokens -= 1.0
+        self.admitted += 1
+        return True
+
+    def getStats(self) -> Dict:
+        return {"packetsPerSecond": self.rate, "admitted": self.admitted, "limited": self.limited}
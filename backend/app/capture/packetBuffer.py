@@ -0,0 +1,147 @@
+"""
+packetBuffer.py
+----------------
+Indexed ring buffer for stored packets.
+Stored packets carry contiguous IDs, so a packet's slot is simply its ID
+modulo the capacity. That makes "latest N" and "everything after ID X"
+queries O(k) in the number of returned packets, with no copy of the whole
+buffer, and lets readers learn how many packets were evicted past a cursor.
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+class PacketRingBuffer:
+    """
+    Fixed-capacity, thread-safe packet store addressed by packet ID.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        # Preallocated slots; the packet with ID n lives at slots[n % capacity]
+        self.slots: List[Optional[Dict]] = [None] * self.capacity
+        # ID range currently held (oldestId > newestId when empty)
+        self.oldestId: int = 1
+        self.newestId: int = 0
+        # Packets overwritten since the last clear()
+        self.evicted: int = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.newestId - self.oldestId + 1
+
+    def _clearSlots(self) -> None:
+        self.slots = [None] * self.capacity
+        self.oldestId = 1
+        self.newestId = 0
+
+    def extend(self, packets: List[Dict]) -> int:
+        """
+        Appends packets whose 'id' fields continue the stored sequence.
+        A gap or restart in the IDs (e.g. after an ID reset) discards the held range.
+        Returns the number of packets evicted to make room.
+        """
+        if not packets:
+            return 0
+        with self.lock:
+            firstId = packets[0]["id"]
+            if firstId != self.newestId + 1:
+                self._clearSlots()
+                self.oldestId = firstId
+            capacity = self.capacity
+            slots = self.slots
+            for packetData in packets:
+                slots[packetData["id"] % capacity] = packetData
+            self.newestId = packets[-1]["id"]
+
+            overflow = max(0, len(self) - capacity)
+            self.oldestId += overflow
+            self.evicted += overflow
+            return overflow
+
+    def clear(self, resetIds: bool = False) -> None:
+        """
+        Drops every stored packet. Unless resetIds is set, the ID sequence is kept so
+        cursors held by readers stay valid and report the cleared packets as evicted.
+        """
+        with self.lock:
+            newestId = self.newestId
+            self._clearSlots()
+            if not resetIds:
+                self.oldestId = newestId + 1
+                self.newestId = newestId
+            self.evicted = 0
+
+    # -----------------------------------------------------------------------
+    # Queries
+    # -----------------------------------------------------------------------
+
+    def _slice(self, startId: int, endId: int) -> List[Dict]:
+        """
+        Returns packets startId..endId (inclusive). Must be called with the lock held.
+        """
+        if endId < startId:
+            return []
+        capacity = self.capacity
+        start = startId % capacity
+        end = endId % capacity
+        if start <= end:
+            return self.slots[start:end + 1]
+        return self.slots[start:] + self.slots[:end + 1]
+
+    def latestId(self) -> int:
+        """
+        Returns the ID of the newest stored packet (0 when nothing was stored).
+        """
+        with self.lock:
+            return self.newestId
+
+    def latest(self, limit: int = 50) -> List[Dict]:
+        """
+        Returns up to 'limit' of the newest packets, oldest first.
+        """
+        with self.lock:
+            if limit <= 0:
+                return []
+            return self._slice(max(self.oldestId, self.newestId - limit + 1), self.newestId)
+
+    def since(self, sinceId: int, limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """
+        Returns up to 'limit' of the oldest packets with an ID greater than sinceId, plus
+        the number of packets after sinceId that were evicted before they could be read.
+        """
+        with self.lock:
+            startId = max(sinceId + 1, self.oldestId)
+            evicted = max(0, self.oldestId - sinceId - 1)
+            endId = self.newestId if limit is None else min(self.newestId, startId + limit - 1)
+            return self._slice(startId, endId), evicted
+
+    def query(
+        self,
+        risk: Optional[str] = None,
+        protocol: Optional[str] = None,
+        source: Optional[str] = None,
+        sinceId: Optional[int] = None,
+        limit: int = 50,
+    ) -> List[Dict]:
+        """
+        Returns packets matching every given filter. Without sinceId the newest 'limit'
+        matches are returned, otherwise the oldest 'limit' matches after sinceId; both oldest first.
+        """
+        filters = [(field, value) for field, value in (("risk", risk), ("protocol", protocol), ("source", source)) if value is not None]
+        with self.lock:
+            startId = self.oldestId if sinceId is None else max(sinceId + 1, self.oldestId)
+            packets = self._slice(startId, self.newestId)
+        matches = [packetData for packetData in packets if all(packetData.get(field) == value for field, value in filters)]
+        return matches[-limit:] if sinceId is None else matches[:limit]
+
+    def getStats(self) -> Dict:
+        with self.lock:
+            return {
+                "capacity": self.capacity,
+                "size": len(self),
+                "oldestId": self.oldestId if len(self) else None,
+                "newestId": self.newestId if len(self) else None,
+                "evicted": self.evicted,
+            }
@@ -3,38 +3,165 @@ packetParser.py
 ----------------
 Extracts and standardizes metadata from raw Scapy packets,
 then passes the structured data through the ML stub for risk scoring.
+Raw frame bytes can take the struct-based fast path in rawDecoder.py,
+which falls back to Scapy dissection only for frames it cannot decode.
+Scapy and the risk model are loaded on first use (usually the first capture
+start), so importing the API does not pay for either.
 """
 
-from scapy.all import IP, TCP, UDP, ICMP # pylint: disable=no-name-in-module
+import threading
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
+from app.capture.rawDecoder import decodeFrame, PROTOCOL_NAMES
+from app import config
 from app.ml.featureExtractor import extractFeatures
-from app.ml.modelInterface import DefaultModelHandler
+from app.ml.modelInterface import BaseModelInterface, DefaultModelHandler
+from app.ml.verdictCache import CachedModelHandler
+from app.utils import metrics, startupProfiler
 
-# Instantiate classifier once to avoid repeated initialization
-classifier = DefaultModelHandler()
+# scapy.all module and classifier, created once on first use
+_scapy = None
+_modelHandler: Optional[DefaultModelHandler] = None
+_classifier: Optional[BaseModelInterface] = None
+_scapyLock = threading.Lock()
+_classifierLock = threading.Lock()
 
-def parsePacket(packet, packetId: int) -> Dict:
+# Packets replaced by the PARSE_ERROR placeholder, per decoder
+_parseErrors = {
+    decoder: metrics.registry.counter("udon_parse_errors_total", "Packets that fell back to the PARSE_ERROR placeholder", decoder=decoder)
+    for decoder in ("scapy", "raw")
+}
+# Raw frames the struct fast path could not decode and handed to Scapy
+_rawFallbacks = metrics.registry.counter("udon_raw_decoder_fallbacks_total", "Raw frames dissected with Scapy because the fast path could not decode them")
+
+# IPv6 extension headers walked to reach the transport header
+IPV6_EXTENSION_HEADERS = (0, 43, 44, 51, 60, 135)
+
+
+def loadScapy():
+    """
+    Imports scapy.all on first use and returns the module.
+    """
+    global _scapy
+    if _scapy is None:
+        with _scapyLock:
+            if _scapy is None:
+                with startupProfiler.phase("scapyImport"):
+                    import scapy.all as scapyAll  # pylint: disable=import-outside-toplevel
+                _scapy = scapyAll
+    return _scapy
+
+
+def getModelHandler() -> DefaultModelHandler:
+    """
+    Returns the model handler, loading the model on first use.
+    """
+    getClassifier()
+    return _modelHandler
+
+
+def getClassifier() -> BaseModelInterface:
+    """
+    Returns the classifier used for scoring (the model handler behind the verdict cache, if enabled).
+    Instantiated once to avoid repeated initialization.
+    """
+    global _modelHandler, _classifier
+    if _classifier is None:
+        with _classifierLock:
+            if _classifier is None:
+                with startupProfiler.phase("modelLoad"):
+                    handler = DefaultModelHandler()
+                classifier = handler
+                if config.VERDICT_CACHE_SIZE > 0:
+                    # Memoize verdicts for repeated feature vectors
+                    classifier = CachedModelHandler(
+                        handler,
+                        maxEntries=config.VERDICT_CACHE_SIZE,
+                        ttlSeconds=config.VERDICT_CACHE_TTL,
+                        quantization=config.VERDICT_CACHE_QUANTIZATION,
+                    )
+                _modelHandler = handler
+                _classifier = classifier
+    return _classifier
+
+
+def peekClassifier() -> Optional[BaseModelInterface]:
+    """
+    Returns the classifier if it was already created, without loading the model.
+    """
+    return _classifier
+
+
+def _classify(packetData: Dict) -> Dict:
+    """
+    Extracts features and attaches the predicted risk level.
+    """
+    features = extractFeatures(packetData)
+    packetData["risk"] = (_classifier or getClassifier()).predict(features)
+    return packetData
+
+
+def _parseErrorPacket(packetId: Optional[int], decoder: str) -> Dict:
+    """
+    Placeholder entry for packets that could not be parsed.
+    """
+    _parseErrors[decoder].inc()
+    return {
+        "id": packetId,
+        "source": "PARSE_ERROR",
+        "destination": "PARSE_ERROR",
+        "protocol": "UNKNOWN",
+        "length": 0,
+        "sourcePort": 0,
+        "destinationPort": 0,
+        "tcpFlags": 0,
+        "timestamp": datetime.now().strftime("%H:%M:%S"),
+        "risk": "LOW"
+    }
+
+
+def parsePacket(packet, packetId: Optional[int], classify: bool = True) -> Dict:
     """
     Extracts packet metadata and classifies risk level.
+    With classify=False the 'risk' field is left for a later (batched) inference stage,
+    and packetId may be None when the ID is assigned further down the pipeline.
     """
     try:
+        scapy = _scapy or loadScapy()
+        IP, IPv6, TCP, UDP = scapy.IP, scapy.IPv6, scapy.TCP, scapy.UDP
         source = destination = protocol = "UNKNOWN"
+        sourcePort = destinationPort = tcpFlags = 0
         length = len(packet)
         timestamp = datetime.now().strftime("%H:%M:%S")
 
+        ipLayer = None
         if packet.haslayer(IP):
-            source = packet[IP].src
-            destination = packet[IP].dst
-
-            if packet.haslayer(TCP):
-                protocol = "TCP"
-            elif packet.haslayer(UDP):
-                protocol = "UDP"
-            elif packet.haslayer(ICMP):
-                protocol = "ICMP"
-            else:
-                protocol = f"IP-{packet[IP].proto}"
+            ipLayer = packet[IP]
+            protocolNumber = ipLayer.proto
+            transport = ipLayer.payload
+            # Non-first fragments carry no transport header
+            isFragment = ipLayer.frag != 0
+        elif packet.haslayer(IPv6):
+            ipLayer = packet[IPv6]
+            protocolNumber = ipLayer.nh
+            transport = ipLayer.payload
+            isFragment = False
+            while protocolNumber in IPV6_EXTENSION_HEADERS and hasattr(transport, "nh"):
+                protocolNumber = transport.nh
+                transport = transport.payload
+
+        if ipLayer is not None:
+            source = ipLayer.src
+            destination = ipLayer.dst
+
+            protocol = PROTOCOL_NAMES.get(protocolNumber)
+            if protocol is None or isFragment:
+                protocol = f"IP-{protocolNumber}"
+            elif isinstance(transport, TCP):
+                sourcePort, destinationPort = transport.sport, transport.dport
+                tcpFlags = int(transport.flags)
+            elif isinstance(transport, UDP):
+                sourcePort, destinationPort = transport.sport, transport.dport
         else:
             protocol = packet.name
 
@@ -45,22 +172,43 @@ def parsePacket(packet, packetId: int) -> Dict:
             "destination": destination,
             "protocol": protocol,
             "length": length,
+            "sourcePort": sourcePort,
+            "destinationPort": destinationPort,
+            "tcpFlags": tcpFlags,
             "timestamp": timestamp
         }
 
         # Extract features and classify risk
-        features = extractFeatures(packetData)
-        packetData["risk"] = classifier.predict(features)
+        if classify:
+            _classify(packetData)
 
         return packetData
 
     except Exception as e:
-        return {
-            "id": packetId,
-            "source": "PARSE_ERROR",
-            "destination": "PARSE_ERROR",
-            "protocol": "UNKNOWN",
-            "length": 0,
-            "timestamp": datetime.now().strftime("%H:%M:%S"),
-            "risk": "LOW"
-        }
+        return _parseErrorPacket(packetId, "scapy")
+
+
+def parseRawFrame(frame: bytes, packetId: Optional[int], classify: bool = True, layerClass=None) -> Dict:
+    """
+    Fast-path variant of parsePacket() for raw frame bytes.
+    Decodes headers with struct offsets and only dissects with Scapy ('layerClass', Ether by default)
+    when the fast path cannot handle the frame. Produces the same packetData dict.
+    """
+    try:
+        decoded = decodeFrame(frame)
+        if decoded is None:
+            _rawFallbacks.inc()
+            layerClass = layerClass or loadScapy().Ether
+            return parsePacket(layerClass(frame), packetId, classify)
+
+        packetData = {"id": packetId}
+        packetData.update(decoded)
+        packetData["timestamp"] = datetime.now().strftime("%H:%M:%S")
+
+        if classify:
+            _classify(packetData)
+
+        return packetData
+
+    except Exception as e:
+        return _parseErrorPacket(packetId, "raw")
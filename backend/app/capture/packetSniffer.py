@@ -2,90 +2,415 @@
 packetSniffer.py
 ----------------
 Implements sequential packet capture using Scapy.
-This module ensures that each packet is processed in order without skipping,
-assigning continuous incremental IDs and storing minimal metadata for analysis.
+Capture is decoupled from analysis through a bounded multi-stage pipeline:
+
+    capture thread -> bounded ring queue -> parse/feature workers
+                   -> batched classification -> store
+
+Each stage reports backpressure and drop counters, and packets receive
+continuous incremental IDs when they are stored.
+
+With CAPTURE_MODE=process, parsing and classification run in shard worker
+processes instead (see shardedCapture.py) so capture scales beyond one core.
+
+Each session runs with a capture profile (see captureFilter.py): a BPF filter
+attached to the capture socket and optional 1-in-N flow sampling.
+
+Every sniffer is one named capture session (see sessionManager.py) with its own
+packet store, ID sequence, flow table, statistics and resource limits.
+
+When enrichment datasets are configured (see enrichment/ipEnricher.py), each batch is
+enriched with reputation, country and ASN context right before it is scored.
 """
 
-from scapy.all import sniff, Packet
+import os
+
 from datetime import datetime
 from app.utils.idGenerator import PacketIDGenerator
 from app.utils.logger import SystemLogger
-from app.capture.packetParser import parsePacket
-from typing import List, Dict
+from app.capture.packetParser import getClassifier, loadScapy, parsePacket, parseRawFrame, peekClassifier
+from app.capture.boundedQueue import BoundedQueue
+from app.capture.captureFilter import CaptureSettings, FlowSampler, PacketRateLimiter
+from app.capture.packetBuffer import PacketRingBuffer
+from app.capture.packetStore import ColumnarPacketStore
+from app.capture.shardedCapture import ShardedCapture
+from app.ml.featureExtractor import extractFeatures
+from app.ml.flowTable import FlowTable
+from app.ml.modelSwap import addSwapListener, removeSwapListener
+from app.analytics.aggregator import TrafficAggregator
+from app.analytics.detectors import StreamingDetector
+from app.ml.batchInference import BatchInferenceStage
+from app.enrichment.ipEnricher import getEnricher
+from app.storage.captureLog import CaptureLog
+from app.utils import metrics
+from app import config
+from typing import List, Dict, Optional, Tuple
+import queue
 import threading
-from collections import deque
+
+# Per-packet stages are sampled (METRICS_SAMPLE_EVERY); the store stage runs once per batch
+_parseLatency = metrics.stageLatency("parse")
+_featureLatency = metrics.stageLatency("features")
+_storeLatency = metrics.stageLatency("store", sampleEvery=1)
+_detectLatency = metrics.stageLatency("detect", sampleEvery=1)
+_enrichLatency = metrics.stageLatency("enrich", sampleEvery=1)
+
+for _name, _type, _help in (
+    ("udon_capture_active", "gauge", "1 while a capture session is running"),
+    ("udon_packets_total", "counter", "Packets handled per pipeline stage in the current capture session"),
+    ("udon_store_evicted_total", "counter", "Packets evicted from the in-memory store"),
+    ("udon_dropped_total", "counter", "Packets dropped by any full pipeline queue"),
+    ("udon_flows_active", "gauge", "Flows tracked by the live flow table"),
+    ("udon_logger_dropped_total", "counter", "Log records dropped because the logger queue was full"),
+    ("udon_queue_depth", "gauge", "Items waiting in a pipeline queue"),
+    ("udon_queue_dropped_total", "counter", "Items dropped by a pipeline queue's overflow policy"),
+    ("udon_queue_blocked_seconds_total", "counter", "Time producers spent blocked on a full pipeline queue"),
+    ("udon_shard_truncated_total", "counter", "Frames truncated to the shard input slot size (CAPTURE_MODE=process)"),
+    ("udon_verdict_cache_lookups_total", "counter", "Verdict cache lookups by result"),
+    ("udon_detector_escalated_total", "counter", "Packets escalated by the streaming detectors"),
+    ("udon_detector_flagged", "gauge", "Addresses currently flagged by the streaming detectors"),
+):
+    metrics.registry.describe(_name, _type, _help)
 
 
 class PacketSniffer:
     """
     Handles live packet sniffing in a separate thread.
     Provides start, stop, and retrieval operations for sequential packets.
+    Unset limits fall back to the global configuration:
+    'bufferSize' packets kept in memory, 'queueCapacity' per pipeline queue,
+    'workers' parse threads (or shard processes) and 'maxPacketsPerSecond' admitted from the capture socket.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        name: str = "default",
+        bufferSize: Optional[int] = None,
+        queueCapacity: Optional[int] = None,
+        workers: Optional[int] = None,
+        maxPacketsPerSecond: Optional[float] = None,
+    ):
+        # Session name, used in logs and metric labels
+        self.name = name
         # Sequential ID generator to maintain continuous packet IDs
         self.idGenerator = PacketIDGenerator()
-        # Thread-safe list to store captured packet metadata
-        self.capturedPackets = deque(maxlen=10000)
+        # Thread-safe packet store indexed by packet ID (columnar unless PACKET_STORE=ring)
+        self.bufferSize = max(1, bufferSize or config.PACKET_BUFFER_SIZE)
+        storeClass = PacketRingBuffer if config.PACKET_STORE == "ring" else ColumnarPacketStore
+        self.capturedPackets = storeClass(self.bufferSize)
+        # Private flow table, so sessions seeing the same traffic do not double-count its flows
+        self.flowTable = FlowTable(
+            idleTimeout=config.FLOW_IDLE_TIMEOUT,
+            activeTimeout=config.FLOW_ACTIVE_TIMEOUT,
+            maxFlows=config.FLOW_TABLE_MAX_FLOWS,
+        )
+        # Windowed dashboard statistics, updated once per stored batch
+        self.aggregator = TrafficAggregator(
+            bucketSeconds=config.STATS_BUCKET_SECONDS,
+            windows=config.STATS_WINDOWS,
+            topCapacity=config.STATS_TOP_CAPACITY,
+            hllPrecision=config.STATS_HLL_PRECISION,
+        )
+        # Scan/flood detectors over all stored traffic, escalating flagged addresses before they are stored
+        self.detector = StreamingDetector(
+            windowSeconds=config.DETECTOR_WINDOW_SECONDS,
+            portScanPorts=config.DETECTOR_PORTSCAN_PORTS,
+            hostScanHosts=config.DETECTOR_HOSTSCAN_HOSTS,
+            synFloodPackets=config.DETECTOR_SYN_PACKETS,
+            floodPackets=config.DETECTOR_FLOOD_PACKETS,
+            baselineFactor=config.DETECTOR_BASELINE_FACTOR,
+            ewmaAlpha=config.DETECTOR_EWMA_ALPHA,
+            sketchWidth=config.DETECTOR_SKETCH_WIDTH,
+            sketchDepth=config.DETECTOR_SKETCH_DEPTH,
+            poolRegisters=config.DETECTOR_HLL_POOL,
+            virtualRegisters=config.DETECTOR_HLL_REGISTERS,
+            maxFlagged=config.DETECTOR_MAX_FLAGGED,
+            flagWindows=config.DETECTOR_FLAG_WINDOWS,
+            maxAlerts=config.DETECTOR_MAX_ALERTS,
+            risk=config.DETECTOR_RISK,
+            session=name,
+        ) if config.DETECTOR_ENABLED else None
         # Internal flag to control capture session state
         self.isCapturing: bool = False
         # Thread handle for live capture
         self.captureThread = None
-        # Logger instance for system-level events
-        self.logger = SystemLogger("packet_sniffer")
+        # Interface, BPF filter and sampling of the current (or last) session
+        self.captureSettings = CaptureSettings()
+        self.sampler = FlowSampler(1)
+        # Caps this session's share of the parse/scoring work (0: no limit)
+        self.maxPacketsPerSecond = config.SESSION_MAX_PPS if maxPacketsPerSecond is None else max(0.0, maxPacketsPerSecond)
+        self.rateLimiter = PacketRateLimiter(self.maxPacketsPerSecond)
+        # Logger instance for system-level events (one log file per session)
+        self.logger = SystemLogger("packet_sniffer" if name == "default" else f"packet_sniffer.{name}")
+        # Stage 1 -> 2: raw packets handed over by the capture thread
+        self.queueCapacity = max(1, queueCapacity or config.CAPTURE_QUEUE_CAPACITY)
+        self.rawQueue = BoundedQueue(self.queueCapacity, config.QUEUE_FULL_POLICY, name="capture")
+        # "scapy" dissects every packet, "raw" reads frame bytes through the fast-path decoder
+        self.decoderMode: str = config.DECODER_MODE
+        # Link-layer class used when a raw frame falls back to Scapy dissection (Ether until the socket reports one)
+        self.rawLayerClass = None
+        # Stage 2: parse/feature worker threads
+        self.parseWorkerCount = max(1, workers or config.PARSE_WORKERS)
+        self.parseThreads: List[threading.Thread] = []
+        # Stage 3: micro-batching classification, which hands scored batches to the store
+        # (the model is attached on the first capture start, see startCapture())
+        self.inferenceStage = BatchInferenceStage(
+            model=None,
+            onScored=self._storePackets,
+            batchSize=config.INFERENCE_BATCH_SIZE,
+            maxLatencyMs=config.INFERENCE_MAX_LATENCY_MS,
+            queueCapacity=queueCapacity or config.INFERENCE_QUEUE_CAPACITY,
+            queuePolicy=config.QUEUE_FULL_POLICY,
+            prepareBatch=self._enrichBatch,
+            logger=self.logger,
+        )
+        # Shared IP enricher (None when no dataset is configured), attached on capture start
+        self.enricher = None
+        # "thread" runs the in-process pipeline, "process" shards frames across worker processes
+        self.captureMode: str = config.CAPTURE_MODE
+        # Shard worker pool (None in thread mode)
+        self.shardPool: Optional[ShardedCapture] = None
+        if self.captureMode == "process":
+            self.shardPool = ShardedCapture(
+                workerCount=workers or config.SHARD_WORKERS,
+                onPackets=self._storePackets,
+                batchSize=config.INFERENCE_BATCH_SIZE,
+                logger=self.logger,
+            )
+            # Shard workers hold their own model copy; hot swaps are forwarded to them
+            addSwapListener(self.shardPool.reloadModel)
+        # Durable on-disk copy of every stored packet (None when CAPTURE_LOG_DIR is empty);
+        # sessions other than the default one log into CAPTURE_LOG_DIR/sessions/<name>
+        self.captureLog = None
+        if config.CAPTURE_LOG_DIR:
+            self.captureLog = CaptureLog(
+                config.CAPTURE_LOG_DIR if name == "default" else os.path.join(config.CAPTURE_LOG_DIR, "sessions", name),
+                segmentBytes=int(config.CAPTURE_LOG_SEGMENT_MB * 1024 * 1024),
+                segmentSeconds=config.CAPTURE_LOG_SEGMENT_SECONDS,
+                retentionBytes=int(config.CAPTURE_LOG_RETENTION_MB * 1024 * 1024),
+                retentionSeconds=config.CAPTURE_LOG_RETENTION_SECONDS,
+                flushInterval=config.CAPTURE_LOG_FLUSH_INTERVAL,
+            )
+        # Per-stage counters
+        self.statsLock = threading.Lock()
+        self._resetCounters()
+        # Existing counters are converted to Prometheus samples only when /metrics is scraped
+        metrics.registry.addCollector(self._collectMetrics)
+
+    def _resetCounters(self) -> None:
+        self.packetsCaptured: int = 0
+        self.packetsParsed: int = 0
+        self.parseErrors: int = 0
+        self.packetsStored: int = 0
+        self.storeEvictions: int = 0
 
     # -----------------------------------------------------------------------
-    # Internal Capture Handler
+    # Pipeline Stages
     # -----------------------------------------------------------------------
 
-    def _processPacket(self, packet: Packet) -> None:
+    def _processPacket(self, packet) -> None:
         """
-        Callback executed for every packet captured by Scapy.
-        Extracts metadata, assigns a sequential ID, and stores it.
+        Callback executed for every captured packet (Scapy packet or raw frame bytes).
+        Only hands the packet to the ring queue so the capture thread never stalls on analysis.
         """
-        packetId = self.idGenerator.getNextId()
-        parsedData = parsePacket(packet, packetId)
-        self.capturedPackets.append(parsedData)
-        self.logger.logInfo(f"Captured Packet #{packetId}: {parsedData['protocol']}")
+        self.packetsCaptured += 1
+        if not self.sampler.accept(packet) or not self.rateLimiter.accept():
+            return
+        if self.captureMode == "process":
+            self.shardPool.submit(packet)
+        else:
+            self.rawQueue.put(packet)
+
+    def _parseLoop(self) -> None:
+        """
+        Parse/feature worker: extracts metadata and features and queues the packet for scoring.
+        Keeps draining the ring queue after capture stops so that no accepted packet is lost.
+        """
+        while self.isCapturing or not self.rawQueue.empty():
+            try:
+                packet = self.rawQueue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            # IDs are assigned by the store stage so they stay continuous despite drops
+            started = _parseLatency.start()
+            if isinstance(packet, bytes):
+                parsedData = parseRawFrame(packet, None, classify=False, layerClass=self.rawLayerClass)
+            else:
+                parsedData = parsePacket(packet, None, classify=False)
+            _parseLatency.stop(started)
+            # Packets that already carry a risk (parse errors) skip the model
+            isParseError = "risk" in parsedData
+            started = _featureLatency.start()
+            features = None if isParseError else extractFeatures(parsedData, self.flowTable)
+            _featureLatency.stop(started)
+
+            with self.statsLock:
+                self.packetsParsed += 1
+                if isParseError:
+                    self.parseErrors += 1
+
+            self.inferenceStage.submit(parsedData, features)
+
+    def _enrichBatch(self, packets: List[Dict], featureRows: Optional[List[Optional[Dict]]] = None) -> None:
+        """
+        Adds reputation, country and ASN fields to a batch, once per distinct address.
+        With ENRICH_MODEL_FEATURES, the enrichment flags are appended to the batch's feature rows.
+        """
+        if self.enricher is None:
+            return
+        started = _enrichLatency.start()
+        self.enricher.enrichBatch(packets)
+        if featureRows is not None and config.ENRICH_MODEL_FEATURES:
+            self.enricher.extendFeatures(packets, featureRows)
+        _enrichLatency.stop(started)
+
+    def _storePackets(self, packets: List[Dict]) -> None:
+        """
+        Receives scored batches from the inference stage, assigns sequential IDs and stores them.
+        The streaming detectors see every batch first, so escalated verdicts are what gets stored.
+        """
+        # Shard workers score without the enricher, so their batches are enriched here
+        if self.captureMode == "process":
+            self._enrichBatch(packets)
+
+        if self.detector is not None:
+            started = _detectLatency.start()
+            self.detector.inspect(packets)
+            _detectLatency.stop(started)
+
+        started = _storeLatency.start()
+        for packetData in packets:
+            packetData["id"] = self.idGenerator.getNextId()
+
+        evicted = self.capturedPackets.extend(packets)
+        self.aggregator.update(packets)
+        if self.captureLog is not None:
+            try:
+                self.captureLog.append(packets)
+            except OSError as e:
+                self.logger.logError(f"Error writing capture log: {str(e)}")
+        with self.statsLock:
+            self.storeEvictions += evicted
+            self.packetsStored += len(packets)
+        _storeLatency.stop(started)
+
+        # Folded into a periodic summary line instead of one log record per packet
+        self.logger.logPackets(packets)
 
     def _captureLoop(self, iface: str = None) -> None:
         """
         Runs the packet sniffing loop in a background thread.
-        The 'store=False' parameter prevents Scapy from keeping packet objects in memory.
+        The 'store=False' parameter prevents Scapy from keeping packet objects in memory,
+        and the session's BPF filter is attached to the socket so the kernel drops unwanted frames.
         """
         self.logger.logInfo("Packet capture loop initiated.")
+        # Shard workers receive frame bytes, so process mode always reads raw frames
+        if self.decoderMode == "raw" or self.captureMode == "process":
+            self._rawCaptureLoop(iface)
+            return
+
         try:
-            sniff(
+            loadScapy().sniff(
                 prn=self._processPacket,  # Callback per packet
                 store=False,              # Avoid memory growth
                 stop_filter=lambda x: not self.isCapturing,
-                iface=iface               # Interface to sniff from
+                iface=iface,              # Interface to sniff from
+                filter=self.captureSettings.bpfFilter or None
             )
         except Exception as e:
             self.logger.logError(f"Error during packet capture: {str(e)}")
 
+    def _rawCaptureLoop(self, iface: str = None) -> None:
+        """
+        Reads undissected frame bytes from a Scapy listen socket.
+        Parse workers decode them with the struct-based fast path instead of full dissection.
+        """
+        try:
+            listenSocket = loadScapy().conf.L2listen(iface=iface, filter=self.captureSettings.bpfFilter or None)
+        except Exception as e:
+            self.logger.logError(f"Error opening raw capture socket: {str(e)}")
+            return
+
+        try:
+            while self.isCapturing:
+                # Poll so that stopCapture() is honoured even on an idle link
+                if not listenSocket.select([listenSocket], 0.5):
+                    continue
+                layerClass, frame, _ = listenSocket.recv_raw()
+                if frame is None:
+                    continue
+                if layerClass is not None:
+                    self.rawLayerClass = layerClass
+                self._processPacket(frame)
+        except Exception as e:
+            self.logger.logError(f"Error during packet capture: {str(e)}")
+        finally:
+            listenSocket.close()
+
     # -----------------------------------------------------------------------
     # Public Methods
     # -----------------------------------------------------------------------
 
-    def startCapture(self, iface: str = None) -> None:
+    def startCapture(
+        self,
+        iface: str = None,
+        profile: Optional[str] = None,
+        bpfFilter: Optional[str] = None,
+        sampleRate: Optional[int] = None,
+        excludeSelf: Optional[bool] = None,
+    ) -> None:
         """
-        Initiates the packet capture process in a separate thread.
+        Initiates the packet capture process and its pipeline workers.
+        Unset parameters fall back to the CAPTURE_* configuration.
+        Raises ValueError for an unknown profile, an invalid filter or sample rate.
         """
         if self.isCapturing:
             self.logger.logWarning("Attempted to start capture, but a session is already active.")
             return
 
+        # Scapy and the model are loaded lazily; pay for both here rather than at import time
+        loadScapy()
+        settings = CaptureSettings(iface, profile, bpfFilter, sampleRate, excludeSelf)
+        settings.resolveFilter(self.logger)
+        self.captureSettings = settings
+        self.sampler = FlowSampler(settings.sampleRate, config.CAPTURE_SAMPLE_SEED)
+        self.rateLimiter = PacketRateLimiter(self.maxPacketsPerSecond)
+        if self.captureMode != "process":
+            # Shard workers load their own model copy
+            self.inferenceStage.model = getClassifier()
+        self.enricher = getEnricher()
+
         self.isCapturing = True
         self.capturedPackets.clear()
+        self.aggregator.clear()
+        self.rawQueue.clear()
+        with self.statsLock:
+            self._resetCounters()
         self.logger.logInfo("Starting live packet capture...")
 
-        self.captureThread = threading.Thread(target=self._captureLoop, args=(iface,), daemon=True)
+        if self.captureMode == "process":
+            self.shardPool.start()
+        else:
+            self.inferenceStage.start()
+            self.parseThreads = [
+                threading.Thread(target=self._parseLoop, name=f"parse-worker-{index}", daemon=True)
+                for index in range(self.parseWorkerCount)
+            ]
+            for thread in self.parseThreads:
+                thread.start()
+
+        self.logger.logInfo(
+            f"Session '{self.name}': capture profile '{settings.profile}' on {settings.iface or 'default interface'}: "
+            f"filter '{settings.bpfFilter or 'none'}', 1 in {settings.sampleRate} flows."
+        )
+        self.captureThread = threading.Thread(target=self._captureLoop, args=(settings.iface,), daemon=True)
         self.captureThread.start()
 
     def stopCapture(self) -> None:
         """
         Stops the ongoing packet capture session safely.
+        Stages are stopped front to back so queued packets are flushed into the store.
         """
         if not self.isCapturing:
             self.logger.logWarning("Attempted to stop capture, but no session is active.")
@@ -95,19 +420,180 @@ class PacketSniffer:
         self.logger.logInfo("Stopping live packet capture...")
         if self.captureThread and self.captureThread.is_alive():
             self.captureThread.join(timeout=2.0)
+        for thread in self.parseThreads:
+            thread.join(timeout=2.0)
+        # Flush packets still waiting for their batch
+        self.inferenceStage.stop()
+        if self.shardPool is not None:
+            self.shardPool.stop()
+        if self.captureLog is not None:
+            self.captureLog.flush()
 
     def getCapturedPackets(self, limit: int = 50) -> List[Dict]:
         """
         Returns the most recently captured packets up to the specified limit.
         This data will be delivered to the frontend for visualization.
         """
-        return list(self.capturedPackets)[-limit:]
+        return self.capturedPackets.latest(limit)
+
+    def getLatestId(self) -> int:
+        """
+        Returns the ID of the newest stored packet (0 when nothing was stored).
+        """
+        return self.capturedPackets.latestId()
+
+    def getResetGeneration(self) -> int:
+        """
+        Returns how many times this session was reset (and its packet IDs restarted).
+        """
+        return self.idGenerator.generation
+
+    def getPacketsSince(self, sinceId: int, limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """
+        Returns up to 'limit' of the oldest packets with an ID greater than sinceId, plus
+        the number of packets after sinceId that were already evicted from the buffer.
+        Only the requested packets are visited.
+        """
+        return self.capturedPackets.since(sinceId, limit)
+
+    def queryPackets(
+        self,
+        risk: Optional[str] = None,
+        protocol: Optional[str] = None,
+        source: Optional[str] = None,
+        sinceId: Optional[int] = None,
+        limit: int = 50,
+    ) -> List[Dict]:
+        """
+        Returns stored packets filtered by risk level, protocol and/or source address.
+        """
+        return self.capturedPackets.query(risk=risk, protocol=protocol, source=source, sinceId=sinceId, limit=limit)
+
+    def _verdictCacheStats(self) -> Optional[Dict]:
+        classifier = peekClassifier()
+        return classifier.getStats() if hasattr(classifier, "getStats") else None
+
+    def getPipelineStats(self) -> Dict:
+        """
+        Returns throughput, backpressure and drop counters for every pipeline stage.
+        """
+        with self.statsLock:
+            counters = {
+                "captured": self.packetsCaptured,
+                "parsed": self.packetsParsed,
+                "parseErrors": self.parseErrors,
+                "stored": self.packetsStored,
+                "evicted": self.storeEvictions,
+            }
+
+        inferenceStats = self.inferenceStage.getStats()
+        shardStats = self.shardPool.getStats() if self.shardPool is not None else None
+        return {
+            "session": self.name,
+            "mode": self.captureMode,
+            "limits": self.getLimits(),
+            "capture": {
+                "packets": counters["captured"],
+                "settings": self.captureSettings.toDict(),
+                "sampling": self.sampler.getStats(),
+                "rateLimit": self.rateLimiter.getStats(),
+                "queue": self.rawQueue.getStats(),
+            },
+            "parse": {
+                "workers": self.parseWorkerCount,
+                "packets": counters["parsed"],
+                "errors": counters["parseErrors"],
+            },
+            "classify": inferenceStats,
+            "shards": shardStats,
+            "flows": self.flowTable.getStats(),
+            "verdictCache": self._verdictCacheStats(),
+            "detector": self.detector.getStats() if self.detector is not None else None,
+            "enrichment": self.enricher.getStats() if self.enricher is not None else None,
+            "captureLog": self.captureLog.getStats() if self.captureLog is not None else None,
+            "logger": self.logger.getStats(),
+            "store": {
+                **self.capturedPackets.getStats(),
+                "packets": counters["stored"],
+                "evicted": counters["evicted"],
+            },
+            "totalDropped": (
+                self.rawQueue.dropped
+                + inferenceStats["queue"]["dropped"]
+                + inferenceStats["packetsFailed"]
+                + (sum(shard["inputDropped"] for shard in shardStats["shards"]) + shardStats["failed"] if shardStats is not None else 0)
+            ),
+        }
+
+    def _collectMetrics(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """
+        Turns the pipeline statistics into (name, labels, value) samples for /metrics.
+        """
+        stats = self.getPipelineStats()
+        session = {"session": self.name}
+        samples = [
+            ("udon_capture_active", session, int(self.isCapturing)),
+            ("udon_packets_total", {**session, "stage": "captured"}, stats["capture"]["packets"]),
+            ("udon_packets_total", {**session, "stage": "sampled_out"}, stats["capture"]["sampling"]["sampledOut"]),
+            ("udon_packets_total", {**session, "stage": "rate_limited"}, stats["capture"]["rateLimit"]["limited"]),
+            ("udon_packets_total", {**session, "stage": "parsed"}, stats["parse"]["packets"]),
+            ("udon_packets_total", {**session, "stage": "scored"}, stats["classify"]["packetsScored"]),
+            ("udon_packets_total", {**session, "stage": "stored"}, stats["store"]["packets"]),
+            ("udon_store_evicted_total", session, stats["store"]["evicted"]),
+            ("udon_dropped_total", session, stats["totalDropped"]),
+            ("udon_flows_active", session, stats["flows"]["activeFlows"]),
+            ("udon_logger_dropped_total", session, stats["logger"]["dropped"]),
+        ]
+        for queueStats in (stats["capture"]["queue"], stats["classify"]["queue"]):
+            labels = {**session, "queue": queueStats["name"]}
+            samples.append(("udon_queue_depth", labels, queueStats["depth"]))
+            samples.append(("udon_queue_dropped_total", labels, queueStats["dropped"]))
+            samples.append(("udon_queue_blocked_seconds_total", labels, queueStats["blockedSeconds"]))
+        for shard in stats["shards"]["shards"] if stats["shards"] is not None else ():
+            labels = {**session, "queue": f"shard-{shard['shard']}"}
+            samples.append(("udon_queue_depth", labels, shard["inputDepth"]))
+            samples.append(("udon_queue_dropped_total", labels, shard["inputDropped"]))
+            samples.append(("udon_shard_truncated_total", labels, shard["inputTruncated"]))
+        if stats["detector"] is not None:
+            samples.append(("udon_detector_escalated_total", session, stats["detector"]["packetsEscalated"]))
+            samples.append(("udon_detector_flagged", session, stats["detector"]["flagged"]))
+        # The verdict cache belongs to the shared model, so only the default session reports it
+        if stats["verdictCache"] is not None and self.name == "default":
+            samples.append(("udon_verdict_cache_lookups_total", {"result": "hit"}, stats["verdictCache"]["hits"]))
+            samples.append(("udon_verdict_cache_lookups_total", {"result": "miss"}, stats["verdictCache"]["misses"]))
+        return samples
+
+    def getLimits(self) -> Dict:
+        return {
+            "bufferSize": self.bufferSize,
+            "queueCapacity": self.queueCapacity,
+            "workers": self.shardPool.workerCount if self.captureMode == "process" else self.parseWorkerCount,
+            "maxPacketsPerSecond": self.maxPacketsPerSecond,
+        }
+
+    def close(self) -> None:
+        """
+        Stops capture and releases the session's metrics collector, swap listener and capture log.
+        """
+        if self.isCapturing:
+            self.stopCapture()
+        metrics.registry.removeCollector(self._collectMetrics)
+        if self.shardPool is not None:
+            removeSwapListener(self.shardPool.reloadModel)
+        if self.captureLog is not None:
+            self.captureLog.close()
 
     def resetCapture(self) -> None:
         """
-        Resets the internal state of the sniffer, clearing all captured data and IDs.
+        Resets the internal state of this session, clearing its captured data and IDs.
         """
         self.stopCapture()
-        self.capturedPackets.clear()
+        self.rawQueue.clear()
+        self.inferenceStage.clear()
+        self.capturedPackets.clear(resetIds=True)
+        self.aggregator.clear()
+        if self.detector is not None:
+            self.detector.clear()
+        self.flowTable.clear()
         self.idGenerator.reset()
         self.logger.logInfo("Capture session reset successfully.")
@@ -0,0 +1,377 @@
+"""
+packetStore.py
+---------------
+Columnar, array-backed packet store.
+Instead of one dict per packet, every field lives in a preallocated NumPy
+column indexed by packet ID (slot = ID % capacity, like packetBuffer.py).
+Addresses, protocols and risk labels are interned into integer codes, and
+timestamps are kept as seconds of the day, so a stored packet costs a few
+dozen bytes. Packets are materialized back into dicts only when read, and
+filters by risk, protocol or source run as vectorized column comparisons.
+
+Enrichment context (country, ASN, organization, reputation lists) repeats for every
+packet of an address, so each side's context tuple is interned as well and costs
+one integer per packet.
+"""
+
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from app.enrichment.ipEnricher import ENRICHED_FIELDS
+
+# Fields held in dedicated columns; any other packet field is kept per slot in 'extras'
+COLUMN_FIELDS = (
+    "id", "source", "destination", "protocol", "length",
+    "sourcePort", "destinationPort", "tcpFlags", "timestamp", "risk",
+)
+_STORED_FIELDS = frozenset(COLUMN_FIELDS + ENRICHED_FIELDS)
+
+
+class StringTable:
+    """
+    Interns strings into dense integer codes.
+    """
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: str) -> int:
+        """
+        Returns the code of an interned string, or -1 if it was never stored.
+        """
+        return self.codes.get(value, -1)
+
+    def compact(self, liveCodes: np.ndarray) -> np.ndarray:
+        """
+        Keeps only the strings in 'liveCodes' and returns an old-code -> new-code map.
+        """
+        remap = np.full(len(self.values), -1, dtype=np.int64)
+        kept = np.unique(liveCodes)
+        remap[kept] = np.arange(len(kept))
+        self.values = [self.values[code] for code in kept.tolist()]
+        self.codes = {value: code for code, value in enumerate(self.values)}
+        return remap
+
+
+def _secondsOfDay(timestamp: str) -> int:
+    hours, minutes, seconds = timestamp.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def _formatSecondsOfDay(value: int) -> str:
+    return f"{value // 3600:02d}:{value // 60 % 60:02d}:{value % 60:02d}"
+
+
+class ColumnarPacketStore:
+    """
+    Fixed-capacity, thread-safe columnar packet store addressed by packet ID.
+    Drop-in replacement for PacketRingBuffer, with vectorized filtering via query().
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.ids = np.zeros(self.capacity, dtype=np.int64)
+        self.source = np.zeros(self.capacity, dtype=np.uint32)
+        self.destination = np.zeros(self.capacity, dtype=np.uint32)
+        self.protocol = np.zeros(self.capacity, dtype=np.uint16)
+        self.risk = np.zeros(self.capacity, dtype=np.uint8)
+        self.length = np.zeros(self.capacity, dtype=np.uint32)
+        self.sourcePort = np.zeros(self.capacity, dtype=np.uint16)
+        self.destinationPort = np.zeros(self.capacity, dtype=np.uint16)
+        self.tcpFlags = np.zeros(self.capacity, dtype=np.uint16)
+        self.timestamp = np.zeros(self.capacity, dtype=np.uint32)
+        # Interned (country, asn, asOrg, reputation) per side; code 0 means not enriched
+        self.sourceInfo = np.zeros(self.capacity, dtype=np.uint32)
+        self.destinationInfo = np.zeros(self.capacity, dtype=np.uint32)
+        self.enrichments = self._newEnrichmentTable()
+        # Addresses share one table; protocol and risk vocabularies are tiny
+        self.addresses = StringTable()
+        self.protocols = StringTable()
+        self.risks = StringTable()
+        # Address table size that triggers compaction of unreferenced entries
+        self.addressCompactThreshold = 2 * self.capacity + 1024
+        # slot -> fields outside COLUMN_FIELDS and ENRICHED_FIELDS (rare, so kept sparse)
+        self.extras: Dict[int, Dict] = {}
+        # ID range currently held (oldestId > newestId when empty)
+        self.oldestId: int = 1
+        self.newestId: int = 0
+        # Packets overwritten since the last clear()
+        self.evicted: int = 0
+        self.compactions: int = 0
+        # Last parsed timestamp string; consecutive packets usually share it
+        self.lastTimestamp: Tuple[str, int] = ("", 0)
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.newestId - self.oldestId + 1
+
+    @staticmethod
+    def _newEnrichmentTable() -> StringTable:
+        table = StringTable()
+        table.encode(None)
+        return table
+
+    def _clearSlots(self) -> None:
+        self.extras.clear()
+        self.oldestId = 1
+        self.newestId = 0
+
+    def _encodeTimestamp(self, timestamp: str) -> int:
+        lastString, lastValue = self.lastTimestamp
+        if timestamp == lastString:
+            return lastValue
+        try:
+            value = _secondsOfDay(timestamp)
+        except (AttributeError, ValueError):
+            value = 0
+        self.lastTimestamp = (timestamp, value)
+        return value
+
+    def _compactAddresses(self) -> None:
+        """
+        Drops addresses no stored packet refers to any more. Must be called with the lock held.
+        """
+        slots = self._slots(self.oldestId, self.newestId)
+        liveCodes = np.concatenate([self.source[slots], self.destination[slots]])
+        remap = self.addresses.compact(liveCodes)
+        self.source[slots] = remap[self.source[slots]]
+        self.destination[slots] = remap[self.destination[slots]]
+        self.compactions += 1
+        # Leave headroom so a store full of distinct addresses doesn't compact on every batch
+        self.addressCompactThreshold = max(2 * self.capacity + 1024, 2 * len(self.addresses))
+
+    def extend(self, packets: List[Dict]) -> int:
+        """
+        Appends packets whose 'id' fields continue the stored sequence.
+        A gap or restart in the IDs (e.g. after an ID reset) discards the held range.
+        Returns the number of packets evicted to make room.
+        """
+        if not packets:
+            return 0
+        with self.lock:
+            firstId = packets[0]["id"]
+            if firstId != self.newestId + 1:
+                self._clearSlots()
+                self.oldestId = firstId
+
+            count = len(packets)
+            # Only the last 'capacity' packets of an oversized batch survive
+            if count > self.capacity:
+                packets = packets[-self.capacity:]
+            slots = np.asarray([packetData["id"] for packetData in packets], dtype=np.int64) % self.capacity
+
+            if self.extras:
+                for slot in slots.tolist():
+                    self.extras.pop(slot, None)
+            encodeAddress = self.addresses.encode
+            encodeProtocol = self.protocols.encode
+            encodeRisk = self.risks.encode
+            encodeTimestamp = self._encodeTimestamp
+            self.ids[slots] = [packetData["id"] for packetData in packets]
+            self.source[slots] = [encodeAddress(packetData["source"]) for packetData in packets]
+            self.destination[slots] = [encodeAddress(packetData["destination"]) for packetData in packets]
+            self.protocol[slots] = [encodeProtocol(packetData["protocol"]) for packetData in packets]
+            self.risk[slots] = [encodeRisk(packetData.get("risk", "LOW")) for packetData in packets]
+            self.length[slots] = [packetData["length"] for packetData in packets]
+            self.sourcePort[slots] = [packetData["sourcePort"] for packetData in packets]
+            self.destinationPort[slots] = [packetData["destinationPort"] for packetData in packets]
+            self.tcpFlags[slots] = [packetData["tcpFlags"] for packetData in packets]
+            self.timestamp[slots] = [encodeTimestamp(packetData["timestamp"]) for packetData in packets]
+            # The enrichment stage enriches whole batches, so the first packet tells for all of them
+            fieldCount = len(COLUMN_FIELDS)
+            if "sourceReputation" in packets[0]:
+                fieldCount += len(ENRICHED_FIELDS)
+                encodeInfo = self.enrichments.encode
+                self.sourceInfo[slots] = [encodeInfo((
+                    packetData["sourceCountry"], packetData["sourceAsn"],
+                    packetData["sourceAsOrg"], packetData["sourceReputation"],
+                )) for packetData in packets]
+                self.destinationInfo[slots] = [encodeInfo((
+                    packetData["destinationCountry"], packetData["destinationAsn"],
+                    packetData["destinationAsOrg"], packetData["destinationReputation"],
+                )) for packetData in packets]
+            else:
+                self.sourceInfo[slots] = 0
+                self.destinationInfo[slots] = 0
+            for slot, packetData in zip(slots.tolist(), packets):
+                if len(packetData) > fieldCount:
+                    self.extras[slot] = {key: value for key, value in packetData.items() if key not in _STORED_FIELDS}
+            self.newestId = packets[-1]["id"]
+
+            overflow = max(0, len(self) - self.capacity)
+            self.oldestId += overflow
+            self.evicted += overflow
+
+            if len(self.addresses) > self.addressCompactThreshold:
+                self._compactAddresses()
+            return overflow
+
+    def clear(self, resetIds: bool = False) -> None:
+        """
+        Drops every stored packet. Unless resetIds is set, the ID sequence is kept so
+        cursors held by readers stay valid and report the cleared packets as evicted.
+        """
+        with self.lock:
+            newestId = self.newestId
+            self._clearSlots()
+            self.addresses = StringTable()
+            self.enrichments = self._newEnrichmentTable()
+            if not resetIds:
+                self.oldestId = newestId + 1
+                self.newestId = newestId
+            self.evicted = 0
+
+    # -----------------------------------------------------------------------
+    # Queries
+    # -----------------------------------------------------------------------
+
+    def _slots(self, startId: int, endId: int) -> np.ndarray:
+        """
+        Returns the slots of packets startId..endId (inclusive), in ID order.
+        """
+        if endId < startId:
+            return np.empty(0, dtype=np.int64)
+        return np.arange(startId, endId + 1, dtype=np.int64) % self.capacity
+
+    def _materialize(self, slots: np.ndarray) -> List[Dict]:
+        """
+        Builds packet dicts for the given slots. Must be called with the lock held.
+        """
+        addresses = self.addresses.values
+        protocols = self.protocols.values
+        risks = self.risks.values
+        packets = [
+            {
+                "id": packetId,
+                "source": addresses[source],
+                "destination": addresses[destination],
+                "protocol": protocols[protocol],
+                "length": length,
+                "sourcePort": sourcePort,
+                "destinationPort": destinationPort,
+                "tcpFlags": tcpFlags,
+                "timestamp": _formatSecondsOfDay(timestamp),
+                "risk": risks[risk],
+            }
+            for packetId, source, destination, protocol, length, sourcePort, destinationPort, tcpFlags, timestamp, risk in zip(
+                self.ids[slots].tolist(),
+                self.source[slots].tolist(),
+                self.destination[slots].tolist(),
+                self.protocol[slots].tolist(),
+                self.length[slots].tolist(),
+                self.sourcePort[slots].tolist(),
+                self.destinationPort[slots].tolist(),
+                self.tcpFlags[slots].tolist(),
+                self.timestamp[slots].tolist(),
+                self.risk[slots].tolist(),
+            )
+        ]
+        if len(self.enrichments) > 1:
+            infos = self.enrichments.values
+            for packetData, sourceInfo, destinationInfo in zip(
+                packets, self.sourceInfo[slots].tolist(), self.destinationInfo[slots].tolist()
+            ):
+                if sourceInfo:
+                    (packetData["sourceCountry"], packetData["sourceAsn"],
+                     packetData["sourceAsOrg"], packetData["sourceReputation"]) = infos[sourceInfo]
+                    (packetData["destinationCountry"], packetData["destinationAsn"],
+                     packetData["destinationAsOrg"], packetData["destinationReputation"]) = infos[destinationInfo]
+        if self.extras:
+            for slot, packetData in zip(slots.tolist(), packets):
+                extra = self.extras.get(slot)
+                if extra:
+                    packetData.update(extra)
+        return packets
+
+    def latestId(self) -> int:
+        """
+        Returns the ID of the newest stored packet (0 when nothing was stored).
+        """
+        with self.lock:
+            return self.newestId
+
+    def latest(self, limit: int = 50) -> List[Dict]:
+        """
+        Returns up to 'limit' of the newest packets, oldest first.
+        """
+        with self.lock:
+            if limit <= 0:
+                return []
+            return self._materialize(self._slots(max(self.oldestId, self.newestId - limit + 1), self.newestId))
+
+    def since(self, sinceId: int, limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """
+        Returns up to 'limit' of the oldest packets with an ID greater than sinceId, plus
+        the number of packets after sinceId that were evicted before they could be read.
+        """
+        with self.lock:
+            startId = max(sinceId + 1, self.oldestId)
+            evicted = max(0, self.oldestId - sinceId - 1)
+            endId = self.newestId if limit is None else min(self.newestId, startId + limit - 1)
+            return self._materialize(self._slots(startId, endId)), evicted
+
+    def query(
+        self,
+        risk: Optional[str] = None,
+        protocol: Optional[str] = None,
+        source: Optional[str] = None,
+        sinceId: Optional[int] = None,
+        limit: int = 50,
+    ) -> List[Dict]:
+        """
+        Returns packets matching every given filter, evaluated as vectorized column masks.
+        Without sinceId the newest 'limit' matches are returned, otherwise the oldest
+        'limit' matches after sinceId; both oldest first.
+        """
+        with self.lock:
+            startId = self.oldestId if sinceId is None else max(sinceId + 1, self.oldestId)
+            slots = self._slots(startId, self.newestId)
+            mask = np.ones(len(slots), dtype=bool)
+            for column, table, value in (
+                (self.risk, self.risks, risk),
+                (self.protocol, self.protocols, protocol),
+                (self.source, self.addresses, source),
+            ):
+                if value is None:
+                    continue
+                code = table.lookup(value)
+                if code < 0:
+                    return []
+                mask &= column[slots] == code
+
+            matches = slots[mask]
+            matches = matches[-limit:] if sinceId is None else matches[:limit]
+            return self._materialize(matches)
+
+    def getStats(self) -> Dict:
+        with self.lock:
+            columnBytes = sum(
+                column.nbytes for column in (
+                    self.ids, self.source, self.destination, self.protocol, self.risk, self.length,
+                    self.sourcePort, self.destinationPort, self.tcpFlags, self.timestamp,
+                    self.sourceInfo, self.destinationInfo,
+                )
+            )
+            return {
+                "capacity": self.capacity,
+                "size": len(self),
+                "oldestId": self.oldestId if len(self) else None,
+                "newestId": self.newestId if len(self) else None,
+                "evicted": self.evicted,
+                "columnBytes": columnBytes,
+                "internedAddresses": len(self.addresses),
+                "internedEnrichments": len(self.enrichments) - 1,
+                "addressCompactions": self.compactions,
+            }
@@ -0,0 +1,87 @@
+"""
+packetStream.py
+----------------
+Per-client cursors for the server-push packet stream (WebSocket and SSE).
+Each client remembers the last packet ID it received and is only sent packets
+stored after it, coalesced into one frame per tick. Clients that fall too far
+behind are either skipped ahead to the newest packets or disconnected.
+"""
+
+from typing import Dict, Optional
+
+# Slow-consumer policies
+SKIP_AHEAD = "skip"
+DISCONNECT = "disconnect"
+
+
+class SlowConsumerError(Exception):
+    """
+    Raised when a client's backlog exceeds the limit under the 'disconnect' policy.
+    """
+
+
+class PacketStreamCursor:
+    """
+    Tracks one client's position in the sniffer's packet buffer.
+    """
+
+    def __init__(
+        self,
+        sniffer,
+        sinceId: Optional[int] = None,
+        maxBatch: int = 500,
+        maxBacklog: int = 5000,
+        policy: str = SKIP_AHEAD,
+    ):
+        self.sniffer = sniffer
+        self.generation: int = sniffer.getResetGeneration()
+        # Start at the newest packet unless the client resumes from a known ID
+        self.cursor: int = sniffer.getLatestId() if sinceId is None else max(0, sinceId)
+        self.maxBatch = max(1, maxBatch)
+        self.maxBacklog = max(self.maxBatch, maxBacklog)
+        self.policy = policy
+        self.framesSent: int = 0
+        self.packetsSent: int = 0
+        self.packetsDropped: int = 0
+
+    def nextFrame(self) -> Optional[Dict]:
+        """
+        Returns the next coalesced frame, or None when nothing new was stored.
+        """
+        generation = self.sniffer.getResetGeneration()
+        latestId = self.sniffer.getLatestId()
+        # The capture session was reset and IDs restarted. New traffic may already have pushed
+        # them past the cursor, so compare generations; an ID behind the cursor only catches
+        # a client resuming with an ID from before a reset.
+        reset = generation != self.generation or latestId < self.cursor
+        if reset:
+            self.generation = generation
+            self.cursor = 0
+        elif latestId == self.cursor:
+            return None
+
+        dropped = 0
+        backlog = latestId - self.cursor
+        if backlog > self.maxBacklog:
+            if self.policy == DISCONNECT:
+                raise SlowConsumerError(f"Client is {backlog} packets behind (limit {self.maxBacklog}).")
+            skipTo = latestId - self.maxBatch
+            dropped += skipTo - self.cursor
+            self.cursor = skipTo
+
+        packets, evicted = self.sniffer.getPacketsSince(self.cursor, self.maxBatch)
+        dropped += evicted
+        if packets:
+            self.cursor = packets[-1]["id"]
+
+        self.framesSent += 1
+        self.packetsSent += len(packets)
+        self.packetsDropped += dropped
+        return {
+            "cursor": self.cursor,
+            "latestId": latestId,
+            "count": len(packets),
+            "dropped": dropped,
+            "reset": reset,
+            "packets": packets,
+        }
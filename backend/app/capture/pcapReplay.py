@@ -0,0 +1,366 @@
+"""
+pcapReplay.py
+--------------
+Offline replay of pcap/pcapng files through the scoring path.
+Capture files are memory-mapped and walked by a chunked generator, so files
+much larger than RAM stream through with only one chunk of frames in flight.
+Each frame goes through the same parse -> features -> classify steps as live
+traffic (parseRawFrame / extractFeatures / batched predictBatch), using a
+private flow table driven by the capture timestamps. Replay runs as fast as
+possible or paced against the wall clock, and writes the scored packets to a
+JSON-lines or CSV results file together with throughput numbers.
+When enrichment datasets are configured, every batch is enriched before it is scored.
+"""
+
+import csv
+import json
+import mmap
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.capture.packetParser import getClassifier, loadScapy, parsePacket, parseRawFrame
+from app.enrichment.ipEnricher import ENRICHED_FIELDS, getEnricher
+from app.ml.featureExtractor import extractFeatures
+from app.ml.flowTable import FlowTable
+from app import config
+
+# Link-layer types
+LINKTYPE_ETHERNET = 1
+
+# Classic pcap magic numbers (as read little-endian) -> (byte order, timestamp divisor)
+PCAP_MAGICS = {
+    0xA1B2C3D4: ("<", 1e6),
+    0xD4C3B2A1: (">", 1e6),
+    0xA1B23C4D: ("<", 1e9),
+    0x4D3CB2A1: (">", 1e9),
+}
+PCAP_GLOBAL_HEADER_LEN = 24
+PCAP_RECORD_HEADER_LEN = 16
+
+# pcapng block types
+PCAPNG_SECTION_HEADER = 0x0A0D0D0A
+PCAPNG_INTERFACE_DESCRIPTION = 0x00000001
+PCAPNG_OBSOLETE_PACKET = 0x00000002
+PCAPNG_SIMPLE_PACKET = 0x00000003
+PCAPNG_ENHANCED_PACKET = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_OPTION_TSRESOL = 9
+
+# (capture timestamp, frame bytes, link-layer type)
+Frame = Tuple[float, bytes, int]
+
+# Columns written to CSV results files
+RESULT_FIELDS = (
+    "id", "captureTime", "timestamp", "source", "destination", "protocol", "length",
+    "sourcePort", "destinationPort", "tcpFlags", "risk",
+) + ENRICHED_FIELDS
+
+
+# -----------------------------------------------------------------------
+# Capture File Readers
+# -----------------------------------------------------------------------
+
+def _readPcap(data: mmap.mmap, chunkSize: int) -> Iterator[List[Frame]]:
+    magic = struct.unpack_from("<I", data, 0)[0]
+    byteOrder, divisor = PCAP_MAGICS[magic]
+    linkType = struct.unpack_from(byteOrder + "I", data, 20)[0] & 0x0FFFFFFF
+    recordHeader = struct.Struct(byteOrder + "IIII")
+
+    offset = PCAP_GLOBAL_HEADER_LEN
+    end = len(data)
+    chunk: List[Frame] = []
+    while offset + PCAP_RECORD_HEADER_LEN <= end:
+        seconds, fraction, capturedLength, _ = recordHeader.unpack_from(data, offset)
+        offset += PCAP_RECORD_HEADER_LEN
+        if offset + capturedLength > end:
+            # Truncated trailing record
+            break
+        chunk.append((seconds + fraction / divisor, data[offset:offset + capturedLength], linkType))
+        offset += capturedLength
+        if len(chunk) >= chunkSize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _interfaceResolution(data: mmap.mmap, byteOrder: str, offset: int, end: int) -> float:
+    """
+    Reads the if_tsresol option of an Interface Description Block (default: microseconds).
+    """
+    while offset + 4 <= end:
+        code, length = struct.unpack_from(byteOrder + "HH", data, offset)
+        if code == 0:
+            break
+        if code == PCAPNG_OPTION_TSRESOL and length >= 1:
+            value = data[offset + 4]
+            return float(2 ** (value & 0x7F)) if value & 0x80 else float(10 ** value)
+        offset += 4 + (length + 3) // 4 * 4
+    return 1e6
+
+
+def _readPcapng(data: mmap.mmap, chunkSize: int) -> Iterator[List[Frame]]:
+    byteOrder = "<"
+    # Per section: (link type, timestamp units per second) for each interface
+    interfaces: List[Tuple[int, float]] = []
+    lastTimestamp = 0.0
+
+    offset = 0
+    end = len(data)
+    chunk: List[Frame] = []
+    while offset + 12 <= end:
+        blockType = struct.unpack_from(byteOrder + "I", data, offset)[0]
+        if blockType == PCAPNG_SECTION_HEADER:
+            # Every section declares its own byte order
+            magic = struct.unpack_from("<I", data, offset + 8)[0]
+            byteOrder = "<" if magic == PCAPNG_BYTE_ORDER_MAGIC else ">"
+            interfaces = []
+        blockLength = struct.unpack_from(byteOrder + "I", data, offset + 4)[0]
+        if blockLength < 12 or offset + blockLength > end:
+            break
+        body = offset + 8
+        blockEnd = offset + blockLength - 4
+
+        if blockType == PCAPNG_INTERFACE_DESCRIPTION:
+            linkType = struct.unpack_from(byteOrder + "H", data, body)[0]
+            interfaces.append((linkType, _interfaceResolution(data, byteOrder, body + 8, blockEnd)))
+        elif blockType in (PCAPNG_ENHANCED_PACKET, PCAPNG_OBSOLETE_PACKET):
+            if blockType == PCAPNG_ENHANCED_PACKET:
+                interfaceId, high, low, capturedLength = struct.unpack_from(byteOrder + "IIII", data, body)
+            else:
+                interfaceId, _, high, low, capturedLength = struct.unpack_from(byteOrder + "HHIII", data, body)
+            linkType, resolution = interfaces[interfaceId] if interfaceId < len(interfaces) else (LINKTYPE_ETHERNET, 1e6)
+            lastTimestamp = ((high << 32) | low) / resolution
+            start = body + 20
+            chunk.append((lastTimestamp, data[start:min(start + capturedLength, blockEnd)], linkType))
+        elif blockType == PCAPNG_SIMPLE_PACKET:
+            # Simple packets carry no timestamp; reuse the previous one
+            originalLength = struct.unpack_from(byteOrder + "I", data, body)[0]
+            linkType = interfaces[0][0] if interfaces else LINKTYPE_ETHERNET
+            start = body + 4
+            chunk.append((lastTimestamp, data[start:min(start + originalLength, blockEnd)], linkType))
+
+        offset += blockLength
+        if len(chunk) >= chunkSize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def readCaptureFile(path: str, chunkSize: int = 4096) -> Iterator[List[Frame]]:
+    """
+    Memory-maps a pcap or pcapng file and yields its frames in chunks of up to 'chunkSize'.
+    """
+    with open(path, "rb") as captureFile:
+        try:
+            data = mmap.mmap(captureFile.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            return
+        try:
+            if len(data) < 12:
+                return
+            magic = struct.unpack_from("<I", data, 0)[0]
+            if magic in PCAP_MAGICS:
+                if len(data) < PCAP_GLOBAL_HEADER_LEN:
+                    raise ValueError(f"{path} is too short for a pcap global header.")
+                yield from _readPcap(data, chunkSize)
+            elif magic == PCAPNG_SECTION_HEADER:
+                yield from _readPcapng(data, chunkSize)
+            else:
+                raise ValueError(f"{path} is not a pcap or pcapng file.")
+        except struct.error as e:
+            # A block header that claims more bytes than the file holds
+            raise ValueError(f"{path} is corrupt: {e}") from e
+        finally:
+            data.close()
+
+
+# -----------------------------------------------------------------------
+# Replay Engine
+# -----------------------------------------------------------------------
+
+class PcapReplay:
+    """
+    Streams a capture file through parse -> features -> classify and records the verdicts.
+    'speed' 0 replays as fast as possible; otherwise inter-packet gaps are divided by it
+    (1.0 = original timing, 10.0 = ten times faster).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        outputPath: Optional[str] = None,
+        speed: float = 0.0,
+        chunkSize: int = config.REPLAY_CHUNK_SIZE,
+        batchSize: int = config.INFERENCE_BATCH_SIZE,
+        limit: Optional[int] = None,
+    ):
+        self.path = path
+        self.outputPath = outputPath
+        self.speed = max(0.0, speed)
+        self.chunkSize = max(1, chunkSize)
+        self.batchSize = max(1, batchSize)
+        self.limit = limit
+        # Private flow table so replayed flows never mix with live traffic
+        self.flowTable = FlowTable(
+            idleTimeout=config.FLOW_IDLE_TIMEOUT,
+            activeTimeout=config.FLOW_ACTIVE_TIMEOUT,
+            maxFlows=config.FLOW_TABLE_MAX_FLOWS,
+        )
+        self.stopEvent = threading.Event()
+        self.lock = threading.Lock()
+        self.state: str = "pending"
+        self.error: Optional[str] = None
+        self.packets: int = 0
+        self.bytes: int = 0
+        self.parseErrors: int = 0
+        self.riskCounts: Dict[str, int] = {}
+        self.firstTimestamp: Optional[float] = None
+        self.lastTimestamp: Optional[float] = None
+        self.startedAt: Optional[float] = None
+        self.finishedAt: Optional[float] = None
+
+    def _parseFrame(self, captureTime: float, frame: bytes, linkType: int) -> Dict:
+        if linkType == LINKTYPE_ETHERNET:
+            packetData = parseRawFrame(frame, None, classify=False)
+        else:
+            scapy = loadScapy()
+            layerClass = scapy.conf.l2types.num2layer.get(linkType, scapy.Raw)
+            packetData = parsePacket(layerClass(frame), None, classify=False)
+        packetData["captureTime"] = captureTime
+        packetData["timestamp"] = datetime.fromtimestamp(captureTime).strftime("%H:%M:%S")
+        return packetData
+
+    def _scoreBatch(self, pending: List[Tuple[Dict, Optional[Dict]]], writeResult) -> None:
+        """
+        Classifies a batch with one model call and writes every packet in capture order.
+        """
+        enricher = getEnricher()
+        if enricher is not None:
+            enricher.enrichBatch([packetData for packetData, _ in pending])
+            if config.ENRICH_MODEL_FEATURES:
+                enricher.extendFeatures([packetData for packetData, _ in pending], [features for _, features in pending])
+        scored = [(packetData, features) for packetData, features in pending if features is not None]
+        if scored:
+            labels = getClassifier().predictBatch([features for _, features in scored])
+            for (packetData, _), label in zip(scored, labels):
+                packetData["risk"] = label
+
+        with self.lock:
+            for packetData, features in pending:
+                self.packets += 1
+                packetData["id"] = self.packets
+                self.bytes += packetData["length"]
+                if features is None:
+                    self.parseErrors += 1
+                self.riskCounts[packetData["risk"]] = self.riskCounts.get(packetData["risk"], 0) + 1
+        if writeResult is not None:
+            for packetData, _ in pending:
+                writeResult(packetData)
+        pending.clear()
+
+    def _pace(self, captureTime: float, wallStart: float, pending, writeResult) -> None:
+        """
+        Sleeps until the packet is due, flushing pending verdicts first so output isn't held back.
+        """
+        delay = wallStart + (captureTime - self.firstTimestamp) / self.speed - time.perf_counter()
+        if delay > 0.001:
+            if pending:
+                self._scoreBatch(pending, writeResult)
+            self.stopEvent.wait(delay)
+
+    def run(self) -> Dict:
+        """
+        Replays the whole file (or 'limit' packets) and returns the summary.
+        """
+        self.state = "running"
+        self.startedAt = time.perf_counter()
+        outputFile = None
+        writeResult = None
+        try:
+            if self.outputPath:
+                outputFile = open(self.outputPath, "w", newline="")
+                if self.outputPath.endswith(".csv"):
+                    writer = csv.DictWriter(outputFile, fieldnames=RESULT_FIELDS, extrasaction="ignore")
+                    writer.writeheader()
+                    # Reputation list names are joined into one cell
+                    writeResult = lambda packetData: writer.writerow({
+                        **packetData,
+                        "sourceReputation": "|".join(packetData.get("sourceReputation", ())),
+                        "destinationReputation": "|".join(packetData.get("destinationReputation", ())),
+                    })
+                else:
+                    writeResult = lambda packetData: outputFile.write(json.dumps(packetData) + "\n")
+
+            pending: List[Tuple[Dict, Optional[Dict]]] = []
+            wallStart = time.perf_counter()
+            remaining = self.limit
+            for chunk in readCaptureFile(self.path, self.chunkSize):
+                for captureTime, frame, linkType in chunk:
+                    if self.stopEvent.is_set() or remaining == 0:
+                        break
+                    if self.firstTimestamp is None:
+                        self.firstTimestamp = captureTime
+                    self.lastTimestamp = captureTime
+                    if self.speed:
+                        self._pace(captureTime, wallStart, pending, writeResult)
+
+                    packetData = self._parseFrame(captureTime, frame, linkType)
+                    # Packets that already carry a risk (parse errors) skip the model
+                    features = None if "risk" in packetData else extractFeatures(packetData, self.flowTable, captureTime)
+                    pending.append((packetData, features))
+                    if len(pending) >= self.batchSize:
+                        self._scoreBatch(pending, writeResult)
+                    if remaining is not None:
+                        remaining -= 1
+                else:
+                    continue
+                break
+
+            if pending:
+                self._scoreBatch(pending, writeResult)
+            self.state = "stopped" if self.stopEvent.is_set() else "completed"
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+        finally:
+            if outputFile is not None:
+                outputFile.close()
+            self.finishedAt = time.perf_counter()
+        return self.getSummary()
+
+    def stop(self) -> None:
+        self.stopEvent.set()
+
+    def getSummary(self) -> Dict:
+        """
+        Returns progress and throughput (packets/s, Mbit/s) of the replay.
+        """
+        with self.lock:
+            packets, totalBytes, parseErrors = self.packets, self.bytes, self.parseErrors
+            riskCounts = dict(self.riskCounts)
+        if self.startedAt is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finishedAt or time.perf_counter()) - self.startedAt
+        captureSpan = (self.lastTimestamp - self.firstTimestamp) if self.firstTimestamp is not None else 0.0
+        return {
+            "state": self.state,
+            "error": self.error,
+            "path": self.path,
+            "outputPath": self.outputPath,
+            "speed": self.speed,
+            "packets": packets,
+            "bytes": totalBytes,
+            "parseErrors": parseErrors,
+            "risk": riskCounts,
+            "elapsedSeconds": elapsed,
+            "captureSpanSeconds": captureSpan,
+            "packetsPerSecond": packets / elapsed if elapsed else 0.0,
+            "megabitsPerSecond": totalBytes * 8 / elapsed / 1e6 if elapsed else 0.0,
+            "flows": self.flowTable.getStats(),
+        }
@@ -0,0 +1,158 @@
+"""
+rawDecoder.py
+--------------
+Fast-path header decoder that reads packet metadata straight from raw frame bytes.
+Handles Ethernet (optionally VLAN-tagged) frames carrying IPv4/IPv6 with TCP, UDP or ICMP
+using fixed struct offsets, so the common case never pays for a full Scapy dissection.
+Frames it cannot decode return None and are handed back to the Scapy path by the parser.
+"""
+
+import socket
+import struct
+import zlib
+from typing import Dict, Optional
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+VLAN_ETHERTYPES = (0x8100, 0x88A8)
+
+PROTO_ICMP = 1
+PROTO_TCP = 6
+PROTO_UDP = 17
+PROTO_ICMPV6 = 58
+
+# Transport protocol numbers mapped to the names used in packetData
+PROTOCOL_NAMES = {PROTO_TCP: "TCP", PROTO_UDP: "UDP", PROTO_ICMP: "ICMP", PROTO_ICMPV6: "ICMPv6"}
+
+ETHERNET_HEADER_LEN = 14
+IPV6_HEADER_LEN = 40
+
+_unpackEthertype = struct.Struct("!H").unpack_from
+_unpackPorts = struct.Struct("!HH").unpack_from
+
+
+def decodeFrame(frame: bytes) -> Optional[Dict]:
+    """
+    Decodes addresses, protocol, ports, length and TCP flags from an Ethernet frame.
+    Returns None when the frame needs a full Scapy dissection (non-IP, IPv6 extension
+    headers, truncated headers, ...).
+    """
+    view = memoryview(frame)
+    frameLength = len(view)
+    if frameLength < ETHERNET_HEADER_LEN:
+        return None
+
+    offset = 12
+    etherType = _unpackEthertype(view, offset)[0]
+    offset += 2
+
+    # Skip up to two 802.1Q / 802.1ad tags
+    for _ in range(2):
+        if etherType not in VLAN_ETHERTYPES:
+            break
+        if frameLength < offset + 4:
+            return None
+        etherType = _unpackEthertype(view, offset + 2)[0]
+        offset += 4
+
+    if etherType == ETHERTYPE_IPV4:
+        if frameLength < offset + 20:
+            return None
+        versionIhl = view[offset]
+        headerLength = (versionIhl & 0x0F) * 4
+        if versionIhl >> 4 != 4 or headerLength < 20 or frameLength < offset + headerLength:
+            return None
+
+        protocolNumber = view[offset + 9]
+        source = socket.inet_ntoa(view[offset + 12:offset + 16])
+        destination = socket.inet_ntoa(view[offset + 16:offset + 20])
+        # Non-first fragments carry no transport header
+        isFragment = (_unpackEthertype(view, offset + 6)[0] & 0x1FFF) != 0
+        transportOffset = offset + headerLength
+
+    elif etherType == ETHERTYPE_IPV6:
+        if frameLength < offset + IPV6_HEADER_LEN:
+            return None
+        if view[offset] >> 4 != 6:
+            return None
+
+        protocolNumber = view[offset + 6]
+        # Extension headers are rare enough to leave to Scapy
+        if protocolNumber not in PROTOCOL_NAMES:
+            return None
+        source = socket.inet_ntop(socket.AF_INET6, view[offset + 8:offset + 24])
+        destination = socket.inet_ntop(socket.AF_INET6, view[offset + 24:offset + 40])
+        isFragment = False
+        transportOffset = offset + IPV6_HEADER_LEN
+
+    else:
+        return None
+
+    sourcePort = destinationPort = tcpFlags = 0
+    protocol = PROTOCOL_NAMES.get(protocolNumber)
+
+    if protocol is None or isFragment:
+        protocol = f"IP-{protocolNumber}"
+
+    elif protocolNumber == PROTO_TCP:
+        if frameLength < transportOffset + 20:
+            return None
+        sourcePort, destinationPort = _unpackPorts(view, transportOffset)
+        # 9-bit flag field: NS bit followed by CWR..FIN
+        tcpFlags = ((view[transportOffset + 12] & 0x01) << 8) | view[transportOffset + 13]
+
+    elif protocolNumber == PROTO_UDP:
+        if frameLength < transportOffset + 8:
+            return None
+        sourcePort, destinationPort = _unpackPorts(view, transportOffset)
+
+    return {
+        "source": source,
+        "destination": destination,
+        "protocol": protocol,
+        "length": frameLength,
+        "sourcePort": sourcePort,
+        "destinationPort": destinationPort,
+        "tcpFlags": tcpFlags,
+    }
+
+
+def flowHash(frame: bytes) -> int:
+    """
+    Symmetric, process-independent hash of a frame's 5-tuple (addresses, protocol, ports).
+    Both directions of a flow hash to the same value; non-IP frames hash to 0.
+    """
+    view = memoryview(frame)
+    frameLength = len(view)
+    if frameLength < ETHERNET_HEADER_LEN:
+        return 0
+
+    offset = 12
+    etherType = _unpackEthertype(view, offset)[0]
+    offset += 2
+    for _ in range(2):
+        if etherType not in VLAN_ETHERTYPES or frameLength < offset + 4:
+            break
+        etherType = _unpackEthertype(view, offset + 2)[0]
+        offset += 4
+
+    if etherType == ETHERTYPE_IPV4 and frameLength >= offset + 20:
+        protocolNumber = view[offset + 9]
+        sourceAddress = bytes(view[offset + 12:offset + 16])
+        destinationAddress = bytes(view[offset + 16:offset + 20])
+        transportOffset = offset + (view[offset] & 0x0F) * 4
+    elif etherType == ETHERTYPE_IPV6 and frameLength >= offset + IPV6_HEADER_LEN:
+        protocolNumber = view[offset + 6]
+        sourceAddress = bytes(view[offset + 8:offset + 24])
+        destinationAddress = bytes(view[offset + 24:offset + 40])
+        transportOffset = offset + IPV6_HEADER_LEN
+    else:
+        return 0
+
+    sourceEndpoint, destinationEndpoint = sourceAddress, destinationAddress
+    if protocolNumber in (PROTO_TCP, PROTO_UDP) and frameLength >= transportOffset + 4:
+        sourceEndpoint += bytes(view[transportOffset:transportOffset + 2])
+        destinationEndpoint += bytes(view[transportOffset + 2:transportOffset + 4])
+
+    low, high = sorted((sourceEndpoint, destinationEndpoint))
+    return zlib.crc32(high, zlib.crc32(low + bytes((protocolNumber,))))
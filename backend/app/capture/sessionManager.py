@@ -0,0 +1,137 @@
+"""
+sessionManager.py
+------------------
+Named capture sessions running side by side, e.g. one per interface or filter.
+
+Each session is a PacketSniffer with its own packet store, ID sequence, flow table,
+statistics, detectors and capture log, so resetting one never touches the others.
+The "default" session always exists and serves the unscoped /api/packets routes.
+
+Resource limits keep a busy session from starving the rest:
+
+- memory: every session's buffer size counts against SESSION_BUFFER_BUDGET
+- CPU share: a token bucket caps the packets per second a session admits, and
+  its worker count bounds the parse threads (or shard processes) it runs
+- queue depth: the capacity of the session's capture and inference queues
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from app.capture.packetSniffer import PacketSniffer
+from app import config
+
+DEFAULT_SESSION = "default"
+# Names that would clash with the fixed /api/packets/<segment> routes
+RESERVED_NAMES = {
+    "start", "stop", "latest", "reset", "status", "stats", "alerts", "stream", "ws",
+    "replay", "history", "model", "debug", "sessions",
+}
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,31}$")
+
+
+class CaptureSessionManager:
+    """
+    Creates, looks up and removes capture sessions within the configured limits.
+    """
+
+    def __init__(self, maxSessions: int = 4, bufferBudget: int = 40000):
+        self.maxSessions = max(1, maxSessions)
+        self.bufferBudget = bufferBudget
+        self.lock = threading.Lock()
+        self.sessions: "OrderedDict[str, PacketSniffer]" = OrderedDict()
+        self.sessions[DEFAULT_SESSION] = PacketSniffer(DEFAULT_SESSION)
+
+    @property
+    def default(self) -> PacketSniffer:
+        return self.sessions[DEFAULT_SESSION]
+
+    def get(self, name: str) -> Optional[PacketSniffer]:
+        return self.sessions.get(name)
+
+    def bufferUsage(self) -> int:
+        """
+        Packets the existing session buffers may hold together.
+        """
+        with self.lock:
+            return sum(sniffer.bufferSize for sniffer in self.sessions.values())
+
+    def create(
+        self,
+        name: str,
+        bufferSize: Optional[int] = None,
+        queueCapacity: Optional[int] = None,
+        workers: Optional[int] = None,
+        maxPacketsPerSecond: Optional[float] = None,
+    ) -> PacketSniffer:
+        """
+        Creates an idle session; unset limits fall back to the global configuration.
+        Raises ValueError for an invalid or taken name, or when a limit cannot be granted.
+        """
+        if not _NAME_PATTERN.match(name) or name in RESERVED_NAMES:
+            raise ValueError(
+                "Session names are 1-32 letters, digits, '-' or '_' and must not be one of: "
+                + ", ".join(sorted(RESERVED_NAMES)) + "."
+            )
+        bufferSize = bufferSize or config.PACKET_BUFFER_SIZE
+        queueLimit = max(config.CAPTURE_QUEUE_CAPACITY, config.INFERENCE_QUEUE_CAPACITY)
+        if queueCapacity is not None and not 1 <= queueCapacity <= queueLimit:
+            raise ValueError(f"queue_capacity must be between 1 and {queueLimit}.")
+        workerLimit = os.cpu_count() or 1
+        if workers is not None and not 1 <= workers <= workerLimit:
+            raise ValueError(f"workers must be between 1 and {workerLimit}.")
+        if maxPacketsPerSecond is not None and maxPacketsPerSecond < 0:
+            raise ValueError("max_pps must be 0 (no limit) or positive.")
+
+        with self.lock:
+            if name in self.sessions:
+                raise ValueError(f"Capture session '{name}' already exists.")
+            if len(self.sessions) >= self.maxSessions:
+                raise ValueError(f"At most {self.maxSessions} capture sessions may exist (SESSION_MAX_COUNT).")
+            available = self.bufferBudget - sum(sniffer.bufferSize for sniffer in self.sessions.values())
+            if not 1 <= bufferSize <= available:
+                raise ValueError(
+                    f"buffer_size must be between 1 and {max(0, available)} packets "
+                    f"(SESSION_BUFFER_BUDGET {self.bufferBudget} minus the existing sessions)."
+                )
+            sniffer = PacketSniffer(name, bufferSize, queueCapacity, workers, maxPacketsPerSecond)
+            self.sessions[name] = sniffer
+            return sniffer
+
+    def remove(self, name: str) -> bool:
+        """
+        Stops and discards a session; returns False when it does not exist.
+        Raises ValueError for the default session, which can only be reset.
+        """
+        if name == DEFAULT_SESSION:
+            raise ValueError("The default session cannot be removed; reset it instead.")
+        with self.lock:
+            sniffer = self.sessions.pop(name, None)
+        if sniffer is None:
+            return False
+        sniffer.close()
+        return True
+
+    def getSummary(self) -> List[Dict]:
+        """
+        Returns the state, capture settings, limits and counters of every session.
+        """
+        with self.lock:
+            sniffers = list(self.sessions.values())
+        summary = []
+        for sniffer in sniffers:
+            stats = sniffer.getPipelineStats()
+            summary.append({
+                "name": sniffer.name,
+                "isCapturing": sniffer.isCapturing,
+                "capture": stats["capture"]["settings"],
+                "limits": stats["limits"],
+                "captured": stats["capture"]["packets"],
+                "rateLimited": stats["capture"]["rateLimit"]["limited"],
+                "stored": stats["store"]["packets"],
+                "latestId": sniffer.getLatestId(),
+                "dropped": stats["totalDropped"],
+            })
+        return summary
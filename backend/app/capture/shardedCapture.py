@@ -0,0 +1,352 @@
+"""
+shardedCapture.py
+------------------
+Multi-process capture mode that scales parsing and classification across cores.
+The capture thread shards raw frames by a symmetric 5-tuple flow hash onto N worker
+processes. Each worker runs parseRawFrame() plus batched classification and sends
+compact results back over a shared-memory ring; a collector thread in the main
+process decodes them and hands them to the store, where global sequential IDs are assigned.
+Model hot swaps are published to the workers through a shared model epoch: a worker
+that sees a new epoch reloads the swapped-in artifact before its next batch.
+"""
+
+import multiprocessing
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from app.capture.rawDecoder import flowHash
+from app.capture.sharedRing import SharedRing
+from app.utils.logger import SystemLogger
+
+# Compact result record: length, sourcePort, destinationPort, tcpFlags, risk code,
+# followed by source, destination, protocol and timestamp joined by a unit separator
+_RESULT_HEADER = struct.Struct("<IHHHB")
+_FIELD_SEPARATOR = b"\x1f"
+RISK_CODES = {"LOW": 0, "MEDIUM": 1, "HIGH": 2}
+RISK_LABELS = {code: label for label, code in RISK_CODES.items()}
+
+# Largest Ethernet frame (with two VLAN tags) copied into an input slot; longer frames
+# (e.g. coalesced by segmentation offload) are truncated, keep their original length and are counted
+FRAME_SLOT_SIZE = 1522
+# Longest textual address (IPv4-mapped IPv6), protocol name kept in a result and "HH:MM:SS" timestamp
+_MAX_ADDRESS_LENGTH = 45
+_MAX_PROTOCOL_LENGTH = 48
+_TIMESTAMP_LENGTH = 8
+# Largest encodeResult() record, so results are never truncated
+RESULT_SLOT_SIZE = (
+    _RESULT_HEADER.size + 2 * _MAX_ADDRESS_LENGTH + _MAX_PROTOCOL_LENGTH + _TIMESTAMP_LENGTH + 3 * len(_FIELD_SEPARATOR)
+)
+# Longest model artifact path that can be published to the workers
+MODEL_PATH_SIZE = 4096
+
+
+def encodeResult(packetData: Dict) -> bytes:
+    """
+    Packs a scored packetData dict into a compact binary record of at most RESULT_SLOT_SIZE bytes.
+    Protocol names longer than _MAX_PROTOCOL_LENGTH (only non-IP Scapy layer names) are shortened.
+    """
+    header = _RESULT_HEADER.pack(
+        packetData["length"],
+        packetData["sourcePort"],
+        packetData["destinationPort"],
+        packetData["tcpFlags"],
+        RISK_CODES.get(packetData.get("risk"), 0),
+    )
+    fields = (packetData["source"], packetData["destination"], packetData["protocol"][:_MAX_PROTOCOL_LENGTH], packetData["timestamp"])
+    return header + _FIELD_SEPARATOR.join(str(field).encode() for field in fields)
+
+
+def decodeResult(record: bytes) -> Dict:
+    """
+    Rebuilds the packetData dict from a compact record (the ID is assigned by the caller).
+    """
+    length, sourcePort, destinationPort, tcpFlags, riskCode = _RESULT_HEADER.unpack_from(record, 0)
+    source, destination, protocol, timestamp = record[_RESULT_HEADER.size:].decode().split("\x1f")
+    return {
+        "id": None,
+        "source": source,
+        "destination": destination,
+        "protocol": protocol,
+        "length": length,
+        "sourcePort": sourcePort,
+        "destinationPort": destinationPort,
+        "tcpFlags": tcpFlags,
+        "timestamp": timestamp,
+        "risk": RISK_LABELS[riskCode],
+    }
+
+
+def _reloadModel(handler, modelEpoch, modelPath, modelArtifactVersion) -> int:
+    """
+    Loads the artifact last published by the main process into the worker's handler.
+    Returns the epoch it belongs to; the current model is kept if the artifact cannot be loaded.
+    """
+    with modelEpoch.get_lock():
+        epoch = modelEpoch.value
+        path = modelPath.value.decode()
+        artifactVersion = modelArtifactVersion.value
+    artifactVersion = artifactVersion if artifactVersion >= 0 else None
+    try:
+        model = handler.readArtifact(path)
+        handler.swapIn(model, handler.compileModel(model, artifactVersion), True, path, artifactVersion)
+    except Exception as e:
+        print(f"[WARNING] Shard worker could not load model {path} ({e}). Keeping the current model.")
+    return epoch
+
+
+def _parseFrames(frames: List[Tuple[bytes, int]]) -> List[Dict]:
+    """
+    Parses (frame, original length) pairs popped from an input ring, without classifying them.
+    """
+    from app.capture.packetParser import parseRawFrame  # pylint: disable=import-outside-toplevel
+    packets = []
+    for frame, originalLength in frames:
+        packetData = parseRawFrame(frame, None, classify=False)
+        if originalLength > len(frame) and packetData["length"]:
+            # Truncated in the input slot: report the captured size
+            packetData["length"] = originalLength
+        packets.append(packetData)
+    return packets
+
+
+def _shardWorker(
+    inputName: str,
+    outputName: str,
+    slotCount: int,
+    batchSize: int,
+    stopEvent,
+    modelEpoch,
+    modelPath,
+    modelArtifactVersion,
+) -> None:
+    """
+    Worker process entry point: parse, classify in batches and publish compact results.
+    """
+    # Imported here so every worker loads its own copy of the model
+    from app.capture.packetParser import getClassifier, getModelHandler
+    from app.ml.featureExtractor import extractFeatures
+
+    classifier = getClassifier()
+    loadedEpoch = 0
+    inputRing = SharedRing.attach(inputName, slotCount, FRAME_SLOT_SIZE)
+    outputRing = SharedRing.attach(outputName, slotCount, RESULT_SLOT_SIZE)
+
+    try:
+        while True:
+            if modelEpoch.value != loadedEpoch:
+                # The verdict cache invalidates itself when the handler's model changes
+                loadedEpoch = _reloadModel(getModelHandler(), modelEpoch, modelPath, modelArtifactVersion)
+            frames = inputRing.popManyWithLength(batchSize)
+            if not frames:
+                if stopEvent.is_set():
+                    break
+                time.sleep(0.001)
+                continue
+
+            packets = _parseFrames(frames)
+            # Packets that already carry a risk (parse errors) skip the model
+            scorable = [packetData for packetData in packets if "risk" not in packetData]
+            labels = classifier.predictBatch([extractFeatures(packetData) for packetData in scorable])
+            for packetData, label in zip(scorable, labels):
+                packetData["risk"] = label
+
+            for packetData in packets:
+                record = encodeResult(packetData)
+                # RESULT_SLOT_SIZE holds the largest record, so a record that does not fit is a bug
+                while not outputRing.push(record, truncate=False) and not stopEvent.is_set():
+                    time.sleep(0.001)
+    finally:
+        inputRing.close()
+        outputRing.close()
+
+
+class ShardedCapture:
+    """
+    Owns the shard worker processes, their shared-memory rings and the result collector.
+    """
+
+    def __init__(
+        self,
+        workerCount: int,
+        onPackets: Callable[[List[Dict]], None],
+        slotCount: int = 8192,
+        batchSize: int = 256,
+        logger: Optional[SystemLogger] = None,
+    ):
+        self.workerCount = max(1, workerCount)
+        # Callback receiving decoded result batches (assigns IDs and stores them)
+        self.onPackets = onPackets
+        self.logger = logger or SystemLogger("sharded_capture")
+        self.slotCount = slotCount
+        self.batchSize = batchSize
+        # "spawn" avoids forking a process that already runs capture threads
+        self.context = multiprocessing.get_context("spawn")
+        self.stopEvent = None
+        self.processes: List[multiprocessing.Process] = []
+        self.inputRings: List[SharedRing] = []
+        self.outputRings: List[SharedRing] = []
+        self.collectorThread: Optional[threading.Thread] = None
+        self.isRunning: bool = False
+        self.framesSubmitted: int = 0
+        self.resultsCollected: int = 0
+        # Results lost because decoding or the callback raised
+        self.resultsFailed: int = 0
+        self.perShardSubmitted: List[int] = []
+        # Model swapped in by the main process (path, artifactVersion); None keeps the workers' default model
+        self.servingArtifact: Optional[Tuple[str, Optional[int]]] = None
+        # Shared with the workers: swap counter, artifact path and registry version (-1 for none).
+        # Allocated on first use, since creating them starts multiprocessing's resource tracker.
+        self.modelEpoch = None
+        self.modelPath = None
+        self.modelArtifactVersion = None
+
+    def _allocateModelState(self) -> None:
+        if self.modelEpoch is None:
+            self.modelEpoch = self.context.Value("q", 0)
+            self.modelPath = self.context.RawArray("c", MODEL_PATH_SIZE)
+            self.modelArtifactVersion = self.context.RawValue("q", -1)
+
+    # -----------------------------------------------------------------------
+    # Internal Collector
+    # -----------------------------------------------------------------------
+
+    def _drainOnce(self) -> int:
+        """
+        Collects pending results from every shard and forwards them as one batch.
+        A batch that fails to decode or store is logged and dropped, so the collector keeps running.
+        """
+        records = []
+        for ring in self.outputRings:
+            records.extend(ring.popMany(self.batchSize))
+        if not records:
+            return 0
+        try:
+            packets = [decodeResult(record) for record in records]
+            self.onPackets(packets)
+            self.resultsCollected += len(packets)
+        except Exception as e:
+            self.resultsFailed += len(records)
+            self.logger.logError(f"Dropped {len(records)} shard results after a collector error: {e!r}")
+        return len(records)
+
+    def _collectLoop(self) -> None:
+        while self.isRunning:
+            if not self._drainOnce():
+                time.sleep(0.001)
+
+    # -----------------------------------------------------------------------
+    # Public Methods
+    # -----------------------------------------------------------------------
+
+    def reloadModel(self, path: str, artifactVersion: Optional[int] = None) -> None:
+        """
+        Publishes a swapped-in model artifact; workers reload it before their next batch
+        (or load it on start if they are not running yet).
+        """
+        encodedPath = path.encode()
+        if len(encodedPath) >= MODEL_PATH_SIZE:
+            raise ValueError(f"Model path is longer than {MODEL_PATH_SIZE - 1} bytes: {path}")
+        self._allocateModelState()
+        with self.modelEpoch.get_lock():
+            self.servingArtifact = (path, artifactVersion)
+            self.modelPath.value = encodedPath
+            self.modelArtifactVersion.value = -1 if artifactVersion is None else artifactVersion
+            self.modelEpoch.value += 1
+
+    def start(self) -> None:
+        """
+        Allocates the rings and launches one worker process per shard.
+        """
+        if self.isRunning:
+            return
+
+        self._allocateModelState()
+        self.stopEvent = self.context.Event()
+        self.inputRings = [SharedRing.create(self.slotCount, FRAME_SLOT_SIZE) for _ in range(self.workerCount)]
+        self.outputRings = [SharedRing.create(self.slotCount, RESULT_SLOT_SIZE) for _ in range(self.workerCount)]
+        self.processes = [
+            self.context.Process(
+                target=_shardWorker,
+                args=(
+                    inputRing.name,
+                    outputRing.name,
+                    self.slotCount,
+                    self.batchSize,
+                    self.stopEvent,
+                    self.modelEpoch,
+                    self.modelPath,
+                    self.modelArtifactVersion,
+                ),
+                name=f"capture-shard-{index}",
+                daemon=True,
+            )
+            for index, (inputRing, outputRing) in enumerate(zip(self.inputRings, self.outputRings))
+        ]
+        for process in self.processes:
+            process.start()
+
+        self.framesSubmitted = 0
+        self.resultsCollected = 0
+        self.resultsFailed = 0
+        self.perShardSubmitted = [0] * self.workerCount
+        self.isRunning = True
+        self.collectorThread = threading.Thread(target=self._collectLoop, daemon=True)
+        self.collectorThread.start()
+
+    def submit(self, frame: bytes) -> bool:
+        """
+        Routes a raw frame to its shard. Returns False if the shard's ring was full.
+        """
+        shard = flowHash(frame) % self.workerCount
+        self.framesSubmitted += 1
+        self.perShardSubmitted[shard] += 1
+        return self.inputRings[shard].push(frame)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Lets workers finish their queued frames, collects the remaining results and frees the rings.
+        """
+        if not self.isRunning:
+            return
+
+        self.stopEvent.set()
+        for process in self.processes:
+            process.join(timeout=timeout)
+            if process.is_alive():
+                process.terminate()
+
+        self.isRunning = False
+        if self.collectorThread:
+            self.collectorThread.join(timeout=timeout)
+        while self._drainOnce():
+            pass
+
+        for ring in self.inputRings + self.outputRings:
+            ring.close()
+        self.inputRings, self.outputRings, self.processes = [], [], []
+
+    def getStats(self) -> Dict:
+        """
+        Returns per-shard backlog, drop and truncation counters.
+        """
+        shards = []
+        for index, (inputRing, outputRing) in enumerate(zip(self.inputRings, self.outputRings)):
+            shards.append({
+                "shard": index,
+                "submitted": self.perShardSubmitted[index],
+                "inputDepth": inputRing.depth(),
+                "inputDropped": inputRing.dropped(),
+                "inputTruncated": inputRing.truncated(),
+                "outputDepth": outputRing.depth(),
+            })
+        return {
+            "workers": self.workerCount,
+            "running": self.isRunning,
+            "submitted": self.framesSubmitted,
+            "collected": self.resultsCollected,
+            "failed": self.resultsFailed,
+            "servingModel": self.servingArtifact[0] if self.servingArtifact else None,
+            "modelEpoch": self.modelEpoch.value if self.modelEpoch is not None else 0,
+            "shards": shards,
+        }
@@ -0,0 +1,132 @@
+"""
+sharedRing.py
+--------------
+Single-producer / single-consumer ring buffer over multiprocessing shared memory.
+Used to exchange raw frames and compact parse results between the capture process
+and its shard workers without pickling every packet through a pipe.
+
+Layout:  [head u64][tail u64][dropped u64][truncated u64]
+         then slotCount x ([stored length u32][original length u32][payload slotSize])
+The consumer only writes 'head', the producer only writes 'tail', 'dropped' and 'truncated'.
+"""
+
+import struct
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+_HEADER = struct.Struct("<QQQQ")
+# Stored and original payload length of a slot
+_SLOT_HEADER = struct.Struct("<II")
+
+
+class SharedRing:
+    """
+    Fixed-slot SPSC ring. Payloads longer than the slot size are truncated (and counted)
+    unless the producer asks for an error instead; each slot keeps the original length.
+    """
+
+    def __init__(self, memory: shared_memory.SharedMemory, slotCount: int, slotSize: int, owner: bool):
+        self.memory = memory
+        self.buffer = memory.buf
+        self.slotCount = slotCount
+        self.slotSize = slotSize
+        self.stride = _SLOT_HEADER.size + slotSize
+        # Only the creating side unlinks the segment
+        self.owner = owner
+
+    @classmethod
+    def create(cls, slotCount: int, slotSize: int) -> "SharedRing":
+        """
+        Allocates a new zeroed ring in shared memory.
+        """
+        size = _HEADER.size + slotCount * (_SLOT_HEADER.size + slotSize)
+        memory = shared_memory.SharedMemory(create=True, size=size)
+        _HEADER.pack_into(memory.buf, 0, 0, 0, 0, 0)
+        return cls(memory, slotCount, slotSize, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, slotCount: int, slotSize: int) -> "SharedRing":
+        """
+        Opens an existing ring created by another process.
+        """
+        return cls(shared_memory.SharedMemory(name=name), slotCount, slotSize, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    # -----------------------------------------------------------------------
+    # Producer / Consumer API
+    # -----------------------------------------------------------------------
+
+    def push(self, payload: bytes, truncate: bool = True) -> bool:
+        """
+        Appends one payload. Returns False (and counts a drop) when the ring is full.
+        A payload longer than the slot size is truncated and counted, or raises ValueError with truncate=False.
+        """
+        originalSize = len(payload)
+        if originalSize > self.slotSize and not truncate:
+            raise ValueError(f"Payload of {originalSize} bytes does not fit a {self.slotSize}-byte ring slot.")
+        head, tail, dropped, truncated = _HEADER.unpack_from(self.buffer, 0)
+        if tail - head >= self.slotCount:
+            struct.pack_into("<Q", self.buffer, 16, dropped + 1)
+            return False
+
+        size = min(originalSize, self.slotSize)
+        offset = _HEADER.size + (tail % self.slotCount) * self.stride
+        _SLOT_HEADER.pack_into(self.buffer, offset, size, originalSize)
+        self.buffer[offset + _SLOT_HEADER.size:offset + _SLOT_HEADER.size + size] = payload[:size]
+        if size < originalSize:
+            struct.pack_into("<Q", self.buffer, 24, truncated + 1)
+        # Publish the slot only after its payload is written
+        struct.pack_into("<Q", self.buffer, 8, tail + 1)
+        return True
+
+    def popManyWithLength(self, maxItems: int) -> List[Tuple[bytes, int]]:
+        """
+        Removes and returns up to maxItems (payload, original length) pairs in FIFO order.
+        The original length exceeds len(payload) for truncated payloads.
+        """
+        head, tail, _, _ = _HEADER.unpack_from(self.buffer, 0)
+        count = min(tail - head, maxItems)
+        items = []
+        for position in range(head, head + count):
+            offset = _HEADER.size + (position % self.slotCount) * self.stride
+            size, originalSize = _SLOT_HEADER.unpack_from(self.buffer, offset)
+            start = offset + _SLOT_HEADER.size
+            items.append((bytes(self.buffer[start:start + size]), originalSize))
+        if count:
+            struct.pack_into("<Q", self.buffer, 0, head + count)
+        return items
+
+    def popMany(self, maxItems: int) -> List[bytes]:
+        """
+        Removes and returns up to maxItems payloads in FIFO order.
+        """
+        return [payload for payload, _ in self.popManyWithLength(maxItems)]
+
+    def pop(self) -> Optional[bytes]:
+        items = self.popMany(1)
+        return items[0] if items else None
+
+    def depth(self) -> int:
+        head, tail, _, _ = _HEADER.unpack_from(self.buffer, 0)
+        return tail - head
+
+    def dropped(self) -> int:
+        return _HEADER.unpack_from(self.buffer, 0)[2]
+
+    def truncated(self) -> int:
+        return _HEADER.unpack_from(self.buffer, 0)[3]
+
+    def close(self) -> None:
+        """
+        Detaches from the segment and removes it if this side created it.
+        """
+        self.buffer = None
+        self.memory.close()
+        if self.owner:
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,276 @@
+"""
+config.py
+----------
+Central runtime configuration for the UDON IDS backend.
+Every value can be overridden through an environment variable of the same name.
+"""
+
+import os
+
+# -----------------------------------------------------------------------
+# Risk Inference
+# -----------------------------------------------------------------------
+
+# Maximum number of packets scored by a single model.predict() call
+INFERENCE_BATCH_SIZE: int = int(os.getenv("INFERENCE_BATCH_SIZE", "256"))
+# Longest time (milliseconds) a packet may wait for its batch to fill up
+INFERENCE_MAX_LATENCY_MS: float = float(os.getenv("INFERENCE_MAX_LATENCY_MS", "50"))
+# Scoring backend: "sklearn" (model.predict) or "compiled" (flattened NumPy forest)
+INFERENCE_BACKEND: str = os.getenv("INFERENCE_BACKEND", "compiled")
+# Directory of versioned model artifacts written by trainRiskModel.py
+MODEL_REGISTRY_DIR: str = os.getenv("MODEL_REGISTRY_DIR", "models")
+# Registry version to serve: a version number, "latest" or "best" (highest test accuracy)
+MODEL_VERSION: str = os.getenv("MODEL_VERSION", "latest")
+# Unversioned model loaded when the registry is empty
+MODEL_PATH: str = os.getenv("MODEL_PATH", "risk_model.pkl")
+# numpy.memmap mode for the compiled forest cached next to registry artifacts ("r", "c"; empty disables the cache)
+MODEL_MMAP_MODE: str = os.getenv("MODEL_MMAP_MODE", "r")
+
+# -----------------------------------------------------------------------
+# Model Hot Swap
+# -----------------------------------------------------------------------
+
+# Seconds between checks for a new model artifact (0 disables file watching)
+MODEL_WATCH_INTERVAL: float = float(os.getenv("MODEL_WATCH_INTERVAL", "0"))
+# What the watcher does with a new artifact: "swap" (serve it) or "shadow" (score alongside the serving model)
+MODEL_WATCH_MODE: str = os.getenv("MODEL_WATCH_MODE", "swap")
+# Processed training file used for validation when an artifact has no stored held-out sample
+MODEL_VALIDATION_SAMPLE: str = os.getenv("MODEL_VALIDATION_SAMPLE", "")
+# Maximum held-out rows scored while validating a new model
+MODEL_VALIDATION_ROWS: int = int(os.getenv("MODEL_VALIDATION_ROWS", "10000"))
+# A new model is rejected below this held-out accuracy
+MODEL_MIN_ACCURACY: float = float(os.getenv("MODEL_MIN_ACCURACY", "0.5"))
+# Scored batches queued for the shadow model; older batches are dropped beyond it
+MODEL_SHADOW_QUEUE_CAPACITY: int = int(os.getenv("MODEL_SHADOW_QUEUE_CAPACITY", "64"))
+
+# -----------------------------------------------------------------------
+# Verdict Cache
+# -----------------------------------------------------------------------
+
+# Maximum cached feature-vector verdicts (0 disables the cache)
+VERDICT_CACHE_SIZE: int = int(os.getenv("VERDICT_CACHE_SIZE", "65536"))
+# Seconds a cached verdict stays valid (0 = until evicted or the model changes)
+VERDICT_CACHE_TTL: float = float(os.getenv("VERDICT_CACHE_TTL", "0"))
+# Optional bucket widths per feature, e.g. "length:16,packet_mean:4,packet_std:4"
+VERDICT_CACHE_QUANTIZATION: dict = {
+    name.strip(): float(width)
+    for name, width in (
+        item.split(":") for item in os.getenv("VERDICT_CACHE_QUANTIZATION", "").split(",") if ":" in item
+    )
+}
+
+# -----------------------------------------------------------------------
+# Capture Pipeline
+# -----------------------------------------------------------------------
+
+# Raw packets buffered between the capture thread and the parse workers
+CAPTURE_QUEUE_CAPACITY: int = int(os.getenv("CAPTURE_QUEUE_CAPACITY", "50000"))
+# Parsed packets buffered in front of the inference stage
+INFERENCE_QUEUE_CAPACITY: int = int(os.getenv("INFERENCE_QUEUE_CAPACITY", "50000"))
+# Behaviour of a full pipeline queue: "drop-oldest", "drop-newest" or "block"
+QUEUE_FULL_POLICY: str = os.getenv("QUEUE_FULL_POLICY", "drop-oldest")
+# Packet decoder: "scapy" (full dissection) or "raw" (struct fast path with Scapy fallback)
+DECODER_MODE: str = os.getenv("DECODER_MODE", "scapy")
+# Number of parse/feature worker threads
+PARSE_WORKERS: int = int(os.getenv("PARSE_WORKERS", "1"))
+# "thread" (single-process pipeline) or "process" (flow-hash sharded worker processes)
+CAPTURE_MODE: str = os.getenv("CAPTURE_MODE", "thread")
+# Number of worker processes used when CAPTURE_MODE=process
+SHARD_WORKERS: int = int(os.getenv("SHARD_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Number of scored packets kept in memory for the API
+PACKET_BUFFER_SIZE: int = int(os.getenv("PACKET_BUFFER_SIZE", "10000"))
+# Packet store layout: "columnar" (NumPy columns, interned strings) or "ring" (ring of dicts)
+PACKET_STORE: str = os.getenv("PACKET_STORE", "columnar")
+
+# -----------------------------------------------------------------------
+# Capture Profile (defaults for POST /start)
+# -----------------------------------------------------------------------
+
+# Interface to capture on (empty: Scapy's default interface)
+CAPTURE_INTERFACE: str = os.getenv("CAPTURE_INTERFACE", "")
+# Named BPF preset from capture/captureFilter.py: "all", "ip", "transport", "unicast", "web" or "dns"
+CAPTURE_PROFILE: str = os.getenv("CAPTURE_PROFILE", "all")
+# Custom BPF expression, combined with the profile using 'and'
+CAPTURE_FILTER: str = os.getenv("CAPTURE_FILTER", "")
+# Exclude the backend's own TCP ports from capture (requires libpcap/Npcap or tcpdump)
+CAPTURE_EXCLUDE_SELF: bool = os.getenv("CAPTURE_EXCLUDE_SELF", "1") != "0"
+CAPTURE_SELF_PORTS: list = [int(port) for port in os.getenv("CAPTURE_SELF_PORTS", "8000").split(",") if port.strip()]
+# Keep 1 in N flows (deterministic flow hash); 1 keeps everything
+CAPTURE_SAMPLE_RATE: int = int(os.getenv("CAPTURE_SAMPLE_RATE", "1"))
+# Changing the seed selects a different set of sampled flows
+CAPTURE_SAMPLE_SEED: int = int(os.getenv("CAPTURE_SAMPLE_SEED", "0"))
+
+# -----------------------------------------------------------------------
+# Capture Sessions (/api/packets/sessions, /api/packets/{session}/...)
+# -----------------------------------------------------------------------
+
+# Maximum concurrent capture sessions, including the default one
+SESSION_MAX_COUNT: int = int(os.getenv("SESSION_MAX_COUNT", "4"))
+# Packets all session buffers may hold together; each session's buffer size counts against it
+SESSION_BUFFER_BUDGET: int = int(os.getenv("SESSION_BUFFER_BUDGET", str(4 * PACKET_BUFFER_SIZE)))
+# Packets per second a session admits unless created with its own limit (0: no limit)
+SESSION_MAX_PPS: float = float(os.getenv("SESSION_MAX_PPS", "0"))
+
+# -----------------------------------------------------------------------
+# Dashboard Statistics (GET /api/packets/stats)
+# -----------------------------------------------------------------------
+
+# Width of one tumbling bucket
+STATS_BUCKET_SECONDS: float = float(os.getenv("STATS_BUCKET_SECONDS", "1"))
+# Sliding windows reported by default; the longest one sets how many buckets are kept
+STATS_WINDOWS: list = [int(window) for window in os.getenv("STATS_WINDOWS", "10,60,300").split(",") if window.strip()]
+# Keys monitored per Space-Saving top-talker sketch
+STATS_TOP_CAPACITY: int = int(os.getenv("STATS_TOP_CAPACITY", "64"))
+# HyperLogLog registers = 2^precision (10: about 3% error, 1 KB per sketch)
+STATS_HLL_PRECISION: int = int(os.getenv("STATS_HLL_PRECISION", "10"))
+
+# -----------------------------------------------------------------------
+# Streaming Scan / Flood Detectors
+# -----------------------------------------------------------------------
+
+# Run the detector stage in front of the store (0 disables it)
+DETECTOR_ENABLED: bool = os.getenv("DETECTOR_ENABLED", "1") != "0"
+# Tumbling window the thresholds apply to
+DETECTOR_WINDOW_SECONDS: float = float(os.getenv("DETECTOR_WINDOW_SECONDS", "10"))
+# Distinct destination ports / hosts per source and window that count as a scan
+DETECTOR_PORTSCAN_PORTS: int = int(os.getenv("DETECTOR_PORTSCAN_PORTS", "100"))
+DETECTOR_HOSTSCAN_HOSTS: int = int(os.getenv("DETECTOR_HOSTSCAN_HOSTS", "64"))
+# SYN packets per source and packets per destination per window that count as a flood,
+# provided they also exceed DETECTOR_BASELINE_FACTOR times the EWMA of earlier windows
+DETECTOR_SYN_PACKETS: int = int(os.getenv("DETECTOR_SYN_PACKETS", "1000"))
+DETECTOR_FLOOD_PACKETS: int = int(os.getenv("DETECTOR_FLOOD_PACKETS", "20000"))
+DETECTOR_BASELINE_FACTOR: float = float(os.getenv("DETECTOR_BASELINE_FACTOR", "5"))
+DETECTOR_EWMA_ALPHA: float = float(os.getenv("DETECTOR_EWMA_ALPHA", "0.2"))
+# Count-Min sketch size (width x depth counters) and virtual HyperLogLog pool / per-source registers
+DETECTOR_SKETCH_WIDTH: int = int(os.getenv("DETECTOR_SKETCH_WIDTH", "65536"))
+DETECTOR_SKETCH_DEPTH: int = int(os.getenv("DETECTOR_SKETCH_DEPTH", "4"))
+DETECTOR_HLL_POOL: int = int(os.getenv("DETECTOR_HLL_POOL", "1048576"))
+DETECTOR_HLL_REGISTERS: int = int(os.getenv("DETECTOR_HLL_REGISTERS", "128"))
+# Flagged addresses kept (oldest forgotten first) and how many windows a flag lasts without new evidence
+DETECTOR_MAX_FLAGGED: int = int(os.getenv("DETECTOR_MAX_FLAGGED", "10000"))
+DETECTOR_FLAG_WINDOWS: int = int(os.getenv("DETECTOR_FLAG_WINDOWS", "3"))
+# Recent alerts served by GET /api/packets/alerts
+DETECTOR_MAX_ALERTS: int = int(os.getenv("DETECTOR_MAX_ALERTS", "1000"))
+# Risk given to packets from flagged sources or to flagged flood targets
+DETECTOR_RISK: str = os.getenv("DETECTOR_RISK", "HIGH")
+
+# -----------------------------------------------------------------------
+# IP Enrichment (reputation lists, GeoIP / ASN)
+# -----------------------------------------------------------------------
+
+# Directory of CIDR reputation lists (.txt, .netset, .ipset, .csv, .list; one label per file); empty disables them
+ENRICH_REPUTATION_DIR: str = os.getenv("ENRICH_REPUTATION_DIR", "")
+# Comma-separated MaxMind DB files (e.g. GeoLite2-Country.mmdb,GeoLite2-ASN.mmdb); empty disables GeoIP/ASN
+ENRICH_MMDB_FILES: list = [path.strip() for path in os.getenv("ENRICH_MMDB_FILES", "").split(",") if path.strip()]
+# Directory the compiled reputation index is cached in
+ENRICH_INDEX_DIR: str = os.getenv("ENRICH_INDEX_DIR", "data/enrichment")
+# How the cached index is opened: "r" (memory-mapped, shared between processes) or "" (read into memory)
+ENRICH_MMAP_MODE: str = os.getenv("ENRICH_MMAP_MODE", "r")
+# Addresses kept in the LRU cache of resolved enrichments (0 disables the cache)
+ENRICH_CACHE_SIZE: int = int(os.getenv("ENRICH_CACHE_SIZE", "65536"))
+# Append src_listed / dst_listed / cross_border to the model features (only for models trained with them)
+ENRICH_MODEL_FEATURES: bool = os.getenv("ENRICH_MODEL_FEATURES", "0") == "1"
+
+# -----------------------------------------------------------------------
+# Flow Table
+# -----------------------------------------------------------------------
+
+# Seconds without packets after which a flow is considered finished
+FLOW_IDLE_TIMEOUT: float = float(os.getenv("FLOW_IDLE_TIMEOUT", "120"))
+# Maximum lifetime (seconds) of a flow before its statistics restart
+FLOW_ACTIVE_TIMEOUT: float = float(os.getenv("FLOW_ACTIVE_TIMEOUT", "1800"))
+# Hard cap on concurrently tracked flows; the least recently active flow is evicted beyond it
+FLOW_TABLE_MAX_FLOWS: int = int(os.getenv("FLOW_TABLE_MAX_FLOWS", "1000000"))
+
+# -----------------------------------------------------------------------
+# Packet Streaming (SSE / WebSocket)
+# -----------------------------------------------------------------------
+
+# Maximum frames pushed to one client per second
+STREAM_MAX_FPS: float = float(os.getenv("STREAM_MAX_FPS", "4"))
+# Maximum packets coalesced into one frame
+STREAM_MAX_BATCH: int = int(os.getenv("STREAM_MAX_BATCH", "500"))
+# Packets a client may lag behind before the slow-consumer policy applies
+STREAM_MAX_BACKLOG: int = int(os.getenv("STREAM_MAX_BACKLOG", "5000"))
+# Slow-consumer policy: "skip" (jump to the newest packets) or "disconnect"
+STREAM_SLOW_CONSUMER_POLICY: str = os.getenv("STREAM_SLOW_CONSUMER_POLICY", "skip")
+# Seconds a WebSocket send may take before the client is dropped
+STREAM_SEND_TIMEOUT: float = float(os.getenv("STREAM_SEND_TIMEOUT", "5"))
+# Maximum concurrently connected stream clients
+STREAM_MAX_CLIENTS: int = int(os.getenv("STREAM_MAX_CLIENTS", "64"))
+
+# -----------------------------------------------------------------------
+# Packet API Wire Format (format / layout query parameters, Accept-Encoding)
+# -----------------------------------------------------------------------
+
+# Packet list bodies smaller than this (bytes) are sent uncompressed
+WIRE_COMPRESS_MIN_BYTES: int = int(os.getenv("WIRE_COMPRESS_MIN_BYTES", "1024"))
+# gzip (1-9) and zstd (1-22) compression levels; low levels favour CPU over ratio
+WIRE_GZIP_LEVEL: int = int(os.getenv("WIRE_GZIP_LEVEL", "5"))
+WIRE_ZSTD_LEVEL: int = int(os.getenv("WIRE_ZSTD_LEVEL", "3"))
+
+# -----------------------------------------------------------------------
+# Offline pcap Replay
+# -----------------------------------------------------------------------
+
+# Frames read from the memory-mapped capture file per chunk
+REPLAY_CHUNK_SIZE: int = int(os.getenv("REPLAY_CHUNK_SIZE", "4096"))
+# Directory the replay API may read capture files from
+REPLAY_INPUT_DIR: str = os.getenv("REPLAY_INPUT_DIR", "pcaps")
+# Directory the replay API writes results files to
+REPLAY_OUTPUT_DIR: str = os.getenv("REPLAY_OUTPUT_DIR", "replays")
+
+# -----------------------------------------------------------------------
+# Durable Capture Log
+# -----------------------------------------------------------------------
+
+# Directory of the append-only packet segment log (e.g. "data/capture"); empty (the default) disables the log
+CAPTURE_LOG_DIR: str = os.getenv("CAPTURE_LOG_DIR", "")
+# A segment is sealed and a new one started beyond this size (MB) ...
+CAPTURE_LOG_SEGMENT_MB: float = float(os.getenv("CAPTURE_LOG_SEGMENT_MB", "64"))
+# ... or this age (seconds; 0 disables age-based rotation)
+CAPTURE_LOG_SEGMENT_SECONDS: float = float(os.getenv("CAPTURE_LOG_SEGMENT_SECONDS", "3600"))
+# Oldest segments are deleted once the log exceeds this size (MB; 0 = unlimited) ...
+CAPTURE_LOG_RETENTION_MB: float = float(os.getenv("CAPTURE_LOG_RETENTION_MB", "1024"))
+# ... or once their newest packet is older than this (seconds; 0 = unlimited)
+CAPTURE_LOG_RETENTION_SECONDS: float = float(os.getenv("CAPTURE_LOG_RETENTION_SECONDS", "0"))
+# Longest time (seconds) appended packets may sit in the write buffer
+CAPTURE_LOG_FLUSH_INTERVAL: float = float(os.getenv("CAPTURE_LOG_FLUSH_INTERVAL", "1"))
+
+# -----------------------------------------------------------------------
+# Metrics
+# -----------------------------------------------------------------------
+
+# Per-packet stage timings are recorded for 1 in N calls (1 times every call, 0 disables timing)
+METRICS_SAMPLE_EVERY: int = int(os.getenv("METRICS_SAMPLE_EVERY", "32"))
+# Require the X-API-Key header (or 'api_key' query parameter) on /metrics
+METRICS_REQUIRE_API_KEY: bool = os.getenv("METRICS_REQUIRE_API_KEY", "1") != "0"
+# Time every module import until startup completes, for GET /api/packets/debug/startup (1 enables it)
+STARTUP_PROFILE: bool = os.getenv("STARTUP_PROFILE", "0") == "1"
+
+# -----------------------------------------------------------------------
+# Logging
+# -----------------------------------------------------------------------
+
+# Minimum level written by SystemLogger
+LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+# Also echo log records to the console ("0" writes to the log file only)
+LOG_TO_CONSOLE: bool = os.getenv("LOG_TO_CONSOLE", "1") != "0"
+# Records buffered for the background writer; further records are dropped and counted
+LOG_QUEUE_CAPACITY: int = int(os.getenv("LOG_QUEUE_CAPACITY", "10000"))
+# Fraction of records kept per level, e.g. "DEBUG:0.01,INFO:0.5" (unlisted levels keep everything)
+LOG_SAMPLE_RATES: dict = {
+    level.strip().upper(): float(rate)
+    for level, rate in (
+        item.split(":") for item in os.getenv("LOG_SAMPLE_RATES", "").split(",") if ":" in item
+    )
+}
+# Maximum records per second per level, e.g. "INFO:100,WARNING:20" (unlisted levels are unlimited)
+LOG_RATE_LIMITS: dict = {
+    level.strip().upper(): float(limit)
+    for level, limit in (
+        item.split(":") for item in os.getenv("LOG_RATE_LIMITS", "DEBUG:100,INFO:200,WARNING:50").split(",") if ":" in item
+    )
+}
+# Seconds between the aggregated "Captured N packets" summary lines
+LOG_SUMMARY_INTERVAL: float = float(os.getenv("LOG_SUMMARY_INTERVAL", "5"))
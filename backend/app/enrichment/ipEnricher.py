@@ -0,0 +1,250 @@
+"""
+ipEnricher.py
+--------------
+Batch enrichment of packet addresses with network context from offline datasets:
+reputation list membership (prefixIndex.py) and country / autonomous system from
+MaxMind DB files (mmdbReader.py).
+
+A batch is enriched once per distinct address. Hot addresses are served from an LRU
+cache; the misses of a batch are resolved together (one vectorized reputation lookup
+for all IPv4 misses, one tree walk per database and address). Every packet gains:
+
+    sourceCountry, destinationCountry        ISO 3166 country code or None
+    sourceAsn, destinationAsn                autonomous system number or None
+    sourceAsOrg, destinationAsOrg            autonomous system organization or None
+    sourceReputation, destinationReputation  names of the lists containing the address
+
+With ENRICH_MODEL_FEATURES=1, the ENRICHMENT_FEATURES flags are also appended to the
+model features (only for models trained with these extra columns).
+"""
+
+import os
+import socket
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.enrichment.mmdbReader import MmdbReader
+from app.enrichment.prefixIndex import PrefixIndex
+from app.utils.logger import SystemLogger
+from app.utils import metrics
+from app import config
+
+# Per-side enrichment fields, stored as one (country, asn, asOrg, reputation) tuple per address
+ENRICHMENT_FIELDS = ("Country", "Asn", "AsOrg", "Reputation")
+ENRICHED_FIELDS = tuple(f"{side}{field}" for side in ("source", "destination") for field in ENRICHMENT_FIELDS)
+# Extra model feature columns, appended after FEATURE_COLUMNS
+ENRICHMENT_FEATURES = ("src_listed", "dst_listed", "cross_border")
+# Context of addresses that are not IPs or appear in no dataset
+EMPTY_INFO: Tuple = (None, None, None, ())
+
+_enricher = None
+_enricherLoaded = False
+_enricherLock = threading.Lock()
+
+metrics.registry.describe("udon_enrich_lookups_total", "counter", "Address lookups of the enrichment stage by cache result")
+metrics.registry.describe("udon_enrich_cache_entries", "gauge", "Addresses held in the enrichment LRU cache")
+
+
+def parseAddress(address: str) -> Tuple[Optional[int], int]:
+    """
+    Returns an address as (integer, IP version), or (None, 0) for anything that is not an IP.
+    """
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, address), "big"), 4
+    except (OSError, TypeError):
+        pass
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET6, address), "big"), 6
+    except (OSError, TypeError):
+        return None, 0
+
+
+def _networkFields(record) -> Tuple[Optional[str], Optional[int], Optional[str]]:
+    """
+    Extracts (country, asn, asOrg) from a GeoIP2/GeoLite2 Country, City or ASN record.
+    """
+    if not isinstance(record, dict):
+        return None, None, None
+    country = record.get("country") or record.get("registered_country") or {}
+    return (
+        country.get("iso_code") if isinstance(country, dict) else None,
+        record.get("autonomous_system_number"),
+        record.get("autonomous_system_organization"),
+    )
+
+
+class IpEnricher:
+    """
+    Resolves addresses against a reputation index and MaxMind databases, with an LRU cache of hot addresses.
+    """
+
+    def __init__(self, reputation: Optional[PrefixIndex] = None, readers: Optional[List[MmdbReader]] = None, cacheSize: int = 65536):
+        self.reputation = reputation
+        self.readers = readers or []
+        self.cacheSize = max(0, cacheSize)
+        # address -> (country, asn, asOrg, reputation)
+        self.cache: "OrderedDict[str, Tuple]" = OrderedDict()
+        # reader index -> {record offset: (country, asn, asOrg)}
+        self.networkFields: List[Dict[int, Tuple]] = [{} for _ in self.readers]
+        self.lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def _resolve(self, addresses: List[str]) -> Dict[str, Tuple]:
+        """
+        Looks up cache misses in every dataset.
+        """
+        parsed = [parseAddress(address) for address in addresses]
+        masks = [0] * len(addresses)
+        if self.reputation is not None:
+            ipv4 = [position for position, (_, version) in enumerate(parsed) if version == 4]
+            if ipv4:
+                values = np.fromiter((parsed[position][0] for position in ipv4), dtype=np.uint32, count=len(ipv4))
+                for position, mask in zip(ipv4, self.reputation.lookupIPv4(values).tolist()):
+                    masks[position] = mask
+            for position, (value, version) in enumerate(parsed):
+                if version == 6:
+                    masks[position] = self.reputation.lookupIPv6(value)
+
+        resolved = {}
+        for address, (value, version), mask in zip(addresses, parsed, masks):
+            if value is None:
+                resolved[address] = EMPTY_INFO
+                continue
+            country = asn = asOrg = None
+            for reader, fieldCache in zip(self.readers, self.networkFields):
+                offset = reader.findRecord(value, version)
+                if offset < 0:
+                    continue
+                fields = fieldCache.get(offset)
+                if fields is None:
+                    fields = fieldCache[offset] = _networkFields(reader.record(offset))
+                country = country or fields[0]
+                asn = asn or fields[1]
+                asOrg = asOrg or fields[2]
+            labels = self.reputation.labelsFor(mask) if mask else ()
+            resolved[address] = (country, asn, asOrg, labels)
+        return resolved
+
+    def enrichBatch(self, packets: List[Dict]) -> None:
+        """
+        Adds the enrichment fields to every packet of a batch in place.
+        """
+        infos: Dict[str, Optional[Tuple]] = {}
+        for packetData in packets:
+            infos[packetData.get("source")] = None
+            infos[packetData.get("destination")] = None
+
+        misses = []
+        with self.lock:
+            cache = self.cache
+            for address in infos:
+                info = cache.get(address)
+                if info is None:
+                    misses.append(address)
+                else:
+                    cache.move_to_end(address)
+                    infos[address] = info
+            self.hits += len(infos) - len(misses)
+            self.misses += len(misses)
+
+        if misses:
+            # Datasets are read-only, so misses are resolved without holding the cache lock
+            resolved = self._resolve(misses)
+            infos.update(resolved)
+            if self.cacheSize:
+                with self.lock:
+                    self.cache.update(resolved)
+                    while len(self.cache) > self.cacheSize:
+                        self.cache.popitem(last=False)
+
+        for packetData in packets:
+            (packetData["sourceCountry"], packetData["sourceAsn"],
+             packetData["sourceAsOrg"], packetData["sourceReputation"]) = infos[packetData.get("source")]
+            (packetData["destinationCountry"], packetData["destinationAsn"],
+             packetData["destinationAsOrg"], packetData["destinationReputation"]) = infos[packetData.get("destination")]
+
+    @staticmethod
+    def extendFeatures(packets: List[Dict], featureRows: List[Optional[Dict]]) -> None:
+        """
+        Appends the ENRICHMENT_FEATURES columns to the feature rows of enriched packets.
+        """
+        for packetData, features in zip(packets, featureRows):
+            if features is None:
+                continue
+            sourceCountry = packetData["sourceCountry"]
+            destinationCountry = packetData["destinationCountry"]
+            features["src_listed"] = 1.0 if packetData["sourceReputation"] else 0.0
+            features["dst_listed"] = 1.0 if packetData["destinationReputation"] else 0.0
+            features["cross_border"] = 1.0 if sourceCountry and destinationCountry and sourceCountry != destinationCountry else 0.0
+
+    def clearCache(self) -> None:
+        with self.lock:
+            self.cache.clear()
+
+    def getStats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "cacheSize": len(self.cache),
+                "cacheCapacity": self.cacheSize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+                "reputation": self.reputation.getStats() if self.reputation is not None else None,
+                "databases": [reader.getStats() for reader in self.readers],
+                "modelFeatures": list(ENRICHMENT_FEATURES) if config.ENRICH_MODEL_FEATURES else [],
+            }
+
+    def _collectMetrics(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self.lock:
+            return [
+                ("udon_enrich_lookups_total", {"result": "hit"}, self.hits),
+                ("udon_enrich_lookups_total", {"result": "miss"}, self.misses),
+                ("udon_enrich_cache_entries", {}, len(self.cache)),
+            ]
+
+
+def loadEnricher(logger: Optional[SystemLogger] = None) -> Optional[IpEnricher]:
+    """
+    Opens the datasets configured by ENRICH_REPUTATION_DIR and ENRICH_MMDB_FILES.
+    A dataset that cannot be read is skipped with an error; returns None when none is usable.
+    """
+    logger = logger or SystemLogger("ip_enricher")
+    reputation = None
+    if config.ENRICH_REPUTATION_DIR:
+        try:
+            reputation = PrefixIndex.open(config.ENRICH_REPUTATION_DIR, config.ENRICH_INDEX_DIR, config.ENRICH_MMAP_MODE)
+            logger.logInfo(
+                f"Reputation index: {len(reputation.labels)} lists, {reputation.entries} entries, "
+                f"{len(reputation.starts)} IPv4 ranges ({reputation.invalid} invalid lines skipped)."
+            )
+        except (OSError, ValueError) as e:
+            logger.logError(f"Could not load reputation lists from {config.ENRICH_REPUTATION_DIR}: {str(e)}")
+    readers = []
+    for path in config.ENRICH_MMDB_FILES:
+        try:
+            readers.append(MmdbReader(path))
+            logger.logInfo(f"GeoIP/ASN database {os.path.basename(path)}: {readers[-1].metadata.get('database_type')}.")
+        except (OSError, ValueError, KeyError) as e:
+            logger.logError(f"Could not open MaxMind DB {path}: {str(e)}")
+    if reputation is None and not readers:
+        return None
+    return IpEnricher(reputation, readers, config.ENRICH_CACHE_SIZE)
+
+
+def getEnricher() -> Optional[IpEnricher]:
+    """
+    Returns the process-wide enricher, loading the datasets on first use (None when none are configured).
+    Shared by all capture sessions and replays, so hot addresses are cached once.
+    """
+    global _enricher, _enricherLoaded
+    if not _enricherLoaded:
+        with _enricherLock:
+            if not _enricherLoaded:
+                _enricher = loadEnricher()
+                if _enricher is not None:
+                    metrics.registry.addCollector(_enricher._collectMetrics)
+                _enricherLoaded = True
+    return _enricher
@@ -0,0 +1,191 @@
+"""
+mmdbReader.py
+--------------
+Minimal reader for MaxMind DB files (GeoLite2/GeoIP2 Country, City and ASN, or any
+other database in the MMDB format), so GeoIP/ASN lookups need no extra dependency.
+
+The file is memory-mapped. A lookup walks the binary search tree one address bit at
+a time and only decodes the data record it ends on. Many networks share one record
+(every network of a country points to the same one), so decoded records are memoized
+by their offset in the data section.
+"""
+
+import mmap
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+METADATA_MARKER = b"\xab\xcd\xefMaxMind.com"
+# The metadata section sits within the last 128 KiB of the file
+METADATA_MAX_SIZE = 128 * 1024
+# Zero bytes between the search tree and the data section
+DATA_SECTION_SEPARATOR = 16
+# Decoded records memoized before the memo is reset
+RECORD_CACHE_SIZE = 65536
+
+# Data field types
+_POINTER, _STRING, _DOUBLE, _BYTES, _UINT16, _UINT32, _MAP = 1, 2, 3, 4, 5, 6, 7
+_INT32, _UINT64, _UINT128, _ARRAY, _BOOLEAN, _FLOAT = 8, 9, 10, 11, 14, 15
+_POINTER_BIAS = (0, 2048, 526336, 0)
+
+
+class MmdbReader:
+    """
+    Looks up addresses in one MaxMind DB file.
+    Raises ValueError when the file is not in the MMDB format.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as dbFile:
+            self.buffer = mmap.mmap(dbFile.fileno(), 0, access=mmap.ACCESS_READ)
+        marker = self.buffer.rfind(METADATA_MARKER, max(0, len(self.buffer) - METADATA_MAX_SIZE))
+        if marker < 0:
+            self.buffer.close()
+            raise ValueError(f"{path} is not a MaxMind DB file (metadata marker not found).")
+
+        # Pointers are relative to the section being decoded; the metadata contains none
+        self.dataStart = marker + len(METADATA_MARKER)
+        self.metadata: Dict[str, Any] = self._decode(self.dataStart)[0]
+        self.nodeCount: int = self.metadata["node_count"]
+        self.recordSize: int = self.metadata["record_size"]
+        if self.recordSize not in (24, 28, 32):
+            raise ValueError(f"{path}: unsupported record size {self.recordSize}.")
+        self.ipVersion: int = self.metadata["ip_version"]
+        self.nodeBytes = self.recordSize // 4
+        self.dataStart = self.nodeCount * self.nodeBytes + DATA_SECTION_SEPARATOR
+        # IPv4 addresses live under ::/96 in IPv6 trees
+        self.ipv4Start = 0
+        if self.ipVersion == 6:
+            for _ in range(96):
+                if self.ipv4Start >= self.nodeCount:
+                    break
+                self.ipv4Start = self._readNode(self.ipv4Start, 0)
+        self.records: Dict[int, Any] = {}
+        self.lookups: int = 0
+
+    def close(self) -> None:
+        self.buffer.close()
+
+    # -----------------------------------------------------------------------
+    # Search Tree
+    # -----------------------------------------------------------------------
+
+    def _readNode(self, node: int, bit: int) -> int:
+        buffer = self.buffer
+        base = node * self.nodeBytes
+        if self.recordSize == 24:
+            offset = base + bit * 3
+            return (buffer[offset] << 16) | (buffer[offset + 1] << 8) | buffer[offset + 2]
+        if self.recordSize == 28:
+            # The middle byte holds the top nibble of both records
+            if bit == 0:
+                return ((buffer[base + 3] & 0xF0) << 20) | (buffer[base] << 16) | (buffer[base + 1] << 8) | buffer[base + 2]
+            return ((buffer[base + 3] & 0x0F) << 24) | (buffer[base + 4] << 16) | (buffer[base + 5] << 8) | buffer[base + 6]
+        offset = base + bit * 4
+        return int.from_bytes(buffer[offset:offset + 4], "big")
+
+    def findRecord(self, address: int, version: int) -> int:
+        """
+        Returns the data-section offset of the record for an address given as an integer,
+        or -1 when the database has no data for it.
+        """
+        if version == 6 and self.ipVersion == 4:
+            return -1
+        bitCount = 32 if version == 4 else 128
+        node = self.ipv4Start if bitCount == 32 else 0
+        nodeCount = self.nodeCount
+        readNode = self._readNode
+        self.lookups += 1
+        for shift in range(bitCount - 1, -1, -1):
+            if node >= nodeCount:
+                break
+            node = readNode(node, (address >> shift) & 1)
+        if node <= nodeCount:
+            return -1
+        return node - nodeCount - DATA_SECTION_SEPARATOR
+
+    def record(self, offset: int) -> Any:
+        """
+        Returns the decoded record at a data-section offset (memoized).
+        """
+        record = self.records.get(offset)
+        if record is None:
+            if len(self.records) >= RECORD_CACHE_SIZE:
+                self.records.clear()
+            record = self.records[offset] = self._decode(self.dataStart + offset)[0]
+        return record
+
+    def get(self, address: int, version: int) -> Optional[Any]:
+        offset = self.findRecord(address, version)
+        return None if offset < 0 else self.record(offset)
+
+    # -----------------------------------------------------------------------
+    # Data Section Decoder
+    # -----------------------------------------------------------------------
+
+    def _decode(self, offset: int) -> Tuple[Any, int]:
+        """
+        Decodes the field at an absolute file offset; returns it with the offset after it.
+        """
+        buffer = self.buffer
+        control = buffer[offset]
+        offset += 1
+        fieldType = control >> 5
+
+        if fieldType == _POINTER:
+            sizeBits = (control >> 3) & 0x3
+            length = sizeBits + 1
+            value = int.from_bytes(buffer[offset:offset + length], "big")
+            if sizeBits < 3:
+                value |= (control & 0x7) << (8 * length)
+            target = self.dataStart + value + _POINTER_BIAS[sizeBits]
+            return self._decode(target)[0], offset + length
+
+        if fieldType == 0:
+            fieldType = 7 + buffer[offset]
+            offset += 1
+        size = control & 0x1F
+        if size >= 29:
+            length = size - 28
+            extra = int.from_bytes(buffer[offset:offset + length], "big")
+            offset += length
+            size = (29, 285, 65821)[length - 1] + extra
+
+        if fieldType == _MAP:
+            result = {}
+            for _ in range(size):
+                key, offset = self._decode(offset)
+                result[key], offset = self._decode(offset)
+            return result, offset
+        if fieldType == _STRING:
+            return buffer[offset:offset + size].decode("utf-8"), offset + size
+        if fieldType in (_UINT16, _UINT32, _UINT64, _UINT128):
+            return int.from_bytes(buffer[offset:offset + size], "big"), offset + size
+        if fieldType == _ARRAY:
+            result = []
+            for _ in range(size):
+                value, offset = self._decode(offset)
+                result.append(value)
+            return result, offset
+        if fieldType == _INT32:
+            return int.from_bytes(buffer[offset:offset + size].rjust(4, b"\x00"), "big", signed=True), offset + size
+        if fieldType == _DOUBLE:
+            return struct.unpack(">d", buffer[offset:offset + 8])[0], offset + 8
+        if fieldType == _FLOAT:
+            return struct.unpack(">f", buffer[offset:offset + 4])[0], offset + 4
+        if fieldType == _BOOLEAN:
+            return bool(size), offset
+        if fieldType == _BYTES:
+            return bytes(buffer[offset:offset + size]), offset + size
+        raise ValueError(f"{self.path}: unexpected MMDB field type {fieldType} at offset {offset - 1}.")
+
+    def getStats(self) -> Dict:
+        return {
+            "path": self.path,
+            "databaseType": self.metadata.get("database_type"),
+            "buildEpoch": self.metadata.get("build_epoch"),
+            "ipVersion": self.ipVersion,
+            "nodeCount": self.nodeCount,
+            "lookups": self.lookups,
+            "cachedRecords": len(self.records),
+        }
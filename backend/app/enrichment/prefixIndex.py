@@ -0,0 +1,255 @@
+"""
+prefixIndex.py
+---------------
+Longest-prefix index over CIDR reputation lists.
+
+Every list file (one IP or CIDR per line; '#'/';' comments and trailing fields are
+ignored, which covers FireHOL netsets, Spamhaus DROP and plain blocklists) becomes one
+bit of a label mask. CIDR blocks are either nested or disjoint, so the prefix tree is
+flattened at build time: a sweep over the sorted blocks emits disjoint address ranges,
+each carrying the mask of every block that covers it. A lookup is then one binary search,
+vectorized over a whole batch of IPv4 addresses with np.searchsorted instead of walking
+up to 32 trie nodes per address in Python.
+
+The compiled IPv4 arrays are cached in ENRICH_INDEX_DIR as .npy files keyed by the list
+files' names, sizes and modification times. Later starts memory-map them (ENRICH_MMAP_MODE),
+so restarts skip parsing and processes share the pages. IPv6 blocks are rare in
+reputation feeds and are kept as Python integers searched with bisect.
+"""
+
+import bisect
+import hashlib
+import ipaddress
+import json
+import os
+import re
+import shutil
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# One bit of the uint64 label mask per list
+MAX_LISTS = 64
+LIST_SUFFIXES = (".txt", ".netset", ".ipset", ".csv", ".list")
+_TOKEN_SPLIT = re.compile(r"[\s,;]")
+_CACHE_PREFIX = "reputation-"
+
+
+def _flatten(blocks: List[Tuple[int, int, int]]) -> Tuple[List[int], List[int], List[int]]:
+    """
+    Turns nested or disjoint (start, end, mask) blocks into sorted, disjoint ranges
+    whose mask is the union of every block covering them.
+    """
+    # Outer blocks first when several start at the same address
+    blocks.sort(key=lambda block: (block[0], -block[1]))
+    starts: List[int] = []
+    ends: List[int] = []
+    masks: List[int] = []
+
+    def emit(start: int, end: int, mask: int) -> None:
+        if start > end:
+            return
+        if masks and masks[-1] == mask and ends[-1] + 1 == start:
+            ends[-1] = end
+        else:
+            starts.append(start)
+            ends.append(end)
+            masks.append(mask)
+
+    # Open blocks as (end, combined mask); the next address not yet emitted
+    stack: List[Tuple[int, int]] = []
+    position = 0
+    for start, end, mask in blocks:
+        while stack and stack[-1][0] < start:
+            closedEnd, closedMask = stack.pop()
+            emit(position, closedEnd, closedMask)
+            position = closedEnd + 1
+        if stack:
+            emit(position, start - 1, stack[-1][1])
+        position = start
+        stack.append((end, mask | (stack[-1][1] if stack else 0)))
+    while stack:
+        closedEnd, closedMask = stack.pop()
+        emit(position, closedEnd, closedMask)
+        position = closedEnd + 1
+    return starts, ends, masks
+
+
+def readList(path: str) -> Tuple[List, int]:
+    """
+    Parses one reputation list; returns its networks and the number of unparsable lines.
+    """
+    networks = []
+    invalid = 0
+    with open(path, encoding="utf-8", errors="replace") as listFile:
+        for line in listFile:
+            token = _TOKEN_SPLIT.split(line.strip(), 1)[0]
+            if not token or token[0] in "#;":
+                continue
+            try:
+                networks.append(ipaddress.ip_network(token, strict=False))
+            except ValueError:
+                invalid += 1
+    return networks, invalid
+
+
+class PrefixIndex:
+    """
+    Maps addresses to the reputation lists containing them.
+    """
+
+    def __init__(
+        self,
+        labels: List[str],
+        starts: np.ndarray,
+        ends: np.ndarray,
+        masks: np.ndarray,
+        ipv6Ranges: Optional[List[Tuple[int, int, int]]] = None,
+        entries: int = 0,
+        invalid: int = 0,
+        mapped: bool = False,
+    ):
+        self.labels = labels
+        # Disjoint IPv4 ranges sorted by start (uint32) and their label masks (uint64)
+        self.starts = starts
+        self.ends = ends
+        self.masks = masks
+        ipv6Ranges = ipv6Ranges or []
+        self.ipv6Starts = [start for start, _, _ in ipv6Ranges]
+        self.ipv6Ranges = ipv6Ranges
+        self.entries = entries
+        self.invalid = invalid
+        self.mapped = mapped
+        # mask -> tuple of list names
+        self._labelCache: Dict[int, Tuple[str, ...]] = {0: ()}
+
+    # -----------------------------------------------------------------------
+    # Building and Loading
+    # -----------------------------------------------------------------------
+
+    @classmethod
+    def build(cls, paths: List[str]) -> "PrefixIndex":
+        """
+        Parses the list files (one label each, named after the file) and flattens them.
+        """
+        labels: List[str] = []
+        blocks4: List[Tuple[int, int, int]] = []
+        blocks6: List[Tuple[int, int, int]] = []
+        entries = invalid = 0
+        for bit, path in enumerate(sorted(paths)[:MAX_LISTS]):
+            labels.append(os.path.splitext(os.path.basename(path))[0])
+            networks, listInvalid = readList(path)
+            entries += len(networks)
+            invalid += listInvalid
+            for network in networks:
+                block = (int(network.network_address), int(network.broadcast_address), 1 << bit)
+                (blocks4 if network.version == 4 else blocks6).append(block)
+        starts, ends, masks = _flatten(blocks4)
+        return cls(
+            labels,
+            np.asarray(starts, dtype=np.uint32),
+            np.asarray(ends, dtype=np.uint32),
+            np.asarray(masks, dtype=np.uint64),
+            list(zip(*_flatten(blocks6))),
+            entries=entries,
+            invalid=invalid,
+        )
+
+    def save(self, directory: str) -> None:
+        """
+        Writes the compiled index atomically into 'directory'.
+        """
+        staging = directory + ".tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        np.save(os.path.join(staging, "starts.npy"), self.starts)
+        np.save(os.path.join(staging, "ends.npy"), self.ends)
+        np.save(os.path.join(staging, "masks.npy"), self.masks)
+        with open(os.path.join(staging, "meta.json"), "w") as metaFile:
+            json.dump({
+                "labels": self.labels,
+                "entries": self.entries,
+                "invalid": self.invalid,
+                # 128-bit values as hex strings
+                "ipv6": [[f"{start:x}", f"{end:x}", mask] for start, end, mask in self.ipv6Ranges],
+            }, metaFile)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+
+    @classmethod
+    def load(cls, directory: str, mmapMode: Optional[str] = "r") -> "PrefixIndex":
+        with open(os.path.join(directory, "meta.json")) as metaFile:
+            meta = json.load(metaFile)
+        arrays = [np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmapMode or None) for name in ("starts", "ends", "masks")]
+        return cls(
+            meta["labels"],
+            *arrays,
+            [(int(start, 16), int(end, 16), mask) for start, end, mask in meta["ipv6"]],
+            entries=meta["entries"],
+            invalid=meta["invalid"],
+            mapped=bool(mmapMode),
+        )
+
+    @classmethod
+    def open(cls, listDirectory: str, indexDirectory: str, mmapMode: Optional[str] = "r") -> "PrefixIndex":
+        """
+        Loads the cached index for the current list files, compiling and caching it first if the lists changed.
+        """
+        paths = sorted(
+            os.path.join(listDirectory, name) for name in os.listdir(listDirectory)
+            if name.lower().endswith(LIST_SUFFIXES)
+        )
+        fingerprint = hashlib.sha1(json.dumps([
+            [os.path.basename(path), os.stat(path).st_size, os.stat(path).st_mtime_ns] for path in paths
+        ]).encode()).hexdigest()[:16]
+        directory = os.path.join(indexDirectory, _CACHE_PREFIX + fingerprint)
+        if not os.path.exists(os.path.join(directory, "meta.json")):
+            os.makedirs(indexDirectory, exist_ok=True)
+            cls.build(paths).save(directory)
+            # Indexes of earlier list versions are never read again
+            for name in os.listdir(indexDirectory):
+                if name.startswith(_CACHE_PREFIX) and name != os.path.basename(directory):
+                    shutil.rmtree(os.path.join(indexDirectory, name), ignore_errors=True)
+        return cls.load(directory, mmapMode)
+
+    # -----------------------------------------------------------------------
+    # Lookups
+    # -----------------------------------------------------------------------
+
+    def lookupIPv4(self, addresses: np.ndarray) -> np.ndarray:
+        """
+        Returns the label mask of every IPv4 address (uint32 array); 0 when no list contains it.
+        """
+        if not len(self.starts) or not len(addresses):
+            return np.zeros(len(addresses), dtype=np.uint64)
+        positions = np.searchsorted(self.starts, addresses, side="right") - 1
+        clipped = np.maximum(positions, 0)
+        hits = (positions >= 0) & (addresses <= self.ends[clipped])
+        return np.where(hits, self.masks[clipped], np.uint64(0))
+
+    def lookupIPv6(self, address: int) -> int:
+        position = bisect.bisect_right(self.ipv6Starts, address) - 1
+        if position >= 0:
+            _, end, mask = self.ipv6Ranges[position]
+            if address <= end:
+                return mask
+        return 0
+
+    def labelsFor(self, mask: int) -> Tuple[str, ...]:
+        """
+        Returns the names of the lists in a label mask.
+        """
+        labels = self._labelCache.get(mask)
+        if labels is None:
+            labels = tuple(label for bit, label in enumerate(self.labels) if mask >> bit & 1)
+            self._labelCache[mask] = labels
+        return labels
+
+    def getStats(self) -> Dict:
+        return {
+            "lists": list(self.labels),
+            "entries": self.entries,
+            "invalidLines": self.invalid,
+            "ipv4Ranges": len(self.starts),
+            "ipv6Ranges": len(self.ipv6Ranges),
+            "memoryMapped": self.mapped,
+        }
@@ -5,9 +5,16 @@ This module initializes and runs the FastAPI backend application for the Intrusi
 It exposes the REST endpoints that allow the frontend to control and retrieve real-time network capture data.
 """
 
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from app.routes import packetRoutes
+# Installed first (with STARTUP_PROFILE=1) so the import cost of everything below is measured
+# (GET /api/packets/debug/startup); the import hook is removed once startup completes
+from app import config
+from app.utils import startupProfiler
+if config.STARTUP_PROFILE:
+    startupProfiler.install()
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
+from app.routes import packetRoutes  # noqa: E402
 
 #----------------------------------------------------------------------------------------------------------------------
 # Application Initialization
@@ -40,6 +47,15 @@ app.add_middleware(
 
 # Mount all packet-related routes from the dedicated route module
 app.include_router(packetRoutes.router, prefix="/api/packets", tags=["Packet Operation"])
+app.include_router(packetRoutes.streamRouter, prefix="/api/packets", tags=["Packet Operation"])
+app.include_router(packetRoutes.metricsRouter, tags=["Monitoring"])
+
+@app.on_event("startup")
+async def recordStartup():
+    """
+    Marks the end of startup for the startup-time report.
+    """
+    startupProfiler.markReady()
 
 #------------------------------------------------------------------------------------------------------
 # Root Endpoint
@@ -0,0 +1,209 @@
+"""
+batchInference.py
+------------------
+Micro-batching risk inference stage.
+Parsed packets are queued by the capture engine and scored in N-row batches
+by a background worker, so the model is called once per batch instead of once per packet.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from app.capture.boundedQueue import BoundedQueue, DROP_OLDEST
+from app.ml.modelInterface import BaseModelInterface
+from app.utils import metrics
+from app.utils.logger import SystemLogger
+
+
+class BatchInferenceStage:
+    """
+    Collects parsed packets into batches and classifies them in a worker thread.
+    A batch is flushed as soon as it reaches 'batchSize' rows or when its oldest
+    packet has waited 'maxLatencyMs' milliseconds, whichever happens first.
+    """
+
+    def __init__(
+        self,
+        model: Optional[BaseModelInterface],
+        onScored: Callable[[List[Dict]], None],
+        batchSize: int = 256,
+        maxLatencyMs: float = 50.0,
+        queueCapacity: int = 10000,
+        queuePolicy: str = DROP_OLDEST,
+        prepareBatch: Optional[Callable[[List[Dict], List[Optional[Dict]]], None]] = None,
+        logger: Optional[SystemLogger] = None,
+    ):
+        # Model used to score each batch (may be attached after construction, before start())
+        self.model = model
+        # Callback receiving every scored batch (packets already carry their 'risk')
+        self.onScored = onScored
+        # Optional hook run on (packets, feature rows) of each batch right before the model call,
+        # e.g. to enrich the packets and extend their features once per batch
+        self.prepareBatch = prepareBatch
+        self.logger = logger or SystemLogger("batch_inference")
+        # Flush thresholds
+        self.batchSize = max(1, batchSize)
+        self.maxLatency = max(0.0, maxLatencyMs) / 1000.0
+        # Pending (packetData, features, enqueueTime) entries
+        self.pending = BoundedQueue(queueCapacity, queuePolicy, name="classify")
+        # Worker thread state
+        self.isRunning: bool = False
+        self.workerThread: Optional[threading.Thread] = None
+        # One model call per batch, and the wait of its oldest packet (enqueue -> scored)
+        self.inferenceLatency = metrics.stageLatency("inference_batch", sampleEvery=1)
+        self.batchLatency = metrics.stageLatency("classify_wait", sampleEvery=1)
+        # Throughput counters
+        self.statsLock = threading.Lock()
+        self._resetCounters()
+
+    def _resetCounters(self) -> None:
+        self.packetsScored: int = 0
+        self.batchesScored: int = 0
+        self.sizeFlushes: int = 0
+        self.deadlineFlushes: int = 0
+        # Batches whose enrichment, scoring or storing raised; their packets are dropped
+        self.batchesFailed: int = 0
+        self.packetsFailed: int = 0
+        self.maxObservedLatencyMs: float = 0.0
+        self.totalInferenceSeconds: float = 0.0
+        self.startedAt: float = time.monotonic()
+
+    # -----------------------------------------------------------------------
+    # Internal Worker
+    # -----------------------------------------------------------------------
+
+    def _collectBatch(self) -> List[Tuple[Dict, Dict, float]]:
+        """
+        Blocks until at least one packet is pending, then keeps draining the
+        queue until the batch is full or the oldest packet hits its deadline.
+        """
+        try:
+            first = self.pending.get(timeout=0.5)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = first[2] + self.maxLatency
+
+        while len(batch) < self.batchSize:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self.pending.get_nowait())
+                else:
+                    batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _scoreBatch(self, batch: List[Tuple[Dict, Dict, float]]) -> None:
+        """
+        Runs a single model call for the whole batch and writes the labels back.
+        """
+        packets = [entry[0] for entry in batch]
+        # Entries without features were already labeled upstream (e.g. parse errors)
+        scorable = [entry for entry in batch if entry[1] is not None]
+        if self.prepareBatch is not None:
+            self.prepareBatch(packets, [entry[1] for entry in batch])
+
+        inferenceStart = time.monotonic()
+        labels = self.model.predictBatch([entry[1] for entry in scorable])
+        finishedAt = time.monotonic()
+
+        for entry, label in zip(scorable, labels):
+            entry[0]["risk"] = label
+
+        self.inferenceLatency.observe(finishedAt - inferenceStart)
+        self.batchLatency.observe(finishedAt - batch[0][2])
+
+        with self.statsLock:
+            self.packetsScored += len(batch)
+            self.batchesScored += 1
+            if len(batch) >= self.batchSize:
+                self.sizeFlushes += 1
+            else:
+                self.deadlineFlushes += 1
+            self.totalInferenceSeconds += finishedAt - inferenceStart
+            oldestWaitMs = (finishedAt - batch[0][2]) * 1000.0
+            self.maxObservedLatencyMs = max(self.maxObservedLatencyMs, oldestWaitMs)
+
+        self.onScored(packets)
+
+    def _workerLoop(self) -> None:
+        """
+        Drains the pending queue until the stage is stopped and the queue is empty.
+        """
+        while self.isRunning or not self.pending.empty():
+            batch = self._collectBatch()
+            if not batch:
+                continue
+            try:
+                self._scoreBatch(batch)
+            except Exception as e:
+                # One bad batch must not stop the only inference thread
+                with self.statsLock:
+                    self.batchesFailed += 1
+                    self.packetsFailed += len(batch)
+                self.logger.logError(f"Dropped a batch of {len(batch)} packets after an inference error: {e!r}")
+
+    # -----------------------------------------------------------------------
+    # Public Methods
+    # -----------------------------------------------------------------------
+
+    def start(self) -> None:
+        """
+        Starts the background inference worker.
+        """
+        if self.isRunning:
+            return
+        self.isRunning = True
+        with self.statsLock:
+            self._resetCounters()
+        self.workerThread = threading.Thread(target=self._workerLoop, daemon=True)
+        self.workerThread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """
+        Stops the worker after flushing every packet already queued.
+        """
+        self.isRunning = False
+        if self.workerThread and self.workerThread.is_alive():
+            self.workerThread.join(timeout=timeout)
+
+    def submit(self, packetData: Dict, features: Optional[Dict]) -> bool:
+        """
+        Queues a parsed packet and its feature vector for batched scoring.
+        Packets submitted with features=None keep their existing 'risk' label.
+        Returns False if the packet was dropped by the queue policy.
+        """
+        return self.pending.put((packetData, features, time.monotonic()))
+
+    def clear(self) -> None:
+        """
+        Discards all packets still waiting to be scored.
+        """
+        self.pending.clear()
+
+    def getStats(self) -> Dict:
+        """
+        Returns batching configuration and throughput counters.
+        """
+        with self.statsLock:
+            elapsed = max(time.monotonic() - self.startedAt, 1e-9)
+            return {
+                "batchSize": self.batchSize,
+                "maxLatencyMs": self.maxLatency * 1000.0,
+                "queue": self.pending.getStats(),
+                "packetsScored": self.packetsScored,
+                "batchesScored": self.batchesScored,
+                "sizeFlushes": self.sizeFlushes,
+                "deadlineFlushes": self.deadlineFlushes,
+                "batchesFailed": self.batchesFailed,
+                "packetsFailed": self.packetsFailed,
+                "avgBatchSize": self.packetsScored / self.batchesScored if self.batchesScored else 0.0,
+                "maxObservedLatencyMs": self.maxObservedLatencyMs,
+                "inferenceSeconds": self.totalInferenceSeconds,
+                "packetsPerSecond": self.packetsScored / elapsed,
+            }
@@ -0,0 +1,208 @@
+"""
+compiledForest.py
+------------------
+"Compiled" inference backend for scikit-learn RandomForest classifiers.
+All trees of the forest are flattened into contiguous NumPy node arrays
+(feature, threshold, children, normalized leaf values) and evaluated level by
+level for a whole batch of rows at once from a preallocated feature buffer,
+without sklearn's per-call input validation and per-tree dispatch.
+
+Predictions match RandomForestClassifier.predict exactly: inputs are cast to
+float32 like sklearn does, leaf distributions are normalized the same way and
+per-tree probabilities are accumulated in estimator order.
+
+A compiled forest can be saved uncompressed and loaded back with its node
+arrays memory-mapped, so processes serving the same artifact share one copy.
+"""
+
+import os
+import threading
+import numpy as np
+from typing import Dict, List
+
+
+class CompiledForest:
+    """
+    Vectorized evaluator over a flattened random forest.
+    """
+
+    def __init__(self, feature, threshold, children, isLeaf, value, roots, classes, maxBatch: int = 256):
+        self.feature = feature
+        self.threshold = threshold
+        # Interleaved (right, left) child pairs: children[2 * node + (x <= threshold)]
+        self.children = children
+        self.isLeaf = isLeaf
+        self.value = value
+        self.roots = roots
+        self.classes = classes
+        self.treeCount = len(roots)
+        self.featureCount = 0
+        self.maxBatch = max(1, maxBatch)
+        # Work buffers are shared, so batches are evaluated one at a time
+        self.lock = threading.Lock()
+
+    @classmethod
+    def fromSklearn(cls, model, maxBatch: int = 256) -> "CompiledForest":
+        """
+        Flattens a fitted RandomForestClassifier into contiguous node arrays.
+        """
+        features, thresholds, children, leaves, values, roots = [], [], [], [], [], []
+        offset = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            nodeCount = tree.node_count
+            nodeIds = np.arange(nodeCount, dtype=np.intp)
+            isLeaf = tree.children_left == -1
+
+            features.append(np.where(isLeaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(tree.threshold.astype(np.float64))
+            rightChild = np.where(isLeaf, nodeIds, tree.children_right).astype(np.intp) + offset
+            leftChild = np.where(isLeaf, nodeIds, tree.children_left).astype(np.intp) + offset
+            children.append(np.stack([rightChild, leftChild], axis=1).reshape(-1))
+            leaves.append(isLeaf)
+
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            leafValues = tree.value[:, 0, :model.n_classes_].astype(np.float64)
+            normalizer = leafValues.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(leafValues / normalizer)
+
+            roots.append(offset)
+            offset += nodeCount
+
+        forest = cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            children=np.concatenate(children),
+            isLeaf=np.concatenate(leaves),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            classes=np.asarray(model.classes_),
+            maxBatch=maxBatch,
+        )
+        forest._allocate(model.n_features_in_)
+        return forest
+
+    def __getstate__(self) -> Dict:
+        # Only the node arrays are stored; the lock and work buffers are rebuilt on load
+        return {
+            name: self.__dict__[name]
+            for name in ("feature", "threshold", "children", "isLeaf", "value", "roots", "classes", "featureCount", "maxBatch")
+        }
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self.treeCount = len(self.roots)
+        self.lock = threading.Lock()
+        self._allocate(self.featureCount)
+
+    def save(self, path: str) -> None:
+        """
+        Writes the node arrays uncompressed, so load() can memory-map them.
+        The file is renamed into place, so concurrent loaders never see a partial write.
+        """
+        import joblib  # pylint: disable=import-outside-toplevel
+        temporaryPath = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(self, temporaryPath, compress=0)
+        os.replace(temporaryPath, path)
+
+    @classmethod
+    def load(cls, path: str, maxBatch: int = 256, mmapMode: str = "r") -> "CompiledForest":
+        """
+        Reads a forest written by save(), memory-mapping its node arrays unless mmapMode is empty.
+        """
+        import joblib  # pylint: disable=import-outside-toplevel
+        forest = joblib.load(path, mmap_mode=mmapMode or None)
+        if not isinstance(forest, cls):
+            raise ValueError(f"{path} does not hold a compiled forest.")
+        if forest.maxBatch != max(1, maxBatch):
+            forest.maxBatch = max(1, maxBatch)
+            forest._allocate(forest.featureCount)
+        return forest
+
+    def _allocate(self, featureCount: int) -> None:
+        """
+        Preallocates the feature batch and the per-batch output buffers.
+        Node buffers are sample-major (row * treeCount + tree) so any batch uses a prefix.
+        """
+        self.featureCount = featureCount
+        size = self.maxBatch * self.treeCount
+        self.rows = np.zeros((self.maxBatch, featureCount), dtype=np.float32)
+        self.rootIndex = np.tile(self.roots, self.maxBatch)
+        self.rowOffsets = np.repeat(np.arange(self.maxBatch, dtype=np.intp) * featureCount, self.treeCount)
+        self.nodeIndex = np.empty(size, dtype=np.intp)
+        self.leafValue = np.empty((self.maxBatch, self.value.shape[1]), dtype=np.float64)
+        self.proba = np.empty((self.maxBatch, self.value.shape[1]), dtype=np.float64)
+
+    def _predictProbaChunk(self, count: int) -> np.ndarray:
+        """
+        Evaluates the first 'count' rows of the row buffer and returns a view of their probabilities.
+        Every (row, tree) pair descends one level per step; pairs that reach a leaf
+        drop out of the active set, so the work follows the actual path lengths.
+        """
+        size = count * self.treeCount
+        node = self.nodeIndex[:size]
+        flatRows = self.rows[:count].reshape(-1)
+
+        np.copyto(node, self.rootIndex[:size])
+        active = np.flatnonzero(~self.isLeaf[node])
+        activeNode = node[active]
+        activeOffset = self.rowOffsets[active]
+
+        while active.size:
+            nodeInput = flatRows.take(self.feature.take(activeNode) + activeOffset)
+            # Same test as sklearn (x <= threshold goes left), which also routes NaN to the right
+            goLeft = nodeInput <= self.threshold.take(activeNode)
+            activeNode = self.children.take(2 * activeNode + goLeft)
+
+            reachedLeaf = self.isLeaf.take(activeNode)
+            if reachedLeaf.any():
+                node[active[reachedLeaf]] = activeNode[reachedLeaf]
+                stillInternal = ~reachedLeaf
+                active = active[stillInternal]
+                activeNode = activeNode[stillInternal]
+                activeOffset = activeOffset[stillInternal]
+
+        # Accumulate tree by tree, in estimator order, exactly like sklearn
+        leaves = node.reshape(count, self.treeCount)
+        proba = self.proba[:count]
+        leafValue = self.leafValue[:count]
+        proba.fill(0.0)
+        for tree in range(self.treeCount):
+            np.take(self.value, leaves[:, tree], axis=0, out=leafValue, mode="clip")
+            np.add(proba, leafValue, out=proba)
+        np.divide(proba, self.treeCount, out=proba)
+        return proba
+
+    # -----------------------------------------------------------------------
+    # Public Methods
+    # -----------------------------------------------------------------------
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Predicts class labels for a 2-D feature matrix.
+        """
+        X = np.asarray(X)
+        predictions = np.empty(len(X), dtype=self.classes.dtype)
+        with self.lock:
+            for start in range(0, len(X), self.maxBatch):
+                chunk = X[start:start + self.maxBatch]
+                self.rows[:len(chunk)] = chunk
+                proba = self._predictProbaChunk(len(chunk))
+                predictions[start:start + len(chunk)] = self.classes.take(np.argmax(proba, axis=1))
+        return predictions
+
+    def predictRows(self, featureRows: List[Dict]) -> List:
+        """
+        Predicts class labels for feature dicts, filling the preallocated row buffer in place.
+        """
+        predictions = []
+        with self.lock:
+            for start in range(0, len(featureRows), self.maxBatch):
+                chunk = featureRows[start:start + self.maxBatch]
+                for row, features in enumerate(chunk):
+                    self.rows[row] = tuple(features.values())
+                proba = self._predictProbaChunk(len(chunk))
+                predictions.extend(self.classes.take(np.argmax(proba, axis=1)).tolist())
+        return predictions
@@ -3,23 +3,38 @@ featureExtractor.py
 --------------------
 Converts parsed packet metadata into numerical features
 for the trained risk model.
+Features are computed from the packet's flow statistics (see flowTable.py),
+matching the CICIDS2017 columns used by preprocess_cicids.py.
 """
 
-from typing import Dict
+from typing import Dict, Optional
+from app import config
+from app.ml.flowTable import FlowRecord, FlowTable
 
-def extractFeatures(packetData: Dict) -> Dict:
-    """
-    Extract features expected by the trained model.
-    """
-    # Base length feature
-    features = {
-        "length": packetData.get("length", 0),
+# Shared flow table for live traffic (one per process)
+flowTable = FlowTable(
+    idleTimeout=config.FLOW_IDLE_TIMEOUT,
+    activeTimeout=config.FLOW_ACTIVE_TIMEOUT,
+    maxFlows=config.FLOW_TABLE_MAX_FLOWS,
+)
+
+
+def _flowFeatures(record: FlowRecord) -> Dict:
+    # Same definitions as preprocess_cicids.py:
+    #   length      = Total Length of Fwd Packets + Bwd Packet Length Mean
+    #   packet_mean = Packet Length Mean
+    #   packet_std  = Packet Length Std
+    return {
+        "length": record.fwdBytes + record.bwdLengthMean,
+        "packet_mean": record.lengthMean,
+        "packet_std": record.lengthStd,
     }
 
-    # Add optional statistical placeholders since live packets won’t have them
-    # (the trained model uses these)
-    # For real-time use, these can be approximated or extended later
-    features["packet_mean"] = packetData.get("length", 0) / 2  # rough heuristic
-    features["packet_std"] = packetData.get("length", 0) / 4   # rough heuristic
 
-    return features
+def extractFeatures(packetData: Dict, table: Optional[FlowTable] = None, timestamp: Optional[float] = None) -> Dict:
+    """
+    Extract features expected by the trained model.
+    Updates the packet's flow in 'table' (the shared flow table by default)
+    and derives the features from the flow's running statistics while the table is locked.
+    """
+    return (table or flowTable).updateAndRead(packetData, _flowFeatures, timestamp)
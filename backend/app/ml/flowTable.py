@@ -0,0 +1,221 @@
+"""
+flowTable.py
+-------------
+Stateful flow table that maintains CICIDS-style per-flow statistics for live traffic.
+Flows are keyed by a direction-independent 5-tuple and updated in O(1) per packet
+(Welford mean/variance, forward/backward byte counts, inter-arrival times).
+Idle and active timeouts plus a hard flow cap keep memory bounded.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class FlowRecord:
+    """
+    Compact running statistics for one bidirectional flow.
+    'Forward' is the direction of the first packet seen for the flow.
+    """
+
+    __slots__ = (
+        "forwardSource", "firstSeen", "lastSeen",
+        "packetCount", "lengthMean", "lengthM2",
+        "fwdPackets", "fwdBytes",
+        "bwdPackets", "bwdBytes", "bwdLengthMean", "bwdLengthM2",
+        "iatMean", "iatM2",
+    )
+
+    def __init__(self, forwardSource: Tuple, timestamp: float):
+        self.forwardSource = forwardSource
+        self.firstSeen = timestamp
+        self.lastSeen = timestamp
+        self.packetCount = 0
+        self.lengthMean = 0.0
+        self.lengthM2 = 0.0
+        self.fwdPackets = 0
+        self.fwdBytes = 0
+        self.bwdPackets = 0
+        self.bwdBytes = 0
+        self.bwdLengthMean = 0.0
+        self.bwdLengthM2 = 0.0
+        self.iatMean = 0.0
+        self.iatM2 = 0.0
+
+    def update(self, source: Tuple, length: int, timestamp: float) -> None:
+        """
+        Folds one packet into the running statistics (Welford's online algorithm).
+        """
+        if self.packetCount:
+            interArrival = max(0.0, timestamp - self.lastSeen)
+            # There is one inter-arrival sample per packet after the first
+            iatDelta = interArrival - self.iatMean
+            self.iatMean += iatDelta / self.packetCount
+            self.iatM2 += iatDelta * (interArrival - self.iatMean)
+        self.lastSeen = timestamp
+
+        self.packetCount += 1
+        delta = length - self.lengthMean
+        self.lengthMean += delta / self.packetCount
+        self.lengthM2 += delta * (length - self.lengthMean)
+
+        if source == self.forwardSource:
+            self.fwdPackets += 1
+            self.fwdBytes += length
+        else:
+            self.bwdPackets += 1
+            self.bwdBytes += length
+            bwdDelta = length - self.bwdLengthMean
+            self.bwdLengthMean += bwdDelta / self.bwdPackets
+            self.bwdLengthM2 += bwdDelta * (length - self.bwdLengthMean)
+
+    @property
+    def lengthStd(self) -> float:
+        """Sample standard deviation of packet lengths (CICFlowMeter convention)."""
+        return math.sqrt(self.lengthM2 / (self.packetCount - 1)) if self.packetCount > 1 else 0.0
+
+    @property
+    def bwdLengthStd(self) -> float:
+        return math.sqrt(self.bwdLengthM2 / (self.bwdPackets - 1)) if self.bwdPackets > 1 else 0.0
+
+    @property
+    def iatStd(self) -> float:
+        samples = self.packetCount - 1
+        return math.sqrt(self.iatM2 / (samples - 1)) if samples > 1 else 0.0
+
+    def toStats(self) -> Dict:
+        """
+        Returns the flow statistics under their CICIDS2017 column names.
+        """
+        return {
+            "Flow Duration": self.lastSeen - self.firstSeen,
+            "Total Fwd Packets": self.fwdPackets,
+            "Total Backward Packets": self.bwdPackets,
+            "Total Length of Fwd Packets": self.fwdBytes,
+            "Total Length of Bwd Packets": self.bwdBytes,
+            "Bwd Packet Length Mean": self.bwdLengthMean,
+            "Bwd Packet Length Std": self.bwdLengthStd,
+            "Packet Length Mean": self.lengthMean,
+            "Packet Length Std": self.lengthStd,
+            "Flow IAT Mean": self.iatMean,
+            "Flow IAT Std": self.iatStd,
+        }
+
+
+class FlowTable:
+    """
+    Bounded map of active flows ordered by last activity.
+    Expired flows are swept incrementally from the least recently active end,
+    and the least recently active flow is evicted once 'maxFlows' is reached.
+    """
+
+    # Upper bound on expired flows removed per update, keeping updates O(1)
+    SWEEP_BATCH = 8
+
+    def __init__(self, idleTimeout: float = 120.0, activeTimeout: float = 1800.0, maxFlows: int = 1000000):
+        self.idleTimeout = idleTimeout
+        self.activeTimeout = activeTimeout
+        self.maxFlows = max(1, maxFlows)
+        self.flows: "OrderedDict[Tuple, FlowRecord]" = OrderedDict()
+        self.lock = threading.Lock()
+        self._resetCounters()
+
+    def _resetCounters(self) -> None:
+        self.flowsCreated: int = 0
+        self.idleEvictions: int = 0
+        self.activeTimeouts: int = 0
+        self.capacityEvictions: int = 0
+
+    @staticmethod
+    def flowKey(packetData: Dict) -> Tuple[Tuple, Tuple]:
+        """
+        Returns (canonical key, source endpoint). The key is identical for both directions.
+        """
+        source = (packetData.get("source"), packetData.get("sourcePort", 0))
+        destination = (packetData.get("destination"), packetData.get("destinationPort", 0))
+        low, high = (source, destination) if source <= destination else (destination, source)
+        return (low, high, packetData.get("protocol")), source
+
+    def _sweepExpired(self, now: float) -> None:
+        for _ in range(self.SWEEP_BATCH):
+            if not self.flows:
+                return
+            key, record = next(iter(self.flows.items()))
+            if now - record.lastSeen < self.idleTimeout:
+                return
+            del self.flows[key]
+            self.idleEvictions += 1
+
+    def _updateLocked(self, key: Tuple, source: Tuple, length: int, now: float) -> FlowRecord:
+        """
+        Folds one packet into its flow. Must be called with the lock held.
+        """
+        self._sweepExpired(now)
+
+        record = self.flows.get(key)
+        if record is not None and (
+            now - record.lastSeen >= self.idleTimeout or now - record.firstSeen >= self.activeTimeout
+        ):
+            # Flow ended by timeout; the packet starts a new flow under the same key
+            if now - record.lastSeen < self.idleTimeout:
+                self.activeTimeouts += 1
+            else:
+                self.idleEvictions += 1
+            del self.flows[key]
+            record = None
+
+        if record is None:
+            if len(self.flows) >= self.maxFlows:
+                self.flows.popitem(last=False)
+                self.capacityEvictions += 1
+            record = FlowRecord(source, now)
+            self.flows[key] = record
+            self.flowsCreated += 1
+        else:
+            self.flows.move_to_end(key)
+
+        record.update(source, length, now)
+        return record
+
+    def update(self, packetData: Dict, timestamp: Optional[float] = None) -> FlowRecord:
+        """
+        Records one packet and returns its (updated) flow record.
+        The record keeps changing with later packets; use updateAndRead() for a consistent view.
+        """
+        now = time.time() if timestamp is None else timestamp
+        key, source = self.flowKey(packetData)
+        with self.lock:
+            return self._updateLocked(key, source, packetData.get("length", 0), now)
+
+    def updateAndRead(self, packetData: Dict, read: Callable[[FlowRecord], T], timestamp: Optional[float] = None) -> T:
+        """
+        Records one packet and returns read(record), evaluated under the table lock so it
+        sees the statistics right after this packet, not a mix with concurrent updates.
+        """
+        now = time.time() if timestamp is None else timestamp
+        key, source = self.flowKey(packetData)
+        with self.lock:
+            return read(self._updateLocked(key, source, packetData.get("length", 0), now))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.flows.clear()
+            self._resetCounters()
+
+    def getStats(self) -> Dict:
+        """
+        Returns flow counts and eviction counters.
+        """
+        with self.lock:
+            return {
+                "activeFlows": len(self.flows),
+                "maxFlows": self.maxFlows,
+                "flowsCreated": self.flowsCreated,
+                "idleEvictions": self.idleEvictions,
+                "activeTimeouts": self.activeTimeouts,
+                "capacityEvictions": self.capacityEvictions,
+            }
@@ -9,12 +9,43 @@ Loads the trained model (risk_model.pkl)
 Falls back to the RiskClassifierStub if unavailable
 Supports multi-class predictions (LOW, MEDIUM, HIGH)
 Automatically loads model once at startup
+Optionally scores through the compiled forest backend (compiledForest.py)
+Picks a versioned artifact from the model registry (modelRegistry.py) when one exists
+Can be swapped to another model at runtime (modelSwap.py) without a restart
+Memory-maps the compiled forest of registry artifacts instead of rebuilding it (MODEL_MMAP_MODE)
 """
 
-import joblib
+import os
+import time
 import numpy as np
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
+from app import config
+from app.ml.compiledForest import CompiledForest
+from app.ml.modelRegistry import ModelRegistry
 from app.ml.modelStub import RiskClassifierStub
+from app.utils import metrics
+
+# Integer model outputs mapped to the risk labels served by the API
+LABEL_MAP = {0: "LOW", 1: "MEDIUM", 2: "HIGH"}
+
+# Rows answered by the random stub instead of the model
+_STUB_PREDICTIONS = "udon_stub_predictions_total"
+_STUB_PREDICTIONS_HELP = "Risk labels produced by the random stub instead of a trained model"
+_stubNoModel = metrics.registry.counter(_STUB_PREDICTIONS, _STUB_PREDICTIONS_HELP, reason="no_model")
+_stubError = metrics.registry.counter(_STUB_PREDICTIONS, _STUB_PREDICTIONS_HELP, reason="error")
+
+
+def scoreRows(model, compiled, featureRows: List[Dict]) -> List[str]:
+    """
+    Scores feature dicts with the compiled forest when available, else with model.predict().
+    """
+    if compiled is not None:
+        preds = compiled.predictRows(featureRows)
+    else:
+        # Convert features (dicts) → numpy array
+        preds = model.predict(np.array([list(features.values()) for features in featureRows]))
+    # Map integer predictions to string labels
+    return [LABEL_MAP.get(int(pred), "LOW") for pred in preds]
 
 
 class BaseModelInterface:
@@ -28,6 +59,20 @@ class BaseModelInterface:
     def predict(self, features: Dict) -> str:
         raise NotImplementedError("Subclasses must implement predict()")
 
+    def predictBatch(self, featureRows: List[Dict]) -> List[str]:
+        """
+        Predicts risk levels for several packets at once.
+        Subclasses backed by vectorized models should override this.
+        """
+        return [self.predict(features) for features in featureRows]
+
+    def scoreBatch(self, featureRows: List[Dict]) -> List[str]:
+        """
+        Like predictBatch(), but without side effects such as shadow scoring.
+        Used by wrappers that only pass part of a batch on (e.g. verdict-cache misses).
+        """
+        return self.predictBatch(featureRows)
+
 
 class DefaultModelHandler(BaseModelInterface):
     """
@@ -36,55 +81,173 @@ class DefaultModelHandler(BaseModelInterface):
     to the RiskClassifierStub (random predictions).
     """
 
-    def __init__(self, modelPath: str = "risk_model.pkl"):
-        self.modelPath = modelPath
-        self.modelLoaded = False
-        self.model = None
+    def __init__(self, modelPath: str = None, backend: str = None, version: str = None):
+        # Unversioned model used when the registry holds no artifact
+        self.modelPath = modelPath or config.MODEL_PATH
+        self.registry = ModelRegistry(config.MODEL_REGISTRY_DIR)
+        # Registry version to load: a number, "latest" or "best"
+        self.versionSelector = version or config.MODEL_VERSION
+        # Registry version and metadata of the loaded artifact (None / {} for unversioned models)
+        self.artifactVersion = None
+        self.metadata: Dict = {}
+        # Path of the loaded artifact (None while the stub is serving) and when it was swapped in
+        self.loadedPath: Optional[str] = None
+        self.loadedAt: float = 0.0
         self.stub = RiskClassifierStub()
+        # "sklearn" calls model.predict, "compiled" evaluates a flattened copy of the forest
+        self.backend = backend or config.INFERENCE_BACKEND
+        # (model, compiled forest or None, loaded, version), replaced as a whole by swapIn().
+        # The version is incremented on every load so caches can detect model changes.
+        self.serving: Tuple = (None, None, False, 0)
+        # Optional ShadowScorer (modelSwap.py) receiving every batch passed to predictBatch()
+        self.shadow = None
 
         # Attempt to load model on startup
         self.loadModel()
 
+    def resolveArtifact(self, selector: str = None, modelPath: str = None) -> Tuple[str, Optional[int], Dict]:
+        """
+        Chooses the artifact to load: an explicit path, else the selected registry version, else modelPath.
+        Returns (path, registry version or None, metadata).
+        """
+        if modelPath:
+            return modelPath, None, {}
+        selector = selector or self.versionSelector
+        try:
+            version = self.registry.resolve(selector)
+        except ValueError:
+            print(f"[WARNING] Invalid MODEL_VERSION '{selector}'. Using {self.modelPath}.")
+            version = None
+        if version is None:
+            return self.modelPath, None, {}
+        return self.registry.artifactPath(version), version, self.registry.getMetadata(version)
+
+    def readArtifact(self, path: str):
+        """
+        Unpickles a model artifact. It is read fully: sklearn trees copy their node arrays while
+        unpickling, so memory-mapping a forest artifact would not save anything (see compileModel()).
+        """
+        import joblib  # pylint: disable=import-outside-toplevel
+        return joblib.load(path)
+
+    def compileModel(self, model, artifactVersion: Optional[int] = None):
+        """
+        Builds the compiled forest for 'model' when the compiled backend is selected (None otherwise).
+        Registry artifacts are never rewritten, so their compiled forest is cached next to them and
+        later loads memory-map its node arrays (MODEL_MMAP_MODE); shard processes then share one copy.
+        """
+        if self.backend != "compiled":
+            return None
+        cachePath = None
+        if artifactVersion is not None and config.MODEL_MMAP_MODE:
+            cachePath = self.registry.compiledPath(artifactVersion)
+            if os.path.exists(cachePath):
+                try:
+                    compiled = CompiledForest.load(cachePath, config.INFERENCE_BATCH_SIZE, config.MODEL_MMAP_MODE)
+                    print("[INFO] Compiled model memory-mapped from cache.")
+                    return compiled
+                except Exception as e:
+                    print(f"[WARNING] Could not load compiled model cache ({e}). Recompiling.")
+        try:
+            compiled = CompiledForest.fromSklearn(model, maxBatch=config.INFERENCE_BATCH_SIZE)
+            print("[INFO] Model compiled for vectorized inference.")
+        except Exception as e:
+            print(f"[WARNING] Could not compile model ({e}). Using sklearn predict.")
+            return None
+        if cachePath is not None:
+            try:
+                compiled.save(cachePath)
+            except OSError as e:
+                print(f"[WARNING] Could not cache compiled model ({e}).")
+        return compiled
+
+    @property
+    def model(self):
+        return self.serving[0]
+
+    @property
+    def compiled(self):
+        return self.serving[1]
+
+    @property
+    def modelLoaded(self) -> bool:
+        return self.serving[2]
+
+    @property
+    def modelVersion(self) -> int:
+        return self.serving[3]
+
+    def swapIn(self, model, compiled=None, loaded: bool = True, path: str = None, artifactVersion: int = None, metadata: Dict = None) -> None:
+        """
+        Replaces the serving model. Model, compiled forest, loaded flag and version are published
+        in one assignment, so a scoring call sees either the previous or the new model, never a mix.
+        Calls already in flight finish on the previous model.
+        """
+        self.loadedPath = path
+        self.artifactVersion = artifactVersion
+        self.metadata = metadata or {}
+        self.loadedAt = time.time()
+        self.serving = (model, compiled, loaded, self.serving[3] + 1)
+
     def loadModel(self, modelPath: str = None) -> None:
         """
         Loads the trained machine learning model from disk.
         Falls back to RiskClassifierStub if model not found or corrupted.
         """
-        path = modelPath or self.modelPath
+        path, artifactVersion, metadata = self.resolveArtifact(modelPath=modelPath)
         try:
             print(f"[INFO] Loading trained risk model from {path} ...")
-            self.model = joblib.load(path)
-            self.modelLoaded = True
+            model = self.readArtifact(path)
+            loaded = True
             print("[INFO] Model loaded successfully.")
         except Exception as e:
             print(f"[WARNING] Could not load model ({e}). Using fallback stub.")
-            self.model = self.stub
-            self.modelLoaded = False
+            model = self.stub
+            loaded = False
+
+        compiled = self.compileModel(model, artifactVersion) if loaded else None
+        self.swapIn(model, compiled, loaded, path if loaded else None, artifactVersion, metadata)
 
     def predict(self, features: Dict) -> str:
         """
         Predicts risk level ('LOW', 'MEDIUM', 'HIGH') from packet features.
         If the trained model is not loaded, uses the stub.
         """
-        if self.model is None:
-            self.loadModel()
+        return self.predictBatch([features])[0]
 
-        # Convert features (dict) → numpy array
-        try:
-            X = np.array([list(features.values())])
+    def predictBatch(self, featureRows: List[Dict]) -> List[str]:
+        """
+        Predicts risk levels for a batch of packets with a single model call
+        and hands the batch and its labels to the shadow model, if one is attached.
+        """
+        start = time.perf_counter()
+        labels = self.scoreBatch(featureRows)
+        shadow = self.shadow
+        if shadow is not None and labels:
+            shadow.submit(featureRows, labels, time.perf_counter() - start)
+        return labels
+
+    def scoreBatch(self, featureRows: List[Dict]) -> List[str]:
+        """
+        Scores a batch with a single model call.
+        Amortizes sklearn's per-call overhead across all rows of the batch.
+        """
+        if not featureRows:
+            return []
 
-            # If the real model is loaded
-            if self.modelLoaded:
-                # Handle sklearn models
-                pred = int(self.model.predict(X)[0])
+        if self.serving[0] is None:
+            self.loadModel()
 
-                # Map integer predictions to string labels
-                label_map = {0: "LOW", 1: "MEDIUM", 2: "HIGH"}
-                return label_map.get(pred, "LOW")
+        # Read once so a concurrent swapIn() cannot switch models halfway through the batch
+        model, compiled, loaded, _ = self.serving
+        if not loaded:
+            _stubNoModel.inc(len(featureRows))
+            return [self.stub.predict(features) for features in featureRows]
 
-            # If not loaded, fallback to stub
-            return self.stub.predict(features)
+        try:
+            return scoreRows(model, compiled, featureRows)
 
         except Exception as e:
-            print(f"[ERROR] Model prediction failed: {e}")
-            return self.stub.predict(features)
+            print(f"[ERROR] Batch model prediction failed: {e}")
+            _stubError.inc(len(featureRows))
+            return [self.stub.predict(features) for features in featureRows]
@@ -0,0 +1,115 @@
+"""
+modelRegistry.py
+-----------------
+Versioned storage for trained risk models.
+Every training run writes a new artifact 'risk_model-v<N>.pkl' next to a
+JSON metadata file (feature list, classes, hyperparameters, metrics, training
+time, inference latency per 1k rows, parent version for warm-started models)
+and a held-out sample used to validate the model before it is hot-swapped in.
+Artifacts are never rewritten, so the compiled forest of a version is cached
+next to it ('risk_model-v<N>-compiled.pkl') the first time it is served.
+DefaultModelHandler picks an artifact by version number, "latest" or "best".
+"""
+
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+ARTIFACT_PATTERN = re.compile(r"^risk_model-v(\d+)\.pkl$")
+
+
+class ModelRegistry:
+    """
+    Directory of versioned model artifacts and their metadata.
+    """
+
+    def __init__(self, directory: str = "models"):
+        self.directory = directory
+
+    def artifactPath(self, version: int) -> str:
+        return os.path.join(self.directory, f"risk_model-v{version:04d}.pkl")
+
+    def metadataPath(self, version: int) -> str:
+        return os.path.join(self.directory, f"risk_model-v{version:04d}.json")
+
+    def compiledPath(self, version: int) -> str:
+        return os.path.join(self.directory, f"risk_model-v{version:04d}-compiled.pkl")
+
+    def holdoutPath(self, version: int) -> str:
+        return os.path.join(self.directory, f"risk_model-v{version:04d}-holdout.npz")
+
+    def listVersions(self) -> List[int]:
+        if not os.path.isdir(self.directory):
+            return []
+        versions = []
+        for name in os.listdir(self.directory):
+            match = ARTIFACT_PATTERN.match(name)
+            if match:
+                versions.append(int(match.group(1)))
+        return sorted(versions)
+
+    def getMetadata(self, version: int) -> Dict:
+        try:
+            with open(self.metadataPath(version)) as metadataFile:
+                return json.load(metadataFile)
+        except (OSError, ValueError):
+            return {"version": version}
+
+    def loadHoldout(self, version: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Returns the (X, y) test rows stored with a version, or None if it has none.
+        """
+        try:
+            with np.load(self.holdoutPath(version)) as archive:
+                return archive["features"], archive["risk"]
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def resolve(self, selector: str = "latest") -> Optional[int]:
+        """
+        Turns "latest", "best" (highest test accuracy) or a version number into an existing version.
+        """
+        versions = self.listVersions()
+        if not versions:
+            return None
+        if selector in ("", "latest"):
+            return versions[-1]
+        if selector == "best":
+            return max(versions, key=lambda version: self.getMetadata(version).get("metrics", {}).get("accuracy", 0.0))
+        version = int(selector)
+        return version if version in versions else None
+
+    def save(self, model, metadata: Dict, holdout: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> int:
+        """
+        Writes the model, its metadata and optional held-out (X, y) rows as the next version and returns that version.
+        The artifact is renamed into place last, so a listed version always has complete metadata.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        versions = self.listVersions()
+        version = versions[-1] + 1 if versions else 1
+        metadata = {"version": version, "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"), **metadata}
+
+        with open(self.metadataPath(version), "w") as metadataFile:
+            json.dump(metadata, metadataFile, indent=2)
+        if holdout is not None:
+            np.savez_compressed(self.holdoutPath(version), features=holdout[0], risk=holdout[1])
+        try:
+            # Compiled forest cached for a deleted artifact that had the same version number
+            os.remove(self.compiledPath(version))
+        except FileNotFoundError:
+            pass
+        import joblib  # pylint: disable=import-outside-toplevel
+        temporaryPath = self.artifactPath(version) + ".tmp"
+        # Uncompressed, so loading skips decompression
+        joblib.dump(model, temporaryPath, compress=0)
+        os.replace(temporaryPath, self.artifactPath(version))
+        return version
+
+    def describe(self) -> List[Dict]:
+        """
+        Returns the metadata of every stored version, oldest first.
+        """
+        return [self.getMetadata(version) for version in self.listVersions()]
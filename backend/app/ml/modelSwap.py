@@ -0,0 +1,457 @@
+"""
+modelSwap.py
+-------------
+Runtime model replacement for DefaultModelHandler.
+A new artifact is loaded, compiled and validated on its held-out sample in a
+background thread, then either swapped in (a single tuple assignment, so the
+capture and inference threads never wait on joblib.load) or attached as a
+shadow model that scores the same batches off the hot path and reports
+disagreement and latency against the serving model.
+A watcher thread can trigger this automatically when the registry (or the
+unversioned model file) changes.
+Swap listeners (addSwapListener) are told about every swap, so capture shard
+worker processes, which hold their own model copy, reload the new artifact.
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from app import config
+from app.capture.boundedQueue import BoundedQueue, DROP_OLDEST
+from app.ml.modelInterface import LABEL_MAP, DefaultModelHandler, scoreRows
+from app.utils.logger import SystemLogger
+
+SWAP_MODES = ("swap", "shadow")
+
+# Callbacks receiving (path, artifactVersion) of every swapped-in model
+_swapListeners: List[Callable[[str, Optional[int]], None]] = []
+# (path, artifactVersion) of the last swapped-in model, None until the first swap
+_swappedArtifact: Optional[Tuple[str, Optional[int]]] = None
+_swapListenersLock = threading.Lock()
+
+
+def addSwapListener(callback: Callable[[str, Optional[int]], None]) -> None:
+    """
+    Registers a callback for model swaps. It is called right away with the last swapped-in model, if any.
+    """
+    with _swapListenersLock:
+        _swapListeners.append(callback)
+        if _swappedArtifact is not None:
+            callback(*_swappedArtifact)
+
+
+def removeSwapListener(callback: Callable[[str, Optional[int]], None]) -> None:
+    with _swapListenersLock:
+        if callback in _swapListeners:
+            _swapListeners.remove(callback)
+
+
+def _notifySwap(path: str, artifactVersion: Optional[int]) -> None:
+    global _swappedArtifact
+    with _swapListenersLock:
+        _swappedArtifact = (path, artifactVersion)
+        for callback in _swapListeners:
+            try:
+                callback(path, artifactVersion)
+            except Exception as e:
+                print(f"[WARNING] Swap listener failed ({e}).")
+
+
+class ModelCandidate:
+    """
+    A loaded (and compiled) model that is not serving traffic yet.
+    """
+
+    def __init__(self, model, compiled, path: str, artifactVersion: Optional[int], metadata: Dict, loadSeconds: float):
+        self.model = model
+        self.compiled = compiled
+        self.path = path
+        self.artifactVersion = artifactVersion
+        self.metadata = metadata
+        self.loadSeconds = loadSeconds
+        # Filled in by ModelSwapManager.validate()
+        self.validation: Dict = {}
+
+    def describe(self) -> Dict:
+        return {
+            "path": self.path,
+            "artifactVersion": self.artifactVersion,
+            "compiled": self.compiled is not None,
+            "loadSeconds": self.loadSeconds,
+            "validation": self.validation,
+        }
+
+
+class ShadowScorer:
+    """
+    Scores every batch the serving model scored with a candidate model in a worker thread.
+    Batches are handed over through a bounded drop-oldest queue, so a slow shadow model
+    loses samples instead of delaying the serving path.
+    """
+
+    def __init__(self, candidate: ModelCandidate, queueCapacity: int = 64):
+        self.candidate = candidate
+        # Pending (featureRows, servingLabels, servingSeconds) entries
+        self.pending = BoundedQueue(queueCapacity, DROP_OLDEST, name="shadow")
+        self.isRunning: bool = False
+        self.workerThread: Optional[threading.Thread] = None
+        self.statsLock = threading.Lock()
+        self.logger = SystemLogger("model_swap")
+        self._resetCounters()
+
+    def _resetCounters(self) -> None:
+        self.rowsScored: int = 0
+        self.batchesScored: int = 0
+        self.disagreements: int = 0
+        # "SERVING->SHADOW" label pairs of disagreeing rows
+        self.transitions: Dict[str, int] = {}
+        self.servingSeconds: float = 0.0
+        self.shadowSeconds: float = 0.0
+        self.errors: int = 0
+        self.lastError: Optional[str] = None
+        self.startedAt: float = time.monotonic()
+
+    def _scoreBatch(self, featureRows: List[Dict], servingLabels: List[str], servingSeconds: float) -> None:
+        start = time.perf_counter()
+        try:
+            labels = scoreRows(self.candidate.model, self.candidate.compiled, featureRows)
+        except Exception as e:
+            with self.statsLock:
+                self.errors += 1
+                self.lastError = str(e)
+            self.logger.logError(f"Shadow model prediction failed: {str(e)}")
+            return
+        elapsed = time.perf_counter() - start
+
+        with self.statsLock:
+            self.rowsScored += len(featureRows)
+            self.batchesScored += 1
+            self.servingSeconds += servingSeconds
+            self.shadowSeconds += elapsed
+            for servingLabel, shadowLabel in zip(servingLabels, labels):
+                if servingLabel != shadowLabel:
+                    self.disagreements += 1
+                    transition = f"{servingLabel}->{shadowLabel}"
+                    self.transitions[transition] = self.transitions.get(transition, 0) + 1
+
+    def _workerLoop(self) -> None:
+        while self.isRunning:
+            try:
+                entry = self.pending.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._scoreBatch(*entry)
+
+    # -----------------------------------------------------------------------
+    # Public Methods
+    # -----------------------------------------------------------------------
+
+    def start(self) -> None:
+        if self.isRunning:
+            return
+        self.isRunning = True
+        self.workerThread = threading.Thread(target=self._workerLoop, name="shadow-scorer", daemon=True)
+        self.workerThread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self.isRunning = False
+        if self.workerThread and self.workerThread.is_alive():
+            self.workerThread.join(timeout=timeout)
+        self.pending.clear()
+
+    def submit(self, featureRows: List[Dict], servingLabels: List[str], servingSeconds: float) -> bool:
+        """
+        Queues a batch scored by the serving model. Called on the inference hot path.
+        """
+        return self.pending.put((featureRows, servingLabels, servingSeconds))
+
+    def getStats(self) -> Dict:
+        """
+        Returns disagreement counters and per-1k-row latency of both models.
+        """
+        with self.statsLock:
+            rows = self.rowsScored
+            return {
+                "candidate": self.candidate.describe(),
+                "runningSeconds": time.monotonic() - self.startedAt,
+                "rowsScored": rows,
+                "batchesScored": self.batchesScored,
+                "disagreements": self.disagreements,
+                "disagreementRate": self.disagreements / rows if rows else 0.0,
+                "transitions": dict(self.transitions),
+                "servingMsPer1k": self.servingSeconds * 1e6 / rows if rows else 0.0,
+                "shadowMsPer1k": self.shadowSeconds * 1e6 / rows if rows else 0.0,
+                "errors": self.errors,
+                "lastError": self.lastError,
+                "queue": self.pending.getStats(),
+            }
+
+
+class ModelSwapManager:
+    """
+    Loads, validates and installs models into a running DefaultModelHandler.
+    Only one load job runs at a time; its progress is reported by getStatus().
+    """
+
+    def __init__(
+        self,
+        handler: DefaultModelHandler,
+        validationSample: str = None,
+        validationRows: int = None,
+        minAccuracy: float = None,
+        shadowQueueCapacity: int = None,
+    ):
+        self.handler = handler
+        self.validationSample = config.MODEL_VALIDATION_SAMPLE if validationSample is None else validationSample
+        self.validationRows = max(1, validationRows or config.MODEL_VALIDATION_ROWS)
+        self.minAccuracy = config.MODEL_MIN_ACCURACY if minAccuracy is None else minAccuracy
+        self.shadowQueueCapacity = shadowQueueCapacity or config.MODEL_SHADOW_QUEUE_CAPACITY
+        # Guards job, shadow and swap bookkeeping
+        self.lock = threading.Lock()
+        # Current or last load job: selector, mode, state (loading/validating/done/failed), timings, error
+        self.job: Optional[Dict] = None
+        self.shadow: Optional[ShadowScorer] = None
+        self.swaps: int = 0
+        self.lastSwap: Optional[Dict] = None
+        # File watcher state
+        self.watchThread: Optional[threading.Thread] = None
+        self.watchStop = threading.Event()
+        self.watchInterval: float = 0.0
+        self.watchMode: str = "swap"
+
+    # -----------------------------------------------------------------------
+    # Loading and Validation
+    # -----------------------------------------------------------------------
+
+    def _validationSample(self, candidate: ModelCandidate):
+        """
+        Returns (X, y, source): the artifact's held-out rows, else MODEL_VALIDATION_SAMPLE, else (None, None, None).
+        """
+        if candidate.artifactVersion is not None:
+            holdout = self.handler.registry.loadHoldout(candidate.artifactVersion)
+            if holdout is not None:
+                return holdout[0][:self.validationRows], holdout[1][:self.validationRows], "holdout"
+        if self.validationSample and os.path.exists(self.validationSample):
+            from app.ml.trainingData import loadProcessed  # pylint: disable=import-outside-toplevel
+            X, y = loadProcessed(self.validationSample)
+            return X[:self.validationRows], y[:self.validationRows], self.validationSample
+        return None, None, None
+
+    def validate(self, candidate: ModelCandidate) -> Dict:
+        """
+        Checks that the candidate accepts the serving feature vector, only emits known risk codes,
+        scores identically through the compiled backend and reaches MODEL_MIN_ACCURACY on held-out rows.
+        Raises ValueError when a check fails.
+        """
+        from app.ml.trainingData import FEATURE_COLUMNS  # pylint: disable=import-outside-toplevel
+        X, y, source = self._validationSample(candidate)
+        if X is None:
+            # Without labelled rows only the structural checks can run
+            X = np.zeros((1, len(FEATURE_COLUMNS)), dtype=np.float32)
+        X = np.ascontiguousarray(X, dtype=np.float32)
+
+        featureCount = getattr(candidate.model, "n_features_in_", None)
+        if featureCount is not None and featureCount != X.shape[1]:
+            raise ValueError(f"Model expects {featureCount} features, the capture pipeline provides {X.shape[1]}.")
+
+        start = time.perf_counter()
+        preds = np.asarray(candidate.model.predict(X))
+        msPer1k = (time.perf_counter() - start) * 1e6 / len(X)
+        unknown = set(np.unique(preds).tolist()) - set(LABEL_MAP)
+        if unknown:
+            raise ValueError(f"Model emits unknown risk codes {sorted(unknown)}.")
+        if candidate.compiled is not None and not np.array_equal(candidate.compiled.predict(X), preds):
+            raise ValueError("Compiled forest predictions differ from model.predict().")
+
+        result = {"source": source, "rows": int(len(X)) if source else 0, "msPer1k": msPer1k, "accuracy": None, "servingAccuracy": None}
+        if y is not None:
+            result["accuracy"] = float(np.mean(preds == y))
+            servingModel, _, servingLoaded, _ = self.handler.serving
+            if servingLoaded:
+                result["servingAccuracy"] = float(np.mean(np.asarray(servingModel.predict(X)) == y))
+            if result["accuracy"] < self.minAccuracy:
+                raise ValueError(f"Held-out accuracy {result['accuracy']:.3f} is below MODEL_MIN_ACCURACY {self.minAccuracy}.")
+        return result
+
+    def _runJob(self, selector: Optional[str], mode: str) -> None:
+        job = self.job
+        try:
+            path, artifactVersion, metadata = self.handler.resolveArtifact(selector)
+            job.update(path=path, artifactVersion=artifactVersion)
+            print(f"[INFO] Loading candidate model from {path} ...")
+            start = time.perf_counter()
+            model = self.handler.readArtifact(path)
+            compiled = self.handler.compileModel(model, artifactVersion)
+            candidate = ModelCandidate(model, compiled, path, artifactVersion, metadata, time.perf_counter() - start)
+
+            job["state"] = "validating"
+            candidate.validation = self.validate(candidate)
+
+            if mode == "shadow":
+                self._startShadow(candidate)
+            else:
+                self._swap(candidate)
+            job["state"] = "done"
+        except Exception as e:
+            print(f"[WARNING] Model {mode} of {job.get('path')} failed ({e}). Keeping the serving model.")
+            job.update(state="failed", error=str(e))
+        finally:
+            job["finishedAt"] = time.time()
+
+    def requestLoad(self, selector: Optional[str] = None, mode: str = "swap") -> bool:
+        """
+        Starts loading a registry version ("latest", "best", a number; default MODEL_VERSION) in the background.
+        Returns False if another load job is still running.
+        Raises RuntimeError for mode=shadow with CAPTURE_MODE=process, where batches are scored in the shard workers.
+        """
+        if mode not in SWAP_MODES:
+            raise ValueError(f"Unknown swap mode '{mode}'. Expected one of {SWAP_MODES}.")
+        if mode == "shadow" and config.CAPTURE_MODE == "process":
+            raise RuntimeError("Shadow scoring is not available with CAPTURE_MODE=process.")
+        with self.lock:
+            if self.job is not None and self.job["state"] in ("loading", "validating"):
+                return False
+            self.job = {
+                "selector": selector or self.handler.versionSelector,
+                "mode": mode,
+                "state": "loading",
+                "path": None,
+                "artifactVersion": None,
+                "startedAt": time.time(),
+                "finishedAt": None,
+                "error": None,
+            }
+        threading.Thread(target=self._runJob, args=(selector, mode), name="model-loader", daemon=True).start()
+        return True
+
+    # -----------------------------------------------------------------------
+    # Swap and Shadow
+    # -----------------------------------------------------------------------
+
+    def _swap(self, candidate: ModelCandidate) -> None:
+        with self.lock:
+            previous = {"path": self.handler.loadedPath, "artifactVersion": self.handler.artifactVersion}
+            self.handler.swapIn(
+                candidate.model, candidate.compiled, True, candidate.path, candidate.artifactVersion, candidate.metadata
+            )
+            self.swaps += 1
+            self.lastSwap = {"at": time.time(), "previous": previous, **candidate.describe()}
+        _notifySwap(candidate.path, candidate.artifactVersion)
+        print(f"[INFO] Now serving model {candidate.path}.")
+
+    def _startShadow(self, candidate: ModelCandidate) -> None:
+        scorer = ShadowScorer(candidate, self.shadowQueueCapacity)
+        scorer.start()
+        with self.lock:
+            previous, self.shadow = self.shadow, scorer
+            self.handler.shadow = scorer
+        if previous is not None:
+            previous.stop()
+        print(f"[INFO] Shadow scoring with model {candidate.path}.")
+
+    def stopShadow(self) -> Optional[Dict]:
+        """
+        Detaches the shadow model and returns its final statistics (None if none was running).
+        """
+        with self.lock:
+            scorer, self.shadow = self.shadow, None
+            self.handler.shadow = None
+        if scorer is None:
+            return None
+        scorer.stop()
+        return scorer.getStats()
+
+    def promoteShadow(self) -> Optional[Dict]:
+        """
+        Makes the shadow model the serving model. Returns its final shadow statistics.
+        """
+        with self.lock:
+            scorer = self.shadow
+        if scorer is None:
+            return None
+        stats = self.stopShadow()
+        self._swap(scorer.candidate)
+        return stats
+
+    # -----------------------------------------------------------------------
+    # File Watching
+    # -----------------------------------------------------------------------
+
+    def _watchKey(self):
+        path, _, _ = self.handler.resolveArtifact()
+        try:
+            return path, os.path.getmtime(path)
+        except OSError:
+            return path, None
+
+    def _watchLoop(self) -> None:
+        watchedKey = self._watchKey()
+        pendingKey = None
+        while not self.watchStop.wait(self.watchInterval):
+            key = self._watchKey()
+            if key == watchedKey or key[1] is None:
+                pendingKey = None
+                continue
+            # Act once the artifact is unchanged for a full interval, so half-written files are skipped
+            if key != pendingKey:
+                pendingKey = key
+                continue
+            if self.requestLoad(mode=self.watchMode):
+                watchedKey, pendingKey = key, None
+
+    def startWatching(self, interval: float = None, mode: str = None) -> None:
+        """
+        Polls the registry (or the unversioned model file) and loads new artifacts automatically.
+        """
+        if self.watchThread and self.watchThread.is_alive():
+            return
+        self.watchInterval = max(0.1, interval or config.MODEL_WATCH_INTERVAL)
+        self.watchMode = mode or config.MODEL_WATCH_MODE
+        if self.watchMode == "shadow" and config.CAPTURE_MODE == "process":
+            print("[WARNING] Shadow scoring is not available with CAPTURE_MODE=process. The model watcher swaps instead.")
+            self.watchMode = "swap"
+        self.watchStop.clear()
+        self.watchThread = threading.Thread(target=self._watchLoop, name="model-watcher", daemon=True)
+        self.watchThread.start()
+
+    def stopWatching(self) -> None:
+        self.watchStop.set()
+        if self.watchThread and self.watchThread.is_alive():
+            self.watchThread.join(timeout=2.0)
+
+    # -----------------------------------------------------------------------
+    # Status
+    # -----------------------------------------------------------------------
+
+    def getStatus(self) -> Dict:
+        """
+        Returns the serving model, the current/last load job, shadow statistics and watcher settings.
+        """
+        handler = self.handler
+        with self.lock:
+            job = dict(self.job) if self.job else None
+            shadow = self.shadow
+            _, compiled, loaded, _ = handler.serving
+            status = {
+                "serving": {
+                    "path": handler.loadedPath,
+                    "artifactVersion": handler.artifactVersion,
+                    "modelLoaded": loaded,
+                    "backend": "compiled" if compiled is not None else "sklearn",
+                    "loadedAt": handler.loadedAt,
+                    "accuracy": handler.metadata.get("metrics", {}).get("accuracy"),
+                },
+                "job": job,
+                "swaps": self.swaps,
+                "lastSwap": self.lastSwap,
+            }
+        status["shadow"] = shadow.getStats() if shadow is not None else None
+        status["watch"] = {
+            "enabled": bool(self.watchThread and self.watchThread.is_alive()),
+            "intervalSeconds": self.watchInterval,
+            "mode": self.watchMode,
+        }
+        return status
@@ -0,0 +1,150 @@
+"""
+trainingData.py
+----------------
+Storage format for the processed training set shared by preprocess_cicids.py
+and trainRiskModel.py.
+
+Rows are kept column-wise with narrow dtypes: the three model features as
+float32 (trees split on float32 anyway) and the risk label as an int8 code
+(LABEL_MAP order). The output format follows the file extension:
+
+    .parquet  streamed row group per chunk, zstd-compressed (requires pyarrow)
+    .npz      compressed NumPy archive; chunks spill to temporary files next to the
+              output and are streamed into the archive on close, so memory stays bounded
+    .csv      plain text, streamed (the original format, kept for compatibility)
+"""
+
+import os
+import shutil
+import tempfile
+import zipfile
+import numpy as np
+import pandas as pd
+from typing import Dict, Tuple
+from app.ml.labeler import map_attack_label_to_risk
+from app.ml.modelInterface import LABEL_MAP
+
+# Model input columns, in the order the model expects them
+FEATURE_COLUMNS = ("length", "packet_mean", "packet_std")
+# Risk label -> integer class used for training
+RISK_CODES = {label: code for code, label in LABEL_MAP.items()}
+# Bytes copied at a time from the spill files into the .npz archive
+_COPY_BUFFER = 1 << 20
+
+
+def riskCodes(attackTypes: pd.Series, labelCache: Dict[str, int]) -> np.ndarray:
+    """
+    Maps 'Attack Type' values to risk codes by labelling each distinct value once.
+    'labelCache' carries the value -> code mapping across chunks.
+    """
+    codes, uniques = pd.factorize(attackTypes, use_na_sentinel=True)
+    lookup = np.empty(len(uniques) + 1, dtype=np.int8)
+    for position, value in enumerate(uniques):
+        code = labelCache.get(value)
+        if code is None:
+            code = RISK_CODES[map_attack_label_to_risk(value)]
+            labelCache[value] = code
+        lookup[position] = code
+    # Missing labels (sentinel -1) land on the last entry
+    lookup[-1] = RISK_CODES[map_attack_label_to_risk(None)]
+    return lookup[codes]
+
+
+class ProcessedWriter:
+    """
+    Streams processed chunks (feature columns + risk codes) to the output file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows: int = 0
+        self.parquetWriter = None
+        # .npz appends the raw column bytes to spill files until close()
+        self.featureSpill = None
+        self.riskSpill = None
+        self.csvHeaderWritten = False
+        if path.endswith(".parquet"):
+            try:
+                import pyarrow # noqa: F401
+            except ImportError as e:
+                raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow), or use a .npz/.csv output.") from e
+        elif path.endswith(".npz"):
+            # Next to the output rather than in /tmp, which may be too small for a full dataset
+            spillDirectory = os.path.dirname(os.path.abspath(path))
+            self.featureSpill = tempfile.TemporaryFile(dir=spillDirectory)
+            self.riskSpill = tempfile.TemporaryFile(dir=spillDirectory)
+        elif not path.endswith(".csv"):
+            raise ValueError(f"Unsupported output format: {path} (use .parquet, .npz or .csv)")
+
+    def write(self, features: np.ndarray, risk: np.ndarray) -> None:
+        """
+        Appends a chunk: 'features' is an (n, 3) float32 array, 'risk' an int8 array of codes.
+        """
+        self.rows += len(risk)
+        if self.path.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.table({
+                **{name: features[:, column] for column, name in enumerate(FEATURE_COLUMNS)},
+                "risk": risk,
+            })
+            if self.parquetWriter is None:
+                self.parquetWriter = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+            self.parquetWriter.write_table(table)
+        elif self.path.endswith(".npz"):
+            self.featureSpill.write(np.ascontiguousarray(features, dtype=np.float32).tobytes())
+            self.riskSpill.write(np.ascontiguousarray(risk, dtype=np.int8).tobytes())
+        else:
+            frame = pd.DataFrame(features, columns=FEATURE_COLUMNS)
+            frame["risk"] = pd.Categorical.from_codes(risk, categories=[LABEL_MAP[code] for code in sorted(LABEL_MAP)])
+            frame.to_csv(self.path, mode="a" if self.csvHeaderWritten else "w", header=not self.csvHeaderWritten, index=False)
+            self.csvHeaderWritten = True
+
+    def close(self) -> None:
+        if self.parquetWriter is not None:
+            self.parquetWriter.close()
+        elif self.featureSpill is not None:
+            try:
+                with zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                    _copySpill(archive, "features", self.featureSpill, np.float32, (self.rows, len(FEATURE_COLUMNS)))
+                    _copySpill(archive, "risk", self.riskSpill, np.int8, (self.rows,))
+                    with archive.open("columns.npy", "w") as entry:
+                        np.save(entry, np.asarray(FEATURE_COLUMNS))
+            finally:
+                self.featureSpill.close()
+                self.riskSpill.close()
+                self.featureSpill = self.riskSpill = None
+
+
+def _copySpill(archive: zipfile.ZipFile, name: str, spill, dtype, shape: Tuple[int, ...]) -> None:
+    """
+    Writes a raw C-order spill file into 'archive' as '<name>.npy', the layout np.savez_compressed produces.
+    """
+    with archive.open(f"{name}.npy", "w", force_zip64=True) as entry:
+        np.lib.format.write_array_header_1_0(entry, {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+            "fortran_order": False,
+            "shape": shape,
+        })
+        spill.seek(0)
+        shutil.copyfileobj(spill, entry, _COPY_BUFFER)
+
+
+def loadProcessed(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Loads a processed training set as (X float32 (n, 3), y int8 risk codes).
+    """
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=[*FEATURE_COLUMNS, "risk"])
+        X = np.column_stack([table.column(name).to_numpy() for name in FEATURE_COLUMNS]).astype(np.float32, copy=False)
+        y = table.column("risk").to_numpy().astype(np.int8, copy=False)
+        return X, y
+    if path.endswith(".npz"):
+        with np.load(path) as archive:
+            return archive["features"], archive["risk"]
+
+    frame = pd.read_csv(path, usecols=[*FEATURE_COLUMNS, "risk"], dtype={name: np.float32 for name in FEATURE_COLUMNS})
+    codes, uniques = pd.factorize(frame["risk"])
+    lookup = np.asarray([RISK_CODES.get(label, 0) for label in uniques] + [0], dtype=np.int8)
+    return frame[list(FEATURE_COLUMNS)].to_numpy(), lookup[codes]
@@ -0,0 +1,181 @@
+"""
+verdictCache.py
+----------------
+Memoizing layer in front of a BaseModelInterface.
+Many packets produce identical (or nearly identical) feature vectors, so verdicts
+are cached in a bounded LRU map keyed on the feature tuple, optionally quantized
+into buckets. Entries expire after a TTL, and the whole cache is invalidated
+automatically whenever the wrapped handler loads a new model.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.ml.modelInterface import BaseModelInterface
+
+
+class CachedModelHandler(BaseModelInterface):
+    """
+    Wraps a model handler with an LRU/TTL verdict cache.
+    'quantization' maps feature names to bucket widths; unlisted features are used as-is.
+    """
+
+    def __init__(
+        self,
+        model: BaseModelInterface,
+        maxEntries: int = 65536,
+        ttlSeconds: float = 0.0,
+        quantization: Optional[Dict[str, float]] = None,
+    ):
+        # Wrapped handler that computes verdicts on cache misses
+        self.model = model
+        self.maxEntries = max(1, maxEntries)
+        # 0 disables expiry
+        self.ttlSeconds = ttlSeconds
+        self.quantization = quantization or {}
+        # key -> (label, storedAt)
+        self.entries: "OrderedDict[Tuple, Tuple[str, float]]" = OrderedDict()
+        self.lock = threading.Lock()
+        # Model version the cached verdicts belong to
+        self.cachedVersion = self._modelVersion()
+        self.invalidations: int = 0
+        self._resetCounters()
+
+    def _resetCounters(self) -> None:
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.expirations: int = 0
+
+    def _modelVersion(self) -> int:
+        return getattr(self.model, "modelVersion", 0)
+
+    def _makeKey(self, features: Dict) -> Tuple:
+        """
+        Builds the cache key, snapping quantized features to their bucket index.
+        """
+        if not self.quantization:
+            return tuple(features.values())
+        key = []
+        for name, value in features.items():
+            width = self.quantization.get(name)
+            key.append(int(value // width) if width else value)
+        return tuple(key)
+
+    def _checkVersion(self) -> None:
+        """
+        Drops every cached verdict if the wrapped handler loaded another model.
+        Must be called with the lock held.
+        """
+        version = self._modelVersion()
+        if version != self.cachedVersion:
+            self.entries.clear()
+            self.cachedVersion = version
+            self.invalidations += 1
+
+    def _lookup(self, key: Tuple, now: float) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        label, storedAt = entry
+        if self.ttlSeconds and now - storedAt > self.ttlSeconds:
+            del self.entries[key]
+            self.expirations += 1
+            return None
+        self.entries.move_to_end(key)
+        return label
+
+    def _store(self, key: Tuple, label: str, now: float) -> None:
+        self.entries[key] = (label, now)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    # -----------------------------------------------------------------------
+    # BaseModelInterface
+    # -----------------------------------------------------------------------
+
+    def loadModel(self, modelPath: str = None) -> None:
+        """
+        Loads a new model into the wrapped handler and invalidates the cache.
+        """
+        self.model.loadModel(modelPath)
+        self.invalidate()
+
+    def predict(self, features: Dict) -> str:
+        return self.predictBatch([features])[0]
+
+    def predictBatch(self, featureRows: List[Dict]) -> List[str]:
+        """
+        Serves cached verdicts and scores all misses with a single call to the wrapped model.
+        The whole batch and its served labels then go to the wrapped handler's shadow model, if any.
+        """
+        start = time.perf_counter()
+        now = time.monotonic()
+        keys = [self._makeKey(features) for features in featureRows]
+        labels: List[Optional[str]] = [None] * len(featureRows)
+        missIndexes: Dict[Tuple, List[int]] = {}
+
+        with self.lock:
+            self._checkVersion()
+            version = self.cachedVersion
+            for index, key in enumerate(keys):
+                label = self._lookup(key, now)
+                if label is None:
+                    missIndexes.setdefault(key, []).append(index)
+                else:
+                    labels[index] = label
+            self.hits += len(keys) - sum(len(indexes) for indexes in missIndexes.values())
+            self.misses += sum(len(indexes) for indexes in missIndexes.values())
+
+        if missIndexes:
+            # Duplicate keys within the batch are scored once
+            missKeys = list(missIndexes)
+            missLabels = self.model.scoreBatch([featureRows[missIndexes[key][0]] for key in missKeys])
+            with self.lock:
+                # Don't cache stub verdicts or verdicts from a model replaced in the meantime
+                storeVerdicts = self._modelVersion() == version and getattr(self.model, "modelLoaded", True)
+                for key, label in zip(missKeys, missLabels):
+                    for index in missIndexes[key]:
+                        labels[index] = label
+                    if storeVerdicts:
+                        self._store(key, label, now)
+
+        shadow = getattr(self.model, "shadow", None)
+        if shadow is not None and labels:
+            shadow.submit(featureRows, labels, time.perf_counter() - start)
+        return labels
+
+    # -----------------------------------------------------------------------
+    # Cache Management
+    # -----------------------------------------------------------------------
+
+    def invalidate(self) -> None:
+        """
+        Discards every cached verdict.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.cachedVersion = self._modelVersion()
+            self.invalidations += 1
+
+    def getStats(self) -> Dict:
+        """
+        Returns hit/miss/eviction counters and the current cache size.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "maxEntries": self.maxEntries,
+                "ttlSeconds": self.ttlSeconds,
+                "quantization": self.quantization,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -3,28 +3,114 @@ packetRoutes.py
 ----------------
 Connects the PacketSniffer backend engine with REST endpoints.
 Provides APIs to start, stop, retrieve, and reset live packet capture sessions.
+The unscoped routes act on the default session; /{session}/... variants act on a named one.
+Packet lists are encoded by utils/wireFormat.py (JSON, MessagePack or Arrow; gzip/zstd).
 """
 
+import asyncio
+import json
 import os
-from fastapi import APIRouter, Depends, HTTPException, status
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.security import APIKeyHeader
+from app import config
+from app.capture.packetParser import getModelHandler
 from app.capture.packetSniffer import PacketSniffer
+from app.capture.sessionManager import DEFAULT_SESSION, CaptureSessionManager
+from app.capture.packetStream import PacketStreamCursor, SlowConsumerError
+from app.capture.pcapReplay import PcapReplay
+from app.enrichment.ipEnricher import getEnricher
+from app.ml.modelSwap import ModelSwapManager
+from app.utils import metrics, startupProfiler, wireFormat
 
 API_KEY_NAME = "X-API-Key"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=True)
 
+def is_valid_api_key(api_key: Optional[str]) -> bool:
+    return api_key == os.getenv("API_KEY", "default-secret-key")
+
 def verify_api_key(api_key: str = Depends(api_key_header)):
-    expected_api_key = os.getenv("API_KEY", "default-secret-key")
-    if api_key != expected_api_key:
+    if not is_valid_api_key(api_key):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or missing API Key",
         )
     return api_key
 
-# Initialize router and packet sniffer instance
+# Initialize router and capture sessions
 router = APIRouter(dependencies=[Depends(verify_api_key)])
-sniffer = PacketSniffer()
+# WebSocket clients cannot send custom headers from browsers, so this router checks the key itself
+streamRouter = APIRouter()
+# Prometheus scrape endpoint, mounted at the application root
+metricsRouter = APIRouter()
+sessionManager = CaptureSessionManager(config.SESSION_MAX_COUNT, config.SESSION_BUFFER_BUDGET)
+# Number of connected push-stream clients (SSE + WebSocket)
+activeStreamClients = 0
+# Current (or last finished) offline pcap replay job
+activeReplay: Optional[PcapReplay] = None
+# Background loading, validation and hot swap of the serving risk model (see getModelManager())
+modelManager: Optional[ModelSwapManager] = None
+
+
+def getModelManager() -> ModelSwapManager:
+    """
+    Creates the model swap manager on first use, which also loads the model.
+    """
+    global modelManager
+    if modelManager is None:
+        modelManager = ModelSwapManager(getModelHandler())
+        if config.MODEL_WATCH_INTERVAL > 0:
+            modelManager.startWatching()
+    return modelManager
+
+
+def _lookupSession(name: str) -> PacketSniffer:
+    sniffer = sessionManager.get(name)
+    if sniffer is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown capture session '{name}'.")
+    return sniffer
+
+
+def getSession(request: Request) -> PacketSniffer:
+    """
+    Resolves the session named in the path, or the default session for unscoped routes.
+    """
+    return _lookupSession(request.path_params.get("session", DEFAULT_SESSION))
+
+
+def _newStreamCursor(sniffer: PacketSniffer, sinceId: Optional[int]) -> PacketStreamCursor:
+    return PacketStreamCursor(
+        sniffer,
+        sinceId=sinceId,
+        maxBatch=config.STREAM_MAX_BATCH,
+        maxBacklog=config.STREAM_MAX_BACKLOG,
+        policy=config.STREAM_SLOW_CONSUMER_POLICY,
+    )
+
+
+def _packetResponse(
+    envelope: dict,
+    packets: list,
+    format: Optional[str],
+    layout: str,
+    accept: Optional[str],
+    acceptEncoding: Optional[str],
+) -> Response:
+    """
+    Serializes a packet list in the negotiated format and encoding, bypassing FastAPI's JSON encoder.
+    """
+    try:
+        fmt = wireFormat.negotiateFormat(format, accept)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=str(e))
+    body, mediaType, headers = wireFormat.encodeResponse(
+        envelope, packets, fmt, layout, wireFormat.negotiateEncoding(acceptEncoding)
+    )
+    return Response(content=body, media_type=mediaType, headers=headers)
 
 
 # ---------------------------------------------------------------------------
@@ -32,53 +118,487 @@ sniffer = PacketSniffer()
 # ---------------------------------------------------------------------------
 
 @router.post("/start")
-async def startPacketCapture():
+async def startPacketCapture(
+    iface: Optional[str] = None,
+    profile: Optional[str] = None,
+    filter: Optional[str] = None,
+    sample_rate: Optional[int] = Query(None, ge=1),
+    exclude_self: Optional[bool] = None,
+    sniffer: PacketSniffer = Depends(getSession),
+):
     """
     Starts the sequential packet capture thread.
+    'filter' is a BPF expression combined with the named 'profile'; 'sample_rate' keeps 1 in N flows.
+    Unset parameters fall back to the CAPTURE_* configuration.
     """
     if sniffer.isCapturing:
         return {"status": "already_running", "detail": "Packet capture session is already active."}
 
-    sniffer.startCapture()
-    return {"status": "started", "detail": "Packet capture initiated successfully."}
+    try:
+        # The first start loads Scapy, the model and the enrichment datasets
+        await asyncio.to_thread(sniffer.startCapture, iface, profile, filter, sample_rate, exclude_self)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    if config.MODEL_WATCH_INTERVAL > 0:
+        await asyncio.to_thread(getModelManager)
+    return {
+        "status": "started",
+        "detail": "Packet capture initiated successfully.",
+        "capture": sniffer.captureSettings.toDict(),
+    }
 
 
 @router.post("/stop")
-async def stopPacketCapture():
+async def stopPacketCapture(sniffer: PacketSniffer = Depends(getSession)):
     """
     Stops the currently active packet capture session.
     """
     if not sniffer.isCapturing:
         return {"status": "not_running", "detail": "No active capture session found."}
 
-    sniffer.stopCapture()
+    # Joins the capture, parse and inference threads (and shard processes)
+    await asyncio.to_thread(sniffer.stopCapture)
     return {"status": "stopped", "detail": "Packet capture stopped successfully."}
 
 
 @router.get("/latest")
-async def getLatestPackets(limit: int = 50):
+async def getLatestPackets(
+    limit: int = Query(50, ge=1, le=config.PACKET_BUFFER_SIZE),
+    since_id: Optional[int] = Query(None, ge=0),
+    risk: Optional[str] = None,
+    protocol: Optional[str] = None,
+    source: Optional[str] = None,
+    format: Optional[str] = Query(None, pattern="^(json|msgpack|arrow)$"),
+    layout: str = Query("rows", pattern="^(rows|columns)$"),
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    sniffer: PacketSniffer = Depends(getSession),
+):
     """
     Retrieves the most recent packets captured by the sniffer.
+    With 'since_id', returns up to 'limit' packets stored after that ID instead (oldest first);
+    pass the returned 'nextCursor' as the next 'since_id' to page through new packets.
+    'risk', 'protocol' and 'source' filter the stored packets.
+    'format' (or the Accept header) selects JSON, MessagePack or Arrow IPC; layout=columns sends
+    one array per field instead of one object per packet. Accept-Encoding enables gzip/zstd.
     """
-    packets = sniffer.getCapturedPackets(limit=limit)
-    return {"count": len(packets), "packets": packets}
+    latestId = sniffer.getLatestId()
+    if risk is not None or protocol is not None or source is not None:
+        packets = sniffer.queryPackets(risk=risk, protocol=protocol, source=source, sinceId=since_id, limit=limit)
+        evicted = 0 if since_id is None else sniffer.getPacketsSince(since_id, 0)[1]
+        # A short page means every stored packet up to latestId was scanned
+        nextCursor = packets[-1]["id"] if packets and len(packets) == limit and since_id is not None else latestId
+    elif since_id is None:
+        packets = sniffer.getCapturedPackets(limit=limit)
+        evicted = 0
+        nextCursor = packets[-1]["id"] if packets else latestId
+    else:
+        packets, evicted = sniffer.getPacketsSince(since_id, limit)
+        # Skip past evicted packets so they are only reported once
+        nextCursor = packets[-1]["id"] if packets else since_id + evicted
+    envelope = {
+        "count": len(packets),
+        "evicted": evicted,
+        "latestId": latestId,
+        "nextCursor": nextCursor,
+    }
+    return _packetResponse(envelope, packets, format, layout, accept, accept_encoding)
 
 
 @router.delete("/reset")
-async def resetSession():
+async def resetSession(sniffer: PacketSniffer = Depends(getSession)):
     """
-    Resets all sniffer state, clears captured data, and restarts packet ID sequence.
+    Resets the session's sniffer state, clears its captured data, and restarts its packet ID sequence.
+    Other sessions keep running untouched.
     """
-    sniffer.resetCapture()
+    await asyncio.to_thread(sniffer.resetCapture)
     return {"status": "reset", "detail": "Capture session and ID counter cleared."}
 
 
 @router.get("/status")
-async def getStatus():
+async def getStatus(sniffer: PacketSniffer = Depends(getSession)):
     """
-    Returns the current operational status of the packet sniffer.
+    Returns the current operational status of the session's packet sniffer.
     """
     return {
+        "session": sniffer.name,
         "isCapturing": sniffer.isCapturing,
-        "totalCaptured": len(sniffer.capturedPackets)
+        "totalCaptured": len(sniffer.capturedPackets),
+        "streamClients": activeStreamClients,
+        "pipeline": sniffer.getPipelineStats(),
+        "latency": metrics.registry.latencySummary(metrics.STAGE_LATENCY),
+    }
+
+
+@router.get("/sessions")
+async def listSessions():
+    """
+    Lists every capture session with its state, capture settings, resource limits and counters.
+    """
+    return {
+        "count": len(sessionManager.sessions),
+        "maxSessions": sessionManager.maxSessions,
+        "bufferBudget": sessionManager.bufferBudget,
+        "bufferUsed": sessionManager.bufferUsage(),
+        "sessions": sessionManager.getSummary(),
+    }
+
+
+@router.post("/sessions/{name}")
+async def createSession(
+    name: str,
+    buffer_size: Optional[int] = Query(None, ge=1),
+    queue_capacity: Optional[int] = Query(None, ge=1),
+    workers: Optional[int] = Query(None, ge=1),
+    max_pps: Optional[float] = Query(None, ge=0),
+):
+    """
+    Creates an idle capture session; start it with POST /{name}/start.
+    'buffer_size' packets are kept in memory (counted against SESSION_BUFFER_BUDGET), 'queue_capacity' bounds
+    each pipeline queue, 'workers' sets the parse threads (or shard processes) and 'max_pps' caps admitted packets.
+    """
+    if sessionManager.get(name) is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Capture session '{name}' already exists.")
+    try:
+        sniffer = sessionManager.create(name, buffer_size, queue_capacity, workers, max_pps)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return {"status": "created", "detail": f"Capture session '{name}' created.", "limits": sniffer.getLimits()}
+
+
+@router.delete("/sessions/{name}")
+async def removeSession(name: str):
+    """
+    Stops a capture session and discards its packets and statistics.
+    """
+    try:
+        removed = await asyncio.to_thread(sessionManager.remove, name)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    if not removed:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown capture session '{name}'.")
+    return {"status": "removed", "detail": f"Capture session '{name}' removed."}
+
+
+@router.get("/stats")
+async def getTrafficStats(
+    window: Optional[int] = Query(None, ge=1),
+    top: int = Query(10, ge=1, le=config.STATS_TOP_CAPACITY),
+    sniffer: PacketSniffer = Depends(getSession),
+):
+    """
+    Server-side dashboard statistics over sliding windows: packet/byte rates, protocol mix, risk rates,
+    top talkers (Space-Saving) and distinct hosts (HyperLogLog), plus session totals and a per-bucket timeline.
+    The cost depends on the number of buckets and sketch sizes, not on the packet volume.
+    """
+    try:
+        # A new bucket period re-merges the closed buckets, so keep that off the event loop
+        return await asyncio.to_thread(sniffer.aggregator.snapshot, window, top)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+
+@router.get("/alerts")
+async def getAlerts(
+    since_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=config.DETECTOR_MAX_ALERTS),
+    sniffer: PacketSniffer = Depends(getSession),
+):
+    """
+    Returns scan/flood alerts raised by the streaming detectors after 'since_id', oldest first.
+    """
+    if sniffer.detector is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Streaming detectors are disabled (DETECTOR_ENABLED).")
+    alerts = sniffer.detector.getAlerts(since_id, limit)
+    return {
+        "count": len(alerts),
+        "nextCursor": alerts[-1]["id"] if alerts else since_id,
+        "alerts": alerts,
+        "detector": sniffer.detector.getStats(),
+    }
+
+
+@router.get("/stream")
+async def streamPackets(
+    request: Request,
+    since_id: Optional[int] = None,
+    last_event_id: Optional[str] = Header(None),
+    sniffer: PacketSniffer = Depends(getSession),
+):
+    """
+    Server-Sent Events stream pushing only newly stored packets, coalesced per tick.
+    Reconnecting clients resume from the Last-Event-ID header (or 'since_id').
+    """
+    global activeStreamClients
+    if activeStreamClients >= config.STREAM_MAX_CLIENTS:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many stream clients.")
+
+    if since_id is None and last_event_id and last_event_id.isdigit():
+        since_id = int(last_event_id)
+    cursor = _newStreamCursor(sniffer, since_id)
+    interval = 1.0 / config.STREAM_MAX_FPS
+
+    async def eventStream():
+        global activeStreamClients
+        activeStreamClients += 1
+        lastSent = time.monotonic()
+        try:
+            while not await request.is_disconnected():
+                try:
+                    frame = cursor.nextFrame()
+                except SlowConsumerError as e:
+                    yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+                    return
+                if frame is not None:
+                    yield f"event: packets\nid: {frame['cursor']}\ndata: {json.dumps(frame)}\n\n"
+                    lastSent = time.monotonic()
+                elif time.monotonic() - lastSent > 15.0:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    lastSent = time.monotonic()
+                await asyncio.sleep(interval)
+        finally:
+            activeStreamClients -= 1
+
+    return StreamingResponse(eventStream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@streamRouter.websocket("/ws")
+async def packetWebSocket(websocket: WebSocket, since_id: Optional[int] = None, api_key: Optional[str] = None):
+    """
+    WebSocket stream pushing only newly stored packets, coalesced per tick.
+    Authenticates with the 'api_key' query parameter or the X-API-Key header.
+    """
+    global activeStreamClients
+    if not is_valid_api_key(api_key or websocket.headers.get(API_KEY_NAME)):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if activeStreamClients >= config.STREAM_MAX_CLIENTS:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    sniffer = sessionManager.get(websocket.path_params.get("session", DEFAULT_SESSION))
+    if sniffer is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Unknown capture session.")
+        return
+
+    await websocket.accept()
+    cursor = _newStreamCursor(sniffer, since_id)
+    interval = 1.0 / config.STREAM_MAX_FPS
+    activeStreamClients += 1
+    try:
+        while True:
+            frame = cursor.nextFrame()
+            if frame is not None:
+                # A client that cannot absorb a frame in time is treated as a slow consumer
+                await asyncio.wait_for(websocket.send_json(frame), timeout=config.STREAM_SEND_TIMEOUT)
+            await asyncio.sleep(interval)
+    except SlowConsumerError as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e)[:120])
+    except (WebSocketDisconnect, asyncio.TimeoutError, RuntimeError):
+        pass
+    finally:
+        activeStreamClients -= 1
+
+
+@router.post("/replay")
+async def startReplay(file: str, speed: float = Query(0.0, ge=0.0), format: str = Query("jsonl", pattern="^(jsonl|csv)$"), limit: Optional[int] = Query(None, ge=1)):
+    """
+    Replays a pcap/pcapng file from REPLAY_INPUT_DIR offline through parse -> features -> classify.
+    Scored packets are written to a results file in REPLAY_OUTPUT_DIR; poll GET /replay for progress.
+    """
+    global activeReplay
+    if activeReplay is not None and activeReplay.state == "running":
+        return {"status": "already_running", "detail": "A replay job is already active.", "replay": activeReplay.getSummary()}
+
+    inputDir = os.path.realpath(config.REPLAY_INPUT_DIR)
+    path = os.path.realpath(os.path.join(inputDir, file))
+    if os.path.commonpath([inputDir, path]) != inputDir or not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Capture file not found.")
+
+    os.makedirs(config.REPLAY_OUTPUT_DIR, exist_ok=True)
+    baseName = os.path.splitext(os.path.basename(path))[0]
+    outputPath = os.path.join(config.REPLAY_OUTPUT_DIR, f"{baseName}-{time.strftime('%Y%m%d-%H%M%S')}.{format}")
+    activeReplay = PcapReplay(path, outputPath=outputPath, speed=speed, limit=limit)
+    threading.Thread(target=activeReplay.run, name="pcap-replay", daemon=True).start()
+    return {"status": "started", "detail": "Replay started.", "replay": activeReplay.getSummary()}
+
+
+@router.get("/replay")
+async def getReplayStatus():
+    """
+    Returns progress and throughput of the current or last replay job.
+    """
+    if activeReplay is None:
+        return {"status": "idle", "replay": None}
+    return {"status": activeReplay.state, "replay": activeReplay.getSummary()}
+
+
+@router.post("/replay/stop")
+async def stopReplay():
+    """
+    Stops the running replay job; packets scored so far stay in the results file.
+    """
+    if activeReplay is None or activeReplay.state != "running":
+        return {"status": "not_running", "detail": "No active replay job found."}
+
+    activeReplay.stop()
+    return {"status": "stopping", "detail": "Replay stop requested."}
+
+
+def _requireCaptureLog(sniffer: PacketSniffer):
+    if sniffer.captureLog is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Capture log is disabled (CAPTURE_LOG_DIR).")
+    return sniffer.captureLog
+
+
+def _queryHistory(query, *args):
+    """
+    Runs a capture log query and enriches the result; the log itself stores no enrichment.
+    """
+    packets = query(*args)
+    enricher = getEnricher()
+    if enricher is not None:
+        enricher.enrichBatch(packets)
+    return packets
+
+
+@router.get("/history")
+async def getHistoryStatus(sniffer: PacketSniffer = Depends(getSession)):
+    """
+    Returns the segments, epochs and size of the session's durable capture log.
+    """
+    return _requireCaptureLog(sniffer).getStats(includeSegments=True)
+
+
+@router.get("/history/ids")
+async def getHistoryByIds(
+    start_id: int = Query(..., ge=0),
+    end_id: Optional[int] = Query(None, ge=0),
+    limit: int = Query(1000, ge=1, le=100000),
+    epoch: Optional[int] = Query(None, ge=0),
+    format: Optional[str] = Query(None, pattern="^(json|msgpack|arrow)$"),
+    layout: str = Query("rows", pattern="^(rows|columns)$"),
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    sniffer: PacketSniffer = Depends(getSession),
+):
+    """
+    Returns logged packets with start_id <= id <= end_id from one capture epoch (latest by default).
+    IDs restart after a reset, and every restart opens a new epoch.
+    """
+    captureLog = _requireCaptureLog(sniffer)
+    packets = await asyncio.to_thread(_queryHistory, captureLog.queryIds, start_id, end_id, limit, epoch)
+    envelope = {
+        "count": len(packets),
+        "truncated": len(packets) == limit,
+        "nextStartId": packets[-1]["id"] + 1 if packets else None,
     }
+    # Large history pages are serialized off the event loop, like the query itself
+    return await asyncio.to_thread(_packetResponse, envelope, packets, format, layout, accept, accept_encoding)
+
+
+@router.get("/history/time")
+async def getHistoryByTime(
+    start: datetime,
+    end: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=100000),
+    format: Optional[str] = Query(None, pattern="^(json|msgpack|arrow)$"),
+    layout: str = Query("rows", pattern="^(rows|columns)$"),
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    sniffer: PacketSniffer = Depends(getSession),
+):
+    """
+    Returns logged packets captured between 'start' and 'end' (ISO 8601 or Unix seconds).
+    """
+    captureLog = _requireCaptureLog(sniffer)
+    startTime = start.timestamp()
+    endTime = end.timestamp() if end is not None else None
+    packets = await asyncio.to_thread(_queryHistory, captureLog.queryTime, startTime, endTime, limit)
+    envelope = {
+        "count": len(packets),
+        "truncated": len(packets) == limit,
+    }
+    return await asyncio.to_thread(_packetResponse, envelope, packets, format, layout, accept, accept_encoding)
+
+
+@router.get("/model")
+async def getModelStatus():
+    """
+    Returns the serving model, the current/last load job and shadow scoring statistics.
+    """
+    return getModelManager().getStatus()
+
+
+@router.post("/model/load")
+async def loadModel(version: Optional[str] = None, mode: str = Query("swap", pattern="^(swap|shadow)$")):
+    """
+    Loads a registry version ("latest", "best" or a number; default MODEL_VERSION) in the background,
+    validates it on its held-out sample, then serves it (mode=swap) or scores alongside the serving model (mode=shadow).
+    Capture keeps running on the current model meanwhile; poll GET /model for the outcome.
+    With CAPTURE_MODE=process, swaps are reloaded by the shard workers and mode=shadow is rejected with 409.
+    """
+    if version is not None and version not in ("latest", "best") and not version.isdigit():
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="version must be 'latest', 'best' or a number.")
+    try:
+        started = getModelManager().requestLoad(version, mode)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    if not started:
+        return {"status": "already_running", "detail": "A model load is already in progress.", "model": getModelManager().getStatus()}
+    return {"status": "loading", "detail": f"Model load started (mode={mode}).", "model": getModelManager().getStatus()}
+
+
+@router.post("/model/promote")
+async def promoteShadowModel():
+    """
+    Makes the shadow model the serving model.
+    """
+    stats = getModelManager().promoteShadow()
+    if stats is None:
+        return {"status": "no_shadow", "detail": "No shadow model is running."}
+    return {"status": "promoted", "detail": "Shadow model is now serving.", "shadow": stats}
+
+
+@router.delete("/model/shadow")
+async def stopShadowModel():
+    """
+    Stops shadow scoring and returns its final statistics.
+    """
+    stats = getModelManager().stopShadow()
+    if stats is None:
+        return {"status": "no_shadow", "detail": "No shadow model is running."}
+    return {"status": "stopped", "detail": "Shadow scoring stopped.", "shadow": stats}
+
+
+@router.get("/debug/startup")
+async def getStartupReport(limit: int = Query(30, ge=1, le=1000)):
+    """
+    Returns backend startup time, the most expensive module imports and deferred loads (Scapy, model).
+    """
+    return startupProfiler.getReport(limit)
+
+
+@metricsRouter.get("/metrics", response_class=PlainTextResponse)
+async def getMetrics(api_key: Optional[str] = None, x_api_key: Optional[str] = Header(None)):
+    """
+    Pipeline counters, drops and per-stage latency histograms in the Prometheus text format.
+    Authenticates with the X-API-Key header or 'api_key' query parameter unless METRICS_REQUIRE_API_KEY=0.
+    """
+    if config.METRICS_REQUIRE_API_KEY and not is_valid_api_key(api_key or x_api_key):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or missing API Key")
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+# Session-scoped variants (/api/packets/{session}/...) are registered last,
+# so fixed two-segment paths such as /replay/stop are matched first
+SESSION_SCOPED_PATHS = (
+    "/start", "/stop", "/latest", "/reset", "/status", "/stats", "/alerts", "/stream",
+    "/history", "/history/ids", "/history/time",
+)
+for _route in list(router.routes):
+    if _route.path in SESSION_SCOPED_PATHS:
+        router.add_api_route(
+            "/{session}" + _route.path, _route.endpoint, methods=list(_route.methods), name=f"{_route.name}_session"
+        )
+streamRouter.add_api_websocket_route("/{session}/ws", packetWebSocket)
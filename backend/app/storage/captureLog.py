@@ -0,0 +1,434 @@
+"""
+captureLog.py
+--------------
+Durable, append-only on-disk log of parsed and scored packets.
+Packets are appended in batches as compact binary records to segment files.
+Every segment keeps a sparse index (one entry per INDEX_INTERVAL records)
+on packet ID and capture time, which is written next to the segment when it
+is sealed. Segments rotate by size or age, and the oldest are deleted once
+the log exceeds its retention limits.
+
+Range queries bisect the sparse index and decode records straight from an
+mmap of the segment, so only the requested records are ever materialized.
+
+Packet IDs restart when a capture session is reset, so the log tracks an
+'epoch' that increases whenever IDs go backwards; ID-range queries address
+one epoch (the latest by default), time-range queries span all of them.
+"""
+
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Record layout: total length, id, captureTime, length, sourcePort, destinationPort, tcpFlags,
+# followed by "source \x1f destination \x1f protocol \x1f risk \x1f timestamp" (UTF-8)
+RECORD_HEADER = struct.Struct("<IqdIHHH")
+# Sparse index entry: id, captureTime, byte offset of the record
+INDEX_ENTRY = struct.Struct("<qdQ")
+# One index entry per this many records
+INDEX_INTERVAL = 256
+FIELD_SEPARATOR = "\x1f"
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+INDEX_SUFFIX = ".idx"
+
+
+def encodeRecord(packetData: Dict, captureTime: float) -> bytes:
+    """
+    Serializes one packet into a length-prefixed binary record.
+    """
+    text = FIELD_SEPARATOR.join((
+        str(packetData["source"]),
+        str(packetData["destination"]),
+        str(packetData["protocol"]),
+        str(packetData.get("risk", "LOW")),
+        str(packetData["timestamp"]),
+    )).encode()
+    return RECORD_HEADER.pack(
+        RECORD_HEADER.size + len(text),
+        packetData["id"],
+        captureTime,
+        packetData["length"] & 0xFFFFFFFF,
+        packetData["sourcePort"] & 0xFFFF,
+        packetData["destinationPort"] & 0xFFFF,
+        packetData["tcpFlags"] & 0xFFFF,
+    ) + text
+
+
+def decodeRecord(data, offset: int) -> Tuple[Dict, int]:
+    """
+    Decodes the record at 'offset' and returns it with the offset of the next record.
+    """
+    recordLength, packetId, captureTime, length, sourcePort, destinationPort, tcpFlags = RECORD_HEADER.unpack_from(data, offset)
+    text = bytes(data[offset + RECORD_HEADER.size:offset + recordLength]).decode()
+    source, destination, protocol, risk, timestamp = text.split(FIELD_SEPARATOR)
+    packetData = {
+        "id": packetId,
+        "source": source,
+        "destination": destination,
+        "protocol": protocol,
+        "length": length,
+        "sourcePort": sourcePort,
+        "destinationPort": destinationPort,
+        "tcpFlags": tcpFlags,
+        "timestamp": timestamp,
+        "risk": risk,
+        "captureTime": captureTime,
+    }
+    return packetData, offset + recordLength
+
+
+class Segment:
+    """
+    One segment file plus its in-memory sparse index and ID/time bounds.
+    """
+
+    def __init__(self, path: str, epoch: int):
+        self.path = path
+        self.epoch = epoch
+        self.createdAt: float = time.time()
+        self.indexIds: List[int] = []
+        self.indexTimes: List[float] = []
+        self.indexOffsets: List[int] = []
+        self.firstId: Optional[int] = None
+        self.lastId: Optional[int] = None
+        self.firstTime: Optional[float] = None
+        self.lastTime: Optional[float] = None
+        self.records: int = 0
+        self.size: int = 0
+        self.sealed: bool = False
+
+    def addRecord(self, packetId: int, captureTime: float, offset: int, recordLength: int) -> None:
+        if self.records % INDEX_INTERVAL == 0:
+            self.indexIds.append(packetId)
+            self.indexTimes.append(captureTime)
+            self.indexOffsets.append(offset)
+        if self.firstId is None:
+            self.firstId, self.firstTime = packetId, captureTime
+        self.lastId, self.lastTime = packetId, captureTime
+        self.records += 1
+        self.size = offset + recordLength
+
+    def writeIndex(self) -> None:
+        with open(self.path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX, "wb") as indexFile:
+            for entry in zip(self.indexIds, self.indexTimes, self.indexOffsets):
+                indexFile.write(INDEX_ENTRY.pack(*entry))
+
+    def load(self) -> int:
+        """
+        Rebuilds the index and bounds by scanning the file; returns the size of the valid prefix.
+        A sealed segment's bounds come from its index file plus one scan from the last indexed record.
+        """
+        fileSize = os.path.getsize(self.path)
+        if fileSize == 0:
+            return 0
+        self.createdAt = os.path.getmtime(self.path)
+        with open(self.path, "rb") as segmentFile, mmap.mmap(segmentFile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            indexPath = self.path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+            if os.path.exists(indexPath):
+                with open(indexPath, "rb") as indexFile:
+                    entries = list(INDEX_ENTRY.iter_unpack(indexFile.read()))
+                if entries:
+                    # Resume the scan at the last indexed record instead of the start
+                    self.indexIds = [entry[0] for entry in entries[:-1]]
+                    self.indexTimes = [entry[1] for entry in entries[:-1]]
+                    self.indexOffsets = [entry[2] for entry in entries[:-1]]
+                    self.records = len(self.indexIds) * INDEX_INTERVAL
+                    self.firstId, self.firstTime = entries[0][0], entries[0][1]
+                    offset = entries[-1][2]
+
+            while offset + RECORD_HEADER.size <= fileSize:
+                recordLength, packetId, captureTime = struct.unpack_from("<Iqd", data, offset)
+                if recordLength < RECORD_HEADER.size or offset + recordLength > fileSize:
+                    # Partially written trailing record
+                    break
+                self.addRecord(packetId, captureTime, offset, recordLength)
+                offset += recordLength
+        return offset
+
+    def scan(self, startOffset: int, size: int, stopId: Optional[int] = None, stopTime: Optional[float] = None) -> Iterator[Dict]:
+        """
+        Decodes records between 'startOffset' and 'size' straight out of an mmap of the segment.
+        Yields nothing if the segment file no longer exists.
+        """
+        if size == 0:
+            return
+        try:
+            segmentFile = open(self.path, "rb")
+        except FileNotFoundError:
+            # Deleted by retention after the caller took its snapshot
+            return
+        with segmentFile, mmap.mmap(segmentFile.fileno(), size, access=mmap.ACCESS_READ) as data:
+            offset = startOffset
+            while offset < size:
+                packetData, offset = decodeRecord(data, offset)
+                if (stopId is not None and packetData["id"] > stopId) or (stopTime is not None and packetData["captureTime"] > stopTime):
+                    return
+                yield packetData
+
+    def offsetForId(self, packetId: int) -> int:
+        position = bisect.bisect_right(self.indexIds, packetId) - 1
+        return self.indexOffsets[max(0, position)]
+
+    def offsetForTime(self, captureTime: float) -> int:
+        # bisect_left so records sharing the indexed timestamp are not skipped
+        position = bisect.bisect_left(self.indexTimes, captureTime) - 1
+        return self.indexOffsets[max(0, position)]
+
+    def getStats(self) -> Dict:
+        return {
+            "file": os.path.basename(self.path),
+            "epoch": self.epoch,
+            "records": self.records,
+            "bytes": self.size,
+            "firstId": self.firstId,
+            "lastId": self.lastId,
+            "firstTime": self.firstTime,
+            "lastTime": self.lastTime,
+            "sealed": self.sealed,
+        }
+
+
+class CaptureLog:
+    """
+    Segmented append-only packet log with sparse ID/time indexes and range queries.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segmentBytes: int = 64 * 1024 * 1024,
+        segmentSeconds: float = 3600.0,
+        retentionBytes: int = 1024 * 1024 * 1024,
+        retentionSeconds: float = 0.0,
+        flushInterval: float = 1.0,
+    ):
+        self.directory = directory
+        self.segmentBytes = max(RECORD_HEADER.size, segmentBytes)
+        # 0 disables age-based rotation / retention
+        self.segmentSeconds = segmentSeconds
+        self.retentionBytes = retentionBytes
+        self.retentionSeconds = retentionSeconds
+        self.flushInterval = flushInterval
+        self.segments: List[Segment] = []
+        self.activeFile = None
+        self.lastFlush: float = time.monotonic()
+        self.epoch: int = 0
+        self.lastCaptureTime: float = 0.0
+        self.recordsWritten: int = 0
+        self.bytesWritten: int = 0
+        self.segmentsDeleted: int = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    # -----------------------------------------------------------------------
+    # Segment Management
+    # -----------------------------------------------------------------------
+
+    def _segmentPath(self, epoch: int, firstId: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{epoch:06d}-{firstId:012d}{SEGMENT_SUFFIX}")
+
+    def _recover(self) -> None:
+        """
+        Loads existing segments; the newest one is truncated to its last complete record and reopened.
+        """
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        for name in names:
+            epoch = int(name[len(SEGMENT_PREFIX):].split("-")[0])
+            segment = Segment(os.path.join(self.directory, name), epoch)
+            validSize = segment.load()
+            if segment.records == 0:
+                os.remove(segment.path)
+                continue
+            segment.sealed = True
+            self.segments.append(segment)
+            self.epoch = max(self.epoch, epoch)
+            self.lastCaptureTime = max(self.lastCaptureTime, segment.lastTime)
+
+        if self.segments:
+            active = self.segments[-1]
+            if os.path.getsize(active.path) > active.size:
+                with open(active.path, "r+b") as segmentFile:
+                    segmentFile.truncate(active.size)
+            indexPath = active.path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+            if os.path.exists(indexPath):
+                os.remove(indexPath)
+            active.sealed = False
+            self.activeFile = open(active.path, "ab")
+
+    def _sealActive(self) -> None:
+        if self.activeFile is None:
+            return
+        self.activeFile.close()
+        self.activeFile = None
+        active = self.segments[-1]
+        active.writeIndex()
+        active.sealed = True
+
+    def _rotate(self, epoch: int, firstId: int) -> Segment:
+        self._sealActive()
+        segment = Segment(self._segmentPath(epoch, firstId), epoch)
+        self.segments.append(segment)
+        self.activeFile = open(segment.path, "ab")
+        self._applyRetention()
+        return segment
+
+    def _applyRetention(self) -> None:
+        """
+        Deletes the oldest sealed segments beyond the size or age limits.
+        """
+        now = time.time()
+        while len(self.segments) > 1:
+            oldest = self.segments[0]
+            totalBytes = sum(segment.size for segment in self.segments)
+            overSize = self.retentionBytes and totalBytes > self.retentionBytes
+            overAge = self.retentionSeconds and oldest.lastTime is not None and now - oldest.lastTime > self.retentionSeconds
+            if not (overSize or overAge):
+                break
+            self.segments.pop(0)
+            for path in (oldest.path, oldest.path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.segmentsDeleted += 1
+
+    def _needsRotation(self, segment: Segment) -> bool:
+        if segment.size >= self.segmentBytes:
+            return True
+        return bool(self.segmentSeconds) and time.time() - segment.createdAt >= self.segmentSeconds
+
+    # -----------------------------------------------------------------------
+    # Writing
+    # -----------------------------------------------------------------------
+
+    def append(self, packets: List[Dict]) -> None:
+        """
+        Appends a batch of stored packets (with IDs) to the active segment.
+        """
+        if not packets:
+            return
+        with self.lock:
+            # Capture times never go backwards, so time ranges can bisect the index
+            captureTime = max(time.time(), self.lastCaptureTime)
+            self.lastCaptureTime = captureTime
+
+            segment = self.segments[-1] if self.segments else None
+            buffer = bytearray()
+            for packetData in packets:
+                packetId = packetData["id"]
+                restarted = segment is not None and segment.lastId is not None and packetId <= segment.lastId
+                if segment is None or restarted or self._needsRotation(segment):
+                    if restarted:
+                        # IDs went backwards (capture reset): start a new epoch
+                        self.epoch += 1
+                    self._writeBuffer(buffer)
+                    segment = self._rotate(self.epoch, packetId)
+
+                record = encodeRecord(packetData, captureTime)
+                segment.addRecord(packetId, captureTime, segment.size, len(record))
+                buffer += record
+            self._writeBuffer(buffer)
+
+            self.recordsWritten += len(packets)
+            if time.monotonic() - self.lastFlush >= self.flushInterval:
+                self.activeFile.flush()
+                self.lastFlush = time.monotonic()
+
+    def _writeBuffer(self, buffer: bytearray) -> None:
+        if buffer:
+            self.activeFile.write(buffer)
+            self.bytesWritten += len(buffer)
+            buffer.clear()
+
+    def flush(self) -> None:
+        with self.lock:
+            if self.activeFile is not None:
+                self.activeFile.flush()
+                self.lastFlush = time.monotonic()
+
+    def close(self) -> None:
+        """
+        Flushes and seals the active segment.
+        """
+        with self.lock:
+            self._sealActive()
+
+    # -----------------------------------------------------------------------
+    # Range Queries
+    # -----------------------------------------------------------------------
+
+    def _snapshot(self) -> List[Tuple[Segment, int]]:
+        """
+        Makes every appended record visible to mmap readers and returns each segment with its flushed size.
+        """
+        with self.lock:
+            if self.activeFile is not None:
+                self.activeFile.flush()
+            return [(segment, segment.size) for segment in self.segments]
+
+    def queryIds(self, startId: int, endId: Optional[int] = None, limit: int = 1000, epoch: Optional[int] = None) -> List[Dict]:
+        """
+        Returns up to 'limit' packets with startId <= id <= endId from one epoch (the latest by default).
+        """
+        segments = self._snapshot()
+        epoch = self.epoch if epoch is None else epoch
+        results: List[Dict] = []
+        for segment, size in segments:
+            if segment.epoch != epoch or segment.records == 0 or segment.lastId < startId:
+                continue
+            if endId is not None and segment.firstId > endId:
+                break
+            for packetData in segment.scan(segment.offsetForId(startId), size, stopId=endId):
+                if packetData["id"] < startId:
+                    continue
+                packetData["epoch"] = segment.epoch
+                results.append(packetData)
+                if len(results) >= limit:
+                    return results
+        return results
+
+    def queryTime(self, startTime: float, endTime: Optional[float] = None, limit: int = 1000) -> List[Dict]:
+        """
+        Returns up to 'limit' packets captured between startTime and endTime (epoch seconds).
+        """
+        segments = self._snapshot()
+        results: List[Dict] = []
+        for segment, size in segments:
+            if segment.records == 0 or segment.lastTime < startTime:
+                continue
+            if endTime is not None and segment.firstTime > endTime:
+                break
+            for packetData in segment.scan(segment.offsetForTime(startTime), size, stopTime=endTime):
+                if packetData["captureTime"] < startTime:
+                    continue
+                packetData["epoch"] = segment.epoch
+                results.append(packetData)
+                if len(results) >= limit:
+                    return results
+        return results
+
+    def getStats(self, includeSegments: bool = False) -> Dict:
+        with self.lock:
+            stats = {
+                "directory": self.directory,
+                "epoch": self.epoch,
+                "segments": len(self.segments),
+                "bytes": sum(segment.size for segment in self.segments),
+                "records": sum(segment.records for segment in self.segments),
+                "recordsWritten": self.recordsWritten,
+                "bytesWritten": self.bytesWritten,
+                "segmentsDeleted": self.segmentsDeleted,
+                "oldestTime": self.segments[0].firstTime if self.segments else None,
+                "newestTime": self.segments[-1].lastTime if self.segments else None,
+            }
+            if includeSegments:
+                stats["segmentList"] = [segment.getStats() for segment in self.segments]
+            return stats
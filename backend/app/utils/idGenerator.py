@@ -17,6 +17,8 @@ class PacketIDGenerator:
     def __init__(self):
         # Internal counter for packet IDs
         self.currentId: int = 0
+        # Incremented by every reset, so readers can tell restarted IDs from old ones
+        self.generation: int = 0
         # Lock ensures atomic increments
         self.lock = threading.Lock()
 
@@ -31,7 +33,8 @@ class PacketIDGenerator:
     def reset(self) -> None:
         """
         Resets the packet ID counter to zero.
-        Used when restarting a capture session.
+        Used when restarting a capture session; starts a new generation.
         """
         with self.lock:
             self.currentId = 0
+            self.generation += 1
@@ -3,45 +3,270 @@ logger.py
 ----------
 Implements a simple but robust logging utility for the UDON IDS backend.
 Logs key operational events to both console and file with timestamps.
+
+Records are handed to a bounded queue and written by a background listener
+thread (QueueHandler/QueueListener), so callers never wait on file or console
+I/O. Each level can be sampled and rate limited, per-packet events are folded
+into periodic summary lines, and every record that is not written is counted.
 """
 
+import atexit
 import logging
-from datetime import datetime
+import logging.handlers
 import os
+import queue
+import threading
+import time
+from typing import Dict, List
+from app import config
 
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
 
-class SystemLogger:
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
     """
-    Provides structured logging for backend modules with timestamps.
+    QueueHandler that drops (and counts) records instead of blocking when the queue is full.
+    """
+
+    def __init__(self, recordQueue: queue.Queue):
+        super().__init__(recordQueue)
+        self.dropped: int = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _LogChannel:
+    """
+    Shared queue, listener, sampling/rate-limit state and packet summary for one log name.
     """
 
     def __init__(self, name: str):
-        self.name = name
         logDirectory = "logs"
         os.makedirs(logDirectory, exist_ok=True)
 
         # Define log file path
         logFile = os.path.join(logDirectory, f"{name}.log")
 
-        # Configure logging format and handlers
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(asctime)s [%(levelname)s] %(message)s",
-            handlers=[
-                logging.FileHandler(logFile),
-                logging.StreamHandler()
-            ]
-        )
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers: List[logging.Handler] = [logging.FileHandler(logFile)]
+        if config.LOG_TO_CONSOLE:
+            handlers.append(logging.StreamHandler())
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        self.queueHandler = _DroppingQueueHandler(queue.Queue(maxsize=config.LOG_QUEUE_CAPACITY))
+        self.listener = logging.handlers.QueueListener(self.queueHandler.queue, *handlers)
+        self.listener.start()
+
         self.logger = logging.getLogger(name)
+        self.logger.setLevel(config.LOG_LEVEL)
+        self.logger.addHandler(self.queueHandler)
+        # Records only go through this channel's queue, never the root logger
+        self.logger.propagate = False
+
+        self.lock = threading.Lock()
+        # Per-level sampling accumulators and token buckets: level -> value
+        self.sampleCredit: Dict[int, float] = {}
+        self.tokens: Dict[int, float] = {}
+        self.refilledAt: Dict[int, float] = {}
+        self.sampledOut: int = 0
+        self.rateLimited: int = 0
+
+        # Packet events accumulated until the next summary line
+        self.packetCount: int = 0
+        self.packetBytes: int = 0
+        self.firstPacketId = None
+        self.lastPacketId = None
+        self.protocolCounts: Dict[str, int] = {}
+        self.riskCounts: Dict[str, int] = {}
+        self.summariesWritten: int = 0
+        self.summaryStarted: float = time.monotonic()
+        self.summaryThread = None
+        self.stopEvent = threading.Event()
+
+    # -----------------------------------------------------------------------
+    # Sampling and Rate Limiting
+    # -----------------------------------------------------------------------
+
+    def admit(self, level: int) -> bool:
+        """
+        Decides whether a record at 'level' is written, applying sampling first and rate limiting second.
+        """
+        levelName = logging.getLevelName(level)
+        sampleRate = config.LOG_SAMPLE_RATES.get(levelName, 1.0)
+        rateLimit = config.LOG_RATE_LIMITS.get(levelName, 0.0)
+        if sampleRate >= 1.0 and not rateLimit:
+            return True
+
+        with self.lock:
+            if sampleRate < 1.0:
+                # Deterministic 1-in-(1/rate) sampling
+                credit = self.sampleCredit.get(level, 1.0) + sampleRate
+                if credit < 1.0:
+                    self.sampleCredit[level] = credit
+                    self.sampledOut += 1
+                    return False
+                self.sampleCredit[level] = credit - 1.0
+
+            if rateLimit:
+                # Token bucket holding up to one second of records
+                now = time.monotonic()
+                elapsed = now - self.refilledAt.get(level, now)
+                tokens = min(rateLimit, self.tokens.get(level, rateLimit) + elapsed * rateLimit)
+                self.refilledAt[level] = now
+                if tokens < 1.0:
+                    self.tokens[level] = tokens
+                    self.rateLimited += 1
+                    return False
+                self.tokens[level] = tokens - 1.0
+        return True
+
+    # -----------------------------------------------------------------------
+    # Packet Summaries
+    # -----------------------------------------------------------------------
+
+    def addPackets(self, packets: List[Dict]) -> None:
+        protocolCounts = self.protocolCounts
+        riskCounts = self.riskCounts
+        with self.lock:
+            for packetData in packets:
+                protocol = packetData.get("protocol")
+                protocolCounts[protocol] = protocolCounts.get(protocol, 0) + 1
+                risk = packetData.get("risk")
+                riskCounts[risk] = riskCounts.get(risk, 0) + 1
+                self.packetBytes += packetData.get("length", 0)
+            if self.firstPacketId is None:
+                self.firstPacketId = packets[0].get("id")
+            self.lastPacketId = packets[-1].get("id")
+            self.packetCount += len(packets)
+            if self.summaryThread is None:
+                self.summaryThread = threading.Thread(target=self._summaryLoop, name="log-summary", daemon=True)
+                self.summaryThread.start()
+
+    def writeSummary(self) -> None:
+        """
+        Emits one line summarizing the packets seen since the previous summary.
+        """
+        with self.lock:
+            now = time.monotonic()
+            interval = now - self.summaryStarted
+            self.summaryStarted = now
+            if not self.packetCount:
+                return
+            count, totalBytes = self.packetCount, self.packetBytes
+            firstId, lastId = self.firstPacketId, self.lastPacketId
+            protocols = ", ".join(f"{name}={value}" for name, value in sorted(self.protocolCounts.items(), key=lambda item: -item[1]))
+            risks = ", ".join(f"{name}={value}" for name, value in sorted(self.riskCounts.items()))
+            self.packetCount = self.packetBytes = 0
+            self.firstPacketId = self.lastPacketId = None
+            self.protocolCounts.clear()
+            self.riskCounts.clear()
+            self.summariesWritten += 1
+
+        self.logger.info(
+            f"Captured {count} packets (#{firstId}-#{lastId}, {totalBytes} bytes) in {interval:.1f}s "
+            f"[{protocols}] risk [{risks}]"
+        )
+
+    def _summaryLoop(self) -> None:
+        while not self.stopEvent.wait(config.LOG_SUMMARY_INTERVAL):
+            self.writeSummary()
+
+    def close(self) -> None:
+        self.stopEvent.set()
+        self.writeSummary()
+        self.listener.stop()
+
+    def getStats(self) -> Dict:
+        with self.lock:
+            return {
+                "queued": self.queueHandler.queue.qsize(),
+                "queueCapacity": self.queueHandler.queue.maxsize,
+                "dropped": self.queueHandler.dropped,
+                "sampledOut": self.sampledOut,
+                "rateLimited": self.rateLimited,
+                "summaries": self.summariesWritten,
+                "pendingPackets": self.packetCount,
+            }
+
+
+# One channel per log name, shared by every SystemLogger using that name
+_channels: Dict[str, _LogChannel] = {}
+_channelsLock = threading.Lock()
+
+
+def _getChannel(name: str) -> _LogChannel:
+    with _channelsLock:
+        channel = _channels.get(name)
+        if channel is None:
+            channel = _LogChannel(name)
+            _channels[name] = channel
+        return channel
+
+
+@atexit.register
+def _closeChannels() -> None:
+    """
+    Writes the last packet summaries and drains every queue before the interpreter exits.
+    """
+    with _channelsLock:
+        for channel in _channels.values():
+            channel.close()
+        _channels.clear()
+
+
+class SystemLogger:
+    """
+    Provides structured logging for backend modules with timestamps.
+    Logging calls only enqueue the record; a listener thread does the writing.
+    The log file and listener are only set up by the first record, so constructing
+    a logger at import time costs nothing.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._channel = None
+
+    @property
+    def channel(self) -> _LogChannel:
+        if self._channel is None:
+            self._channel = _getChannel(self.name)
+        return self._channel
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self.channel.logger
+
+    def _log(self, level: int, message: str) -> None:
+        channel = self._channel or self.channel
+        if channel.logger.isEnabledFor(level) and channel.admit(level):
+            channel.logger.log(level, message)
+
+    def logDebug(self, message: str) -> None:
+        """Logs verbose diagnostic messages."""
+        self._log(logging.DEBUG, message)
 
     def logInfo(self, message: str) -> None:
         """Logs informational messages."""
-        self.logger.info(message)
+        self._log(logging.INFO, message)
 
     def logWarning(self, message: str) -> None:
         """Logs warnings or recoverable issues."""
-        self.logger.warning(message)
+        self._log(logging.WARNING, message)
 
     def logError(self, message: str) -> None:
         """Logs errors or exceptions."""
-        self.logger.error(message)
+        self._log(logging.ERROR, message)
+
+    def logPackets(self, packets: List[Dict]) -> None:
+        """Aggregates per-packet events into the next periodic summary line."""
+        if packets:
+            self.channel.addPackets(packets)
+
+    def getStats(self) -> Dict:
+        """Returns queue depth plus dropped, sampled-out and rate-limited record counts."""
+        return self.channel.getStats()
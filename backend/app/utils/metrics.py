@@ -0,0 +1,281 @@
+"""
+metrics.py
+-----------
+Low-overhead pipeline instrumentation rendered in the Prometheus text format.
+
+- LatencyHistogram: HDR-style log-linear buckets (4 per power of two, 1 us .. ~16 s).
+  Hot-path stages only time 1 in METRICS_SAMPLE_EVERY calls, so the untimed calls
+  cost one counter increment and a modulo.
+- Counter: exact totals for rare events such as parse errors and stub fallbacks.
+- Collectors: callbacks that turn existing stats (queue drops, cache hits, ...) into
+  samples at scrape time, so they add nothing to the hot path.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from app import config
+
+SUB_BUCKETS = 4
+# Largest tracked latency is 2^MAX_EXPONENT microseconds; slower observations land in +Inf
+MAX_EXPONENT = 24
+BUCKET_COUNT = 1 + MAX_EXPONENT * SUB_BUCKETS + 1
+
+# (name, labels, value) samples produced by a collector
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escapeLabel(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _bucketIndex(seconds: float) -> int:
+    micros = int(seconds * 1e6)
+    if micros < 1:
+        return 0
+    exponent = micros.bit_length() - 1
+    if exponent >= MAX_EXPONENT:
+        return BUCKET_COUNT - 1
+    # The two bits below the leading one pick the sub-bucket
+    subBucket = (micros >> (exponent - 2)) & 3 if exponent >= 2 else (micros << (2 - exponent)) & 3
+    return 1 + exponent * SUB_BUCKETS + subBucket
+
+
+def _bucketUpperBound(index: int) -> float:
+    """
+    Upper bound (seconds) of a bucket; the last bucket is unbounded.
+    """
+    if index == 0:
+        return 1e-6
+    if index >= BUCKET_COUNT - 1:
+        return float("inf")
+    exponent, subBucket = divmod(index - 1, SUB_BUCKETS)
+    return (SUB_BUCKETS + 1 + subBucket) * (1 << exponent) / SUB_BUCKETS * 1e-6
+
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram with optional 1-in-N sampling.
+    Usage on a hot path:
+        started = histogram.start()
+        ...
+        histogram.stop(started)
+    """
+
+    def __init__(self, sampleEvery: int = 1):
+        # Time 1 in 'sampleEvery' calls (0 disables timing)
+        self.sampleEvery = max(0, sampleEvery)
+        self.calls: int = 0
+        self.lock = threading.Lock()
+        self.counts: List[int] = [0] * BUCKET_COUNT
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.max: float = 0.0
+
+    def start(self) -> float:
+        """
+        Returns a start timestamp for sampled calls and 0.0 for the others.
+        """
+        if not self.sampleEvery:
+            return 0.0
+        # Unlocked: a lost increment only shifts which call gets sampled
+        self.calls += 1
+        if self.calls % self.sampleEvery:
+            return 0.0
+        return time.perf_counter()
+
+    def stop(self, started: float) -> None:
+        if started:
+            self.observe(time.perf_counter() - started)
+
+    def observe(self, seconds: float) -> None:
+        index = _bucketIndex(seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def snapshot(self) -> Tuple[List[int], int, float, float]:
+        with self.lock:
+            return list(self.counts), self.count, self.sum, self.max
+
+    def quantiles(self, quantiles: Iterable[float] = (0.5, 0.9, 0.99)) -> Dict[str, float]:
+        """
+        Returns the bucket upper bound (seconds) of each quantile, plus count and max.
+        """
+        counts, count, _, maximum = self.snapshot()
+        result: Dict[str, float] = {"count": count, "max": maximum}
+        for quantile in quantiles:
+            target = quantile * count
+            running = 0
+            value = 0.0
+            for index, bucketCount in enumerate(counts):
+                running += bucketCount
+                if count and running >= target:
+                    value = min(_bucketUpperBound(index), maximum)
+                    break
+            result[f"p{quantile * 100:g}"] = value
+        return result
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counts = [0] * BUCKET_COUNT
+            self.count = 0
+            self.sum = 0.0
+            self.max = 0.0
+
+
+class Counter:
+    """
+    Thread-safe monotonically increasing counter.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value: int = 0
+
+    def inc(self, amount: int = 1) -> None:
+        with self.lock:
+            self.value += amount
+
+
+class MetricsRegistry:
+    """
+    Holds labelled histograms, counters and scrape-time collectors and renders them for Prometheus.
+    """
+
+    def __init__(self, sampleEvery: int = 1):
+        self.sampleEvery = sampleEvery
+        self.lock = threading.Lock()
+        # name -> (helpText, {labelTuple: LatencyHistogram})
+        self.histograms: Dict[str, Tuple[str, Dict[Tuple, LatencyHistogram]]] = {}
+        # name -> (helpText, {labelTuple: Counter})
+        self.counters: Dict[str, Tuple[str, Dict[Tuple, Counter]]] = {}
+        # name -> (type, helpText) for collector samples
+        self.collectedTypes: Dict[str, Tuple[str, str]] = {}
+        self.collectors: List[Callable[[], List[Sample]]] = []
+
+    def histogram(self, name: str, helpText: str, sampleEvery: Optional[int] = None, **labels: str) -> LatencyHistogram:
+        """
+        Returns the histogram for (name, labels), creating it on first use.
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            _, series = self.histograms.setdefault(name, (helpText, {}))
+            if key not in series:
+                series[key] = LatencyHistogram(self.sampleEvery if sampleEvery is None else sampleEvery)
+            return series[key]
+
+    def counter(self, name: str, helpText: str, **labels: str) -> Counter:
+        """
+        Returns the counter for (name, labels), creating it on first use.
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            _, series = self.counters.setdefault(name, (helpText, {}))
+            if key not in series:
+                series[key] = Counter()
+            return series[key]
+
+    def describe(self, name: str, metricType: str, helpText: str) -> None:
+        """
+        Declares the type and help text of a metric produced by a collector.
+        """
+        self.collectedTypes[name] = (metricType, helpText)
+
+    def addCollector(self, collector: Callable[[], List[Sample]]) -> None:
+        with self.lock:
+            self.collectors.append(collector)
+
+    def removeCollector(self, collector: Callable[[], List[Sample]]) -> None:
+        with self.lock:
+            if collector in self.collectors:
+                self.collectors.remove(collector)
+
+    def latencySummary(self, name: str) -> Dict[str, Dict[str, float]]:
+        """
+        Returns p50/p90/p99 per label set of one histogram, keyed by its label values.
+        """
+        with self.lock:
+            _, series = self.histograms.get(name, ("", {}))
+            series = dict(series)
+        return {",".join(value for _, value in key): histogram.quantiles() for key, histogram in series.items()}
+
+    # -----------------------------------------------------------------------
+    # Prometheus Text Format
+    # -----------------------------------------------------------------------
+
+    @staticmethod
+    def _formatLabels(labels: Iterable[Tuple[str, str]]) -> str:
+        labels = list(labels)
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{_escapeLabel(value)}"' for key, value in labels) + "}"
+
+    @staticmethod
+    def _formatValue(value: float) -> str:
+        if value == float("inf"):
+            return "+Inf"
+        return repr(float(value)) if isinstance(value, float) else str(value)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self.lock:
+            histograms = {name: (helpText, dict(series)) for name, (helpText, series) in self.histograms.items()}
+            counters = {name: (helpText, dict(series)) for name, (helpText, series) in self.counters.items()}
+            collectors = list(self.collectors)
+
+        for name, (helpText, series) in sorted(histograms.items()):
+            lines.append(f"# HELP {name} {helpText}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in sorted(series.items()):
+                counts, count, total, _ = histogram.snapshot()
+                running = 0
+                for index, bucketCount in enumerate(counts):
+                    running += bucketCount
+                    # Export power-of-two bounds only; the finer buckets feed the quantiles
+                    if index == 0 or (index < BUCKET_COUNT - 1 and (index - 1) % SUB_BUCKETS == SUB_BUCKETS - 1):
+                        le = ("le", f"{_bucketUpperBound(index):.9g}")
+                        lines.append(f"{name}_bucket{self._formatLabels([*key, le])} {running}")
+                lines.append(f"{name}_bucket{self._formatLabels([*key, ('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{self._formatLabels(key)} {self._formatValue(total)}")
+                lines.append(f"{name}_count{self._formatLabels(key)} {count}")
+
+        for name, (helpText, series) in sorted(counters.items()):
+            lines.append(f"# HELP {name} {helpText}")
+            lines.append(f"# TYPE {name} counter")
+            for key, counter in sorted(series.items()):
+                lines.append(f"{name}{self._formatLabels(key)} {counter.value}")
+
+        collected: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+        for collector in collectors:
+            try:
+                samples = collector()
+            except Exception:
+                continue
+            for name, labels, value in samples:
+                collected.setdefault(name, []).append((labels, value))
+        for name, samples in sorted(collected.items()):
+            metricType, helpText = self.collectedTypes.get(name, ("gauge", name))
+            lines.append(f"# HELP {name} {helpText}")
+            lines.append(f"# TYPE {name} {metricType}")
+            for labels, value in samples:
+                lines.append(f"{name}{self._formatLabels(sorted(labels.items()))} {self._formatValue(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry used by the capture pipeline
+registry = MetricsRegistry(sampleEvery=config.METRICS_SAMPLE_EVERY)
+
+STAGE_LATENCY = "udon_stage_latency_seconds"
+STAGE_LATENCY_HELP = "Per-stage latency; per-packet stages are sampled 1 in METRICS_SAMPLE_EVERY calls"
+
+
+def stageLatency(stage: str, sampleEvery: Optional[int] = None) -> LatencyHistogram:
+    """
+    Returns the latency histogram of one pipeline stage.
+    """
+    return registry.histogram(STAGE_LATENCY, STAGE_LATENCY_HELP, sampleEvery=sampleEvery, stage=stage)
@@ -0,0 +1,147 @@
+"""
+startupProfiler.py
+-------------------
+Measures what backend startup spends its time on.
+install() puts a meta path finder in front of the import system that times
+the execution of every module loaded from a source, bytecode or extension
+file, splitting it into self and cumulative time (like 'python -X importtime').
+markReady() removes the finder again, so later imports run unhooked.
+Deferred work such as the first Scapy import or the model load is recorded
+as named phases. getReport() feeds the debug startup endpoint.
+"""
+
+import importlib.abc
+import importlib.machinery
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Loaders created once per module by the path finders; shared loaders cannot be wrapped safely
+_TIMED_LOADERS = (
+    importlib.machinery.SourceFileLoader,
+    importlib.machinery.SourcelessFileLoader,
+    importlib.machinery.ExtensionFileLoader,
+)
+
+_installedAt: Optional[float] = None
+_readyAt: Optional[float] = None
+_finder: Optional["_TimingFinder"] = None
+# module name -> [selfSeconds, cumulativeSeconds, secondsAfterInstall]
+_modules: Dict[str, List[float]] = {}
+# phase name -> [seconds, count]
+_phases: Dict[str, List[float]] = {}
+_phasesLock = threading.Lock()
+# Per-thread stack of [module, start, childSeconds] for nested imports
+_importStack = threading.local()
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """
+    Resolves specs through the remaining finders and times the execution of the modules they load.
+    """
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if isinstance(spec.loader, _TIMED_LOADERS):
+            _timeExecution(spec.loader, fullname)
+        return spec
+
+
+def _timeExecution(loader, fullname: str) -> None:
+    execModule = loader.exec_module
+
+    def timedExecModule(module):
+        stack = getattr(_importStack, "frames", None)
+        if stack is None:
+            stack = _importStack.frames = []
+        stack.append([fullname, time.perf_counter(), 0.0])
+        try:
+            execModule(module)
+        finally:
+            name, start, childSeconds = stack.pop()
+            now = time.perf_counter()
+            elapsed = now - start
+            if stack:
+                stack[-1][2] += elapsed
+            _modules[name] = [elapsed - childSeconds, elapsed, now - (_installedAt or now)]
+
+    loader.exec_module = timedExecModule
+
+
+def install() -> None:
+    """
+    Starts timing imports. Call before the application's own imports.
+    """
+    global _installedAt, _finder
+    if _installedAt is not None:
+        return
+    _installedAt = time.perf_counter()
+    _finder = _TimingFinder()
+    sys.meta_path.insert(0, _finder)
+
+
+def markReady() -> None:
+    """
+    Records the moment the application finished starting up and stops timing imports.
+    """
+    global _readyAt, _finder
+    if _readyAt is None:
+        _readyAt = time.perf_counter()
+    if _finder is not None:
+        if _finder in sys.meta_path:
+            sys.meta_path.remove(_finder)
+        _finder = None
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Times a block of deferred startup work (for example the first model load).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _phasesLock:
+            entry = _phases.setdefault(name, [0.0, 0])
+            entry[0] += elapsed
+            entry[1] += 1
+
+
+def getReport(limit: int = 30) -> Dict:
+    """
+    Returns startup time, the 'limit' most expensive module imports and the deferred phases.
+    """
+    modules = sorted(_modules.items(), key=lambda item: -item[1][1])
+    # Top-level packages (e.g. "scapy", "numpy") with their summed self time
+    packages: Dict[str, float] = {}
+    for name, (selfSeconds, _, _) in modules:
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0.0) + selfSeconds
+    with _phasesLock:
+        phases = {name: {"ms": seconds * 1000, "count": count} for name, (seconds, count) in _phases.items()}
+    return {
+        "profiling": _installedAt is not None,
+        "readyMs": (_readyAt - _installedAt) * 1000 if _readyAt is not None and _installedAt is not None else None,
+        "importMs": sum(selfSeconds for selfSeconds, _, _ in _modules.values()) * 1000,
+        "moduleCount": len(_modules),
+        "packages": [
+            {"package": name, "selfMs": seconds * 1000}
+            for name, seconds in sorted(packages.items(), key=lambda item: -item[1])[:limit]
+        ],
+        "modules": [
+            {"module": name, "selfMs": selfSeconds * 1000, "cumulativeMs": cumulative * 1000, "atMs": at * 1000}
+            for name, (selfSeconds, cumulative, at) in modules[:limit]
+        ],
+        "phases": phases,
+    }
@@ -0,0 +1,192 @@
+"""
+wireFormat.py
+--------------
+Content-negotiated encoding of packet list responses (/latest, /history/...).
+
+Packet lists are serialized straight to bytes instead of going through FastAPI's
+jsonable_encoder, and can be requested in more compact forms:
+
+    format  json (default) | msgpack | arrow   (or via the Accept header)
+    layout  rows (default, one object per packet) | columns (one array per field)
+
+Arrow IPC streams are always columnar. Bodies above WIRE_COMPRESS_MIN_BYTES are
+compressed with zstd or gzip when the client's Accept-Encoding allows it.
+
+orjson, msgpack, pyarrow and zstandard are optional: JSON falls back to the standard
+library, zstd falls back to gzip, and msgpack/arrow raise RuntimeError when missing.
+"""
+
+import gzip
+import importlib
+import json
+from typing import Dict, List, Optional, Tuple
+from app import config
+
+FORMATS = ("json", "msgpack", "arrow")
+LAYOUTS = ("rows", "columns")
+MEDIA_TYPES = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+_ACCEPT_FORMATS = {
+    "application/json": "json",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.msgpack": "msgpack",
+    "application/vnd.apache.arrow.stream": "arrow",
+}
+# Package providing each optional format or encoding
+_PACKAGES = {"msgpack": "msgpack", "arrow": "pyarrow", "zstd": "zstandard"}
+
+# Imported optional modules (None when not installed)
+_modules: Dict[str, Optional[object]] = {}
+
+
+def _optional(name: str):
+    if name not in _modules:
+        try:
+            _modules[name] = importlib.import_module(name)
+        except ImportError:
+            _modules[name] = None
+    return _modules[name]
+
+
+def _dumpsJson(value) -> bytes:
+    orjson = _optional("orjson")
+    if orjson is not None:
+        return orjson.dumps(value)
+    # Same compact output as FastAPI's JSONResponse
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _parseHeader(header: Optional[str]) -> List[Tuple[str, float]]:
+    """
+    Splits an Accept-style header into (value, quality) pairs, best first.
+    """
+    items = []
+    for position, part in enumerate((header or "").split(",")):
+        value, _, parameters = part.strip().partition(";")
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            name, _, number = parameter.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        if value and quality > 0:
+            items.append((value.strip().lower(), quality, position))
+    items.sort(key=lambda item: (-item[1], item[2]))
+    return [(value, quality) for value, quality, _ in items]
+
+
+def negotiateFormat(requested: Optional[str], accept: Optional[str]) -> str:
+    """
+    Picks the response format: the 'format' query parameter wins, then the Accept header, then JSON.
+    Raises RuntimeError when the chosen format needs a package that is not installed.
+    """
+    fmt = requested
+    if fmt is None:
+        fmt = next((_ACCEPT_FORMATS[value] for value, _ in _parseHeader(accept) if value in _ACCEPT_FORMATS), "json")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}' (use one of: {', '.join(FORMATS)}).")
+    package = _PACKAGES.get(fmt)
+    if package is not None and _optional(package) is None:
+        raise RuntimeError(f"The {fmt} format requires {package} (pip install {package}).")
+    return fmt
+
+
+def negotiateEncoding(acceptEncoding: Optional[str]) -> Optional[str]:
+    """
+    Returns "zstd" or "gzip" when the client accepts it (zstd only if zstandard is installed), else None.
+    """
+    accepted = dict(_parseHeader(acceptEncoding))
+    if "zstd" in accepted and _optional("zstandard") is not None:
+        return "zstd"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def toColumns(packets: List[Dict]) -> Dict[str, List]:
+    """
+    Turns packet dicts into one list per field; fields missing from a packet become None.
+    """
+    if not packets:
+        return {}
+    fields = tuple(packets[0])
+    if all(tuple(packetData) == fields for packetData in packets):
+        # Packets from the store share one key order, so the rows can be transposed directly
+        return dict(zip(fields, map(list, zip(*(packetData.values() for packetData in packets)))))
+    allFields = list(fields)
+    known = set(fields)
+    for packetData in packets:
+        for key in packetData:
+            if key not in known:
+                known.add(key)
+                allFields.append(key)
+    return {field: [packetData.get(field) for packetData in packets] for field in allFields}
+
+
+def _encodeArrow(envelope: Dict, packets: List[Dict]) -> bytes:
+    pyarrow = _optional("pyarrow")
+    arrays = {}
+    for field, values in toColumns(packets).items():
+        array = pyarrow.array(values)
+        # Addresses, protocols, risks and timestamps repeat heavily, so strings are dictionary-encoded
+        if pyarrow.types.is_string(array.type):
+            array = array.dictionary_encode()
+        arrays[field] = array
+    table = pyarrow.table(arrays)
+    # The envelope travels as schema metadata, JSON-encoded per key
+    table = table.replace_schema_metadata({key: _dumpsJson(value) for key, value in envelope.items()})
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode(envelope: Dict, packets: List[Dict], fmt: str = "json", layout: str = "rows") -> bytes:
+    """
+    Serializes a response envelope and its packets. With the columns layout (or arrow),
+    'packets' is replaced by 'columns': {field: [values...]}.
+    """
+    if fmt == "arrow":
+        return _encodeArrow(envelope, packets)
+    if layout == "columns":
+        body = {**envelope, "columns": toColumns(packets)}
+    else:
+        body = {**envelope, "packets": packets}
+    if fmt == "msgpack":
+        return _optional("msgpack").packb(body, use_bin_type=True)
+    return _dumpsJson(body)
+
+
+def compress(body: bytes, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """
+    Compresses 'body' with the negotiated encoding; small bodies are sent as they are.
+    Returns the body and the Content-Encoding actually applied.
+    """
+    if encoding is None or len(body) < config.WIRE_COMPRESS_MIN_BYTES:
+        return body, None
+    if encoding == "zstd":
+        return _optional("zstandard").ZstdCompressor(level=config.WIRE_ZSTD_LEVEL).compress(body), "zstd"
+    return gzip.compress(body, compresslevel=config.WIRE_GZIP_LEVEL, mtime=0), "gzip"
+
+
+def encodeResponse(
+    envelope: Dict,
+    packets: List[Dict],
+    fmt: str = "json",
+    layout: str = "rows",
+    encoding: Optional[str] = None,
+) -> Tuple[bytes, str, Dict[str, str]]:
+    """
+    Returns the (compressed) body, its media type and the response headers to set.
+    """
+    body, applied = compress(encode(envelope, packets, fmt, layout), encoding)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if applied is not None:
+        headers["Content-Encoding"] = applied
+    return body, MEDIA_TYPES[fmt], headers
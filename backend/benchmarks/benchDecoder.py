@@ -0,0 +1,80 @@
+"""
+benchDecoder.py
+----------------
+Compares the Scapy dissection path against the raw-bytes fast-path decoder.
+Synthetic frames are generated with Scapy, so no network interface is needed.
+
+Run from the backend directory:
+    python -m benchmarks.benchDecoder --packets 20000
+"""
+
+import argparse
+import random
+import time
+from scapy.all import Ether, IP, IPv6, TCP, UDP, ICMP, ARP, Raw # pylint: disable=no-name-in-module
+from app.capture.packetParser import parsePacket, parseRawFrame
+
+
+def buildFrames(count: int, seed: int = 42) -> list:
+    """
+    Builds a reproducible mix of IPv4/IPv6 TCP/UDP/ICMP frames plus some ARP for the fallback path.
+    """
+    rng = random.Random(seed)
+    frames = []
+    for index in range(count):
+        payload = Raw(b"x" * rng.randint(0, 1200))
+        choice = index % 10
+        if choice < 5:
+            packet = Ether() / IP(src=f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}", dst="10.1.0.1") \
+                / TCP(sport=rng.randint(1024, 65535), dport=443, flags="PA") / payload
+        elif choice < 8:
+            packet = Ether() / IP(src="192.168.1.10", dst="8.8.8.8") / UDP(sport=rng.randint(1024, 65535), dport=53) / payload
+        elif choice == 8:
+            packet = Ether() / IPv6(src="2001:db8::1", dst="2001:db8::2") / TCP(sport=40000, dport=80, flags="S")
+        else:
+            packet = Ether() / (ICMP() if index % 20 else ARP())
+        frames.append(bytes(packet))
+    return frames
+
+
+def timePath(label: str, frames: list, parseOne) -> float:
+    """
+    Runs parseOne over every frame and prints packets/sec for the path.
+    """
+    start = time.perf_counter()
+    for frame in frames:
+        parseOne(frame)
+    elapsed = time.perf_counter() - start
+    rate = len(frames) / elapsed
+    print(f"{label:<28} {elapsed * 1e6 / len(frames):10.2f} us/pkt {rate:14,.0f} pkt/s")
+    return rate
+
+
+def checkEquivalence(frames: list) -> int:
+    """
+    Counts frames whose fast-path packetData differs from the Scapy path (timestamps excluded).
+    """
+    mismatches = 0
+    for frame in frames:
+        scapyData = parsePacket(Ether(frame), 0, classify=False)
+        rawData = parseRawFrame(frame, 0, classify=False)
+        scapyData.pop("timestamp")
+        rawData.pop("timestamp")
+        if scapyData != rawData:
+            mismatches += 1
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Scapy vs. fast-path packet decoding")
+    parser.add_argument("--packets", type=int, default=20000, help="number of synthetic frames")
+    args = parser.parse_args()
+
+    frames = buildFrames(args.packets)
+    print(f"Decoding {len(frames)} synthetic frames (features and model excluded)\n")
+
+    scapyRate = timePath("scapy dissection", frames, lambda f: parsePacket(Ether(f), 0, classify=False))
+    rawRate = timePath("raw fast path", frames, lambda f: parseRawFrame(f, 0, classify=False))
+
+    print(f"\nSpeedup: {rawRate / scapyRate:.1f}x")
+    print(f"packetData mismatches: {checkEquivalence(frames[:2000])}")
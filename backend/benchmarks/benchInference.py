@@ -0,0 +1,77 @@
+"""
+benchInference.py
+------------------
+Compares sklearn RandomForestClassifier.predict against the compiled forest backend,
+both per packet and in batches, and verifies that both return identical predictions.
+Uses risk_model.pkl when present, otherwise trains a forest on synthetic features.
+
+Run from the backend directory:
+    python -m benchmarks.benchInference --rows 20000 --batch 256
+"""
+
+import argparse
+import os
+import time
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from app.ml.compiledForest import CompiledForest
+
+FEATURES = ["length", "packet_mean", "packet_std"]
+
+
+def syntheticFeatures(count: int, seed: int = 42) -> np.ndarray:
+    """
+    Draws feature rows with ranges similar to the processed CICIDS data.
+    """
+    rng = np.random.default_rng(seed)
+    return rng.random((count, len(FEATURES))) * [60000.0, 1500.0, 800.0]
+
+
+def loadOrTrainModel(modelPath: str):
+    if os.path.exists(modelPath):
+        print(f"Using trained model {modelPath}")
+        return joblib.load(modelPath)
+
+    print("risk_model.pkl not found; training a synthetic 100-tree forest")
+    X = syntheticFeatures(50000, seed=7)
+    rng = np.random.default_rng(7)
+    y = (X[:, 1] > 700).astype(int) + (X[:, 2] > 500).astype(int)
+    y = np.where(rng.random(len(y)) < 0.1, rng.integers(0, 3, len(y)), y)
+    return RandomForestClassifier(n_estimators=100, class_weight="balanced", random_state=42).fit(X, y)
+
+
+def timeCall(label: str, rows: int, call) -> float:
+    start = time.perf_counter()
+    call()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed * 1e6 / rows:10.2f} us/row {rows / elapsed:14,.0f} rows/s")
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sklearn vs. compiled forest inference")
+    parser.add_argument("--model", default="risk_model.pkl")
+    parser.add_argument("--rows", type=int, default=20000, help="rows scored in batch mode")
+    parser.add_argument("--single", type=int, default=500, help="rows scored one at a time")
+    parser.add_argument("--batch", type=int, default=256)
+    args = parser.parse_args()
+
+    model = loadOrTrainModel(args.model)
+    compiled = CompiledForest.fromSklearn(model, maxBatch=args.batch)
+    X = syntheticFeatures(args.rows)
+    featureRows = [dict(zip(FEATURES, row)) for row in X.tolist()]
+
+    expected = model.predict(X)
+    actual = compiled.predict(X)
+    print(f"Prediction mismatches: {int((expected != actual).sum())} / {len(X)}\n")
+
+    single = featureRows[:args.single]
+    timeCall("sklearn, one row per call", len(single), lambda: [model.predict(np.array([list(f.values())])) for f in single])
+    timeCall("compiled, one row per call", len(single), lambda: [compiled.predictRows([f]) for f in single])
+
+    batches = [X[start:start + args.batch] for start in range(0, len(X), args.batch)]
+    rowBatches = [featureRows[start:start + args.batch] for start in range(0, len(featureRows), args.batch)]
+    sklearnBatch = timeCall(f"sklearn, {args.batch}-row batches", len(X), lambda: [model.predict(b) for b in batches])
+    compiledBatch = timeCall(f"compiled, {args.batch}-row batches", len(X), lambda: [compiled.predictRows(b) for b in rowBatches])
+    print(f"\nBatch speedup: {sklearnBatch / compiledBatch:.1f}x")
@@ -0,0 +1,470 @@
+"""
+benchPipeline.py
+-----------------
+Reproducible benchmark suite for the capture -> score pipeline, driven by synthetic
+traffic (benchmarks/synthetic.py), so no network interface or root access is needed.
+
+Sections:
+- stages:  per-call latency percentiles and throughput of parsePacket, parseRawFrame,
+           extractFeatures, predict and predictBatch
+- e2e:     the real PacketSniffer pipeline (parse workers -> batched inference -> store)
+           fed from a synthetic capture thread; throughput and capture-to-store latency
+- memory:  retained bytes per stored packet for the ring and columnar stores
+- api:     GET /api/packets/latest response time at several buffer sizes
+- enrich:  reputation index build/load time, vectorized prefix lookups, and batch
+           enrichment with a cold and a hot address cache (plus MaxMind DB lookups
+           when ENRICH_MMDB_FILES is set)
+- wire:    bytes on the wire and serialization time per 1k packets for every response
+           format / layout / compression of the packet APIs, next to FastAPI's default encoder
+
+Results are written as JSON; --baseline compares them with an earlier run.
+
+Run from the backend directory:
+    python -m benchmarks.benchPipeline --output bench.json
+    python -m benchmarks.benchPipeline --baseline bench.json --fail-on-regression
+"""
+
+import os
+
+# Benchmarks must not touch the durable capture log, start watchers or drop packets
+os.environ.setdefault("CAPTURE_LOG_DIR", "")
+os.environ.setdefault("LOG_TO_CONSOLE", "0")
+os.environ.setdefault("MODEL_WATCH_INTERVAL", "0")
+os.environ.setdefault("QUEUE_FULL_POLICY", "block")
+os.environ.setdefault("CAPTURE_MODE", "thread")
+os.environ.setdefault("PARSE_WORKERS", "1")
+os.environ.setdefault("CAPTURE_EXCLUDE_SELF", "0")
+
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from app import config
+from app.capture.packetBuffer import PacketRingBuffer
+from app.capture.packetParser import getClassifier, getModelHandler, loadScapy, parsePacket, parseRawFrame
+from app.capture.packetStore import ColumnarPacketStore
+from app.enrichment.ipEnricher import IpEnricher, parseAddress
+from app.enrichment.mmdbReader import MmdbReader
+from app.enrichment.prefixIndex import PrefixIndex
+from app.ml.featureExtractor import extractFeatures
+from app.ml.flowTable import FlowTable
+from app.utils import wireFormat
+from benchmarks.synthetic import buildRawFrames, buildScapyPackets, buildStoredPackets
+
+STORE_CLASSES = {"ring": PacketRingBuffer, "columnar": ColumnarPacketStore}
+# Metrics compared against a baseline and the direction that counts as better
+HIGHER_IS_BETTER = ("perSecond",)
+LOWER_IS_BETTER = ("p50Us", "p99Us", "bytesPerPacket")
+
+
+# ---------------------------------------------------------------------------
+# Measurement Helpers
+# ---------------------------------------------------------------------------
+
+def summarize(samplesNs: List[int], totalNs: int, units: int) -> Dict:
+    """
+    Latency percentiles (microseconds per call) and throughput (units per second).
+    """
+    ordered = sorted(samplesNs)
+
+    def percentile(quantile: float) -> float:
+        return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))] / 1000 if ordered else 0.0
+
+    return {
+        "calls": len(ordered),
+        "units": units,
+        "seconds": totalNs / 1e9,
+        "perSecond": units / (totalNs / 1e9) if totalNs else 0.0,
+        "p50Us": percentile(0.50),
+        "p90Us": percentile(0.90),
+        "p99Us": percentile(0.99),
+        "p999Us": percentile(0.999),
+        "maxUs": ordered[-1] / 1000 if ordered else 0.0,
+    }
+
+
+def measure(items: List, call: Callable, units: Optional[int] = None, warmup: int = 200) -> Dict:
+    """
+    Times call(item) for every item; 'units' is the number of packets the items represent.
+    """
+    for item in items[:warmup]:
+        call(item)
+    clock = time.perf_counter_ns
+    samples = []
+    started = clock()
+    for item in items:
+        callStarted = clock()
+        call(item)
+        samples.append(clock() - callStarted)
+    return summarize(samples, clock() - started, len(items) if units is None else units)
+
+
+def report(name: str, result: Dict) -> None:
+    if "perSecond" in result:
+        line = f"{name:<40} {result['perSecond']:14,.0f} /s   p50 {result['p50Us']:9.2f} us   p99 {result['p99Us']:9.2f} us"
+        if "bytesPerPacket" in result:
+            line += f"   {result['bytesPerPacket']:8,.1f} bytes/packet"
+        print(line)
+    else:
+        print(f"{name:<40} {result['bytesPerPacket']:14,.1f} bytes/packet")
+
+
+# ---------------------------------------------------------------------------
+# Sections
+# ---------------------------------------------------------------------------
+
+def prepareModel(modelPath: str) -> None:
+    """
+    Serves the model at 'modelPath' (or a synthetic forest) through the regular handler.
+    """
+    from benchmarks.benchInference import loadOrTrainModel  # pylint: disable=import-outside-toplevel
+    handler = getModelHandler()
+    model = loadOrTrainModel(modelPath)
+    handler.swapIn(model, handler.compileModel(model), True, modelPath if os.path.exists(modelPath) else "synthetic")
+
+
+def benchStages(frames: List[bytes], batchSize: int, results: Dict) -> None:
+    handler = getModelHandler()
+    scapyPackets = buildScapyPackets(frames)
+
+    results["stage.parse.scapy"] = measure(scapyPackets, lambda packet: parsePacket(packet, 0, classify=False))
+    results["stage.parse.raw"] = measure(frames, lambda frame: parseRawFrame(frame, 0, classify=False))
+
+    parsed = [parseRawFrame(frame, 0, classify=False) for frame in frames]
+    parsed = [packetData for packetData in parsed if "risk" not in packetData]
+    table = FlowTable(idleTimeout=config.FLOW_IDLE_TIMEOUT, activeTimeout=config.FLOW_ACTIVE_TIMEOUT, maxFlows=config.FLOW_TABLE_MAX_FLOWS)
+    results["stage.features"] = measure(parsed, lambda packetData: extractFeatures(packetData, table), warmup=0)
+
+    table = FlowTable(idleTimeout=config.FLOW_IDLE_TIMEOUT, activeTimeout=config.FLOW_ACTIVE_TIMEOUT, maxFlows=config.FLOW_TABLE_MAX_FLOWS)
+    featureRows = [extractFeatures(packetData, table) for packetData in parsed]
+    batches = [featureRows[start:start + batchSize] for start in range(0, len(featureRows), batchSize)]
+    results["stage.predict.single"] = measure(featureRows[:5000], handler.predict)
+    results[f"stage.predict.batch{batchSize}"] = measure(batches, handler.predictBatch, units=len(featureRows), warmup=2)
+    classifier = getClassifier()
+    if classifier is not handler:
+        results[f"stage.predict.batch{batchSize}.cached"] = measure(batches, classifier.predictBatch, units=len(featureRows), warmup=2)
+
+
+def benchEndToEnd(frames: List[bytes], decoderMode: str, results: Dict, timeout: float = 300.0) -> None:
+    """
+    Runs the live pipeline with a synthetic capture thread in place of sniff().
+    Frames are dissected in that thread for DECODER_MODE=scapy, as sniff() would.
+    """
+    from app.capture.packetSniffer import PacketSniffer  # pylint: disable=import-outside-toplevel
+    sniffer = PacketSniffer()
+    sniffer.decoderMode = decoderMode
+    clock = time.perf_counter_ns
+    submitted: List[int] = []
+    stored: List[int] = []
+    storePackets = sniffer._storePackets
+
+    def onScored(packets):
+        stored.extend([clock()] * len(packets))
+        storePackets(packets)
+
+    def captureLoop(iface=None):
+        etherClass = loadScapy().Ether
+        for frame in frames:
+            submitted.append(clock())
+            sniffer._processPacket(etherClass(frame) if decoderMode == "scapy" else frame)
+
+    sniffer.inferenceStage.onScored = onScored
+    sniffer._captureLoop = captureLoop
+    sniffer.startCapture()
+    deadline = time.monotonic() + timeout
+    while len(stored) < len(frames) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sniffer.stopCapture()
+
+    stats = sniffer.getPipelineStats()
+    # One parse worker, one inference worker and a blocking queue keep packets in capture order
+    latencies = [storedAt - submittedAt for submittedAt, storedAt in zip(submitted, stored)]
+    result = summarize(latencies, (stored[-1] - submitted[0]) if stored else 0, len(stored))
+    result.update(dropped=stats["totalDropped"], parseErrors=stats["parse"]["errors"], avgBatch=stats["classify"]["avgBatchSize"])
+    results[f"e2e.{decoderMode}"] = result
+
+
+def benchMemory(sizes: List[int], results: Dict) -> None:
+    """
+    Measures memory retained by each packet store once it holds 'size' packets.
+    """
+    for storeName, storeClass in STORE_CLASSES.items():
+        for size in sizes:
+            gc.collect()
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            store = storeClass(size)
+            # Packets are created inside the traced region, like freshly parsed ones
+            packets = buildStoredPackets(size)
+            for start in range(0, size, 256):
+                store.extend(packets[start:start + 256])
+            del packets
+            gc.collect()
+            retained = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+            results[f"memory.{storeName}.{size}"] = {"packets": len(store), "bytes": retained, "bytesPerPacket": retained / size}
+            del store
+
+
+def benchApi(sizes: List[int], repeats: int, results: Dict) -> None:
+    """
+    Times GET /api/packets/latest against stores of several sizes.
+    Goes through the full HTTP stack when fastapi.testclient (httpx) is available, else calls the route directly.
+    """
+    from app.routes import packetRoutes  # pylint: disable=import-outside-toplevel
+    try:
+        from fastapi.testclient import TestClient  # pylint: disable=import-outside-toplevel
+        from app.main import app  # pylint: disable=import-outside-toplevel
+        client = TestClient(app)
+        transport = "http"
+        headers = {packetRoutes.API_KEY_NAME: os.getenv("API_KEY", "default-secret-key")}
+
+        def call(params):
+            response = client.get("/api/packets/latest", params=params, headers=headers)
+            response.raise_for_status()
+    except (ImportError, RuntimeError):
+        # starlette's TestClient raises RuntimeError when httpx is missing
+        transport = "direct"
+        loop = asyncio.new_event_loop()
+        defaults = {
+            "limit": 50, "since_id": None, "risk": None, "protocol": None, "source": None,
+            "format": None, "layout": "rows", "accept": None, "accept_encoding": None,
+            "sniffer": packetRoutes.sessionManager.default,
+        }
+
+        def call(params):
+            # The route returns the already serialized body
+            loop.run_until_complete(packetRoutes.getLatestPackets(**{**defaults, **params})).body
+
+    results["api.transport"] = transport
+    for storeName, storeClass in STORE_CLASSES.items():
+        for size in sizes:
+            store = storeClass(size)
+            packets = buildStoredPackets(size)
+            for start in range(0, size, 256):
+                store.extend(packets[start:start + 256])
+            packetRoutes.sessionManager.default.capturedPackets = store
+            queries = {
+                "latest50": {"limit": 50},
+                "latest1000": {"limit": min(1000, config.PACKET_BUFFER_SIZE)},
+                "since500": {"since_id": size // 2, "limit": min(500, config.PACKET_BUFFER_SIZE)},
+                "filterHigh100": {"risk": "HIGH", "limit": 100},
+            }
+            for queryName, params in queries.items():
+                results[f"api.{storeName}.{size}.{queryName}"] = measure([params] * repeats, call, warmup=5)
+
+
+def benchEnrich(packetCount: int, batchSize: int, seed: int, results: Dict, listCount: int = 8, listSize: int = 20000) -> None:
+    """
+    Times the enrichment stage against synthetic reputation lists covering part of the synthetic traffic.
+    """
+    rng = random.Random(seed)
+    packets = buildStoredPackets(packetCount, seed)
+    batches = [packets[start:start + batchSize] for start in range(0, len(packets), batchSize)]
+    with tempfile.TemporaryDirectory() as workDirectory:
+        listDirectory = os.path.join(workDirectory, "lists")
+        os.makedirs(listDirectory)
+        for index in range(listCount):
+            with open(os.path.join(listDirectory, f"list{index}.netset"), "w") as listFile:
+                for _ in range(listSize):
+                    # A quarter of the blocks fall into the synthetic 10.0.0.0/16 sources
+                    prefix = rng.choice((16, 20, 24, 24, 28, 32))
+                    base = 0x0A000000 | rng.getrandbits(16) if rng.random() < 0.25 else rng.getrandbits(32)
+                    mask = (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF
+                    address = base & mask
+                    listFile.write(f"{address >> 24}.{address >> 16 & 255}.{address >> 8 & 255}.{address & 255}/{prefix}\n")
+        paths = [os.path.join(listDirectory, name) for name in sorted(os.listdir(listDirectory))]
+
+        started = time.perf_counter_ns()
+        index = PrefixIndex.build(paths)
+        elapsed = time.perf_counter_ns() - started
+        results["enrich.index.build"] = summarize([elapsed], elapsed, index.entries)
+        indexDirectory = os.path.join(workDirectory, "index")
+        index.save(os.path.join(indexDirectory, "bench"))
+        results["enrich.index.load"] = measure(
+            [None] * 20, lambda _: PrefixIndex.load(os.path.join(indexDirectory, "bench"), config.ENRICH_MMAP_MODE), warmup=1
+        )
+        index = PrefixIndex.load(os.path.join(indexDirectory, "bench"), config.ENRICH_MMAP_MODE)
+
+        addresses = [np.fromiter(
+            (parseAddress(packetData["source"])[0] for packetData in batch), dtype=np.uint32, count=len(batch)
+        ) for batch in batches]
+        results[f"enrich.lookup.batch{batchSize}"] = measure(addresses, index.lookupIPv4, units=packetCount, warmup=2)
+
+        readers = [MmdbReader(path) for path in config.ENRICH_MMDB_FILES]
+        # Fresh packet copies, since enrichment writes into the dicts
+        copies = [[dict(packetData) for packetData in batch] for batch in batches]
+        uncached = IpEnricher(index, readers, cacheSize=0)
+        results[f"enrich.batch{batchSize}.uncached"] = measure(copies, uncached.enrichBatch, units=packetCount, warmup=0)
+        cached = IpEnricher(index, readers, cacheSize=config.ENRICH_CACHE_SIZE)
+        for batch in copies:
+            cached.enrichBatch(batch)
+        results[f"enrich.batch{batchSize}.cached"] = measure(copies, cached.enrichBatch, units=packetCount, warmup=0)
+        results[f"enrich.batch{batchSize}.cached"]["hitRate"] = cached.getStats()["hitRate"]
+
+        for reader in readers:
+            parsed = [parseAddress(packetData["source"]) for packetData in packets[:5000]]
+            name = os.path.splitext(os.path.basename(reader.path))[0]
+            results[f"enrich.mmdb.{name}"] = measure(parsed, lambda address: reader.findRecord(*address))
+            reader.close()
+
+
+def benchWire(packetCount: int, repeats: int, results: Dict) -> None:
+    """
+    Encodes 'packetCount' stored packets (as served by /latest) in every wire format,
+    with and without compression; p50Us is the serialization time per response.
+    """
+    packets = ColumnarPacketStore(packetCount)
+    packets.extend(buildStoredPackets(packetCount))
+    packets = packets.latest(packetCount)
+    envelope = {"count": len(packets), "evicted": 0, "latestId": packetCount, "nextCursor": packetCount}
+    variants = {}
+    try:
+        from fastapi.encoders import jsonable_encoder  # pylint: disable=import-outside-toplevel
+        from fastapi.responses import JSONResponse  # pylint: disable=import-outside-toplevel
+        # What returning the dict from the route used to cost
+        variants["fastapi.json"] = lambda: JSONResponse(jsonable_encoder({**envelope, "packets": packets})).body
+    except ImportError:
+        pass
+    for fmt in wireFormat.FORMATS:
+        try:
+            wireFormat.negotiateFormat(fmt, None)
+        except RuntimeError as e:
+            print(f"skipping wire.{fmt}: {e}")
+            continue
+        for layout in (("columns",) if fmt == "arrow" else wireFormat.LAYOUTS):
+            for encoding in (None, "gzip", "zstd"):
+                if encoding == "zstd" and wireFormat.negotiateEncoding("zstd") != "zstd":
+                    continue
+                variants[f"{fmt}.{layout}.{encoding or 'identity'}"] = (
+                    lambda fmt=fmt, layout=layout, encoding=encoding:
+                    wireFormat.encodeResponse(envelope, packets, fmt, layout, encoding)[0]
+                )
+    for name, encodeBody in variants.items():
+        result = measure([None] * repeats, lambda _: encodeBody(), units=repeats * len(packets), warmup=5)
+        size = len(encodeBody())
+        result.update(bytes=size, bytesPerPacket=size / max(1, len(packets)))
+        results[f"wire.{len(packets)}.{name}"] = result
+
+
+# ---------------------------------------------------------------------------
+# Baseline Comparison
+# ---------------------------------------------------------------------------
+
+def compareWithBaseline(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Prints relative changes for every shared metric and returns the regressions beyond 'tolerance'.
+    """
+    regressions = []
+    print(f"\n{'metric':<56} {'baseline':>14} {'current':>14} {'change':>9}")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not isinstance(result, dict) or not isinstance(previous, dict):
+            continue
+        for key in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            if key not in result or not previous.get(key):
+                continue
+            change = (result[key] - previous[key]) / previous[key]
+            worse = -change if key in HIGHER_IS_BETTER else change
+            flag = "  REGRESSION" if worse > tolerance else ""
+            print(f"{name + '.' + key:<56} {previous[key]:14,.2f} {result[key]:14,.2f} {change:+8.1%}{flag}")
+            if flag:
+                regressions.append(f"{name}.{key}")
+    return regressions
+
+
+def environment(args: argparse.Namespace) -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    versions = {}
+    for module in ("numpy", "sklearn", "scapy", "fastapi", "orjson", "msgpack", "pyarrow", "zstandard"):
+        versions[module] = getattr(sys.modules.get(module), "__version__", None)
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "versions": versions,
+        "args": vars(args),
+        "config": {
+            name: getattr(config, name)
+            for name in ("INFERENCE_BACKEND", "INFERENCE_BATCH_SIZE", "INFERENCE_MAX_LATENCY_MS", "VERDICT_CACHE_SIZE",
+                         "PACKET_STORE", "QUEUE_FULL_POLICY", "PARSE_WORKERS", "METRICS_SAMPLE_EVERY",
+                         "ENRICH_CACHE_SIZE", "ENRICH_MMAP_MODE")
+        },
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the capture -> score pipeline on synthetic traffic")
+    parser.add_argument("--packets", type=int, default=20000, help="synthetic frames per stage/e2e run")
+    parser.add_argument("--flows", type=int, default=500, help="distinct flows in the synthetic traffic")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch", type=int, default=config.INFERENCE_BATCH_SIZE, help="rows per predictBatch call")
+    parser.add_argument("--model", default="risk_model.pkl", help="model to serve (a synthetic forest if missing)")
+    parser.add_argument("--sections", default="stages,e2e,memory,api,enrich,wire", help="comma-separated sections to run")
+    parser.add_argument("--buffer-sizes", default="1000,10000,100000", help="store sizes for the memory and api sections")
+    parser.add_argument("--api-repeats", type=int, default=200, help="requests per API query")
+    parser.add_argument("--wire-packets", type=int, default=1000, help="packets per response in the wire section")
+    parser.add_argument("--output", default=None, help="write results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="compare with an earlier results file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on regressions")
+    args = parser.parse_args()
+
+    sections = {section.strip() for section in args.sections.split(",") if section.strip()}
+    sizes = [int(size) for size in args.buffer_sizes.split(",") if size.strip()]
+    frames = buildRawFrames(args.packets, flowCount=args.flows, seed=args.seed)
+    results: Dict = {}
+
+    if sections & {"stages", "e2e"}:
+        prepareModel(args.model)
+    if "stages" in sections:
+        benchStages(frames, args.batch, results)
+    if "e2e" in sections:
+        for decoderMode in ("scapy", "raw"):
+            benchEndToEnd(frames, decoderMode, results)
+    if "memory" in sections:
+        benchMemory(sizes, results)
+    if "api" in sections:
+        benchApi(sizes, args.api_repeats, results)
+    if "enrich" in sections:
+        benchEnrich(args.packets, args.batch, args.seed, results)
+    if "wire" in sections:
+        benchWire(args.wire_packets, args.api_repeats, results)
+
+    print()
+    for name, result in results.items():
+        if isinstance(result, dict):
+            report(name, result)
+
+    output = {"environment": environment(args), "results": results}
+    if args.output:
+        with open(args.output, "w") as outputFile:
+            json.dump(output, outputFile, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)
+        regressions = compareWithBaseline(results, baseline.get("results", {}), args.tolerance)
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+synthetic.py
+-------------
+Reproducible synthetic traffic for the benchmarks, so no network interface is needed.
+Raw Ethernet frames are packed with struct (no Scapy required); Scapy packets are
+dissected from the same bytes, so both capture paths see identical traffic.
+Packets are spread over a fixed pool of flows to exercise the flow table realistically.
+"""
+
+import random
+import socket
+import struct
+from typing import Dict, List
+
+_ETHERNET = struct.Struct("!6s6sH")
+_IPV4 = struct.Struct("!BBHHHBBH4s4s")
+_IPV6 = struct.Struct("!IHBB16s16s")
+_TCP = struct.Struct("!HHIIBBHHH")
+_UDP = struct.Struct("!HHHH")
+_ICMP = struct.Struct("!BBHHH")
+
+_SOURCE_MAC = bytes.fromhex("020000000001")
+_DESTINATION_MAC = bytes.fromhex("020000000002")
+TCP_FLAGS = {"S": 0x02, "SA": 0x12, "A": 0x10, "PA": 0x18, "FA": 0x11}
+
+
+def _ipv4Frame(source: str, destination: str, protocol: int, transport: bytes) -> bytes:
+    header = _IPV4.pack(
+        0x45, 0, 20 + len(transport), 0, 0x4000, 64, protocol, 0,
+        socket.inet_aton(source), socket.inet_aton(destination),
+    )
+    return _ETHERNET.pack(_DESTINATION_MAC, _SOURCE_MAC, 0x0800) + header + transport
+
+
+def _ipv6Frame(source: str, destination: str, nextHeader: int, transport: bytes) -> bytes:
+    header = _IPV6.pack(
+        0x60000000, len(transport), nextHeader, 64,
+        socket.inet_pton(socket.AF_INET6, source), socket.inet_pton(socket.AF_INET6, destination),
+    )
+    return _ETHERNET.pack(_DESTINATION_MAC, _SOURCE_MAC, 0x86DD) + header + transport
+
+
+def _tcp(sourcePort: int, destinationPort: int, flags: int, payload: bytes) -> bytes:
+    return _TCP.pack(sourcePort, destinationPort, 0, 0, 5 << 4, flags, 65535, 0, 0) + payload
+
+
+def _udp(sourcePort: int, destinationPort: int, payload: bytes) -> bytes:
+    return _UDP.pack(sourcePort, destinationPort, 8 + len(payload), 0) + payload
+
+
+def _arpFrame(index: int) -> bytes:
+    body = struct.pack("!HHBBH6s4s6s4s", 1, 0x0800, 6, 4, 1, _SOURCE_MAC, socket.inet_aton("10.0.0.1"),
+                       b"\x00" * 6, socket.inet_aton(f"10.0.{index % 256}.1"))
+    return _ETHERNET.pack(b"\xff" * 6, _SOURCE_MAC, 0x0806) + body
+
+
+def buildFlows(count: int, rng: random.Random) -> List[Dict]:
+    """
+    Returns 'count' flow templates: 60% IPv4 TCP, 25% IPv4 UDP, 10% IPv6 TCP, 5% ICMP.
+    """
+    flows = []
+    for index in range(count):
+        roll = rng.random()
+        flow = {
+            "source": f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            "destination": f"172.16.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            "sourcePort": rng.randint(1024, 65535),
+            "destinationPort": rng.choice((80, 443, 22, 8080, 3389)),
+            "meanPayload": rng.choice((0, 64, 400, 1200)),
+        }
+        if roll < 0.60:
+            flow["kind"] = "tcp4"
+        elif roll < 0.85:
+            flow.update(kind="udp4", destinationPort=rng.choice((53, 123, 5353)))
+        elif roll < 0.95:
+            flow.update(kind="tcp6", source=f"2001:db8::{index % 65535:x}", destination="2001:db8:1::1")
+        else:
+            flow["kind"] = "icmp4"
+        flows.append(flow)
+    return flows
+
+
+def buildRawFrames(count: int, flowCount: int = 500, seed: int = 42, arpRatio: float = 0.01) -> List[bytes]:
+    """
+    Builds 'count' Ethernet frames over 'flowCount' flows; a small share of ARP frames exercises the Scapy fallback.
+    """
+    rng = random.Random(seed)
+    flows = buildFlows(flowCount, rng)
+    frames = []
+    for index in range(count):
+        if rng.random() < arpRatio:
+            frames.append(_arpFrame(index))
+            continue
+        flow = rng.choice(flows)
+        payload = b"x" * max(0, int(rng.gauss(flow["meanPayload"], 40)))
+        # Half of the packets travel in the reverse direction of their flow
+        forward = rng.random() < 0.5
+        source, destination = (flow["source"], flow["destination"]) if forward else (flow["destination"], flow["source"])
+        sourcePort, destinationPort = (
+            (flow["sourcePort"], flow["destinationPort"]) if forward else (flow["destinationPort"], flow["sourcePort"])
+        )
+        kind = flow["kind"]
+        if kind == "tcp4":
+            flags = TCP_FLAGS[rng.choice(("PA", "A", "A", "S", "FA"))]
+            frames.append(_ipv4Frame(source, destination, 6, _tcp(sourcePort, destinationPort, flags, payload)))
+        elif kind == "udp4":
+            frames.append(_ipv4Frame(source, destination, 17, _udp(sourcePort, destinationPort, payload)))
+        elif kind == "tcp6":
+            frames.append(_ipv6Frame(source, destination, 6, _tcp(sourcePort, destinationPort, TCP_FLAGS["PA"], payload)))
+        else:
+            frames.append(_ipv4Frame(source, destination, 1, _ICMP.pack(8, 0, 0, index & 0xFFFF, 1) + payload[:56]))
+    return frames
+
+
+def buildScapyPackets(frames: List[bytes]) -> List:
+    """
+    Dissects the frames into Scapy packets, as delivered by sniff() in DECODER_MODE=scapy.
+    """
+    from app.capture.packetParser import loadScapy  # pylint: disable=import-outside-toplevel
+    etherClass = loadScapy().Ether
+    return [etherClass(frame) for frame in frames]
+
+
+def buildStoredPackets(count: int, seed: int = 42) -> List[Dict]:
+    """
+    Builds scored packetData dicts as they reach the packet store (IDs 1..count).
+    """
+    rng = random.Random(seed)
+    protocols = ("TCP", "TCP", "TCP", "UDP", "UDP", "ICMP")
+    risks = ("LOW", "LOW", "LOW", "LOW", "MEDIUM", "HIGH")
+    packets = []
+    for index in range(1, count + 1):
+        second = index // 1000
+        packets.append({
+            "id": index,
+            "source": f"10.0.{rng.randint(0, 63)}.{rng.randint(1, 254)}",
+            "destination": f"172.16.0.{rng.randint(1, 254)}",
+            "protocol": rng.choice(protocols),
+            "length": rng.randint(60, 1514),
+            "sourcePort": rng.randint(1024, 65535),
+            "destinationPort": rng.choice((80, 443, 53)),
+            "tcpFlags": rng.choice((0, 0x10, 0x18)),
+            "timestamp": f"{(second // 3600) % 24:02d}:{(second // 60) % 60:02d}:{second % 60:02d}",
+            "risk": rng.choice(risks),
+        })
+    return packets
@@ -3,38 +3,98 @@ preprocess_cicids.py
 --------------------
 Prepares the Kaggle 'CICIDS2017: Cleaned & Preprocessed' dataset for
 machine learning training compatible with the UDON backend.
+
+The CSV is streamed in chunks with explicit narrow dtypes, so peak memory is
+bounded by the chunk size rather than the dataset size. Risk labels are
+assigned once per distinct 'Attack Type' value (factorize + lookup table)
+instead of once per row. The output format follows the extension (see
+app/ml/trainingData.py): Parquet when pyarrow is installed, otherwise a
+compressed .npz; .csv is still supported.
+
+Usage:
+    python preprocess_cicids.py [--input cicids2017_cleaned.csv] [--output processed_packets.parquet]
 """
 
+import argparse
+import time
+import numpy as np
 import pandas as pd
-from app.ml.labeler import map_attack_label_to_risk  # make sure labeler.py exists
+from app.ml.trainingData import FEATURE_COLUMNS, ProcessedWriter, riskCodes
+from app.ml.modelInterface import LABEL_MAP
+
+# Only these columns are parsed from the source CSV
+SOURCE_DTYPES = {
+    "Total Length of Fwd Packets": np.float64,
+    "Bwd Packet Length Mean": np.float64,
+    "Packet Length Mean": np.float32,
+    "Packet Length Std": np.float32,
+    "Attack Type": "string",
+}
+
+
+def defaultOutputPath() -> str:
+    try:
+        import pyarrow # noqa: F401
+        return "processed_packets.parquet"
+    except ImportError:
+        return "processed_packets.npz"
+
+
+def buildFeatures(chunk: pd.DataFrame) -> np.ndarray:
+    """
+    Vectorized feature construction for one chunk, as an (n, 3) float32 array.
+    """
+    features = np.empty((len(chunk), len(FEATURE_COLUMNS)), dtype=np.float32)
+    # 'length' proxy: total forward length + backward packet length mean
+    features[:, 0] = chunk["Total Length of Fwd Packets"].to_numpy() + chunk["Bwd Packet Length Mean"].to_numpy()
+    features[:, 1] = chunk["Packet Length Mean"].to_numpy()
+    features[:, 2] = chunk["Packet Length Std"].to_numpy()
+    # Normalize NaN or inf values
+    features[~np.isfinite(features)] = 0
+    return features
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stream CICIDS2017 into the processed training format.")
+    parser.add_argument("--input", default="cicids2017_cleaned.csv", help="source CSV")
+    parser.add_argument("--output", default=None, help=".parquet, .npz or .csv (default: parquet if pyarrow is installed)")
+    parser.add_argument("--chunk-size", type=int, default=500_000, help="rows parsed per chunk")
+    args = parser.parse_args()
+    outputPath = args.output or defaultOutputPath()
 
-# === Step 1: Load dataset ===
-input_path = "cicids2017_cleaned.csv"  # your file name
-print(f"Loading dataset from {input_path} ...")
-df = pd.read_csv(input_path)
+    # === Step 1: Stream dataset in chunks ===
+    print(f"Streaming dataset from {args.input} in chunks of {args.chunk_size:,} rows ...")
+    startTime = time.perf_counter()
+    writer = ProcessedWriter(outputPath)
+    labelCache = {}
+    riskCounts = np.zeros(len(LABEL_MAP), dtype=np.int64)
 
-print(f"Dataset loaded with {len(df)} rows and {len(df.columns)} columns.")
+    reader = pd.read_csv(
+        args.input,
+        usecols=list(SOURCE_DTYPES),
+        dtype=SOURCE_DTYPES,
+        chunksize=args.chunk_size,
+    )
+    for chunk in reader:
+        # === Step 2: Build numerical features ===
+        features = buildFeatures(chunk)
 
-# === Step 2: Build numerical features ===
-# Create a 'length' proxy using total forward length and backward packet length mean
-df["length"] = df["Total Length of Fwd Packets"] + df["Bwd Packet Length Mean"]
+        # === Step 3: Risk label mapping (once per distinct Attack Type) ===
+        risk = riskCodes(chunk["Attack Type"], labelCache)
+        riskCounts += np.bincount(risk, minlength=len(LABEL_MAP))
 
-# Normalize NaN or inf values
-df = df.replace([float('inf'), -float('inf')], 0).fillna(0)
+        # === Step 4: Append to the columnar output ===
+        writer.write(features, risk)
+        print(f"  {writer.rows:,} rows processed")
 
-# === Step 3: Simple derived features ===
-df["packet_mean"] = df["Packet Length Mean"]
-df["packet_std"] = df["Packet Length Std"]
+    writer.close()
 
-# === Step 4: Risk label mapping ===
-df["risk"] = df["Attack Type"].apply(lambda x: map_attack_label_to_risk(x))
+    # === Step 5: Report ===
+    elapsed = time.perf_counter() - startTime
+    print(f"Processed dataset ({writer.rows:,} rows) saved to {outputPath} in {elapsed:.1f}s")
+    for code, count in enumerate(riskCounts):
+        print(f"{LABEL_MAP[code]:<8}{count:>12,}")
 
-# === Step 5: Keep only the relevant features ===
-columns_to_keep = ["length", "packet_mean", "packet_std", "risk"]
-processed = df[columns_to_keep]
 
-# === Step 6: Save ===
-output_path = "processed_packets.csv"
-processed.to_csv(output_path, index=False)
-print(f"Processed dataset saved to {output_path}")
-print(processed["risk"].value_counts())
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+replayPcap.py
+--------------
+Replays a pcap/pcapng file offline through parse -> features -> classify
+and writes the scored packets to a results file (.jsonl or .csv).
+
+Run from the backend directory:
+    python replayPcap.py capture.pcap --output results.jsonl
+    python replayPcap.py capture.pcapng --output results.csv --speed 1.0
+"""
+
+import argparse
+import json
+from app.capture.pcapReplay import PcapReplay
+from app import config
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline pcap/pcapng replay and batch scoring.")
+    parser.add_argument("path", help="pcap or pcapng file to replay")
+    parser.add_argument("--output", default=None, help="results file (.jsonl or .csv); omit for throughput only")
+    parser.add_argument("--speed", type=float, default=0.0, help="0 = as fast as possible, 1.0 = original timing")
+    parser.add_argument("--chunk-size", type=int, default=config.REPLAY_CHUNK_SIZE, help="frames read per chunk")
+    parser.add_argument("--batch-size", type=int, default=config.INFERENCE_BATCH_SIZE, help="packets per model call")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many packets")
+    args = parser.parse_args()
+
+    replay = PcapReplay(
+        args.path,
+        outputPath=args.output,
+        speed=args.speed,
+        chunkSize=args.chunk_size,
+        batchSize=args.batch_size,
+        limit=args.limit,
+    )
+    try:
+        summary = replay.run()
+    except KeyboardInterrupt:
+        replay.stop()
+        replay.state = "stopped"
+        summary = replay.getSummary()
+
+    print(f"{summary['packets']:,} packets in {summary['elapsedSeconds']:.2f}s "
+          f"({summary['packetsPerSecond']:,.0f} pkt/s, {summary['megabitsPerSecond']:.1f} Mbit/s)")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+conftest.py
+------------
+Shared test helpers: packet factories and a controllable clock.
+"""
+
+import time
+
+import pytest
+
+
+def makePacket(packetId: int, **fields) -> dict:
+    """
+    Builds a stored packetData dict; protocol and risk cycle with the ID, every ID has its own source.
+    """
+    packetData = {
+        "id": packetId,
+        "source": f"10.0.{packetId // 256 % 256}.{packetId % 256}",
+        "destination": "192.168.1.1",
+        "protocol": ("TCP", "UDP", "ICMP")[packetId % 3],
+        "length": 60 + packetId,
+        "sourcePort": 1000 + packetId % 100,
+        "destinationPort": 443,
+        "tcpFlags": 18,
+        "timestamp": f"12:{packetId // 60 % 60:02d}:{packetId % 60:02d}",
+        "risk": ("LOW", "MEDIUM", "HIGH")[packetId % 3],
+    }
+    packetData.update(fields)
+    return packetData
+
+
+def makePackets(firstId: int, count: int) -> list:
+    return [makePacket(packetId) for packetId in range(firstId, firstId + count)]
+
+
+def ids(packets: list) -> list:
+    return [packetData["id"] for packetData in packets]
+
+
+class FakeClock:
+    """
+    Stands in for time.time() and time.monotonic(); tests move it forward by changing 'now'.
+    """
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fakeClock = FakeClock()
+    monkeypatch.setattr(time, "time", fakeClock)
+    monkeypatch.setattr(time, "monotonic", fakeClock)
+    return fakeClock
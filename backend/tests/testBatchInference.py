@@ -0,0 +1,103 @@
+"""
+testBatchInference.py
+----------------------
+Tests for the micro-batching inference stage, including recovery from a failing batch.
+"""
+
+import threading
+import time
+
+from app.ml.batchInference import BatchInferenceStage
+
+
+class FlakyModel:
+    """
+    Labels every row LOW, but raises on the batches listed in 'failOn' (1-based call numbers).
+    """
+
+    def __init__(self, failOn=()):
+        self.calls = 0
+        self.failOn = set(failOn)
+
+    def predictBatch(self, featureRows):
+        self.calls += 1
+        if self.calls in self.failOn:
+            raise ValueError("feature mismatch")
+        return ["LOW"] * len(featureRows)
+
+
+class RecordingLogger:
+    def __init__(self):
+        self.errors = []
+
+    def logError(self, message):
+        self.errors.append(message)
+
+
+def waitFor(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def makeStage(model, stored, **options):
+    lock = threading.Lock()
+
+    def onScored(packets):
+        with lock:
+            stored.extend(packets)
+
+    return BatchInferenceStage(model, onScored, batchSize=4, maxLatencyMs=5.0, logger=RecordingLogger(), **options)
+
+
+def testBatchesAreScoredAndStored():
+    stored = []
+    stage = makeStage(FlakyModel(), stored)
+    stage.start()
+    for packetId in range(10):
+        stage.submit({"id": packetId}, {"length": packetId})
+    # Packets without features keep the label they already have
+    stage.submit({"id": 10, "risk": "HIGH"}, None)
+    assert waitFor(lambda: len(stored) == 11)
+    stage.stop()
+    assert [packetData["risk"] for packetData in stored] == ["LOW"] * 10 + ["HIGH"]
+    assert stage.getStats()["packetsScored"] == 11
+
+
+def testFailingBatchIsDroppedAndTheWorkerKeepsRunning():
+    stored = []
+    model = FlakyModel(failOn={1})
+    stage = makeStage(model, stored)
+    stage.start()
+    for packetId in range(4):
+        stage.submit({"id": packetId}, {"length": packetId})
+    assert waitFor(lambda: stage.getStats()["batchesFailed"] == 1)
+    for packetId in range(4, 8):
+        stage.submit({"id": packetId}, {"length": packetId})
+    assert waitFor(lambda: len(stored) == 4)
+    stage.stop()
+    assert stage.workerThread is not None and not stage.workerThread.is_alive()
+    assert [packetData["id"] for packetData in stored] == [4, 5, 6, 7]
+    stats = stage.getStats()
+    assert (stats["batchesFailed"], stats["packetsFailed"]) == (1, 4)
+    assert len(stage.logger.errors) == 1 and "feature mismatch" in stage.logger.errors[0]
+
+
+def testFailuresInPrepareBatchAreContained():
+    stored = []
+
+    def prepareBatch(packets, featureRows):
+        if any(packetData["id"] == 0 for packetData in packets):
+            raise OSError("corrupt record")
+
+    stage = makeStage(FlakyModel(), stored, prepareBatch=prepareBatch)
+    stage.start()
+    stage.submit({"id": 0}, {"length": 0})
+    assert waitFor(lambda: stage.getStats()["batchesFailed"] == 1)
+    stage.submit({"id": 1}, {"length": 1})
+    assert waitFor(lambda: len(stored) == 1)
+    stage.stop()
+    assert stage.getStats()["packetsFailed"] == 1
@@ -0,0 +1,87 @@
+"""
+testBoundedQueue.py
+--------------------
+Tests for the overflow policies and counters of the pipeline queue.
+"""
+
+import queue
+import threading
+import time
+import pytest
+from app.capture.boundedQueue import BLOCK, DROP_NEWEST, DROP_OLDEST, BoundedQueue
+
+
+def drain(boundedQueue: BoundedQueue) -> list:
+    items = []
+    while not boundedQueue.empty():
+        items.append(boundedQueue.get_nowait())
+    return items
+
+
+def testUnknownPolicyIsRejected():
+    with pytest.raises(ValueError):
+        BoundedQueue(4, "drop-random")
+
+
+def testDropOldestKeepsTheNewestItems():
+    boundedQueue = BoundedQueue(3, DROP_OLDEST)
+    results = [boundedQueue.put(item) for item in range(5)]
+    # The new item is always accepted; the oldest ones make room for it
+    assert results == [True] * 5
+    assert drain(boundedQueue) == [2, 3, 4]
+    stats = boundedQueue.getStats()
+    assert stats["dropped"] == 2
+    assert stats["enqueued"] == 5
+    assert stats["dequeued"] == 3
+    assert stats["highWatermark"] == 3
+
+
+def testDropNewestRejectsIncomingItems():
+    boundedQueue = BoundedQueue(3, DROP_NEWEST)
+    results = [boundedQueue.put(item) for item in range(5)]
+    assert results == [True, True, True, False, False]
+    assert drain(boundedQueue) == [0, 1, 2]
+    assert boundedQueue.getStats()["dropped"] == 2
+
+
+def testBlockTimesOutAndCountsTheDrop():
+    boundedQueue = BoundedQueue(1, BLOCK)
+    assert boundedQueue.put("first")
+    start = time.monotonic()
+    assert not boundedQueue.put("second", timeout=0.05)
+    assert time.monotonic() - start >= 0.05
+    stats = boundedQueue.getStats()
+    assert stats["blockedPuts"] == 1
+    assert stats["dropped"] == 1
+    assert stats["blockedSeconds"] >= 0.05
+    assert drain(boundedQueue) == ["first"]
+
+
+def testBlockWaitsForTheConsumer():
+    boundedQueue = BoundedQueue(1, BLOCK)
+    boundedQueue.put(1)
+    consumer = threading.Timer(0.05, boundedQueue.get)
+    consumer.start()
+    # Blocks until the consumer frees the slot, then succeeds
+    assert boundedQueue.put(2, timeout=2.0)
+    consumer.join()
+    assert drain(boundedQueue) == [2]
+    assert boundedQueue.getStats()["dropped"] == 0
+
+
+def testGetRaisesEmptyOnTimeout():
+    boundedQueue = BoundedQueue(2)
+    with pytest.raises(queue.Empty):
+        boundedQueue.get(timeout=0.01)
+    with pytest.raises(queue.Empty):
+        boundedQueue.get_nowait()
+
+
+def testClearResetsItemsAndCounters():
+    boundedQueue = BoundedQueue(2, DROP_OLDEST)
+    for item in range(4):
+        boundedQueue.put(item)
+    boundedQueue.clear()
+    stats = boundedQueue.getStats()
+    assert boundedQueue.empty()
+    assert (stats["enqueued"], stats["dropped"], stats["highWatermark"]) == (0, 0, 0)
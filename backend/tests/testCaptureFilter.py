@@ -0,0 +1,55 @@
+"""
+testCaptureFilter.py
+---------------------
+Tests for the per-session packet rate limiter.
+"""
+
+import pytest
+from app.capture.captureFilter import PacketRateLimiter
+
+
+def admitted(limiter: PacketRateLimiter, count: int) -> int:
+    return sum(limiter.accept() for _ in range(count))
+
+
+def testZeroRateAdmitsEverything(clock):
+    limiter = PacketRateLimiter(0)
+    assert admitted(limiter, 1000) == 1000
+    assert limiter.getStats()["limited"] == 0
+
+
+def testBurstIsCappedAtBucketSize(clock):
+    limiter = PacketRateLimiter(100)
+    assert admitted(limiter, 500) == 100
+    assert limiter.getStats() == {"packetsPerSecond": 100, "admitted": 100, "limited": 400}
+
+
+def testIdleTimeIsNotCreditedOnTopOfAFullBucket(clock):
+    limiter = PacketRateLimiter(100)
+    # Idle for ten seconds with a full bucket, then a burst spread over half a second
+    clock.now += 10.0
+    total = 0
+    for _ in range(50):
+        total += admitted(limiter, 100)
+        clock.now += 0.01
+    # One full bucket plus about half a second of refill, not two buckets
+    assert 145 <= total <= 150
+
+
+def testSteadyRateIsAdmitted(clock):
+    limiter = PacketRateLimiter(100)
+    admitted(limiter, 100)
+    total = 0
+    for _ in range(1000):
+        clock.now += 0.001
+        total += admitted(limiter, 5)
+    assert total == pytest.approx(100, abs=1)
+
+
+def testRateBelowOnePacketPerSecond(clock):
+    limiter = PacketRateLimiter(0.5)
+    assert admitted(limiter, 3) == 1
+    clock.now += 1.0
+    assert admitted(limiter, 1) == 0
+    clock.now += 1.0
+    assert admitted(limiter, 1) == 1
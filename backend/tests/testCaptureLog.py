@@ -0,0 +1,132 @@
+"""
+testCaptureLog.py
+------------------
+Tests for the durable capture log: range queries, rotation, crash recovery
+(truncated trailing records) and epochs across ID restarts.
+"""
+
+import os
+from app.storage.captureLog import INDEX_SUFFIX, SEGMENT_SUFFIX, CaptureLog
+from conftest import ids, makePackets
+
+
+def segmentFiles(directory) -> list:
+    return sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+
+
+def testQueriesAcrossRotatedSegments(tmp_path, clock):
+    log = CaptureLog(str(tmp_path), segmentBytes=4096, segmentSeconds=0, flushInterval=0)
+    for firstId in range(1, 1001, 100):
+        log.append(makePackets(firstId, 100))
+        clock.now += 1.0
+    assert len(segmentFiles(tmp_path)) > 1
+    assert ids(log.queryIds(250, 260)) == list(range(250, 261))
+    assert ids(log.queryIds(995)) == list(range(995, 1001))
+    assert ids(log.queryIds(1, limit=5)) == [1, 2, 3, 4, 5]
+    # Packets of the fourth batch were appended at t=1003
+    assert ids(log.queryTime(1003.0, 1003.0)) == list(range(301, 401))
+    stored = log.queryIds(7, 7)[0]
+    assert stored["length"] == 67 and stored["epoch"] == 0
+    log.close()
+
+
+def testRecoveryDropsAPartialTrailingRecord(tmp_path, clock):
+    log = CaptureLog(str(tmp_path), flushInterval=0)
+    log.append(makePackets(1, 300))
+    log.flush()
+    # Simulate a crash in the middle of writing the next record
+    activePath = log.segments[-1].path
+    log.activeFile.write(b"\x40\x00\x00\x00\x2d\x01")
+    log.activeFile.flush()
+    validSize = log.segments[-1].size
+    log.activeFile.close()
+
+    recovered = CaptureLog(str(tmp_path), flushInterval=0)
+    assert os.path.getsize(activePath) == validSize
+    assert recovered.getStats()["records"] == 300
+    assert ids(recovered.queryIds(299)) == [299, 300]
+    # Appending continues the recovered segment and epoch
+    recovered.append(makePackets(301, 5))
+    assert ids(recovered.queryIds(298)) == [298, 299, 300, 301, 302, 303, 304, 305]
+    assert recovered.epoch == 0
+    assert len(segmentFiles(tmp_path)) == 1
+    recovered.close()
+
+
+def testRecoveryOfSealedSegmentsUsesTheirIndex(tmp_path, clock):
+    log = CaptureLog(str(tmp_path), flushInterval=0)
+    log.append(makePackets(1, 1000))
+    log.close()
+    assert os.path.exists(log.segments[0].path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX)
+
+    recovered = CaptureLog(str(tmp_path), flushInterval=0)
+    segment = recovered.segments[0]
+    assert (segment.records, segment.firstId, segment.lastId) == (1000, 1, 1000)
+    assert ids(recovered.queryIds(513, 515)) == [513, 514, 515]
+    recovered.close()
+
+
+
+def testIdRestartOpensANewEpoch(tmp_path, clock):
+    log = CaptureLog(str(tmp_path), flushInterval=0)
+    log.append(makePackets(1, 10))
+    clock.now += 1.0
+    # Capture reset: IDs start over
+    log.append(makePackets(1, 4))
+    assert log.epoch == 1
+    assert ids(log.queryIds(1)) == [1, 2, 3, 4]
+    assert ids(log.queryIds(1, epoch=0)) == list(range(1, 11))
+    # Time ranges span every epoch
+    assert len(log.queryTime(0.0)) == 14
+    log.close()
+
+
+def testEpochsSurviveRecoveryAfterTruncation(tmp_path, clock):
+    log = CaptureLog(str(tmp_path), flushInterval=0)
+    log.append(makePackets(1, 10))
+    log.append(makePackets(1, 6))
+    log.flush()
+    log.activeFile.write(b"\x01\x02\x03")
+    log.activeFile.close()
+
+    recovered = CaptureLog(str(tmp_path), flushInterval=0)
+    assert recovered.epoch == 1
+    assert ids(recovered.queryIds(1)) == [1, 2, 3, 4, 5, 6]
+    # A restart after recovery moves on to the next epoch instead of mixing IDs into epoch 1
+    recovered.append(makePackets(1, 2))
+    assert recovered.epoch == 2
+    assert ids(recovered.queryIds(1)) == [1, 2]
+    assert ids(recovered.queryIds(1, epoch=1)) == [1, 2, 3, 4, 5, 6]
+    recovered.close()
+
+
+def testRetentionDeletesTheOldestSegments(tmp_path, clock):
+    log = CaptureLog(str(tmp_path), segmentBytes=2048, segmentSeconds=0, retentionBytes=8192, flushInterval=0)
+    for firstId in range(1, 2001, 50):
+        log.append(makePackets(firstId, 50))
+    stats = log.getStats()
+    assert stats["segmentsDeleted"] > 0
+    assert stats["bytes"] <= 8192 + 2048 * 2
+    assert len(segmentFiles(tmp_path)) == stats["segments"]
+    # The newest packets are always kept
+    assert ids(log.queryIds(1999)) == [1999, 2000]
+    log.close()
+
+def testQueriesSkipSegmentsDeletedByRetention(tmp_path, clock, monkeypatch):
+    log = CaptureLog(str(tmp_path), segmentBytes=2048, segmentSeconds=0, retentionBytes=8192, flushInterval=0)
+    for firstId in range(1, 501, 50):
+        log.append(makePackets(firstId, 50))
+    # A query snapshots the segment list, then a rotation deletes the oldest segments before it scans them
+    stale = log._snapshot()
+    monkeypatch.setattr(log, "_snapshot", lambda: stale)
+    firstId = 501
+    while os.path.exists(stale[0][0].path):
+        log.append(makePackets(firstId, 10))
+        firstId += 10
+    deleted = [segment for segment, _ in stale if not os.path.exists(segment.path)]
+    assert deleted and len(deleted) < len(stale)
+    # Packets of the deleted segments are gone; the rest of the snapshot is still served
+    firstKept = deleted[-1].lastId + 1
+    assert ids(log.queryIds(1, 500)) == list(range(firstKept, 501))
+    assert ids(log.queryTime(0.0)) == list(range(firstKept, 501))
+    log.close()
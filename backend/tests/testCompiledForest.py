@@ -0,0 +1,87 @@
+"""
+testCompiledForest.py
+----------------------
+Parity tests between the compiled forest backend and scikit-learn's RandomForestClassifier.
+"""
+
+import numpy as np
+import pytest
+
+ensemble = pytest.importorskip("sklearn.ensemble")
+
+from app.ml.compiledForest import CompiledForest  # noqa: E402
+
+FEATURES = ("length", "packet_mean", "packet_std")
+
+
+def trainForest(labels: np.ndarray, seed: int = 7, **parameters):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(len(labels), len(FEATURES))) * [500.0, 200.0, 50.0]
+    model = ensemble.RandomForestClassifier(random_state=seed, **parameters).fit(X, labels)
+    return model, X
+
+
+def testPredictMatchesSklearn():
+    rng = np.random.default_rng(1)
+    model, X = trainForest(rng.integers(0, 3, 600), n_estimators=25, max_depth=12)
+    compiled = CompiledForest.fromSklearn(model, maxBatch=64)
+    # Unseen rows, more than one chunk of maxBatch
+    rows = rng.normal(size=(1000, len(FEATURES))) * [500.0, 200.0, 50.0]
+    assert np.array_equal(compiled.predict(rows), model.predict(rows))
+    assert np.array_equal(compiled.predict(X), model.predict(X))
+
+
+def testProbabilitiesMatchSklearn():
+    rng = np.random.default_rng(2)
+    model, _ = trainForest(rng.integers(0, 3, 400), n_estimators=10)
+    compiled = CompiledForest.fromSklearn(model, maxBatch=128)
+    rows = (rng.normal(size=(100, len(FEATURES))) * [500.0, 200.0, 50.0]).astype(np.float32)
+    compiled.rows[:len(rows)] = rows
+    proba = compiled._predictProbaChunk(len(rows))
+    np.testing.assert_allclose(proba, model.predict_proba(rows), rtol=0, atol=1e-12)
+
+
+def testThresholdValuesFollowSklearn():
+    rng = np.random.default_rng(3)
+    model, _ = trainForest(rng.integers(0, 3, 300), n_estimators=5)
+    compiled = CompiledForest.fromSklearn(model)
+    # Rows sitting exactly on split thresholds exercise the x <= threshold comparison
+    thresholds = np.concatenate([estimator.tree_.threshold[estimator.tree_.feature >= 0] for estimator in model.estimators_])
+    rows = np.repeat(thresholds[:, np.newaxis], len(FEATURES), axis=1).astype(np.float32)
+    assert np.array_equal(compiled.predict(rows), model.predict(rows))
+
+
+def testPredictRowsUsesFeatureDictOrder():
+    rng = np.random.default_rng(4)
+    model, _ = trainForest(rng.integers(0, 3, 300), n_estimators=8)
+    compiled = CompiledForest.fromSklearn(model, maxBatch=16)
+    rows = rng.normal(size=(50, len(FEATURES))) * [500.0, 200.0, 50.0]
+    featureRows = [dict(zip(FEATURES, row.tolist())) for row in rows]
+    assert compiled.predictRows(featureRows) == model.predict(rows).tolist()
+
+
+def testNonContiguousAndStringClasses():
+    rng = np.random.default_rng(5)
+    model, X = trainForest(rng.choice([0, 2], 300), n_estimators=6)
+    assert np.array_equal(CompiledForest.fromSklearn(model).predict(X), model.predict(X))
+    model, X = trainForest(rng.choice(["LOW", "HIGH"], 300), n_estimators=6)
+    assert np.array_equal(CompiledForest.fromSklearn(model).predict(X), model.predict(X))
+
+
+def testSingleTreeAndStumps():
+    rng = np.random.default_rng(6)
+    model, X = trainForest(rng.integers(0, 3, 200), n_estimators=1, max_depth=1)
+    assert np.array_equal(CompiledForest.fromSklearn(model).predict(X), model.predict(X))
+
+
+def testSavedForestIsMemoryMappedOnLoad(tmp_path):
+    rng = np.random.default_rng(5)
+    model, X = trainForest(rng.integers(0, 3, 300), n_estimators=6)
+    path = str(tmp_path / "compiled.pkl")
+    CompiledForest.fromSklearn(model, maxBatch=64).save(path)
+    loaded = CompiledForest.load(path, maxBatch=16)
+    assert isinstance(loaded.children, np.memmap) and isinstance(loaded.value, np.memmap)
+    # Work buffers are rebuilt for the requested batch size
+    assert loaded.maxBatch == 16 and loaded.rows.shape == (16, len(FEATURES))
+    assert np.array_equal(loaded.predict(X), model.predict(X))
+    assert not isinstance(CompiledForest.load(path, mmapMode="").children, np.memmap)
@@ -0,0 +1,155 @@
+"""
+testFlowTable.py
+-----------------
+Tests for the bidirectional flow table: symmetric keys, running statistics,
+idle/active timeouts and the flow cap.
+"""
+
+import statistics
+import threading
+
+import pytest
+
+from app.ml.flowTable import FlowTable
+
+
+def packet(source: str, sourcePort: int, destination: str, destinationPort: int, length: int, protocol: str = "TCP") -> dict:
+    return {
+        "source": source,
+        "sourcePort": sourcePort,
+        "destination": destination,
+        "destinationPort": destinationPort,
+        "protocol": protocol,
+        "length": length,
+    }
+
+
+def forward(length: int) -> dict:
+    return packet("10.0.0.1", 40000, "10.0.0.2", 443, length)
+
+
+def backward(length: int) -> dict:
+    return packet("10.0.0.2", 443, "10.0.0.1", 40000, length)
+
+
+def testBothDirectionsShareOneFlow(clock):
+    table = FlowTable()
+    record = table.update(forward(100))
+    assert table.update(backward(1500)) is record
+    assert FlowTable.flowKey(forward(1))[0] == FlowTable.flowKey(backward(1))[0]
+    # Another port or protocol is another flow
+    assert table.update(packet("10.0.0.1", 40001, "10.0.0.2", 443, 60)) is not record
+    assert table.update(packet("10.0.0.1", 40000, "10.0.0.2", 443, 60, protocol="UDP")) is not record
+    stats = record.toStats()
+    assert (stats["Total Fwd Packets"], stats["Total Backward Packets"]) == (1, 1)
+    assert (stats["Total Length of Fwd Packets"], stats["Total Length of Bwd Packets"]) == (100, 1500)
+    assert table.getStats()["activeFlows"] == 3
+
+
+def testRunningStatisticsMatchBatchFormulas(clock):
+    table = FlowTable()
+    directions = [forward, backward, backward, forward, backward, forward, forward]
+    lengths = [60, 1500, 1400, 52, 900, 40, 1200]
+    gaps = [0.0, 0.01, 0.5, 0.02, 1.5, 0.03, 0.2]
+    arrivals = []
+    for makePacket, length, gap in zip(directions, lengths, gaps):
+        clock.now += gap
+        arrivals.append(clock.now)
+        record = table.update(makePacket(length))
+
+    interArrivals = [later - earlier for earlier, later in zip(arrivals, arrivals[1:])]
+    backwardLengths = [length for makePacket, length in zip(directions, lengths) if makePacket is backward]
+    stats = record.toStats()
+    assert stats["Flow Duration"] == pytest.approx(arrivals[-1] - arrivals[0])
+    assert stats["Packet Length Mean"] == pytest.approx(statistics.mean(lengths))
+    # Sample standard deviations, as in CICFlowMeter
+    assert stats["Packet Length Std"] == pytest.approx(statistics.stdev(lengths))
+    assert stats["Bwd Packet Length Mean"] == pytest.approx(statistics.mean(backwardLengths))
+    assert stats["Bwd Packet Length Std"] == pytest.approx(statistics.stdev(backwardLengths))
+    assert stats["Flow IAT Mean"] == pytest.approx(statistics.mean(interArrivals))
+    assert stats["Flow IAT Std"] == pytest.approx(statistics.stdev(interArrivals))
+
+
+def testSinglePacketFlowHasZeroSpread(clock):
+    stats = FlowTable().update(forward(100)).toStats()
+    assert (stats["Packet Length Std"], stats["Flow IAT Mean"], stats["Flow IAT Std"], stats["Flow Duration"]) == (0.0, 0.0, 0.0, 0.0)
+
+
+def testIdleTimeoutStartsANewFlow(clock):
+    table = FlowTable(idleTimeout=10.0, activeTimeout=100.0)
+    first = table.update(forward(100))
+    clock.now += 9.0
+    assert table.update(backward(100)) is first
+    clock.now += 10.0
+    second = table.update(forward(100))
+    assert second is not first and second.packetCount == 1
+    stats = table.getStats()
+    assert (stats["flowsCreated"], stats["idleEvictions"], stats["activeTimeouts"]) == (2, 1, 0)
+
+
+def testActiveTimeoutSplitsLongFlows(clock):
+    table = FlowTable(idleTimeout=10.0, activeTimeout=30.0)
+    first = table.update(forward(100))
+    for _ in range(5):
+        clock.now += 5.0
+        assert table.update(forward(100)) is first
+    clock.now += 5.0
+    # 30 s after the flow started, even though it never went idle
+    second = table.update(forward(100))
+    assert second is not first
+    assert second.toStats()["Flow Duration"] == 0.0
+    assert table.getStats()["activeTimeouts"] == 1
+
+
+def testIdleFlowsAreSweptByLaterTraffic(clock):
+    table = FlowTable(idleTimeout=10.0)
+    for port in range(5):
+        table.update(packet("10.0.0.1", port, "10.0.0.2", 80, 60))
+    clock.now += 20.0
+    table.update(packet("10.0.0.3", 1, "10.0.0.4", 80, 60))
+    stats = table.getStats()
+    assert (stats["activeFlows"], stats["idleEvictions"]) == (1, 5)
+
+
+def testFlowCapEvictsTheLeastRecentlyActiveFlow(clock):
+    table = FlowTable(maxFlows=3)
+    for port in range(3):
+        clock.now += 1.0
+        table.update(packet("10.0.0.1", port, "10.0.0.2", 80, 60))
+    # Port 0 becomes the most recently active flow
+    clock.now += 1.0
+    table.update(packet("10.0.0.2", 80, "10.0.0.1", 0, 60))
+    clock.now += 1.0
+    table.update(packet("10.0.0.1", 99, "10.0.0.2", 80, 60))
+    # Keys are (lower endpoint, higher endpoint, protocol); 10.0.0.1 is always the lower one here
+    remaining = sorted(key[0][1] for key in table.flows)
+    assert remaining == [0, 2, 99]
+    stats = table.getStats()
+    assert (stats["activeFlows"], stats["capacityEvictions"]) == (3, 1)
+
+
+def testUpdateAndReadSeesThePacketsOwnUpdate(clock):
+    table = FlowTable()
+    counts = [table.updateAndRead(forward(100), lambda record: record.packetCount) for _ in range(3)]
+    assert counts == [1, 2, 3]
+    table.clear()
+    assert table.getStats()["activeFlows"] == 0 and table.getStats()["flowsCreated"] == 0
+
+
+def testConcurrentReadersSeeConsistentCounts(clock):
+    table = FlowTable()
+    seen = []
+    lock = threading.Lock()
+
+    def worker():
+        counts = [table.updateAndRead(forward(100), lambda record: record.packetCount) for _ in range(500)]
+        with lock:
+            seen.extend(counts)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Every packet read the count right after its own update, so no count is seen twice
+    assert sorted(seen) == list(range(1, 2001))
@@ -0,0 +1,138 @@
+"""
+testLogger.py
+--------------
+Tests for the queued logger: per-level sampling, token-bucket rate limits,
+the dropping queue handler and periodic packet summary lines.
+"""
+
+import logging
+import os
+import queue
+
+import pytest
+
+from app import config
+from app.utils import logger as loggerModule
+from app.utils.logger import SystemLogger, _DroppingQueueHandler, _LogChannel
+from conftest import makePackets
+
+
+@pytest.fixture
+def logConfig(tmp_path, monkeypatch):
+    # Log files are written to ./logs
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "LOG_TO_CONSOLE", False)
+    monkeypatch.setattr(config, "LOG_LEVEL", "DEBUG")
+    monkeypatch.setattr(config, "LOG_SAMPLE_RATES", {})
+    monkeypatch.setattr(config, "LOG_RATE_LIMITS", {})
+    monkeypatch.setattr(config, "LOG_SUMMARY_INTERVAL", 3600.0)
+    return config
+
+
+@pytest.fixture
+def channel(logConfig, clock):
+    channel = _LogChannel("test-channel")
+    yield channel
+    if not channel.stopEvent.is_set():
+        channel.close()
+    channel.logger.removeHandler(channel.queueHandler)
+    for handler in channel.listener.handlers:
+        handler.close()
+
+
+def readLog(channel) -> list:
+    # Stopping the listener writes every queued record
+    channel.close()
+    with open(os.path.join("logs", f"{channel.logger.name}.log")) as logFile:
+        return logFile.read().splitlines()
+
+
+def testLevelsWithoutLimitsAreAlwaysAdmitted(channel):
+    assert all(channel.admit(logging.INFO) for _ in range(1000))
+    assert channel.getStats()["sampledOut"] == channel.getStats()["rateLimited"] == 0
+
+
+def testSamplingKeepsAFixedShareOfRecords(channel, logConfig):
+    logConfig.LOG_SAMPLE_RATES = {"DEBUG": 0.25}
+    admitted = [channel.admit(logging.DEBUG) for _ in range(100)]
+    # Deterministic 1 in 4, plus the first record
+    assert admitted[:8] == [True, False, False, True, False, False, False, True]
+    assert sum(admitted) == 26
+    assert channel.getStats()["sampledOut"] == 74
+    # Other levels are not sampled
+    assert channel.admit(logging.WARNING)
+
+
+def testRateLimitRefillsTheTokenBucketOverTime(channel, logConfig, clock):
+    logConfig.LOG_RATE_LIMITS = {"INFO": 5.0}
+    # The bucket starts full with one second of records
+    assert [channel.admit(logging.INFO) for _ in range(6)] == [True] * 5 + [False]
+    clock.now += 0.5
+    assert [channel.admit(logging.INFO) for _ in range(3)] == [True, True, False]
+    # A long pause refills the bucket only up to its capacity
+    clock.now += 10.0
+    assert [channel.admit(logging.INFO) for _ in range(6)] == [True] * 5 + [False]
+    assert channel.getStats()["rateLimited"] == 3
+
+
+def testSamplingIsAppliedBeforeRateLimiting(channel, logConfig):
+    logConfig.LOG_SAMPLE_RATES = {"INFO": 0.5}
+    logConfig.LOG_RATE_LIMITS = {"INFO": 2.0}
+    admitted = [channel.admit(logging.INFO) for _ in range(10)]
+    assert sum(admitted) == 2
+    stats = channel.getStats()
+    # 6 of 10 pass sampling; the bucket of 2 then rejects 4 of them
+    assert (stats["sampledOut"], stats["rateLimited"]) == (4, 4)
+
+
+def testFullQueueDropsAndCountsRecords():
+    handler = _DroppingQueueHandler(queue.Queue(maxsize=2))
+    for number in range(5):
+        handler.handle(logging.makeLogRecord({"msg": f"record {number}", "levelno": logging.INFO}))
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+    assert [handler.queue.get_nowait().getMessage() for _ in range(2)] == ["record 0", "record 1"]
+
+
+def testPacketsAreFoldedIntoOneSummaryLine(channel, clock):
+    channel.addPackets(makePackets(1, 3))
+    channel.addPackets(makePackets(4, 1))
+    assert channel.getStats()["pendingPackets"] == 4
+    clock.now += 2.5
+    channel.writeSummary()
+    stats = channel.getStats()
+    assert (stats["summaries"], stats["pendingPackets"]) == (1, 0)
+    # Nothing new since the last summary: no line is written
+    channel.writeSummary()
+    assert channel.getStats()["summaries"] == 1
+
+    lines = readLog(channel)
+    assert len(lines) == 1
+    assert lines[0].endswith(
+        "[INFO] Captured 4 packets (#1-#4, 250 bytes) in 2.5s [UDP=2, ICMP=1, TCP=1] risk [HIGH=1, LOW=1, MEDIUM=2]"
+    )
+
+
+def testClosingWritesTheLastSummary(channel):
+    channel.addPackets(makePackets(10, 2))
+    lines = readLog(channel)
+    assert len(lines) == 1 and "Captured 2 packets (#10-#11" in lines[0]
+
+
+def testSystemLoggerFiltersRecordsBeforeQueueingThem(logConfig, clock, monkeypatch):
+    monkeypatch.setattr(loggerModule, "_channels", {})
+    logConfig.LOG_RATE_LIMITS = {"WARNING": 2.0}
+    systemLogger = SystemLogger("test-system")
+    # Nothing is set up until the first record
+    assert not os.path.exists("logs")
+    for number in range(4):
+        systemLogger.logWarning(f"warning {number}")
+    systemLogger.logError("error")
+    assert systemLogger.getStats()["rateLimited"] == 2
+
+    channel = systemLogger.channel
+    lines = readLog(channel)
+    channel.logger.removeHandler(channel.queueHandler)
+    for handler in channel.listener.handlers:
+        handler.close()
+    assert [line.split("] ", 1)[1] for line in lines] == ["warning 0", "warning 1", "error"]
@@ -0,0 +1,196 @@
+"""
+testModelSwap.py
+-----------------
+Tests for runtime model replacement: validation and rejection of candidates,
+hot swap, verdict cache invalidation, swap listeners, shadow scoring and the file watcher.
+"""
+
+import os
+import time
+
+import numpy as np
+import pytest
+
+ensemble = pytest.importorskip("sklearn.ensemble")
+
+from app import config  # noqa: E402
+from app.ml import modelSwap  # noqa: E402
+from app.ml.modelInterface import DefaultModelHandler  # noqa: E402
+from app.ml.modelRegistry import ModelRegistry  # noqa: E402
+from app.ml.modelSwap import ModelSwapManager, addSwapListener, removeSwapListener  # noqa: E402
+from app.ml.verdictCache import CachedModelHandler  # noqa: E402
+
+
+def trainingRows(rows: int = 400, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([rng.uniform(40, 1500, rows), rng.uniform(0, 800, rows), rng.uniform(0, 200, rows)]).astype(np.float32)
+    # Large packets are HIGH risk, small ones LOW
+    y = np.where(X[:, 0] > 700, 2, 0)
+    return X, y
+
+
+def fitForest(X, y, seed: int = 0):
+    return ensemble.RandomForestClassifier(n_estimators=5, max_depth=4, random_state=seed).fit(X, y)
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "MODEL_REGISTRY_DIR", str(tmp_path / "models"))
+    monkeypatch.setattr(config, "MODEL_PATH", str(tmp_path / "missing.pkl"))
+    monkeypatch.setattr(config, "MODEL_VALIDATION_SAMPLE", "")
+    monkeypatch.setattr(config, "CAPTURE_MODE", "thread")
+    # Swap listeners and the last swapped artifact are module state
+    monkeypatch.setattr(modelSwap, "_swapListeners", [])
+    monkeypatch.setattr(modelSwap, "_swappedArtifact", None)
+    return ModelRegistry(str(tmp_path / "models"))
+
+
+@pytest.fixture
+def manager(registry):
+    handler = DefaultModelHandler(backend="compiled")
+    manager = ModelSwapManager(handler, minAccuracy=0.9)
+    yield manager
+    manager.stopWatching()
+    manager.stopShadow()
+
+
+def saveGoodModel(registry, seed: int = 0) -> int:
+    X, y = trainingRows(seed=seed)
+    holdoutX, holdoutY = trainingRows(200, seed=seed + 100)
+    return registry.save(fitForest(X, y, seed), {"metrics": {"accuracy": 0.99}}, holdout=(holdoutX, holdoutY))
+
+
+def waitForJob(manager, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while manager.job["state"] in ("loading", "validating"):
+        assert time.monotonic() < deadline, "model load did not finish"
+        time.sleep(0.01)
+    return manager.job
+
+
+def row(length: float) -> dict:
+    return {"length": length, "packet_mean": 100.0, "packet_std": 10.0}
+
+
+def testCandidateBelowMinimumAccuracyIsRejected(registry, manager):
+    X, y = trainingRows()
+    holdoutX, holdoutY = trainingRows(200, seed=1)
+    # Trained on inverted labels, so it gets the held-out rows wrong
+    version = registry.save(fitForest(X, 2 - y), {}, holdout=(holdoutX, holdoutY))
+    notified = []
+    addSwapListener(lambda path, artifactVersion: notified.append((path, artifactVersion)))
+
+    assert manager.requestLoad(str(version))
+    job = waitForJob(manager)
+    assert job["state"] == "failed" and "MODEL_MIN_ACCURACY" in job["error"]
+    # The stub keeps serving and nobody is told about a swap
+    assert manager.handler.modelVersion == 1 and not manager.handler.modelLoaded
+    assert manager.swaps == 0 and notified == []
+
+
+def testCandidateWithWrongFeatureCountIsRejected(registry, manager):
+    X, y = trainingRows()
+    version = registry.save(fitForest(X[:, :2], y), {})
+    manager.requestLoad(str(version))
+    job = waitForJob(manager)
+    assert job["state"] == "failed" and "features" in job["error"]
+    assert not manager.handler.modelLoaded
+
+
+def testSwapUpdatesVersionAndInvalidatesVerdictCache(registry, manager):
+    handler = manager.handler
+    cache = CachedModelHandler(handler)
+    assert cache.predict(row(1200)) in ("LOW", "MEDIUM", "HIGH")
+    version = saveGoodModel(registry)
+    servingVersion = handler.modelVersion
+
+    assert manager.requestLoad(str(version))
+    job = waitForJob(manager)
+    assert job["state"] == "done", job["error"]
+    assert handler.modelVersion == servingVersion + 1
+    assert handler.modelLoaded and handler.compiled is not None
+    assert (handler.loadedPath, handler.artifactVersion) == (registry.artifactPath(version), version)
+    # Stub verdicts were never cached; the swapped-in model's verdicts are served and cached from now on
+    assert cache.predict(row(1200)) == "HIGH" and cache.predict(row(100)) == "LOW"
+    assert cache.predict(row(1200)) == "HIGH"
+    stats = cache.getStats()
+    assert stats["invalidations"] == 1 and stats["hits"] == 1
+    assert manager.getStatus()["serving"]["artifactVersion"] == version
+
+
+def testRegistryModelsMemoryMapTheirCachedCompiledForest(registry):
+    version = saveGoodModel(registry)
+    first = DefaultModelHandler(backend="compiled")
+    assert first.artifactVersion == version
+    assert os.path.exists(registry.compiledPath(version))
+    # Later loads of the same version map the cached node arrays instead of recompiling
+    second = DefaultModelHandler(backend="compiled")
+    assert isinstance(second.compiled.children, np.memmap)
+    assert second.predictBatch([row(1200), row(100)]) == first.predictBatch([row(1200), row(100)]) == ["HIGH", "LOW"]
+    # The cache is not mistaken for a version of its own
+    assert registry.listVersions() == [version]
+
+
+def testSwapListenersReceivePathAndVersion(registry, manager):
+    notified, late = [], []
+
+    def listener(path, artifactVersion):
+        notified.append((path, artifactVersion))
+
+    addSwapListener(listener)
+    first = saveGoodModel(registry)
+    manager.requestLoad(str(first))
+    waitForJob(manager)
+    assert notified == [(registry.artifactPath(first), first)]
+
+    # A listener registered later is told about the model already serving
+    addSwapListener(lambda path, artifactVersion: late.append((path, artifactVersion)))
+    assert late == [(registry.artifactPath(first), first)]
+
+    removeSwapListener(listener)
+    second = saveGoodModel(registry, seed=1)
+    manager.requestLoad(str(second))
+    waitForJob(manager)
+    assert notified == [(registry.artifactPath(first), first)]
+    assert late[-1] == (registry.artifactPath(second), second)
+
+
+def testShadowScoresServingBatchesAndCanBePromoted(registry, manager):
+    handler = manager.handler
+    manager.requestLoad(str(saveGoodModel(registry)))
+    waitForJob(manager)
+    shadowVersion = saveGoodModel(registry, seed=3)
+    manager.requestLoad(str(shadowVersion), mode="shadow")
+    assert waitForJob(manager)["state"] == "done"
+    servingVersion = handler.modelVersion
+
+    handler.predictBatch([row(100), row(1200), row(900)])
+    deadline = time.monotonic() + 5.0
+    while manager.shadow.getStats()["rowsScored"] < 3:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    # The shadow never changes the serving model
+    assert handler.modelVersion == servingVersion
+
+    stats = manager.promoteShadow()
+    assert stats["rowsScored"] == 3 and stats["errors"] == 0
+    assert handler.shadow is None and manager.shadow is None
+    assert (handler.artifactVersion, handler.modelVersion) == (shadowVersion, servingVersion + 1)
+
+
+def testShadowModeIsRefusedInProcessMode(manager, monkeypatch):
+    monkeypatch.setattr(config, "CAPTURE_MODE", "process")
+    with pytest.raises(RuntimeError):
+        manager.requestLoad(mode="shadow")
+    with pytest.raises(ValueError):
+        manager.requestLoad(mode="replace")
+
+
+def testWatcherSwapsInNewRegistryVersions(registry, manager):
+    manager.startWatching(interval=0.05, mode="swap")
+    version = saveGoodModel(registry)
+    deadline = time.monotonic() + 10.0
+    while manager.handler.artifactVersion != version:
+        assert time.monotonic() < deadline, "watcher did not load the new version"
+        time.sleep(0.02)
+    assert manager.swaps == 1
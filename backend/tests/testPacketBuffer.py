@@ -0,0 +1,68 @@
+"""
+testPacketBuffer.py
+--------------------
+Tests for the ID-indexed packet ring buffer and its since_id / evicted cursors.
+"""
+
+from app.capture.packetBuffer import PacketRingBuffer
+from conftest import ids, makePackets
+
+
+def testLatestAndSinceWithinCapacity():
+    buffer = PacketRingBuffer(8)
+    assert buffer.extend(makePackets(1, 5)) == 0
+    assert ids(buffer.latest(3)) == [3, 4, 5]
+    packets, evicted = buffer.since(2)
+    assert (ids(packets), evicted) == ([3, 4, 5], 0)
+    packets, evicted = buffer.since(0, limit=2)
+    assert (ids(packets), evicted) == ([1, 2], 0)
+    assert buffer.latestId() == 5
+
+
+def testSinceReportsEvictedPacketsPastTheCursor():
+    buffer = PacketRingBuffer(4)
+    buffer.extend(makePackets(1, 3))
+    assert buffer.extend(makePackets(4, 7)) == 6
+    # IDs 1..6 were overwritten; a reader at ID 2 missed 3..6
+    packets, evicted = buffer.since(2)
+    assert (ids(packets), evicted) == ([7, 8, 9, 10], 4)
+    assert buffer.getStats() == {"capacity": 4, "size": 4, "oldestId": 7, "newestId": 10, "evicted": 6}
+
+
+def testSinceAtTheNewestIdIsEmpty():
+    buffer = PacketRingBuffer(4)
+    buffer.extend(makePackets(1, 6))
+    assert buffer.since(6) == ([], 0)
+
+
+def testClearKeepsCursorsValid():
+    buffer = PacketRingBuffer(4)
+    buffer.extend(makePackets(1, 3))
+    buffer.clear()
+    assert buffer.latest(10) == []
+    # The cleared packets count as evicted for a reader that had not seen them
+    assert buffer.since(1) == ([], 2)
+    buffer.extend(makePackets(4, 2))
+    packets, evicted = buffer.since(3)
+    assert (ids(packets), evicted) == ([4, 5], 0)
+
+
+def testIdRestartDiscardsTheHeldRange():
+    buffer = PacketRingBuffer(4)
+    buffer.extend(makePackets(1, 3))
+    buffer.clear(resetIds=True)
+    buffer.extend(makePackets(1, 2))
+    assert ids(buffer.latest(10)) == [1, 2]
+    # A gap in the IDs starts over at the new first ID
+    buffer.extend(makePackets(10, 2))
+    assert ids(buffer.latest(10)) == [10, 11]
+
+
+def testQueryFiltersNewestOrAfterCursor():
+    buffer = PacketRingBuffer(16)
+    buffer.extend(makePackets(1, 10))
+    assert ids(buffer.query(protocol="TCP", limit=2)) == [6, 9]
+    assert ids(buffer.query(protocol="TCP", sinceId=2, limit=2)) == [3, 6]
+    assert ids(buffer.query(risk="LOW", protocol="TCP")) == [3, 6, 9]
+    assert ids(buffer.query(source="10.0.0.9", protocol="TCP")) == [9]
+    assert buffer.query(source="10.0.0.9", protocol="UDP") == []
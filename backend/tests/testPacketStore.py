@@ -0,0 +1,82 @@
+"""
+testPacketStore.py
+-------------------
+Tests for the columnar packet store: cursor semantics matching PacketRingBuffer,
+round-tripping of packet fields and address table compaction.
+"""
+
+import pytest
+from app.capture.packetBuffer import PacketRingBuffer
+from app.capture.packetStore import ColumnarPacketStore
+from conftest import ids, makePacket, makePackets
+
+
+def testPacketsRoundTrip():
+    store = ColumnarPacketStore(8)
+    packets = makePackets(1, 5)
+    store.extend([dict(packetData) for packetData in packets])
+    assert store.latest(5) == packets
+
+
+def testExtraFieldsAreKept():
+    store = ColumnarPacketStore(4)
+    store.extend([makePacket(1, note="replayed"), makePacket(2)])
+    first, second = store.latest(2)
+    assert first["note"] == "replayed"
+    assert "note" not in second
+    # The slot's extras are dropped once it is overwritten
+    store.extend(makePackets(3, 3))
+    assert all("note" not in packetData for packetData in store.latest(4))
+
+
+def testSinceReportsEvictedPacketsPastTheCursor():
+    store = ColumnarPacketStore(4)
+    store.extend(makePackets(1, 3))
+    assert store.extend(makePackets(4, 7)) == 6
+    packets, evicted = store.since(2)
+    assert (ids(packets), evicted) == ([7, 8, 9, 10], 4)
+    packets, evicted = store.since(8, limit=1)
+    assert (ids(packets), evicted) == ([9], 0)
+    stats = store.getStats()
+    assert (stats["oldestId"], stats["newestId"], stats["evicted"]) == (7, 10, 6)
+
+
+def testOversizedBatchKeepsTheNewestPackets():
+    store = ColumnarPacketStore(4)
+    assert store.extend(makePackets(1, 10)) == 6
+    assert ids(store.latest(10)) == [7, 8, 9, 10]
+
+
+def testClearKeepsCursorsValid():
+    store = ColumnarPacketStore(4)
+    store.extend(makePackets(1, 3))
+    store.clear()
+    assert store.since(1) == ([], 2)
+    store.extend(makePackets(4, 2))
+    packets, evicted = store.since(3)
+    assert (ids(packets), evicted) == ([4, 5], 0)
+
+
+@pytest.mark.parametrize("sinceId", [None, 0, 5, 17])
+@pytest.mark.parametrize("filters", [{}, {"risk": "HIGH"}, {"protocol": "UDP", "risk": "MEDIUM"}, {"source": "10.0.0.9"}, {"risk": "NONE"}])
+def testQueryMatchesTheRingBuffer(filters, sinceId):
+    store = ColumnarPacketStore(16)
+    ring = PacketRingBuffer(16)
+    for firstId in range(1, 41, 8):
+        batch = makePackets(firstId, 8)
+        store.extend([dict(packetData) for packetData in batch])
+        ring.extend(batch)
+    for limit in (1, 3, 50):
+        assert store.query(sinceId=sinceId, limit=limit, **filters) == ring.query(sinceId=sinceId, limit=limit, **filters)
+    if sinceId is not None:
+        assert store.since(sinceId) == ring.since(sinceId)
+
+
+def testAddressTableIsCompacted():
+    store = ColumnarPacketStore(4)
+    for firstId in range(1, 4000, 4):
+        store.extend(makePackets(firstId, 4))
+    stats = store.getStats()
+    assert stats["addressCompactions"] > 0
+    assert stats["internedAddresses"] <= store.addressCompactThreshold
+    assert store.latest(4) == makePackets(3997, 4)
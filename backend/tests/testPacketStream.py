@@ -0,0 +1,176 @@
+"""
+testPacketStream.py
+--------------------
+Tests for the server-push packet stream: per-client cursors, session resets,
+slow-consumer policies and the WebSocket / SSE routes built on them.
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI, WebSocketDisconnect, status
+from fastapi.testclient import TestClient
+
+from app import config
+from app.capture.packetSniffer import PacketSniffer
+from app.capture.packetStream import DISCONNECT, PacketStreamCursor, SlowConsumerError
+from app.routes import packetRoutes
+from conftest import ids, makePackets
+
+
+@pytest.fixture
+def sniffer(tmp_path, monkeypatch):
+    # Session loggers write to ./logs
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "CAPTURE_MODE", "thread")
+    monkeypatch.setattr(config, "CAPTURE_LOG_DIR", "")
+    sniffer = PacketSniffer("stream", bufferSize=100)
+    yield sniffer
+    sniffer.close()
+
+
+def testNewClientsStartAtTheNewestPacket(sniffer):
+    sniffer.capturedPackets.extend(makePackets(1, 10))
+    cursor = PacketStreamCursor(sniffer)
+    assert cursor.nextFrame() is None
+    sniffer.capturedPackets.extend(makePackets(11, 3))
+    frame = cursor.nextFrame()
+    assert ids(frame["packets"]) == [11, 12, 13]
+    assert (frame["cursor"], frame["latestId"], frame["dropped"], frame["reset"]) == (13, 13, 0, False)
+    assert cursor.nextFrame() is None
+
+
+def testFramesAreCoalescedUpToTheBatchSize(sniffer):
+    sniffer.capturedPackets.extend(makePackets(1, 25))
+    cursor = PacketStreamCursor(sniffer, sinceId=0, maxBatch=10, maxBacklog=50)
+    assert [frame["count"] for frame in iter(cursor.nextFrame, None)] == [10, 10, 5]
+    assert (cursor.framesSent, cursor.packetsSent, cursor.packetsDropped) == (3, 25, 0)
+
+
+def testResetIsDetectedAfterNewIdsPassTheOldCursor(sniffer):
+    sniffer.capturedPackets.extend(makePackets(1, 5))
+    cursor = PacketStreamCursor(sniffer, sinceId=0)
+    assert cursor.nextFrame()["cursor"] == 5
+    # Reset between polls; the new run is already past the old cursor
+    sniffer.resetCapture()
+    sniffer.capturedPackets.extend(makePackets(1, 8))
+    frame = cursor.nextFrame()
+    assert frame["reset"] is True
+    assert ids(frame["packets"]) == list(range(1, 9))
+    assert cursor.nextFrame() is None
+
+
+def testResetIsReportedBeforeNewTrafficArrives(sniffer):
+    sniffer.capturedPackets.extend(makePackets(1, 5))
+    cursor = PacketStreamCursor(sniffer)
+    sniffer.resetCapture()
+    frame = cursor.nextFrame()
+    assert (frame["reset"], frame["count"], frame["cursor"]) == (True, 0, 0)
+    assert cursor.nextFrame() is None
+    sniffer.capturedPackets.extend(makePackets(1, 2))
+    frame = cursor.nextFrame()
+    assert (frame["reset"], ids(frame["packets"])) == (False, [1, 2])
+
+
+def testResumingWithAnIdFromBeforeAResetStartsOver(sniffer):
+    sniffer.capturedPackets.extend(makePackets(1, 3))
+    cursor = PacketStreamCursor(sniffer, sinceId=40)
+    frame = cursor.nextFrame()
+    assert frame["reset"] is True
+    assert ids(frame["packets"]) == [1, 2, 3]
+
+
+def testSlowConsumersSkipAhead(sniffer):
+    cursor = PacketStreamCursor(sniffer, sinceId=0, maxBatch=10, maxBacklog=20)
+    sniffer.capturedPackets.extend(makePackets(1, 50))
+    frame = cursor.nextFrame()
+    assert ids(frame["packets"]) == list(range(41, 51))
+    assert frame["dropped"] == 40
+    assert cursor.packetsDropped == 40
+
+
+def testEvictedPacketsAreCountedAsDropped(sniffer):
+    cursor = PacketStreamCursor(sniffer, sinceId=0, maxBatch=200, maxBacklog=500)
+    # The buffer holds 100 packets, so the first 50 were evicted before the client polled
+    sniffer.capturedPackets.extend(makePackets(1, 150))
+    frame = cursor.nextFrame()
+    assert frame["dropped"] == 50
+    assert ids(frame["packets"]) == list(range(51, 151))
+
+
+def testSlowConsumersAreDisconnectedUnderTheDisconnectPolicy(sniffer):
+    cursor = PacketStreamCursor(sniffer, sinceId=0, maxBatch=10, maxBacklog=20, policy=DISCONNECT)
+    sniffer.capturedPackets.extend(makePackets(1, 21))
+    with pytest.raises(SlowConsumerError):
+        cursor.nextFrame()
+
+
+@pytest.fixture
+def streamRoutes(sniffer, monkeypatch):
+    monkeypatch.setenv("API_KEY", "stream-test-key")
+    monkeypatch.setattr(config, "STREAM_MAX_FPS", 200.0)
+    monkeypatch.setattr(packetRoutes.sessionManager, "get", lambda name: sniffer if name == "stream" else None)
+    streamApp = FastAPI()
+    streamApp.include_router(packetRoutes.streamRouter, prefix="/api/packets")
+    return TestClient(streamApp)
+
+
+def testWebSocketPushesNewPackets(sniffer, streamRoutes):
+    sniffer.capturedPackets.extend(makePackets(1, 4))
+    with streamRoutes.websocket_connect("/api/packets/stream/ws?since_id=2&api_key=stream-test-key") as websocket:
+        assert ids(websocket.receive_json()["packets"]) == [3, 4]
+        sniffer.capturedPackets.extend(makePackets(5, 2))
+        assert ids(websocket.receive_json()["packets"]) == [5, 6]
+        sniffer.resetCapture()
+        sniffer.capturedPackets.extend(makePackets(1, 7))
+        frame = websocket.receive_json()
+        assert frame["reset"] is True and ids(frame["packets"]) == list(range(1, 8))
+
+
+def testWebSocketRejectsMissingKeysAndUnknownSessions(streamRoutes):
+    for path in ("/api/packets/stream/ws", "/api/packets/other/ws?api_key=stream-test-key"):
+        with pytest.raises(WebSocketDisconnect) as closed:
+            with streamRoutes.websocket_connect(path):
+                pass
+        assert closed.value.code == status.WS_1008_POLICY_VIOLATION
+
+
+class DisconnectingRequest:
+    """
+    Stands in for the SSE request; reports a disconnect after a number of polls.
+    """
+
+    def __init__(self, polls: int):
+        self.polls = polls
+
+    async def is_disconnected(self) -> bool:
+        self.polls -= 1
+        return self.polls < 0
+
+
+def collectEvents(sniffer, polls: int, **params) -> list:
+    async def collect():
+        response = await packetRoutes.streamPackets(DisconnectingRequest(polls), sniffer=sniffer, **params)
+        return [event async for event in response.body_iterator]
+    return asyncio.run(collect())
+
+
+def testServerSentEventsResumeFromLastEventId(sniffer, monkeypatch):
+    monkeypatch.setattr(config, "STREAM_MAX_FPS", 200.0)
+    sniffer.capturedPackets.extend(makePackets(1, 6))
+    events = collectEvents(sniffer, 2, since_id=None, last_event_id="4")
+    assert len(events) == 1
+    header, data = events[0].split("data: ")
+    assert header == "event: packets\nid: 6\n"
+    assert ids(json.loads(data)["packets"]) == [5, 6]
+    assert packetRoutes.activeStreamClients == 0
+
+
+def testServerSentEventsReportSlowConsumers(sniffer, monkeypatch):
+    monkeypatch.setattr(config, "STREAM_SLOW_CONSUMER_POLICY", DISCONNECT)
+    monkeypatch.setattr(config, "STREAM_MAX_BATCH", 5)
+    monkeypatch.setattr(config, "STREAM_MAX_BACKLOG", 10)
+    sniffer.capturedPackets.extend(makePackets(1, 20))
+    events = collectEvents(sniffer, 5, since_id=0, last_event_id=None)
+    assert len(events) == 1 and events[0].startswith("event: error\n")
@@ -0,0 +1,92 @@
+"""
+testPcapReplay.py
+------------------
+Tests for the memory-mapped capture file readers: pcap (micro- and nanosecond)
+and pcapng files written by Scapy, chunking, truncation and bad input.
+"""
+
+import struct
+
+import pytest
+from scapy.all import IP, TCP, UDP, Ether, wrpcap, wrpcapng
+
+from app.capture.pcapReplay import LINKTYPE_ETHERNET, PCAP_GLOBAL_HEADER_LEN, readCaptureFile
+
+
+def makeFrames(count: int) -> list:
+    frames = []
+    for number in range(count):
+        transport = TCP(sport=1000 + number, dport=443) if number % 2 else UDP(sport=1000 + number, dport=53)
+        frame = Ether() / IP(src=f"10.0.0.{number + 1}", dst="192.168.1.1") / transport / (b"x" * number)
+        frame.time = 1700000000 + number * 0.25
+        frames.append(frame)
+    return frames
+
+
+def readAll(path, chunkSize: int = 4096) -> list:
+    return [frame for chunk in readCaptureFile(str(path), chunkSize) for frame in chunk]
+
+
+@pytest.mark.parametrize("writer", [wrpcap, wrpcapng], ids=["pcap", "pcapng"])
+def testScapyCapturesRoundTrip(tmp_path, writer):
+    frames = makeFrames(10)
+    path = tmp_path / "capture.cap"
+    writer(str(path), frames)
+    read = readAll(path)
+    assert [frame for _, frame, _ in read] == [bytes(frame) for frame in frames]
+    assert [captureTime for captureTime, _, _ in read] == pytest.approx([float(frame.time) for frame in frames])
+    assert {linkType for _, _, linkType in read} == {LINKTYPE_ETHERNET}
+
+
+def testNanosecondPcapTimestamps(tmp_path):
+    frames = makeFrames(3)
+    frames[1].time = 1700000000.123456789
+    path = tmp_path / "nano.pcap"
+    wrpcap(str(path), frames, nano=True)
+    read = readAll(path)
+    assert read[1][0] == pytest.approx(1700000000.123456789, abs=1e-6)
+    assert [frame for _, frame, _ in read] == [bytes(frame) for frame in frames]
+
+
+def testFramesAreYieldedInChunks(tmp_path):
+    path = tmp_path / "capture.pcap"
+    wrpcap(str(path), makeFrames(10))
+    assert [len(chunk) for chunk in readCaptureFile(str(path), chunkSize=4)] == [4, 4, 2]
+
+
+def testTruncatedTrailingPcapRecordIsSkipped(tmp_path):
+    path = tmp_path / "capture.pcap"
+    wrpcap(str(path), makeFrames(3))
+    data = path.read_bytes()
+    path.write_bytes(data[:-5])
+    assert len(readAll(path)) == 2
+
+
+def testEmptyFileHasNoFrames(tmp_path):
+    path = tmp_path / "empty.pcap"
+    path.write_bytes(b"")
+    assert readAll(path) == []
+
+
+@pytest.mark.parametrize("size", [12, 20, PCAP_GLOBAL_HEADER_LEN - 1])
+def testShortPcapHeaderIsRejected(tmp_path, size):
+    path = tmp_path / "short.pcap"
+    path.write_bytes(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET)[:size])
+    with pytest.raises(ValueError):
+        readAll(path)
+
+
+def testCorruptPcapngBlockIsRejected(tmp_path):
+    path = tmp_path / "capture.pcapng"
+    wrpcapng(str(path), makeFrames(2))
+    # An Enhanced Packet Block header at the very end of the file, without a body
+    path.write_bytes(path.read_bytes() + struct.pack("<II", 6, 12) + b"\x00" * 4)
+    with pytest.raises(ValueError):
+        readAll(path)
+
+
+def testOtherFilesAreRejected(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_bytes(b"not a capture file at all")
+    with pytest.raises(ValueError):
+        readAll(path)
@@ -0,0 +1,137 @@
+"""
+testPrefixIndex.py
+-------------------
+Tests for the flattened longest-prefix index over CIDR reputation lists.
+"""
+
+import ipaddress
+import os
+import random
+
+import numpy as np
+
+from app.enrichment.prefixIndex import PrefixIndex, _flatten
+
+
+def block(cidr: str, mask: int):
+    network = ipaddress.ip_network(cidr)
+    return int(network.network_address), int(network.broadcast_address), mask
+
+
+def naiveMask(blocks, address: int) -> int:
+    mask = 0
+    for start, end, blockMask in blocks:
+        if start <= address <= end:
+            mask |= blockMask
+    return mask
+
+
+def lookup(starts, ends, masks, address: int) -> int:
+    for start, end, mask in zip(starts, ends, masks):
+        if start <= address <= end:
+            return mask
+    return 0
+
+
+def testFlattenNestedBlocks():
+    blocks = [
+        block("10.0.0.0/8", 1),
+        block("10.1.0.0/16", 2),
+        block("10.1.2.0/24", 4),
+        block("10.1.2.128/25", 1),
+        block("10.2.0.0/16", 2),
+        block("192.168.0.0/24", 8),
+    ]
+    starts, ends, masks = _flatten(list(blocks))
+    ranges = [(str(ipaddress.ip_address(start)), str(ipaddress.ip_address(end)), mask) for start, end, mask in zip(starts, ends, masks)]
+    assert ranges == [
+        ("10.0.0.0", "10.0.255.255", 1),
+        ("10.1.0.0", "10.1.1.255", 3),
+        ("10.1.2.0", "10.1.2.255", 7),
+        # Adjacent ranges with the same lists are merged
+        ("10.1.3.0", "10.2.255.255", 3),
+        ("10.3.0.0", "10.255.255.255", 1),
+        ("192.168.0.0", "192.168.0.255", 8),
+    ]
+
+
+def testFlattenSharedStartsAndDuplicates():
+    blocks = [block("10.0.0.0/24", 1), block("10.0.0.0/8", 2), block("10.0.0.0/24", 4), block("0.0.0.0/0", 8)]
+    starts, ends, masks = _flatten(list(blocks))
+    ranges = [(str(ipaddress.ip_address(start)), str(ipaddress.ip_address(end)), mask) for start, end, mask in zip(starts, ends, masks)]
+    assert ranges == [
+        ("0.0.0.0", "9.255.255.255", 8),
+        ("10.0.0.0", "10.0.0.255", 15),
+        ("10.0.1.0", "10.255.255.255", 10),
+        ("11.0.0.0", "255.255.255.255", 8),
+    ]
+
+
+def testFlattenMatchesNaiveLookupOnRandomNestedBlocks():
+    rng = random.Random(7)
+    blocks = []
+    for _ in range(300):
+        prefix = rng.randint(8, 32)
+        address = rng.choice([0x0A000000, 0xC0A80000, 0xAC100000]) | rng.getrandbits(20)
+        network = ipaddress.ip_network(f"{ipaddress.ip_address(address)}/{prefix}", strict=False)
+        blocks.append((int(network.network_address), int(network.broadcast_address), 1 << rng.randint(0, 5)))
+    starts, ends, masks = _flatten(list(blocks))
+    # Sorted, disjoint, and adjacent ranges with the same mask are merged
+    for index in range(1, len(starts)):
+        assert ends[index - 1] < starts[index]
+        assert not (ends[index - 1] + 1 == starts[index] and masks[index - 1] == masks[index])
+    probes = [start for start, _, _ in blocks] + [end for _, end, _ in blocks]
+    probes += [end + 1 for _, end, _ in blocks] + [start - 1 for start, _, _ in blocks]
+    probes += [rng.choice([0x0A000000, 0xC0A80000]) | rng.getrandbits(20) for _ in range(2000)]
+    for address in probes:
+        assert lookup(starts, ends, masks, address) == naiveMask(blocks, address)
+
+
+def writeLists(directory, lists):
+    os.makedirs(directory, exist_ok=True)
+    for name, lines in lists.items():
+        with open(os.path.join(directory, name), "w") as listFile:
+            listFile.write("\n".join(lines) + "\n")
+
+
+LISTS = {
+    "drop.txt": ["; Spamhaus DROP", "10.0.0.0/8 ; SBL1", "2001:db8::/32"],
+    "firehol.netset": ["# FireHOL", "10.1.0.0/16", "192.0.2.1", "2001:db8:1::/48", "not-an-address"],
+    "tor.ipset": ["10.1.2.3", "198.51.100.0/24"],
+}
+
+
+def testBuildAndLookup(tmp_path):
+    writeLists(tmp_path / "lists", LISTS)
+    index = PrefixIndex.build([str(path) for path in (tmp_path / "lists").iterdir()])
+    assert index.labels == ["drop", "firehol", "tor"]
+    addresses = ["10.0.0.1", "10.1.0.1", "10.1.2.3", "192.0.2.1", "192.0.2.2", "198.51.100.77", "8.8.8.8"]
+    values = np.array([int(ipaddress.ip_address(address)) for address in addresses], dtype=np.uint32)
+    labels = [index.labelsFor(int(mask)) for mask in index.lookupIPv4(values)]
+    assert labels == [
+        ("drop",), ("drop", "firehol"), ("drop", "firehol", "tor"), ("firehol",), (), ("tor",), (),
+    ]
+    assert index.labelsFor(index.lookupIPv6(int(ipaddress.ip_address("2001:db8:1::5")))) == ("drop", "firehol")
+    assert index.labelsFor(index.lookupIPv6(int(ipaddress.ip_address("2001:db8:2::5")))) == ("drop",)
+    assert index.lookupIPv6(int(ipaddress.ip_address("2001:db9::1"))) == 0
+    stats = index.getStats()
+    assert (stats["entries"], stats["invalidLines"]) == (7, 1)
+
+
+def testOpenCachesCompiledIndex(tmp_path):
+    listDirectory, indexDirectory = tmp_path / "lists", tmp_path / "index"
+    writeLists(listDirectory, LISTS)
+    first = PrefixIndex.open(str(listDirectory), str(indexDirectory))
+    assert first.mapped
+    cached = os.listdir(indexDirectory)
+    second = PrefixIndex.open(str(listDirectory), str(indexDirectory))
+    assert os.listdir(indexDirectory) == cached
+    assert np.array_equal(first.starts, second.starts) and np.array_equal(first.masks, second.masks)
+    assert second.ipv6Ranges == first.ipv6Ranges
+    # Changing a list compiles a new index and drops the old one
+    writeLists(listDirectory, {"tor.ipset": ["10.1.2.3", "198.51.100.0/24", "203.0.113.9"]})
+    third = PrefixIndex.open(str(listDirectory), str(indexDirectory), mmapMode=None)
+    assert not third.mapped
+    assert len(os.listdir(indexDirectory)) == 1 and os.listdir(indexDirectory) != cached
+    address = np.array([int(ipaddress.ip_address("203.0.113.9"))], dtype=np.uint32)
+    assert third.labelsFor(int(third.lookupIPv4(address)[0])) == ("tor",)
@@ -0,0 +1,83 @@
+"""
+testRawDecoder.py
+------------------
+Parity tests between the struct-based raw frame decoder and the Scapy parser.
+"""
+
+import pytest
+
+scapy = pytest.importorskip("scapy.all")
+
+from app.capture.packetParser import parsePacket, parseRawFrame  # noqa: E402
+from app.capture.rawDecoder import decodeFrame, flowHash  # noqa: E402
+
+Ether, Dot1Q, IP, IPv6, TCP, UDP, ICMP = scapy.Ether, scapy.Dot1Q, scapy.IP, scapy.IPv6, scapy.TCP, scapy.UDP, scapy.ICMP
+
+ETHERNET = Ether(src="02:00:00:00:00:01", dst="02:00:00:00:00:02")
+
+# Frames the fast path decodes itself
+FAST_PATH_FRAMES = {
+    "ipv4-tcp": ETHERNET / IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=40000, dport=443, flags="SA") / (b"x" * 20),
+    "ipv4-tcp-ns": ETHERNET / IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=1, dport=2, flags="NA"),
+    "ipv4-options": ETHERNET / IP(src="10.0.0.1", dst="10.0.0.2", options=[scapy.IPOption_RR()]) / TCP(sport=5, dport=6),
+    "ipv4-udp": ETHERNET / IP(src="192.168.1.10", dst="8.8.8.8") / UDP(sport=53000, dport=53) / b"query",
+    "ipv4-icmp": ETHERNET / IP(src="10.0.0.1", dst="10.0.0.2") / ICMP(),
+    "ipv4-gre": ETHERNET / IP(src="10.0.0.1", dst="10.0.0.2", proto=47) / (b"\x00" * 8),
+    "ipv4-fragment": ETHERNET / IP(src="10.0.0.1", dst="10.0.0.2", proto=6, frag=185) / (b"\x00" * 40),
+    "ipv6-tcp": ETHERNET / IPv6(src="2001:db8::1", dst="2001:db8::2") / TCP(sport=22, dport=50000, flags="PA"),
+    "ipv6-udp": ETHERNET / IPv6(src="fe80::1", dst="ff02::fb") / UDP(sport=5353, dport=5353),
+    "ipv6-icmpv6": ETHERNET / IPv6(src="2001:db8::1", dst="2001:db8::2") / scapy.ICMPv6EchoRequest(),
+    "vlan-ipv4-udp": ETHERNET / Dot1Q(vlan=10) / IP(src="10.1.0.1", dst="10.1.0.2") / UDP(sport=1000, dport=2000),
+    "qinq-ipv6-tcp": ETHERNET / Dot1Q(vlan=100) / Dot1Q(vlan=200) / IPv6(src="2001:db8::a", dst="2001:db8::b") / TCP(sport=80, dport=8080),
+}
+
+# Frames left to Scapy
+FALLBACK_FRAMES = {
+    "arp": ETHERNET / scapy.ARP(psrc="10.0.0.1", pdst="10.0.0.2"),
+    "ipv6-hop-by-hop": ETHERNET / IPv6(src="2001:db8::1", dst="2001:db8::2") / scapy.IPv6ExtHdrHopByHop() / UDP(sport=1, dport=2),
+    "ipv6-fragment-header": ETHERNET / IPv6(src="2001:db8::1", dst="2001:db8::2") / scapy.IPv6ExtHdrFragment() / TCP(sport=3, dport=4),
+}
+
+
+def withoutTimestamp(packetData):
+    return {key: value for key, value in packetData.items() if key != "timestamp"}
+
+
+@pytest.mark.parametrize("name", sorted(FAST_PATH_FRAMES))
+def testFastPathMatchesScapy(name):
+    frame = bytes(FAST_PATH_FRAMES[name])
+    assert decodeFrame(frame) is not None
+    raw = parseRawFrame(frame, 7, classify=False)
+    dissected = parsePacket(Ether(frame), 7, classify=False)
+    assert raw["source"] != "PARSE_ERROR"
+    assert withoutTimestamp(raw) == withoutTimestamp(dissected)
+
+
+@pytest.mark.parametrize("name", sorted(FALLBACK_FRAMES))
+def testFallbackFramesMatchScapy(name):
+    frame = bytes(FALLBACK_FRAMES[name])
+    assert decodeFrame(frame) is None
+    raw = parseRawFrame(frame, 3, classify=False)
+    assert withoutTimestamp(raw) == withoutTimestamp(parsePacket(Ether(frame), 3, classify=False))
+    assert raw["source"] != "PARSE_ERROR"
+
+
+def testExtensionHeadersResolveToTransport():
+    packetData = parseRawFrame(bytes(FALLBACK_FRAMES["ipv6-hop-by-hop"]), 1, classify=False)
+    assert (packetData["protocol"], packetData["sourcePort"], packetData["destinationPort"]) == ("UDP", 1, 2)
+
+
+def testTruncatedFramesAreNotDecoded():
+    frame = bytes(FAST_PATH_FRAMES["ipv4-tcp"])
+    # Ethernet + IPv4 header + half a TCP header
+    assert decodeFrame(frame[:14 + 20 + 10]) is None
+    assert decodeFrame(frame[:10]) is None
+
+
+def testFlowHashIsSymmetric():
+    forward = ETHERNET / IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=40000, dport=443)
+    reverse = ETHERNET / IP(src="10.0.0.2", dst="10.0.0.1") / TCP(sport=443, dport=40000)
+    other = ETHERNET / IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=40001, dport=443)
+    assert flowHash(bytes(forward)) == flowHash(bytes(reverse))
+    assert flowHash(bytes(forward)) != flowHash(bytes(other))
+    assert flowHash(bytes(FALLBACK_FRAMES["arp"])) == 0
@@ -0,0 +1,107 @@
+"""
+testSessionManager.py
+----------------------
+Tests for named capture sessions: name validation, session and buffer budgets,
+and removal of idle and running sessions.
+"""
+
+import os
+import threading
+
+import pytest
+
+from app import config
+from app.capture.sessionManager import DEFAULT_SESSION, RESERVED_NAMES, CaptureSessionManager
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    # Session loggers write to ./logs
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "CAPTURE_MODE", "thread")
+    monkeypatch.setattr(config, "CAPTURE_LOG_DIR", "")
+    manager = CaptureSessionManager(maxSessions=3, bufferBudget=config.PACKET_BUFFER_SIZE + 1000)
+    yield manager
+    for name in list(manager.sessions):
+        manager.sessions.pop(name).close()
+
+
+def testDefaultSessionAlwaysExists(manager):
+    assert list(manager.sessions) == [DEFAULT_SESSION]
+    assert manager.get(DEFAULT_SESSION) is manager.default
+    with pytest.raises(ValueError):
+        manager.remove(DEFAULT_SESSION)
+
+
+@pytest.mark.parametrize("name", sorted(RESERVED_NAMES) + ["", "-lead", "has space", "a/b", "x" * 33, "émoji"])
+def testInvalidAndReservedNamesAreRejected(manager, name):
+    with pytest.raises(ValueError):
+        manager.create(name, bufferSize=10)
+    assert list(manager.sessions) == [DEFAULT_SESSION]
+
+
+def testValidNamesAndDuplicates(manager):
+    sniffer = manager.create("eth0_dmz-1", bufferSize=10)
+    assert sniffer.name == "eth0_dmz-1" and manager.get("eth0_dmz-1") is sniffer
+    with pytest.raises(ValueError, match="already exists"):
+        manager.create("eth0_dmz-1", bufferSize=10)
+
+
+def testSessionCountLimit(manager):
+    manager.create("one", bufferSize=10)
+    manager.create("two", bufferSize=10)
+    with pytest.raises(ValueError, match="SESSION_MAX_COUNT"):
+        manager.create("three", bufferSize=10)
+    # Removing a session frees its slot
+    assert manager.remove("one")
+    manager.create("three", bufferSize=10)
+
+
+def testBufferBudgetIsShared(manager):
+    manager.create("big", bufferSize=600)
+    assert manager.bufferUsage() == config.PACKET_BUFFER_SIZE + 600
+    with pytest.raises(ValueError, match="between 1 and 400"):
+        manager.create("small", bufferSize=401)
+    manager.create("small", bufferSize=400)
+    manager.remove("big")
+    assert manager.bufferUsage() == config.PACKET_BUFFER_SIZE + 400
+
+
+def testLimitsAreValidated(manager):
+    with pytest.raises(ValueError, match="queue_capacity"):
+        manager.create("q", bufferSize=10, queueCapacity=max(config.CAPTURE_QUEUE_CAPACITY, config.INFERENCE_QUEUE_CAPACITY) + 1)
+    with pytest.raises(ValueError, match="workers"):
+        manager.create("w", bufferSize=10, workers=(os.cpu_count() or 1) + 1)
+    with pytest.raises(ValueError, match="max_pps"):
+        manager.create("p", bufferSize=10, maxPacketsPerSecond=-1)
+    sniffer = manager.create("ok", bufferSize=10, queueCapacity=5, workers=1, maxPacketsPerSecond=50)
+    assert sniffer.getLimits() == {"bufferSize": 10, "queueCapacity": 5, "workers": 1, "maxPacketsPerSecond": 50}
+
+
+def testRemovingUnknownSessionReportsFalse(manager):
+    assert manager.remove("missing") is False
+
+
+def testRemovingARunningSessionStopsItsPipeline(manager, monkeypatch):
+    pytest.importorskip("scapy.all")
+    sniffer = manager.create("live", bufferSize=10)
+    captureStopped = threading.Event()
+
+    def fakeCaptureLoop(iface):
+        # Stands in for the socket loop, which needs capture privileges
+        while sniffer.isCapturing:
+            captureStopped.wait(0.01)
+        captureStopped.set()
+
+    monkeypatch.setattr(sniffer, "_captureLoop", fakeCaptureLoop)
+    sniffer.startCapture()
+    assert sniffer.isCapturing and sniffer.inferenceStage.isRunning
+    threads = [sniffer.captureThread, sniffer.inferenceStage.workerThread, *sniffer.parseThreads]
+    assert all(thread.is_alive() for thread in threads)
+
+    assert manager.remove("live")
+    assert manager.get("live") is None
+    assert captureStopped.is_set() and not sniffer.isCapturing
+    assert not any(thread.is_alive() for thread in threads)
+    # The default session is untouched
+    assert manager.get(DEFAULT_SESSION) is not None and not manager.default.isCapturing
@@ -0,0 +1,94 @@
+"""
+testShardedCapture.py
+----------------------
+Tests for the process-sharded capture pipeline that need no worker processes.
+"""
+
+import pytest
+
+from app.capture.shardedCapture import (
+    _MAX_PROTOCOL_LENGTH,
+    FRAME_SLOT_SIZE,
+    RESULT_SLOT_SIZE,
+    ShardedCapture,
+    _parseFrames,
+    decodeResult,
+    encodeResult,
+)
+from app.capture.sharedRing import SharedRing
+from conftest import makePacket
+
+
+class RecordingLogger:
+    def __init__(self):
+        self.errors = []
+
+    def logError(self, message):
+        self.errors.append(message)
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRing.create(16, RESULT_SLOT_SIZE)
+    yield ring
+    ring.close()
+
+
+def testCollectorSurvivesAFailingBatch(ring):
+    batches = []
+
+    def onPackets(packets):
+        if not batches:
+            batches.append(None)
+            raise OSError("disk full")
+        batches.append([packetData["length"] for packetData in packets])
+
+    pool = ShardedCapture(1, onPackets, logger=RecordingLogger())
+    pool.outputRings = [ring]
+    for packetId in range(3):
+        ring.push(encodeResult(makePacket(packetId)))
+    assert pool._drainOnce() == 3
+    ring.push(encodeResult(makePacket(3)))
+    assert pool._drainOnce() == 1
+    assert batches == [None, [63]]
+    assert (pool.resultsCollected, pool.resultsFailed) == (1, 3)
+    assert len(pool.logger.errors) == 1
+    assert pool._drainOnce() == 0
+
+
+def testResultRecordRoundTrip():
+    packetData = makePacket(7, risk="HIGH", tcpFlags=0x1FF, sourcePort=65535, length=9000)
+    decoded = decodeResult(encodeResult(packetData))
+    # The collector assigns the ID
+    assert decoded == {**packetData, "id": None}
+    for risk in ("LOW", "MEDIUM", "HIGH"):
+        assert decodeResult(encodeResult(makePacket(1, risk=risk)))["risk"] == risk
+
+
+def testLargestRecordFitsAResultSlot():
+    longest = "ffff:ffff:ffff:ffff:ffff:ffff:255.255.255.255"
+    packetData = makePacket(1, source=longest, destination=longest, protocol="P" * 200, length=2 ** 32 - 1)
+    record = encodeResult(packetData)
+    assert len(record) == RESULT_SLOT_SIZE
+    # Only the protocol name is shortened
+    decoded = decodeResult(record)
+    assert decoded["protocol"] == "P" * _MAX_PROTOCOL_LENGTH
+    assert (decoded["source"], decoded["length"]) == (longest, 2 ** 32 - 1)
+
+
+def testTruncatedFramesKeepTheirOriginalLength():
+    scapy = pytest.importorskip("scapy.all")
+    frame = bytes(
+        scapy.Ether() / scapy.IP(src="10.0.0.1", dst="10.0.0.2") / scapy.TCP(sport=1234, dport=80) / (b"x" * 3000)
+    )
+    ring = SharedRing.create(4, FRAME_SLOT_SIZE)
+    try:
+        ring.push(frame)
+        ring.push(frame[:100])
+        frames = ring.popManyWithLength(4)
+    finally:
+        ring.close()
+    assert [(len(payload), length) for payload, length in frames] == [(FRAME_SLOT_SIZE, len(frame)), (100, 100)]
+    packets = _parseFrames(frames)
+    assert [packetData["length"] for packetData in packets] == [len(frame), 100]
+    assert packets[0]["sourcePort"] == 1234 and "risk" not in packets[0]
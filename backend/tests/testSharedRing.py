@@ -0,0 +1,70 @@
+"""
+testSharedRing.py
+------------------
+Tests for the single-producer / single-consumer shared-memory ring.
+"""
+
+import pytest
+
+from app.capture.sharedRing import SharedRing
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRing.create(4, 16)
+    yield ring
+    ring.close()
+
+
+def testFifoOrderAcrossWraparound(ring):
+    expected = []
+    received = []
+    for value in range(15):
+        payload = f"frame-{value}".encode()
+        assert ring.push(payload)
+        expected.append(payload)
+        if ring.depth() == 3:
+            # Keep the ring nearly full so its slots wrap around several times
+            received.extend(ring.popMany(2))
+    received.extend(ring.popMany(10))
+    assert received == expected
+    assert ring.depth() == 0 and ring.pop() is None
+
+
+def testFullRingDropsAndCounts(ring):
+    assert all(ring.push(bytes([value])) for value in range(4))
+    assert not ring.push(b"late")
+    assert not ring.push(b"later")
+    assert (ring.depth(), ring.dropped()) == (4, 2)
+    assert ring.pop() == b"\x00"
+    assert ring.push(b"fits")
+    assert ring.popMany(10) == [b"\x01", b"\x02", b"\x03", b"fits"]
+
+
+def testLongPayloadsAreTruncatedAndKeepTheirLength(ring):
+    ring.push(b"x" * 40)
+    ring.push(b"y" * 16)
+    ring.push(b"short")
+    assert ring.popManyWithLength(10) == [(b"x" * 16, 40), (b"y" * 16, 16), (b"short", 5)]
+    assert ring.truncated() == 1
+
+
+def testLongPayloadCanBeRefused(ring):
+    with pytest.raises(ValueError):
+        ring.push(b"z" * 17, truncate=False)
+    assert (ring.depth(), ring.truncated(), ring.dropped()) == (0, 0, 0)
+
+
+def testAttachedRingSharesState(ring):
+    consumer = SharedRing.attach(ring.name, 4, 16)
+    try:
+        ring.push(b"a" * 20)
+        ring.push(b"b")
+        assert consumer.popManyWithLength(1) == [(b"a" * 16, 20)]
+        # Counters and cursors live in the shared header
+        assert (ring.depth(), consumer.truncated()) == (1, 1)
+        assert consumer.pop() == b"b"
+    finally:
+        consumer.close()
+    # The consumer does not own the segment, so the producer can still use it
+    assert ring.push(b"c") and ring.pop() == b"c"
@@ -0,0 +1,143 @@
+"""
+testSketches.py
+----------------
+Error-bound tests for the probabilistic traffic summaries in app/analytics/sketches.py.
+"""
+
+from collections import Counter
+
+import numpy as np
+
+from app.analytics.sketches import CountMinSketch, HyperLogLog, SpaceSaving, VirtualHyperLogLog, hashKeys, mix64
+
+
+def zipfStream(size: int, keys: int, seed: int):
+    rng = np.random.default_rng(seed)
+    return [f"10.0.{value // 256}.{value % 256}" for value in np.minimum(rng.zipf(1.3, size), keys)]
+
+
+def assertSpaceSavingBounds(summary: SpaceSaving, truth: Counter) -> None:
+    total = sum(truth.values())
+    for key, weight in truth.items():
+        counter = summary.counters.get(key)
+        if counter is None:
+            assert weight <= summary.floor
+        else:
+            count, error = counter
+            assert count <= weight <= count + error
+    # Unmonitored keys never weigh more than an even share of the stream
+    assert summary.floor <= total / summary.capacity
+
+
+def testSpaceSavingBoundsOnSkewedStream():
+    stream = zipfStream(50000, 5000, seed=1)
+    summary = SpaceSaving(capacity=32)
+    for key in stream:
+        summary.update(key)
+    truth = Counter(stream)
+    assertSpaceSavingBounds(summary, truth)
+    # The heaviest keys are reported in order
+    assert [key for key, _, _ in summary.top(5)] == [key for key, _ in truth.most_common(5)]
+
+
+def testSpaceSavingWeightedUpdates():
+    rng = np.random.default_rng(2)
+    truth = Counter()
+    summary = SpaceSaving(capacity=16)
+    for _ in range(200):
+        batch = Counter({f"host-{key}": int(rng.integers(1, 1500)) for key in rng.zipf(1.5, 50) % 400})
+        summary.updateMany(batch)
+        truth.update(batch)
+    assertSpaceSavingBounds(summary, truth)
+
+
+def testSpaceSavingMergeKeepsBounds():
+    left, right = zipfStream(20000, 3000, seed=3), zipfStream(20000, 3000, seed=4)
+    merged = SpaceSaving(capacity=24)
+    for part in (left, right):
+        summary = SpaceSaving(capacity=24)
+        for key in part:
+            summary.update(key)
+        merged.mergeFrom(summary)
+    assertSpaceSavingBounds(merged, Counter(left) + Counter(right))
+
+
+def testSpaceSavingIsExactBelowCapacity():
+    summary = SpaceSaving(capacity=8)
+    summary.updateMany({"a": 5, "b": 3})
+    summary.update("a")
+    assert summary.top() == [("a", 6, 0), ("b", 3, 0)]
+    assert summary.floor == 0
+
+
+def testHyperLogLogRelativeError():
+    for precision, distinct in ((10, 300), (12, 20000), (14, 200000)):
+        sketch = HyperLogLog(precision)
+        sketch.addMany(f"192.168.{index}" for index in range(distinct))
+        # Repeated values do not change the estimate
+        sketch.addMany(f"192.168.{index}" for index in range(0, distinct, 7))
+        standardError = 1.04 / np.sqrt(1 << precision)
+        assert abs(sketch.count() - distinct) <= 4 * standardError * distinct
+
+
+def testHyperLogLogMergeEqualsUnion():
+    left, right, union = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+    left.addMany(f"port-{index}" for index in range(0, 6000))
+    right.addMany(f"port-{index}" for index in range(4000, 10000))
+    union.addMany(f"port-{index}" for index in range(0, 10000))
+    left.mergeFrom(right)
+    assert left.registers == union.registers
+    assert left.count() == union.count()
+    assert HyperLogLog(12).count() == 0
+
+
+def testCountMinNeverUndercountsAndStaysWithinBound():
+    rng = np.random.default_rng(5)
+    keys = np.minimum(rng.zipf(1.2, 100000), 20000)
+    sketch = CountMinSketch(width=2048, depth=4)
+    # Applied in batches, with keys repeated inside each batch
+    for batch in np.array_split(keys, 10):
+        sketch.add(hashKeys(batch.tolist()))
+    truth = Counter(keys.tolist())
+    distinct = np.array(list(truth))
+    exact = np.array([truth[key] for key in distinct])
+    estimates = sketch.estimate(hashKeys(distinct.tolist())).astype(np.int64)
+    assert np.all(estimates >= exact)
+    # Overcount exceeds e/width of the total with probability at most exp(-depth) per key
+    bound = np.e / sketch.width * len(keys)
+    assert np.mean(estimates - exact > bound) <= np.exp(-sketch.depth)
+
+
+def testCountMinWeightedCountsAndRotation():
+    sketch = CountMinSketch(width=1024, depth=3, ewmaAlpha=0.5)
+    hashes = hashKeys(["10.0.0.1", "10.0.0.2"])
+    sketch.add(hashes, np.array([10, 4]))
+    assert sketch.estimate(hashes).tolist() == [10, 4]
+    sketch.rotate()
+    assert sketch.estimate(hashes).tolist() == [0, 0]
+    assert sketch.baselineEstimate(hashes).tolist() == [5.0, 2.0]
+    sketch.add(hashes[:1], 10)
+    sketch.rotate()
+    # Three periods passed, two of them without traffic
+    sketch.rotate(3)
+    np.testing.assert_allclose(sketch.baselineEstimate(hashes), [7.5 * 0.5 ** 3, 1.0 * 0.5 ** 3])
+
+
+def testVirtualHyperLogLogPerKeyError():
+    rng = np.random.default_rng(6)
+    sketch = VirtualHyperLogLog(poolRegisters=1 << 18, virtualRegisters=128)
+    # A few scanners touching many ports, hidden among many ordinary sources
+    distinctPorts = {f"scanner-{index}": 500 * (index + 1) for index in range(4)}
+    distinctPorts.update({f"source-{index}": int(rng.integers(1, 20)) for index in range(3000)})
+    for source, ports in distinctPorts.items():
+        elements = np.arange(ports)
+        repeated = np.concatenate([elements, elements[: ports // 2]])
+        sketch.add(hashKeys([source] * len(repeated)), mix64(repeated))
+    sources = list(distinctPorts)
+    estimates = dict(zip(sources, sketch.estimate(hashKeys(sources)).tolist()))
+    # Standard error of a 128-register HLL is about 9%
+    for index in range(4):
+        source = f"scanner-{index}"
+        assert abs(estimates[source] - distinctPorts[source]) <= 0.35 * distinctPorts[source]
+    ordinary = [estimates[source] for source in sources if source.startswith("source-")]
+    assert max(ordinary) < 500 * 0.65
@@ -0,0 +1,163 @@
+"""
+testVerdictCache.py
+--------------------
+Behaviour tests for CachedModelHandler: hit/miss accounting, TTL expiry, LRU eviction,
+invalidation when the wrapped handler swaps models, and shadow submission.
+"""
+
+import numpy as np
+import pytest
+
+from app import config
+from app.ml import verdictCache
+from app.ml.modelInterface import BaseModelInterface, DefaultModelHandler
+from app.ml.verdictCache import CachedModelHandler
+
+
+class CountingModel(BaseModelInterface):
+    """
+    Labels rows by their 'length' feature and records every row it scores.
+    """
+
+    def __init__(self, loaded: bool = True):
+        self.modelVersion = 1
+        self.modelLoaded = loaded
+        self.shadow = None
+        self.scored = []
+
+    def scoreBatch(self, featureRows):
+        self.scored.extend(featureRows)
+        return ["HIGH" if features["length"] > 1000 else "LOW" for features in featureRows]
+
+    predictBatch = scoreBatch
+
+
+class RecordingShadow:
+    def __init__(self):
+        self.batches = []
+
+    def submit(self, featureRows, labels, elapsed):
+        self.batches.append((list(featureRows), list(labels)))
+
+
+class ThresholdModel:
+    """
+    sklearn-like model: predicts class 'label' for every row.
+    """
+
+    def __init__(self, label: int):
+        self.label = label
+
+    def predict(self, X):
+        return np.full(len(X), self.label)
+
+
+def row(length: float, mean: float = 0.0):
+    return {"length": length, "packet_mean": mean}
+
+
+def testRepeatedRowsAreServedFromCache():
+    model = CountingModel()
+    cache = CachedModelHandler(model)
+    assert cache.predictBatch([row(100), row(2000), row(100)]) == ["LOW", "HIGH", "LOW"]
+    # Duplicate keys within a batch are scored once
+    assert model.scored == [row(100), row(2000)]
+    assert cache.predict(row(2000)) == "HIGH"
+    assert len(model.scored) == 2
+    stats = cache.getStats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 3, 2)
+
+
+def testQuantizationSharesBuckets():
+    model = CountingModel()
+    cache = CachedModelHandler(model, quantization={"length": 100})
+    cache.predictBatch([row(110), row(150), row(199)])
+    assert len(model.scored) == 1
+    cache.predict(row(200))
+    assert len(model.scored) == 2
+
+
+def testEntriesExpireAfterTtl(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(verdictCache.time, "monotonic", lambda: clock[0])
+    model = CountingModel()
+    cache = CachedModelHandler(model, ttlSeconds=5.0)
+    cache.predict(row(100))
+    clock[0] += 4.0
+    cache.predict(row(100))
+    assert len(model.scored) == 1
+    clock[0] += 6.0
+    cache.predict(row(100))
+    assert len(model.scored) == 2
+    assert cache.getStats()["expirations"] == 1
+
+
+def testLeastRecentlyUsedEntryIsEvicted():
+    model = CountingModel()
+    cache = CachedModelHandler(model, maxEntries=2)
+    cache.predictBatch([row(1), row(2)])
+    cache.predict(row(1))
+    cache.predict(row(3))
+    assert cache.getStats()["evictions"] == 1
+    model.scored.clear()
+    cache.predictBatch([row(1), row(3)])
+    assert model.scored == []
+    cache.predict(row(2))
+    assert model.scored == [row(2)]
+
+
+def testVersionChangeInvalidatesCache():
+    model = CountingModel()
+    cache = CachedModelHandler(model)
+    cache.predict(row(100))
+    model.modelVersion += 1
+    cache.predict(row(100))
+    assert len(model.scored) == 2
+    assert cache.getStats()["invalidations"] == 1
+
+
+def testStubVerdictsAreNotCached():
+    model = CountingModel(loaded=False)
+    cache = CachedModelHandler(model)
+    cache.predict(row(100))
+    cache.predict(row(100))
+    assert len(model.scored) == 2
+    assert cache.getStats()["size"] == 0
+
+
+def testShadowReceivesFullBatch():
+    model = CountingModel()
+    model.shadow = RecordingShadow()
+    cache = CachedModelHandler(model)
+    cache.predict(row(100))
+    cache.predictBatch([row(100), row(2000)])
+    # Cached rows are shadow-scored too, with the labels actually served
+    assert model.shadow.batches[-1] == ([row(100), row(2000)], ["LOW", "HIGH"])
+    assert len(model.shadow.batches) == 2
+
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "MODEL_PATH", str(tmp_path / "missing.pkl"))
+    monkeypatch.setattr(config, "MODEL_REGISTRY_DIR", str(tmp_path / "models"))
+    return DefaultModelHandler(backend="sklearn")
+
+
+def testSwapInOnDefaultHandlerInvalidatesCache(handler):
+    handler.swapIn(ThresholdModel(0))
+    cache = CachedModelHandler(handler)
+    assert cache.predict(row(100)) == "LOW"
+    assert cache.predict(row(100)) == "LOW"
+    handler.swapIn(ThresholdModel(2))
+    assert cache.predict(row(100)) == "HIGH"
+    stats = cache.getStats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 2, 1)
+
+
+def testDefaultHandlerShadowSeesCachedBatches(handler):
+    handler.swapIn(ThresholdModel(1))
+    handler.shadow = RecordingShadow()
+    cache = CachedModelHandler(handler)
+    cache.predictBatch([row(100), row(100)])
+    cache.predictBatch([row(100)])
+    assert handler.shadow.batches == [([row(100), row(100)], ["MEDIUM", "MEDIUM"]), ([row(100)], ["MEDIUM"])]
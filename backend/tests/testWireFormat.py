@@ -0,0 +1,132 @@
+"""
+testWireFormat.py
+------------------
+Tests for content negotiation and encoding of packet list responses.
+"""
+
+import gzip
+import json
+
+import pytest
+
+from app import config
+from app.utils import wireFormat
+from app.utils.wireFormat import compress, encode, encodeResponse, negotiateEncoding, negotiateFormat, toColumns
+
+PACKETS = [
+    {"id": 1, "source": "10.0.0.1", "destination": "10.0.0.2", "protocol": "TCP", "length": 60, "risk": "LOW"},
+    {"id": 2, "source": "10.0.0.2", "destination": "10.0.0.1", "protocol": "UDP", "length": 1400, "risk": "HIGH"},
+]
+ENVELOPE = {"count": 2, "nextSinceId": 2}
+
+
+@pytest.fixture
+def missingPackage(monkeypatch):
+    """
+    Marks an optional package as not installed.
+    """
+    def mark(name: str) -> None:
+        monkeypatch.setitem(wireFormat._modules, name, None)
+    return mark
+
+
+def testQueryParameterWinsOverAccept():
+    assert negotiateFormat("json", "application/msgpack") == "json"
+    assert negotiateFormat(None, None) == "json"
+    assert negotiateFormat(None, "text/html, */*") == "json"
+
+
+def testAcceptHeaderQualities():
+    pytest.importorskip("msgpack")
+    pytest.importorskip("pyarrow")
+    assert negotiateFormat(None, "application/x-msgpack") == "msgpack"
+    assert negotiateFormat(None, "application/json;q=0.5, application/vnd.apache.arrow.stream") == "arrow"
+    assert negotiateFormat(None, "application/msgpack;q=0.4, application/json;q=0.9") == "json"
+    # Equal qualities keep the client's order; q=0 excludes a type
+    assert negotiateFormat(None, "application/msgpack, application/json") == "msgpack"
+    assert negotiateFormat(None, "application/msgpack;q=0, application/json;q=0.1") == "json"
+    assert negotiateFormat(None, "application/msgpack;q=oops") == "json"
+
+
+def testUnknownFormatIsRejected():
+    with pytest.raises(ValueError):
+        negotiateFormat("xml", None)
+
+
+def testMissingPackageRaisesRuntimeError(missingPackage):
+    missingPackage("msgpack")
+    with pytest.raises(RuntimeError, match="pip install msgpack"):
+        negotiateFormat("msgpack", None)
+    with pytest.raises(RuntimeError):
+        negotiateFormat(None, "application/msgpack")
+
+
+def testEncodingNegotiation(missingPackage):
+    assert negotiateEncoding(None) is None
+    assert negotiateEncoding("identity") is None
+    assert negotiateEncoding("gzip, deflate") == "gzip"
+    assert negotiateEncoding("*") == "gzip"
+    assert negotiateEncoding("gzip;q=0") is None
+    if wireFormat._optional("zstandard") is not None:
+        assert negotiateEncoding("gzip, zstd") == "zstd"
+    missingPackage("zstandard")
+    assert negotiateEncoding("zstd, gzip") == "gzip"
+    assert negotiateEncoding("zstd") is None
+
+
+def testToColumns():
+    assert toColumns([]) == {}
+    assert toColumns(PACKETS) == {
+        "id": [1, 2],
+        "source": ["10.0.0.1", "10.0.0.2"],
+        "destination": ["10.0.0.2", "10.0.0.1"],
+        "protocol": ["TCP", "UDP"],
+        "length": [60, 1400],
+        "risk": ["LOW", "HIGH"],
+    }
+    # Rows with differing fields are padded with None
+    assert toColumns([{"id": 1, "risk": "LOW"}, {"id": 2, "alert": "scan"}]) == {
+        "id": [1, 2], "risk": ["LOW", None], "alert": [None, "scan"],
+    }
+
+
+def testJsonEncodingLayouts():
+    assert json.loads(encode(ENVELOPE, PACKETS)) == {**ENVELOPE, "packets": PACKETS}
+    assert json.loads(encode(ENVELOPE, PACKETS, layout="columns")) == {**ENVELOPE, "columns": toColumns(PACKETS)}
+
+
+def testMsgpackRoundTrip():
+    msgpack = pytest.importorskip("msgpack")
+    body = encode(ENVELOPE, PACKETS, "msgpack", "columns")
+    assert msgpack.unpackb(body, raw=False) == {**ENVELOPE, "columns": toColumns(PACKETS)}
+
+
+def testArrowStreamIsColumnar():
+    pyarrow = pytest.importorskip("pyarrow")
+    body = encode(ENVELOPE, PACKETS, "arrow")
+    table = pyarrow.ipc.open_stream(body).read_all()
+    assert table.to_pydict() == toColumns(PACKETS)
+    assert json.loads(table.schema.metadata[b"nextSinceId"]) == 2
+
+
+def testCompressionThreshold(monkeypatch):
+    monkeypatch.setattr(config, "WIRE_COMPRESS_MIN_BYTES", 100)
+    small, large = b"x" * 99, b"x" * 100
+    assert compress(small, "gzip") == (small, None)
+    assert compress(large, None) == (large, None)
+    body, applied = compress(large, "gzip")
+    assert applied == "gzip" and gzip.decompress(body) == large
+    zstandard = pytest.importorskip("zstandard")
+    body, applied = compress(large, "zstd")
+    assert applied == "zstd" and zstandard.ZstdDecompressor().decompress(body) == large
+
+
+def testEncodeResponseHeaders(monkeypatch):
+    monkeypatch.setattr(config, "WIRE_COMPRESS_MIN_BYTES", 1)
+    body, mediaType, headers = encodeResponse(ENVELOPE, PACKETS, encoding="gzip")
+    assert mediaType == "application/json"
+    assert headers == {"Vary": "Accept, Accept-Encoding", "Content-Encoding": "gzip"}
+    assert json.loads(gzip.decompress(body)) == {**ENVELOPE, "packets": PACKETS}
+    monkeypatch.setattr(config, "WIRE_COMPRESS_MIN_BYTES", 1 << 20)
+    _, _, headers = encodeResponse(ENVELOPE, PACKETS, encoding="gzip")
+    assert "Content-Encoding" not in headers
@@ -1,28 +1,158 @@
-import pandas as pd
+"""
+trainRiskModel.py
+------------------
+Trains the packet risk model and stores it as a new version in the model
+registry (models/risk_model-v<N>.pkl + .json metadata + held-out test sample).
+
+- Trees are fitted on all cores (--n-jobs, default -1).
+- --warm-start VERSION adds --add-estimators new trees, trained on the given
+  data partition(s), to an existing version instead of refitting from scratch.
+- Parsed training matrices are cached as .npy files under --cache-dir, keyed
+  on the input file's path, size and mtime, so reruns skip parsing.
+
+Usage:
+    python trainRiskModel.py [--input processed_packets.parquet ...]
+    python trainRiskModel.py --input new_partition.parquet --warm-start latest --add-estimators 25
+"""
+
+import argparse
+import hashlib
+import os
+import time
+import numpy as np
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 from sklearn.model_selection import train_test_split
 import joblib
+from app import config
+from app.ml.compiledForest import CompiledForest
+from app.ml.modelInterface import LABEL_MAP
+from app.ml.modelRegistry import ModelRegistry
+from app.ml.trainingData import FEATURE_COLUMNS, loadProcessed
+
+DEFAULT_INPUTS = ["processed_packets.parquet", "processed_packets.npz", "processed_packets.csv"]
+RISK_LABELS = set(LABEL_MAP.values())
+# Test rows stored with each version to validate it before a hot swap
+HOLDOUT_ROWS = 10000
+
+
+def loadCached(path: str, cacheDir: str):
+    """
+    Loads (X, y) for one processed file, reusing the cached .npy matrices when the file is unchanged.
+    """
+    stat = os.stat(path)
+    key = hashlib.sha1(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+    featuresPath = os.path.join(cacheDir, f"{key}-X.npy")
+    labelsPath = os.path.join(cacheDir, f"{key}-y.npy")
+    if os.path.exists(featuresPath) and os.path.exists(labelsPath):
+        print(f"Loading cached training matrix for {path} ...")
+        return np.load(featuresPath, mmap_mode="r"), np.load(labelsPath, mmap_mode="r")
+
+    print(f"Parsing {path} ...")
+    X, y = loadProcessed(path)
+    os.makedirs(cacheDir, exist_ok=True)
+    np.save(featuresPath, np.ascontiguousarray(X, dtype=np.float32))
+    np.save(labelsPath, np.ascontiguousarray(y, dtype=np.int8))
+    return X, y
+
+
+def inferenceLatency(model, X: np.ndarray) -> dict:
+    """
+    Milliseconds needed to score 1,000 rows with sklearn and with the compiled forest backend.
+    """
+    rows = np.ascontiguousarray(np.resize(X, (1000, X.shape[1])), dtype=np.float32)
+    trainingJobs = model.n_jobs
+    # Match serving, where one batch is scored on one thread
+    model.n_jobs = 1
+    start = time.perf_counter()
+    model.predict(rows)
+    sklearnMs = (time.perf_counter() - start) * 1000
+    model.n_jobs = trainingJobs
+
+    compiled = CompiledForest.fromSklearn(model, maxBatch=config.INFERENCE_BATCH_SIZE)
+    start = time.perf_counter()
+    compiled.predict(rows)
+    compiledMs = (time.perf_counter() - start) * 1000
+    return {"sklearnMsPer1k": sklearnMs, "compiledMsPer1k": compiledMs}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train the packet risk model and register a new version.")
+    parser.add_argument("--input", nargs="+", default=None, help="processed data file(s) / partitions")
+    parser.add_argument("--n-estimators", type=int, default=100, help="trees for a fresh model")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="parallel tree fitting (-1 = all cores)")
+    parser.add_argument("--warm-start", default=None, help="registry version (number, latest, best) to extend")
+    parser.add_argument("--add-estimators", type=int, default=20, help="trees added to a warm-started model")
+    parser.add_argument("--test-size", type=float, default=0.2, help="held-out fraction for metrics")
+    parser.add_argument("--cache-dir", default=".cache/training", help="parsed matrix cache")
+    parser.add_argument("--registry", default=config.MODEL_REGISTRY_DIR, help="model registry directory")
+    args = parser.parse_args()
+
+    inputs = args.input or [next((path for path in DEFAULT_INPUTS if os.path.exists(path)), DEFAULT_INPUTS[-1])]
+    registry = ModelRegistry(args.registry)
+
+    # === Step 1: Load the processed data (cached between runs) ===
+    parts = [loadCached(path, args.cache_dir) for path in inputs]
+    X = np.concatenate([part[0] for part in parts]) if len(parts) > 1 else np.asarray(parts[0][0])
+    y = np.concatenate([part[1] for part in parts]) if len(parts) > 1 else np.asarray(parts[0][1])
+    print(f"Training matrix: {X.shape[0]:,} rows x {X.shape[1]} features")
 
-# === Step 1: Load the processed data ===
-df = pd.read_csv("processed_packets.csv")
+    # === Step 2: Train/test split ===
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=args.test_size, random_state=42)
 
-# === Step 2: Encode labels ===
-label_map = {"LOW": 0, "MEDIUM": 1, "HIGH": 2}
-df["risk_encoded"] = df["risk"].map(label_map)
+    # === Step 3: Train model (fresh, or warm-started from a registered version) ===
+    parentVersion = None
+    if args.warm_start:
+        parentVersion = registry.resolve(args.warm_start)
+        if parentVersion is None:
+            raise SystemExit(f"No registered model matches '{args.warm_start}'.")
+        model = joblib.load(registry.artifactPath(parentVersion))
+        missing = set(model.classes_.tolist()) - set(np.unique(y_train).tolist())
+        if missing:
+            # New trees must see every class or their probabilities can't be averaged with the old ones
+            raise SystemExit(f"Partition lacks classes {sorted(missing)} required to warm-start v{parentVersion}.")
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + args.add_estimators, n_jobs=args.n_jobs)
+        print(f"Warm-starting v{parentVersion}: adding {args.add_estimators} trees ...")
+    else:
+        model = RandomForestClassifier(
+            n_estimators=args.n_estimators, class_weight="balanced", random_state=42, n_jobs=args.n_jobs
+        )
 
-# === Step 3: Select features ===
-X = df[["length", "packet_mean", "packet_std"]]
-y = df["risk_encoded"]
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    trainingSeconds = time.perf_counter() - start
 
-# === Step 4: Train/test split ===
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # === Step 4: Evaluate ===
+    predictions = model.predict(X_test)
+    accuracy = accuracy_score(y_test, predictions)
+    print("Model accuracy:", accuracy)
+    report = classification_report(
+        y_test, predictions, labels=model.classes_,
+        target_names=[LABEL_MAP[int(code)] for code in model.classes_], output_dict=True, zero_division=0,
+    )
+    latency = inferenceLatency(model, X_test if len(X_test) else X_train)
+    print(f"Inference per 1k rows: sklearn {latency['sklearnMsPer1k']:.2f} ms, compiled {latency['compiledMsPer1k']:.2f} ms")
 
-# === Step 5: Train model ===
-model = RandomForestClassifier(n_estimators=100, class_weight="balanced", random_state=42)
-model.fit(X_train, y_train)
+    # === Step 5: Save a new registry version with metadata ===
+    model.set_params(warm_start=False, n_jobs=None)
+    version = registry.save(model, {
+        "features": list(FEATURE_COLUMNS),
+        "classes": [LABEL_MAP[int(code)] for code in model.classes_],
+        "params": {"n_estimators": model.n_estimators, "class_weight": "balanced", "random_state": 42},
+        "parentVersion": parentVersion,
+        "inputs": inputs,
+        "trainingRows": int(len(X_train)),
+        "testRows": int(len(X_test)),
+        "trainingSeconds": trainingSeconds,
+        "metrics": {
+            "accuracy": accuracy,
+            "perClass": {label: report[label] for label in report if label in RISK_LABELS},
+            "confusionMatrix": confusion_matrix(y_test, predictions, labels=model.classes_).tolist(),
+        },
+        "inference": latency,
+    }, holdout=(np.asarray(X_test[:HOLDOUT_ROWS], dtype=np.float32), np.asarray(y_test[:HOLDOUT_ROWS], dtype=np.int8)))
+    print(f"Model saved as {registry.artifactPath(version)} (version {version})")
 
-print("Model accuracy:", model.score(X_test, y_test))
 
-# === Step 6: Save model ===
-joblib.dump(model, "risk_model.pkl")
-print("Model saved as risk_model.pkl")
+if __name__ == "__main__":
+    main()
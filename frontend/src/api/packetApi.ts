@@ -38,3 +38,23 @@ export async function resetCapture(): Promise<any> {
   if (!response.ok) throw new Error("Failed to reset packet capture");
   return response.json();
 }
+
+/**
+ * Opens a WebSocket that pushes only newly captured packets, coalesced per tick.
+ * Returns the socket so the caller can close it when capture stops.
+ */
+export function openPacketStream(
+  onPackets: (packets: any[]) => void,
+  onError: (event: Event) => void,
+  apiKey: string = import.meta.env.VITE_API_KEY ?? "default-secret-key"
+): WebSocket {
+  const socket = new WebSocket(
+    `${BASE_URL.replace(/^http/, "ws")}/ws?api_key=${encodeURIComponent(apiKey)}`
+  );
+  socket.onmessage = (event) => {
+    const frame = JSON.parse(event.data);
+    onPackets(frame.packets ?? []);
+  };
+  socket.onerror = onError;
+  return socket;
+}
@@ -6,6 +6,7 @@ import {
   startCapture,
   stopCapture,
   getLatestPackets,
+  openPacketStream,
   resetCapture,
 } from "../api/packetApi";
 
@@ -65,7 +66,23 @@ const Dashboard = () => {
   };
 
   useEffect(() => {
-    let interval: NodeJS.Timeout | null = null;
+    let socket: WebSocket | null = null;
+
+    const appendPackets = (newPackets: Packet[]) => {
+      setAllPackets((prevPackets) => {
+        const merged = [...prevPackets, ...newPackets];
+        const unique = Array.from(new Map(merged.map((p) => [p.id, p])).values());
+        return unique;
+      });
+
+      setPackets((prev) => {
+        const combined = [...prev, ...newPackets];
+        const unique = Array.from(new Map(combined.map((p) => [p.id, p])).values());
+        return unique.slice(-10);
+      });
+
+      setError(null);
+    };
 
     const fetchPackets = async () => {
       try {
@@ -82,19 +99,7 @@ const Dashboard = () => {
           return;
         }
 
-        setAllPackets((prevPackets) => {
-          const merged = [...prevPackets, ...newPackets];
-          const unique = Array.from(new Map(merged.map((p) => [p.id, p])).values());
-          return unique;
-        });
-
-        setPackets((prev) => {
-          const combined = [...prev, ...newPackets];
-          const unique = Array.from(new Map(combined.map((p) => [p.id, p])).values());
-          return unique.slice(-10);
-        });
-
-        setError(null);
+        appendPackets(newPackets);
       } catch (err) {
         console.error("Error fetching packets:", err);
         setError("Error fetching packets from backend.");
@@ -102,12 +107,16 @@ const Dashboard = () => {
     };
 
     if (isActive) {
+      // Initial snapshot, then the server pushes only new packets
       fetchPackets();
-      interval = setInterval(fetchPackets, 2000);
+      socket = openPacketStream(appendPackets, (event) => {
+        console.error("Packet stream error:", event);
+        setError("Packet stream connection failed.");
+      });
     }
 
     return () => {
-      if (interval) clearInterval(interval);
+      if (socket) socket.close();
     };
   }, [isActive]);
 